@@ -4,9 +4,10 @@ Used for development to create WorldMap-related links from a layer name
 from __future__ import print_function
 import logging
 import re
-import requests
 from django.conf import settings
 
+from gc_apps.geo_utils.http_client import http_get
+
 LOGGER = logging.getLogger(__name__)
 
 GEONODE_PREFIX = 'geonode:'
@@ -130,7 +131,10 @@ class LayerLinkHelper(object):
 
         #print ('Attempt to retrieve SLD sld_url: %s' % sld_url)
 
-        resp = requests.get(sld_url, auth=settings.WORLDMAP_ACCOUNT_AUTH)
+        resp = http_get(sld_url,
+                        auth=settings.WORLDMAP_ACCOUNT_AUTH,
+                        timeout=settings.WORLDMAP_SHORT_TIMEOUT,
+                        endpoint_name='worldmap.get_sld')
 
         if not resp.status_code == 200:
             LOGGER.error('Failed to retrieve SLD: %s', sld_url)
@@ -12,8 +12,9 @@ from django.conf import settings
 
 from gc_apps.geo_utils.message_helper_json import MessageHelperJSON
 from gc_apps.geo_utils.error_result_msg import log_connect_error_message
+from gc_apps.geo_utils.http_client import http_post
 #from gc_apps.geo_utils.msg_util import msg
-from gc_apps.dv_notify.metadata_updater import MetadataUpdater
+from gc_apps.dv_notify.notification_outbox import NotificationOutbox
 from gc_apps.classification.utils import get_worldmap_info_object
 from gc_apps.gis_tabular.forms import SELECT_LABEL
 from gc_apps.geo_utils.json_field_reader import JSONHelper
@@ -179,10 +180,11 @@ def view_classify_layer_form(request, import_success_md5):
 
     resp = None
     try:
-        resp = requests.post(classify_url,\
+        resp = http_post(classify_url,\
                     data=classify_params,\
                     auth=settings.WORLDMAP_ACCOUNT_AUTH,\
-                    timeout=settings.WORLDMAP_DEFAULT_TIMEOUT)
+                    timeout=settings.WORLDMAP_DEFAULT_TIMEOUT,\
+                    endpoint_name='worldmap.classify_layer')
 
     except requests.exceptions.ConnectionError as exception_obj:
         err_msg = ('<b>Details for administrator:</b>'
@@ -298,7 +300,7 @@ def view_classify_layer_form(request, import_success_md5):
 
     # Is all this needed, or should there be a
     # Dataverse API call to only update the image?
-    MetadataUpdater.run_update_via_popen(worldmap_layerinfo)
+    NotificationOutbox.queue_update(worldmap_layerinfo)
 
     msg_params = classify_form.get_params_for_display()
 
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from gc_apps.dv_notify.models import DataverseNotification
+
+class DataverseNotificationAdmin(admin.ModelAdmin):
+    save_on_top = True
+    search_fields = ('layer_md5', 'dataverse_server_url')
+    list_display = ('layer_type', 'layer_md5', 'status', 'num_attempts',\
+                    'dataverse_server_url', 'next_attempt_time', 'sent_time',\
+                    'created')
+    list_filter = ('status', 'layer_type', 'dataverse_server_url')
+    readonly_fields = ('created', 'modified')
+
+admin.site.register(DataverseNotification, DataverseNotificationAdmin)
@@ -0,0 +1,111 @@
+"""
+Worker: send queued map metadata updates to Dataverse
+
+    python manage.py run_dv_notifier
+
+Notifications are added by NotificationOutbox.queue_update() when
+a map is created or restyled.  Run a single instance of this command.
+"""
+from __future__ import print_function
+import time
+
+from django.core.management.base import BaseCommand#, CommandError
+from django.db import close_old_connections
+
+from gc_apps.dv_notify.notification_outbox import NotificationOutbox,\
+    NotificationWorker, DEFAULT_BATCH_SIZE
+from gc_apps.geo_utils.msg_util import msg, dashes
+from gc_apps.geo_utils.http_client import log_endpoint_metrics
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    # Show this when the user types help
+    help = ('Send queued map metadata updates to Dataverse.'
+            '  Keeps polling the outbox unless "--once" is used.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            dest='run_once',
+            default=False,
+            help='Send the due notifications and then stop',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            dest='show_stats',
+            default=False,
+            help='Show the queue depth and latency and then stop',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='Max notifications per batch. (Default is %s)' % DEFAULT_BATCH_SIZE)
+
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            dest='sleep_seconds',
+            default=2.0,
+            help='Seconds to wait between batches. (Default is 2)')
+
+        parser.add_argument(
+            '--report-seconds',
+            type=int,
+            dest='report_seconds',
+            default=5 * 60,
+            help='Seconds between queue reports. (Default is 300)')
+
+    def show_stats(self):
+        """Log and print the queue stats"""
+        queue_stats = NotificationOutbox.get_queue_stats()
+        stats_line = ', '.join(['%s: %s' % (k, v) for k, v in queue_stats.items()])
+        LOGGER.info('Dataverse notification queue: %s', stats_line)
+        msg(stats_line)
+
+    def handle(self, *args, **options):
+
+        if options.get('show_stats'):
+            self.show_stats()
+            return
+
+        run_once = options.get('run_once', False)
+        sleep_seconds = options.get('sleep_seconds')
+        report_seconds = options.get('report_seconds')
+
+        dashes()
+        msg('Dataverse notification worker')
+        dashes()
+
+        num_reset = NotificationOutbox.reset_stuck_notifications()
+        if num_reset:
+            msg('Notification(s) returned to the queue: %s' % num_reset)
+
+        worker = NotificationWorker(batch_size=options.get('batch_size'))
+        last_report_time = 0
+
+        while True:
+            # Don't keep stale/broken db connections between batches
+            close_old_connections()
+
+            num_attempted = worker.process_batch()
+            if num_attempted:
+                msg('Notification(s) attempted: %s (sent: %s, retried: %s)' %\
+                    (num_attempted, worker.num_sent, worker.num_retried))
+
+            if time.time() - last_report_time > report_seconds:
+                self.show_stats()
+                log_endpoint_metrics(LOGGER)
+                last_report_time = time.time()
+
+            if run_once:
+                break
+
+            # Keep going if the batch was full
+            if num_attempted < worker.batch_size:
+                time.sleep(sleep_seconds)
@@ -10,9 +10,8 @@ Objects passed in for worldmap_layer_info include:
 from __future__ import print_function
 
 import os
-import shlex, subprocess
 import json
-import requests # for POST
+import requests # for exceptions
 
 if __name__ == '__main__':
     import sys
@@ -22,11 +21,14 @@ if __name__ == '__main__':
 
 from requests.exceptions import ConnectionError as RequestsConnectionError
 
+from django.conf import settings
+
 from gc_apps.classification.utils import get_worldmap_info_object
 
 from gc_apps.geo_utils.message_helper_json import MessageHelperJSON
 from gc_apps.geo_utils.msg_util import msgt
 from gc_apps.geo_utils.error_result_msg import log_connect_error_message
+from gc_apps.geo_utils.http_client import http_get, http_post
 
 
 from shared_dataverse_information.dataverse_info.url_helper import get_api_url_update_map_metadata,\
@@ -99,9 +101,10 @@ class MetadataUpdater(object):
 
         req = None
         try:
-            req = requests.post(api_delete_metadata_url,\
+            req = http_post(api_delete_metadata_url,\
                     data=json.dumps(params),\
-                    timeout=self.timeout_seconds)
+                    timeout=self.timeout_seconds,\
+                    endpoint_name='dataverse.delete_map_metadata')
         except requests.exceptions.Timeout:
             return (False, 'This request timed out.  (Time limit: %s seconds(s))'\
                 % self.timeout_seconds)
@@ -201,7 +204,9 @@ class MetadataUpdater(object):
             return (False, 'Download link for PNG not found')
 
         try:
-            resp = requests.get(url_to_check)
+            resp = http_get(url_to_check,
+                            timeout=settings.WORLDMAP_SHORT_TIMEOUT,
+                            endpoint_name='worldmap.wms_thumbnail')
         except RequestsConnectionError as ex_obj:
             #print 'err', ex_obj
             err_msg = 'Error connecting to WorldMap server: %s' % ex_obj.message
@@ -250,9 +255,10 @@ class MetadataUpdater(object):
 
         req = None
         try:
-            req = requests.post(api_update_url,\
+            req = http_post(api_update_url,\
                 data=json.dumps(dv_metadata_params),\
-                timeout=self.timeout_seconds)
+                timeout=self.timeout_seconds,\
+                endpoint_name='dataverse.update_map_metadata')
         except requests.exceptions.Timeout:
             return self.get_result_msg(False,\
                 'This request timed out.  (Time limit: %s seconds(s))'\
@@ -390,37 +396,6 @@ class MetadataUpdater(object):
         return True, None
 
 
-    @staticmethod
-    def run_update_via_popen(worldmap_layer_info, num_attempts=3, seconds_delay=3):
-        """
-        Run the Dataverse update as a separate process
-        (Cheap way of not using a queue)
-        """
-        if worldmap_layer_info is None:
-            return False, 'worldmap_layer_info was None'
-
-        dj_settings_mod = os.environ.get('DJANGO_SETTINGS_MODULE', 'geoconnect.settings')
-
-        cmd_name = ('python manage.py update_dv_metadata'
-                    ' --md5={0} --type={1}'
-                    ' --delay={2} --num_attempts={3}'
-                    ' --settings={4}').format(\
-                     worldmap_layer_info.md5,
-                     worldmap_layer_info.get_layer_type(),
-                     seconds_delay,
-                     num_attempts,
-                     dj_settings_mod)
-
-        print ('cmd_name: %s' % cmd_name)
-        LOGGER.info('run command %s' % cmd_name)
-        cmd_args = shlex.split(cmd_name)
-        #subprocess.Popen([sys.executable, cmd_name],
-        subprocess.Popen(cmd_args,
-                         stdout=subprocess.PIPE)
-                         #stderr=subprocess.STDOUT)
-
-        print('let it go...')
-
 if __name__ == '__main__':
     pass
     #f2 = '../../scripts/worldmap_api/test_shps/poverty_1990_gfz.zip'
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 10:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataverseNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('layer_type', models.CharField(max_length=50)),
+                ('layer_md5', models.CharField(db_index=True, max_length=40)),
+                ('dataverse_server_url', models.CharField(db_index=True, max_length=255)),
+                ('status', models.CharField(choices=[(b'pending', b'pending'), (b'sending', b'sending'), (b'sent', b'sent'), (b'failed', b'failed')], db_index=True, default=b'pending', max_length=50)),
+                ('next_attempt_time', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('num_attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('sent_time', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('next_attempt_time',),
+                'verbose_name': 'Dataverse Notification',
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+"""
+Outbox of map metadata updates to send to Dataverse installations.
+
+Rows are added by NotificationOutbox.queue_update() and sent
+by the "run_dv_notifier" management command.
+"""
+from django.db import models
+from django.utils import timezone
+
+from gc_apps.core.models import TimeStampedModel
+
+NOTIFICATION_STATUS_PENDING = 'pending'
+NOTIFICATION_STATUS_SENDING = 'sending'
+NOTIFICATION_STATUS_SENT = 'sent'
+NOTIFICATION_STATUS_FAILED = 'failed'
+NOTIFICATION_STATUSES = (NOTIFICATION_STATUS_PENDING,\
+                         NOTIFICATION_STATUS_SENDING,\
+                         NOTIFICATION_STATUS_SENT,\
+                         NOTIFICATION_STATUS_FAILED)
+NOTIFICATION_STATUS_CHOICES = [(x, x) for x in NOTIFICATION_STATUSES]
+
+
+class DataverseNotification(TimeStampedModel):
+    """
+    A pending (or completed) map metadata update for a Dataverse installation
+    """
+    # Used to retrieve the WorldMapLayerInfo object
+    #   - see gc_apps.classification.utils.get_worldmap_info_object
+    layer_type = models.CharField(max_length=50)
+    layer_md5 = models.CharField(max_length=40, db_index=True)
+
+    # Dataverse installation; the backoff is applied per url
+    dataverse_server_url = models.CharField(max_length=255, db_index=True)
+
+    status = models.CharField(max_length=50,\
+                    choices=NOTIFICATION_STATUS_CHOICES,\
+                    default=NOTIFICATION_STATUS_PENDING,\
+                    db_index=True)
+
+    next_attempt_time = models.DateTimeField(default=timezone.now, db_index=True)
+    num_attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_time = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '%s %s (%s)' % (self.layer_type, self.layer_md5, self.status)
+
+    def __unicode__(self):
+        return self.__str__()
+
+    def get_latency_seconds(self):
+        """Seconds between the notification being queued and sent"""
+        if self.sent_time is None:
+            return None
+        return (self.sent_time - self.created).total_seconds()
+
+    class Meta:
+        ordering = ('next_attempt_time',)
+        verbose_name = 'Dataverse Notification'
@@ -0,0 +1,317 @@
+"""
+Send map metadata updates to Dataverse via a database outbox.
+
+- NotificationOutbox.queue_update() adds a DataverseNotification
+- The "run_dv_notifier" management command runs a NotificationWorker
+  which sends due notifications in batches, grouped by Dataverse
+  installation
+
+Retries use exponential backoff:
+    - per notification, e.g. the WorldMap thumbnail isn't ready yet
+    - per Dataverse installation, e.g. the server is down.  All pending
+      notifications for that installation are pushed back
+"""
+from __future__ import print_function
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db.models import Min
+from django.utils import timezone
+
+from gc_apps.classification.utils import get_worldmap_info_object
+from gc_apps.dv_notify.models import DataverseNotification,\
+    NOTIFICATION_STATUS_PENDING, NOTIFICATION_STATUS_SENDING,\
+    NOTIFICATION_STATUS_SENT, NOTIFICATION_STATUS_FAILED
+from gc_apps.dv_notify.metadata_updater import MetadataUpdater,\
+    ERROR_DV_NO_SERVER_RESPONSE, ERROR_DV_METADATA_UPDATE
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+# Give GeoServer time to create the layer thumbnail (PNG)
+NOTIFY_INITIAL_DELAY_SECONDS = 3
+
+# Give up after this many attempts
+NOTIFY_MAX_ATTEMPTS = 8
+
+# Backoff: 10s, 20s, 40s, ... up to an hour
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 60 * 60
+
+DEFAULT_BATCH_SIZE = 50
+
+# Errors that mean the Dataverse installation itself is unavailable
+INSTALLATION_ERROR_PREFIXES = (ERROR_DV_NO_SERVER_RESPONSE,
+                               ERROR_DV_METADATA_UPDATE,
+                               'This request timed out.')
+
+
+def get_backoff_seconds(num_failures):
+    """Exponential backoff: the wait doubles with each failure"""
+    num_failures = max(num_failures, 1)
+    return min(BACKOFF_BASE_SECONDS * (2 ** (num_failures - 1)),
+               BACKOFF_MAX_SECONDS)
+
+
+def is_installation_error(err_msg):
+    """Is the Dataverse installation down/unreachable?"""
+    if not err_msg:
+        return False
+    return err_msg.startswith(INSTALLATION_ERROR_PREFIXES)
+
+
+class NotificationOutbox(object):
+    """
+    Add, claim, send, and report on DataverseNotification objects
+    """
+
+    @staticmethod
+    def queue_update(worldmap_layer_info, delay_seconds=NOTIFY_INITIAL_DELAY_SECONDS):
+        """
+        Queue a metadata update for a WorldMapLayerInfo object.
+
+        If an update for the same layer is already pending, reuse it.
+
+        returns a DataverseNotification (or None)
+        """
+        if worldmap_layer_info is None:
+            LOGGER.warn('queue_update: worldmap_layer_info was None')
+            return None
+
+        MetadataUpdater.check_for_required_methods(worldmap_layer_info)
+
+        next_attempt_time = timezone.now() + timedelta(seconds=delay_seconds)
+
+        notification = DataverseNotification.objects.filter(\
+                                layer_md5=worldmap_layer_info.md5,
+                                layer_type=worldmap_layer_info.get_layer_type(),
+                                status=NOTIFICATION_STATUS_PENDING).first()
+        if notification is not None:
+            return notification
+
+        return DataverseNotification.objects.create(\
+                    layer_type=worldmap_layer_info.get_layer_type(),
+                    layer_md5=worldmap_layer_info.md5,
+                    dataverse_server_url=worldmap_layer_info.get_dataverse_server_url() or '',
+                    next_attempt_time=next_attempt_time)
+
+    @staticmethod
+    def get_due_notifications(batch_size=DEFAULT_BATCH_SIZE):
+        """Pending notifications whose next attempt time has passed"""
+        return list(DataverseNotification.objects.filter(\
+                            status=NOTIFICATION_STATUS_PENDING,
+                            next_attempt_time__lte=timezone.now()\
+                        ).order_by('next_attempt_time')[:batch_size])
+
+    @staticmethod
+    def claim(notification):
+        """
+        Move a pending notification to "sending".
+        returns True if this process claimed it
+        """
+        num_updated = DataverseNotification.objects.filter(\
+                            pk=notification.pk,
+                            status=NOTIFICATION_STATUS_PENDING\
+                        ).update(status=NOTIFICATION_STATUS_SENDING,
+                                 modified=timezone.now())
+        if num_updated != 1:
+            return False
+
+        notification.status = NOTIFICATION_STATUS_SENDING
+        return True
+
+    @staticmethod
+    def send(notification):
+        """
+        Send the metadata to Dataverse.
+
+        returns (True, None) or (False, "error message")
+        """
+        worldmap_layerinfo = get_worldmap_info_object(\
+                                    notification.layer_type,
+                                    notification.layer_md5)
+        if worldmap_layerinfo is None:
+            return False, "worldmap_layerinfo not found"
+
+        success, err_or_None = MetadataUpdater.make_wms_thumbnail_check(\
+                                    worldmap_layerinfo)
+        if not success:
+            return False, err_or_None
+
+        success, resp_dict = MetadataUpdater.update_dataverse_with_metadata(\
+                                    worldmap_layerinfo)
+        if not success:
+            return False, resp_dict.get('message', 'Sorry! The update failed.')
+
+        return True, None
+
+    @staticmethod
+    def mark_sent(notification):
+        """Record a successful send"""
+        notification.num_attempts += 1
+        notification.status = NOTIFICATION_STATUS_SENT
+        notification.sent_time = timezone.now()
+        notification.last_error = ''
+        notification.save()
+
+    @staticmethod
+    def mark_for_retry(notification, err_msg, backoff_seconds=None):
+        """
+        Record a failed attempt and schedule the next one.
+        After NOTIFY_MAX_ATTEMPTS, the notification is marked as failed.
+        """
+        notification.num_attempts += 1
+        notification.last_error = err_msg or ''
+
+        if notification.num_attempts >= NOTIFY_MAX_ATTEMPTS:
+            LOGGER.error('Dataverse notification failed after %s attempts: %s (%s)',
+                         notification.num_attempts, notification, err_msg)
+            notification.status = NOTIFICATION_STATUS_FAILED
+            notification.save()
+            return
+
+        if backoff_seconds is None:
+            backoff_seconds = get_backoff_seconds(notification.num_attempts)
+
+        notification.status = NOTIFICATION_STATUS_PENDING
+        notification.next_attempt_time = timezone.now() +\
+                                          timedelta(seconds=backoff_seconds)
+        notification.save()
+
+    @staticmethod
+    def postpone_installation(dataverse_server_url, backoff_seconds):
+        """
+        Push back all pending notifications for a Dataverse installation
+        returns the number postponed
+        """
+        next_attempt_time = timezone.now() + timedelta(seconds=backoff_seconds)
+
+        return DataverseNotification.objects.filter(\
+                        dataverse_server_url=dataverse_server_url,
+                        status=NOTIFICATION_STATUS_PENDING,
+                        next_attempt_time__lt=next_attempt_time\
+                    ).update(next_attempt_time=next_attempt_time)
+
+    @staticmethod
+    def reset_stuck_notifications():
+        """
+        A worker stopped mid-send: put "sending" notifications
+        back in the queue.  Only call this with a single worker running.
+        """
+        return DataverseNotification.objects.filter(\
+                        status=NOTIFICATION_STATUS_SENDING\
+                    ).update(status=NOTIFICATION_STATUS_PENDING)
+
+    @staticmethod
+    def get_queue_stats(window_seconds=60 * 60):
+        """
+        Report on the queue:
+            - num_pending, num_due, num_failed
+            - oldest_pending_seconds: age of the oldest pending notification
+            - num_sent: sent within "window_seconds"
+            - avg_latency_seconds/max_latency_seconds: queued -> sent,
+                within "window_seconds"
+        """
+        current_time = timezone.now()
+
+        pending_qs = DataverseNotification.objects.filter(\
+                            status=NOTIFICATION_STATUS_PENDING)
+
+        oldest_created = pending_qs.aggregate(Min('created'))['created__min']
+        if oldest_created is None:
+            oldest_pending_seconds = None
+        else:
+            oldest_pending_seconds = (current_time - oldest_created).total_seconds()
+
+        sent_times = DataverseNotification.objects.filter(\
+                            status=NOTIFICATION_STATUS_SENT,
+                            sent_time__gte=current_time - timedelta(seconds=window_seconds)\
+                        ).values_list('created', 'sent_time')
+        latencies = [(sent_time - created).total_seconds()\
+                     for created, sent_time in sent_times]
+
+        return OrderedDict([\
+            ('num_pending', pending_qs.count()),
+            ('num_due', pending_qs.filter(next_attempt_time__lte=current_time).count()),
+            ('num_failed', DataverseNotification.objects.filter(\
+                                status=NOTIFICATION_STATUS_FAILED).count()),
+            ('oldest_pending_seconds', oldest_pending_seconds),
+            ('num_sent', len(latencies)),
+            ('avg_latency_seconds', sum(latencies) / len(latencies) if latencies else None),
+            ('max_latency_seconds', max(latencies) if latencies else None),
+            ])
+
+
+class NotificationWorker(object):
+    """
+    Used by the long-running "run_dv_notifier" command.
+
+    Keeps a count of consecutive failures per Dataverse installation
+    to compute its backoff.
+    """
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.installation_failures = {}  # { dataverse_server_url : count }
+        self.num_sent = 0
+        self.num_retried = 0
+
+    def process_batch(self):
+        """
+        Send the due notifications, grouped by Dataverse installation.
+
+        returns the number of notifications attempted
+        """
+        notifications_by_installation = OrderedDict()
+        for notification in NotificationOutbox.get_due_notifications(self.batch_size):
+            notifications_by_installation.setdefault(\
+                    notification.dataverse_server_url, []).append(notification)
+
+        num_attempted = 0
+        for server_url, notifications in notifications_by_installation.items():
+            num_attempted += self.process_installation(server_url, notifications)
+
+        return num_attempted
+
+    def process_installation(self, server_url, notifications):
+        """
+        Send notifications for a single Dataverse installation.
+
+        If the installation is unavailable, stop and back off all
+        of its pending notifications.
+        """
+        num_attempted = 0
+        for notification in notifications:
+            if not NotificationOutbox.claim(notification):
+                continue
+
+            num_attempted += 1
+            try:
+                success, err_msg = NotificationOutbox.send(notification)
+            except Exception as ex_obj:
+                LOGGER.exception('Dataverse notification error: %s', notification)
+                success, err_msg = False, 'Unexpected error: %s' % ex_obj
+
+            if success:
+                NotificationOutbox.mark_sent(notification)
+                self.installation_failures[server_url] = 0
+                self.num_sent += 1
+                continue
+
+            self.num_retried += 1
+            if not is_installation_error(err_msg):
+                NotificationOutbox.mark_for_retry(notification, err_msg)
+                continue
+
+            # The installation is unavailable: back off
+            num_failures = self.installation_failures.get(server_url, 0) + 1
+            self.installation_failures[server_url] = num_failures
+            backoff_seconds = get_backoff_seconds(num_failures)
+
+            LOGGER.warn('Dataverse unavailable (%s). Backing off %s seconds: %s',
+                        server_url, backoff_seconds, err_msg)
+
+            NotificationOutbox.mark_for_retry(notification, err_msg, backoff_seconds)
+            NotificationOutbox.postpone_installation(server_url, backoff_seconds)
+            break
+
+        return num_attempted
@@ -0,0 +1,128 @@
+from __future__ import print_function
+from datetime import timedelta
+
+from django.test import TestCase
+from django.core import management
+from django.utils import timezone
+
+from gc_apps.gis_tabular.models import WorldMapJoinLayerInfo
+from gc_apps.geo_utils.msg_util import msgt
+from gc_apps.dv_notify.models import DataverseNotification,\
+    NOTIFICATION_STATUS_PENDING,\
+    NOTIFICATION_STATUS_SENT, NOTIFICATION_STATUS_FAILED
+from gc_apps.dv_notify.metadata_updater import ERROR_DV_NO_SERVER_RESPONSE
+from gc_apps.dv_notify.notification_outbox import NotificationOutbox,\
+    get_backoff_seconds, is_installation_error,\
+    NOTIFY_MAX_ATTEMPTS, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS
+
+
+class NotificationOutboxTestCase(TestCase):
+    """
+    Test the Dataverse notification outbox (no network calls)
+    """
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+        self.worldmap_info = WorldMapJoinLayerInfo.objects.first()
+
+    def test_01_queue_update(self):
+        """Queued updates are de-duplicated while pending"""
+        msgt(self.test_01_queue_update.__doc__)
+
+        self.assertEqual(NotificationOutbox.queue_update(None), None)
+
+        notification = NotificationOutbox.queue_update(self.worldmap_info)
+        self.assertEqual(notification.status, NOTIFICATION_STATUS_PENDING)
+        self.assertEqual(notification.layer_md5, self.worldmap_info.md5)
+        self.assertEqual(notification.layer_type,
+                         self.worldmap_info.get_layer_type())
+        self.assertEqual(notification.dataverse_server_url,
+                         self.worldmap_info.get_dataverse_server_url())
+
+        # Not due yet: there's an initial delay
+        self.assertEqual(NotificationOutbox.get_due_notifications(), [])
+
+        notification2 = NotificationOutbox.queue_update(self.worldmap_info)
+        self.assertEqual(notification2.id, notification.id)
+
+        # Claim it once
+        DataverseNotification.objects.update(next_attempt_time=timezone.now())
+        due_list = NotificationOutbox.get_due_notifications()
+        self.assertEqual(len(due_list), 1)
+        self.assertTrue(NotificationOutbox.claim(due_list[0]))
+        self.assertFalse(NotificationOutbox.claim(notification))
+
+        # While sending, a new update is queued separately
+        notification3 = NotificationOutbox.queue_update(self.worldmap_info)
+        self.assertNotEqual(notification3.id, notification.id)
+
+        self.assertEqual(NotificationOutbox.reset_stuck_notifications(), 1)
+        self.assertEqual(DataverseNotification.objects.get(pk=notification.id).status,
+                         NOTIFICATION_STATUS_PENDING)
+
+    def test_02_backoff(self):
+        """Exponential backoff and installation errors"""
+        msgt(self.test_02_backoff.__doc__)
+
+        self.assertEqual(get_backoff_seconds(1), BACKOFF_BASE_SECONDS)
+        self.assertEqual(get_backoff_seconds(2), BACKOFF_BASE_SECONDS * 2)
+        self.assertEqual(get_backoff_seconds(3), BACKOFF_BASE_SECONDS * 4)
+        self.assertEqual(get_backoff_seconds(50), BACKOFF_MAX_SECONDS)
+
+        self.assertTrue(is_installation_error(\
+                    '%s http://dv.example.edu' % ERROR_DV_NO_SERVER_RESPONSE))
+        self.assertFalse(is_installation_error('worldmap_layerinfo not found'))
+        self.assertFalse(is_installation_error(None))
+
+        notification = NotificationOutbox.queue_update(self.worldmap_info)
+
+        # Retry later
+        NotificationOutbox.mark_for_retry(notification, 'PNG not ready')
+        notification = DataverseNotification.objects.get(pk=notification.id)
+        self.assertEqual(notification.status, NOTIFICATION_STATUS_PENDING)
+        self.assertEqual(notification.num_attempts, 1)
+        self.assertEqual(notification.last_error, 'PNG not ready')
+        self.assertTrue(notification.next_attempt_time >\
+                        timezone.now() + timedelta(seconds=BACKOFF_BASE_SECONDS - 2))
+
+        # Push back the whole installation
+        num_postponed = NotificationOutbox.postpone_installation(\
+                            notification.dataverse_server_url, 600)
+        self.assertEqual(num_postponed, 1)
+        notification = DataverseNotification.objects.get(pk=notification.id)
+        self.assertTrue(notification.next_attempt_time >\
+                        timezone.now() + timedelta(seconds=590))
+
+        # Give up after the max attempts
+        notification.num_attempts = NOTIFY_MAX_ATTEMPTS - 1
+        NotificationOutbox.mark_for_retry(notification, 'Still failing')
+        self.assertEqual(DataverseNotification.objects.get(pk=notification.id).status,
+                         NOTIFICATION_STATUS_FAILED)
+
+    def test_03_queue_stats(self):
+        """Queue depth and latency"""
+        msgt(self.test_03_queue_stats.__doc__)
+
+        queue_stats = NotificationOutbox.get_queue_stats()
+        self.assertEqual(queue_stats['num_pending'], 0)
+        self.assertEqual(queue_stats['oldest_pending_seconds'], None)
+        self.assertEqual(queue_stats['avg_latency_seconds'], None)
+
+        notification = NotificationOutbox.queue_update(self.worldmap_info)
+        queue_stats = NotificationOutbox.get_queue_stats()
+        self.assertEqual(queue_stats['num_pending'], 1)
+        self.assertEqual(queue_stats['num_due'], 0)
+        self.assertTrue(queue_stats['oldest_pending_seconds'] >= 0)
+
+        DataverseNotification.objects.filter(pk=notification.id).update(\
+                        created=timezone.now() - timedelta(seconds=30))
+        notification = DataverseNotification.objects.get(pk=notification.id)
+        NotificationOutbox.mark_sent(notification)
+        self.assertEqual(notification.status, NOTIFICATION_STATUS_SENT)
+
+        queue_stats = NotificationOutbox.get_queue_stats()
+        self.assertEqual(queue_stats['num_pending'], 0)
+        self.assertEqual(queue_stats['num_sent'], 1)
+        self.assertTrue(29 < queue_stats['avg_latency_seconds'] < 60)
+        self.assertEqual(queue_stats['avg_latency_seconds'],
+                         queue_stats['max_latency_seconds'])
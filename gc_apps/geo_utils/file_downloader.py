@@ -0,0 +1,294 @@
+"""
+Download a file (e.g. a Dataverse DataFile) straight into a Django FileField.
+
+- The response is read in chunks and written to the field's storage
+  (local or S3) as it arrives--no temp file, no full copy in memory
+- A maximum size guard, checked against the Content-Length and
+  while reading
+- An optional progress callback: progress_callback(num_bytes, total_bytes)
+- If the transfer drops, it's resumed with an HTTP Range request
+
+Usage:
+    success, err_msg_or_None = download_to_file_field(\
+                                    datafile_download_url,
+                                    shapefile_info.dv_file,
+                                    datafile_filename)
+"""
+from __future__ import print_function
+import httplib
+import io
+import socket
+import time
+
+import requests
+from requests.packages.urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from django.conf import settings
+from django.core.files import File
+
+from gc_apps.geo_utils.http_client import http_get
+from gc_apps.geo_utils.fsize_human_readable import sizeof_fmt
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024   # 1 MB
+DEFAULT_MAX_RESUMES = 3
+RESUME_WAIT_SECONDS = 1
+
+# A transfer that drops raises one of these while reading
+RESUMABLE_ERRORS = (requests.exceptions.RequestException,
+                    Urllib3HTTPError,
+                    httplib.HTTPException,
+                    socket.error)
+
+
+class DownloadError(Exception):
+    """The file could not be downloaded"""
+    pass
+
+
+class DownloadTooLargeError(DownloadError):
+    """The file is larger than the maximum download size"""
+    pass
+
+
+def get_content_range_start(resp):
+    """
+    e.g. "Content-Range: bytes 1000-4999/5000" returns 1000
+    returns None if not found
+    """
+    content_range = resp.headers.get('content-range', '')
+    if not content_range.startswith('bytes '):
+        return None
+    try:
+        return int(content_range[len('bytes '):].split('-')[0])
+    except ValueError:
+        return None
+
+
+class ResumableDownload(object):
+    """
+    Read-only, file-like view of a url.  read() pulls the next chunk
+    from the response; on a dropped connection it reconnects with an
+    HTTP Range header and continues where it stopped.
+
+    If the server ignores the Range header (status 200), the bytes
+    already read are skipped.
+    """
+
+    def __init__(self, url, max_bytes=None, progress_callback=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_resumes=DEFAULT_MAX_RESUMES,
+                 timeout=None, endpoint_name='dataverse.download_file'):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.progress_callback = progress_callback
+        self.chunk_size = chunk_size
+        self.max_resumes = max_resumes
+        self.timeout = timeout or settings.WORLDMAP_DEFAULT_TIMEOUT
+        self.endpoint_name = endpoint_name
+
+        self.resp = None
+        self.num_bytes = 0
+        self.total_bytes = None     # from the first Content-Length
+        self.num_resumes = 0
+        self.closed = False
+
+    @property
+    def size(self):
+        """Bytes read so far (the full size once the download is done)"""
+        return self.num_bytes
+
+    def make_request(self):
+        """Request the url, starting from byte "num_bytes" """
+        headers = {'Accept-Encoding': 'identity'}
+        if self.num_bytes:
+            headers['Range'] = 'bytes=%d-' % self.num_bytes
+
+        return http_get(self.url,
+                        headers=headers,
+                        stream=True,
+                        timeout=self.timeout,
+                        endpoint_name=self.endpoint_name)
+
+    def open(self):
+        """Make the first request, check the status and size"""
+        self.resp = self.make_request()
+
+        if self.resp.status_code != 200:
+            raise DownloadError('Status code: %s' % self.resp.status_code)
+
+        content_length = self.resp.headers.get('content-length')
+        if content_length and content_length.isdigit():
+            self.total_bytes = int(content_length)
+            self.check_size(self.total_bytes)
+
+    def resume(self, err):
+        """The transfer dropped. Reconnect at the current byte"""
+        self.num_resumes += 1
+        if self.num_resumes > self.max_resumes:
+            raise DownloadError('Download failed after %s bytes and %s retries: %s'\
+                                % (self.num_bytes, self.max_resumes, err))
+
+        LOGGER.warn('Download dropped after %s bytes (%s). Resuming: %s',
+                    self.num_bytes, err, self.endpoint_name)
+        self.close_response()
+        time.sleep(RESUME_WAIT_SECONDS)
+
+        self.resp = self.make_request()
+
+        if self.resp.status_code == 206:
+            if get_content_range_start(self.resp) != self.num_bytes:
+                raise DownloadError('Unexpected Content-Range: %s'\
+                                    % self.resp.headers.get('content-range'))
+            return
+
+        if self.resp.status_code != 200:
+            raise DownloadError('Status code: %s' % self.resp.status_code)
+
+        # Range not supported: skip what was already read
+        num_to_skip = self.num_bytes
+        while num_to_skip > 0:
+            skipped = self.resp.raw.read(min(num_to_skip, self.chunk_size))
+            if not skipped:
+                raise DownloadError('File shorter than the bytes already read')
+            num_to_skip -= len(skipped)
+
+    def check_size(self, num_bytes):
+        """Enforce "max_bytes" """
+        if self.max_bytes and num_bytes > self.max_bytes:
+            raise DownloadTooLargeError(\
+                'The file is larger than the maximum download size: %s'\
+                % sizeof_fmt(self.max_bytes))
+
+    def read_chunk(self, size):
+        """Read up to "size" bytes, resuming if the transfer drops"""
+        if self.resp is None:
+            self.open()
+
+        while True:
+            try:
+                chunk = self.resp.raw.read(size)
+            except RESUMABLE_ERRORS as ex_obj:
+                self.resume(ex_obj)
+                continue
+
+            if chunk:
+                break
+
+            # End of the response.  Complete?
+            if self.total_bytes is None or self.num_bytes >= self.total_bytes:
+                return ''
+
+            self.resume('connection closed at %s of %s bytes'\
+                        % (self.num_bytes, self.total_bytes))
+
+        self.num_bytes += len(chunk)
+        self.check_size(self.num_bytes)
+
+        if self.progress_callback is not None:
+            self.progress_callback(self.num_bytes, self.total_bytes)
+
+        return chunk
+
+    def read(self, size=-1):
+        """
+        Read "size" bytes (fewer at the end of the file).
+        With no size, read "chunk_size" bytes--never the whole file
+        """
+        if size is None or size < 0:
+            size = self.chunk_size
+
+        chunks = []
+        num_remaining = size
+        while num_remaining > 0:
+            chunk = self.read_chunk(num_remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            num_remaining -= len(chunk)
+
+        return ''.join(chunks)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Storage backends "rewind" before reading: only allowed at the start"""
+        if offset == 0 and whence == io.SEEK_SET and self.num_bytes == 0:
+            return
+        raise io.UnsupportedOperation('ResumableDownload is not seekable')
+
+    def tell(self):
+        return self.num_bytes
+
+    def seekable(self):
+        return False
+
+    def readable(self):
+        return True
+
+    def close_response(self):
+        if self.resp is not None:
+            self.resp.close()
+            self.resp = None
+
+    def close(self):
+        self.close_response()
+        self.closed = True
+
+
+class DownloadProgressLogger(object):
+    """progress_callback that logs every "log_every_bytes" """
+
+    def __init__(self, label, log_every_bytes=50 * 1024 * 1024):
+        self.label = label
+        self.log_every_bytes = log_every_bytes
+        self.next_log_bytes = log_every_bytes
+
+    def __call__(self, num_bytes, total_bytes):
+        if num_bytes < self.next_log_bytes:
+            return
+        self.next_log_bytes = num_bytes + self.log_every_bytes
+        LOGGER.info('%s: downloaded %s of %s', self.label, sizeof_fmt(num_bytes),
+                    sizeof_fmt(total_bytes) if total_bytes else '(unknown)')
+
+
+def download_to_file_field(url, field_file, file_name, progress_callback=None,
+                           max_bytes=None, save=True, **kwargs):
+    """
+    Stream the url into a FieldFile, e.g. shapefile_info.dv_file.
+    As with FieldFile.save(), the model instance is saved unless "save" is False
+
+    max_bytes defaults to settings.DV_FILE_MAX_DOWNLOAD_BYTES
+
+    returns (True, None)
+        or (False, 'error message')
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'DV_FILE_MAX_DOWNLOAD_BYTES', None)
+
+    if progress_callback is None:
+        progress_callback = DownloadProgressLogger(file_name)
+
+    download = ResumableDownload(url,
+                                 max_bytes=max_bytes,
+                                 progress_callback=progress_callback,
+                                 **kwargs)
+
+    # Name the file will be saved under--to clean up a partial file
+    storage = field_file.storage
+    storage_name = storage.get_available_name(\
+                        field_file.field.generate_filename(field_file.instance,
+                                                           file_name),
+                        max_length=field_file.field.max_length)
+    try:
+        field_file.save(file_name, File(download, name=file_name), save=save)
+    except (DownloadError,) + RESUMABLE_ERRORS as ex_obj:
+        LOGGER.error('Failed to download %s: %s', file_name, ex_obj)
+        if storage.exists(storage_name):
+            storage.delete(storage_name)
+        return False, str(ex_obj)
+    finally:
+        download.close()
+
+    LOGGER.debug('Downloaded %s bytes (resumed %s time(s)): %s',
+                 download.num_bytes, download.num_resumes, file_name)
+    return True, None
@@ -4,6 +4,8 @@ that may link to an AWS object
     - e.g. When reading the file from pandas,
       use either the '.path' or the '.url '
 """
+import urllib2
+
 from django.db.models.fields.files import FieldFile
 
 def get_file_path_or_url(dv_file):
@@ -31,6 +33,35 @@ def get_file_path_or_url(dv_file):
     raise Exception('dv_file has neither a ".path" or ".url" for access')
 
 
+def is_file_url(path_or_url):
+    """Is the value returned by get_file_path_or_url a url? (e.g. AWS S3)"""
+    if not path_or_url:
+        return False
+
+    return path_or_url.lower().startswith(('http://', 'https://'))
+
+
+def open_file_path_or_url(dv_file):
+    """
+    Given a Django FieldFile, return an open, read-only
+    file-like object that may be read incrementally.
+        - local file: a regular file handle
+        - url (e.g. AWS S3): the urllib2 response
+
+    The caller is responsible for closing the returned object.
+
+    If the dv_file doesn't have an associated file, return None
+    """
+    path_or_url = get_file_path_or_url(dv_file)
+    if path_or_url is None:
+        return None
+
+    if is_file_url(path_or_url):
+        return urllib2.urlopen(path_or_url)
+
+    return open(path_or_url, 'rb')
+
+
 """
 from gc_apps.geo_utils.file_field_helper import get_file_path_or_url
 from gc_apps.gis_tabular.models import WorldMapJoinLayerInfo
@@ -0,0 +1,283 @@
+"""
+Shared HTTP client for calls to the WorldMap and Dataverse APIs.
+
+- One requests.Session per host (scheme + netloc), so connections are
+  kept alive and reused instead of a new TCP/TLS handshake per call
+- Pool sizes, retries and backoff come from settings:
+    HTTP_CLIENT_POOL_CONNECTIONS, HTTP_CLIENT_POOL_MAXSIZE,
+    HTTP_CLIENT_MAX_RETRIES, HTTP_CLIENT_BACKOFF_SECONDS,
+    HTTP_CLIENT_RETRY_STATUS_CODES, HTTP_CLIENT_DEFAULT_TIMEOUT
+- Timing metrics are kept per endpoint.  See get_endpoint_metrics()
+
+Usage:
+    from gc_apps.geo_utils.http_client import http_get, http_post
+
+    resp = http_post(url, data=params, auth=..., timeout=...,
+                     endpoint_name='worldmap.add_shapefile')
+
+Credentials (auth) are passed with each call--not stored on the
+session--as the same session may be used for different APIs on a host.
+The session's cookie jar is turned off: a cookie set in response to one
+user's call is never sent with another's.
+
+The requests exceptions (ConnectionError, Timeout, etc) are raised
+as before, after any retries.
+"""
+from __future__ import print_function
+from collections import OrderedDict
+import threading
+import time
+from urlparse import urlparse
+from cookielib import CookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_SECONDS = 0.5
+DEFAULT_RETRY_STATUS_CODES = (502, 503, 504)
+DEFAULT_TIMEOUT = 2 * 60
+
+# By default, only requests without side effects are retried
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_SESSIONS = {}          # { 'https://worldmap.harvard.edu' : requests.Session }
+_ENDPOINT_METRICS = {}  # { (method, endpoint_name) : EndpointMetric }
+_LOCK = threading.Lock()
+
+
+def get_client_setting(name, default_val):
+    """Settings are optional, use the default if not set"""
+    return getattr(settings, name, default_val)
+
+
+def get_host_key(url):
+    """
+    e.g. "https://worldmap.harvard.edu/maps/api/..."
+        -> "https://worldmap.harvard.edu"
+    """
+    parsed_url = urlparse(url)
+    return '%s://%s' % (parsed_url.scheme.lower(), parsed_url.netloc.lower())
+
+
+def get_default_endpoint_name(url):
+    """Name used for metrics if "endpoint_name" isn't given: host + path"""
+    parsed_url = urlparse(url)
+    return '%s%s' % (parsed_url.netloc.lower(), parsed_url.path)
+
+
+class BlockAllCookies(CookiePolicy):
+    """Never store or send cookies: the session is shared by all users"""
+    netscape = True
+    rfc2965 = hide_cookie2 = False
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+    def domain_return_ok(self, domain, request):
+        return False
+
+    def path_return_ok(self, path, request):
+        return False
+
+
+def make_session():
+    """Create a requests.Session with a connection pool and no cookie jar"""
+    session = requests.Session()
+    session.cookies.set_policy(BlockAllCookies())
+
+    adapter = HTTPAdapter(\
+                pool_connections=get_client_setting(\
+                    'HTTP_CLIENT_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+                pool_maxsize=get_client_setting(\
+                    'HTTP_CLIENT_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE))
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(url):
+    """Return the shared requests.Session for the url's host"""
+    host_key = get_host_key(url)
+
+    session = _SESSIONS.get(host_key)
+    if session is not None:
+        return session
+
+    with _LOCK:
+        session = _SESSIONS.get(host_key)
+        if session is None:
+            LOGGER.debug('New HTTP session for: %s', host_key)
+            session = make_session()
+            _SESSIONS[host_key] = session
+
+    return session
+
+
+def close_sessions():
+    """Close all sessions and their pooled connections"""
+    with _LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+
+
+# ------------------------------------------
+# Timing metrics
+# ------------------------------------------
+class EndpointMetric(object):
+    """Call count and timing for a single endpoint"""
+
+    def __init__(self, method, endpoint_name):
+        self.method = method
+        self.endpoint_name = endpoint_name
+        self.num_calls = 0
+        self.num_errors = 0     # exceptions or status code >= 400
+        self.num_retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add_call(self, elapsed_seconds, is_error, num_retries):
+        """Record a call, including any retries"""
+        self.num_calls += 1
+        self.total_seconds += elapsed_seconds
+        self.max_seconds = max(self.max_seconds, elapsed_seconds)
+        self.num_retries += num_retries
+        if is_error:
+            self.num_errors += 1
+
+    def as_dict(self):
+        """For reporting"""
+        return OrderedDict([\
+                    ('method', self.method),
+                    ('endpoint_name', self.endpoint_name),
+                    ('num_calls', self.num_calls),
+                    ('num_errors', self.num_errors),
+                    ('num_retries', self.num_retries),
+                    ('avg_seconds', self.total_seconds / self.num_calls\
+                                    if self.num_calls else None),
+                    ('max_seconds', self.max_seconds),
+                    ])
+
+
+def record_call(method, endpoint_name, elapsed_seconds, is_error, num_retries):
+    """Add a call to the endpoint's metrics"""
+    with _LOCK:
+        key = (method, endpoint_name)
+        metric = _ENDPOINT_METRICS.get(key)
+        if metric is None:
+            metric = EndpointMetric(method, endpoint_name)
+            _ENDPOINT_METRICS[key] = metric
+        metric.add_call(elapsed_seconds, is_error, num_retries)
+
+
+def get_endpoint_metrics():
+    """
+    Return a list of dicts--one per endpoint--sorted by endpoint name.
+    Metrics are per process.
+    """
+    with _LOCK:
+        metrics = [m.as_dict() for m in _ENDPOINT_METRICS.values()]
+
+    return sorted(metrics, key=lambda x: (x['endpoint_name'], x['method']))
+
+
+def reset_endpoint_metrics():
+    """Clear the metrics"""
+    with _LOCK:
+        _ENDPOINT_METRICS.clear()
+
+
+def log_endpoint_metrics(logger=LOGGER):
+    """Write one line per endpoint to the log"""
+    for metric in get_endpoint_metrics():
+        logger.info('HTTP %(method)s %(endpoint_name)s: calls: %(num_calls)s,'
+                    ' errors: %(num_errors)s, retries: %(num_retries)s,'
+                    ' avg: %(avg_seconds).3fs, max: %(max_seconds).3fs', metric)
+
+
+# ------------------------------------------
+# Requests
+# ------------------------------------------
+def http_request(method, url, endpoint_name=None, max_retries=None, **kwargs):
+    """
+    Make a request using the host's shared session
+
+    :param method: 'GET', 'POST', etc
+    :param endpoint_name: name used for the timing metrics
+    :param max_retries: retries after a connection error, timeout, or
+        a status code in HTTP_CLIENT_RETRY_STATUS_CODES.
+        Default: HTTP_CLIENT_MAX_RETRIES for GET/HEAD/OPTIONS, 0 otherwise
+    :param kwargs: passed to requests, e.g. data, files, auth, timeout
+
+    returns a requests.Response
+    """
+    method = method.upper()
+    if endpoint_name is None:
+        endpoint_name = get_default_endpoint_name(url)
+
+    if max_retries is None:
+        if method in RETRY_METHODS:
+            max_retries = get_client_setting('HTTP_CLIENT_MAX_RETRIES',
+                                             DEFAULT_MAX_RETRIES)
+        else:
+            max_retries = 0
+
+    kwargs.setdefault('timeout', get_client_setting('HTTP_CLIENT_DEFAULT_TIMEOUT',
+                                                    DEFAULT_TIMEOUT))
+
+    backoff_seconds = get_client_setting('HTTP_CLIENT_BACKOFF_SECONDS',
+                                         DEFAULT_BACKOFF_SECONDS)
+    retry_status_codes = get_client_setting('HTTP_CLIENT_RETRY_STATUS_CODES',
+                                            DEFAULT_RETRY_STATUS_CODES)
+
+    session = get_session(url)
+
+    start_time = time.time()
+    num_retries = 0
+    while True:
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as ex_obj:
+            if num_retries >= max_retries:
+                record_call(method, endpoint_name, time.time() - start_time,
+                            True, num_retries)
+                raise
+            LOGGER.warn('HTTP %s %s failed (%s). Retrying.', method, url, ex_obj)
+        else:
+            if resp.status_code not in retry_status_codes or\
+                num_retries >= max_retries:
+                elapsed_seconds = time.time() - start_time
+                record_call(method, endpoint_name, elapsed_seconds,
+                            resp.status_code >= 400, num_retries)
+                LOGGER.debug('HTTP %s %s: %s (%.3fs)', method, endpoint_name,
+                             resp.status_code, elapsed_seconds)
+                return resp
+            LOGGER.warn('HTTP %s %s returned %s. Retrying.',
+                        method, url, resp.status_code)
+
+        # Backoff: 0.5s, 1s, 2s, ...
+        time.sleep(backoff_seconds * (2 ** num_retries))
+        num_retries += 1
+
+
+def http_get(url, **kwargs):
+    """GET using the host's shared session.  See http_request()"""
+    return http_request('GET', url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    """POST using the host's shared session.  See http_request()"""
+    return http_request('POST', url, **kwargs)
@@ -0,0 +1,186 @@
+"""
+Streaming multipart/form-data body for uploading large files.
+
+requests builds multipart bodies in memory.  MultipartFileStream is a
+read-only, file-like body with a known length.  requests sends it with
+a Content-Length and the file is read chunk by chunk as the socket
+is written--memory use stays the same regardless of the file size.
+
+    upload = MultipartFileStream.from_field_file(layer_params,
+                                                'uploaded_file',
+                                                tabular_info.dv_file)
+    try:
+        resp = http_post(url,
+                         data=upload,
+                         headers={'Content-Type': upload.content_type})
+    finally:
+        upload.close()
+
+For S3 storage, the file is read from its url (see file_field_helper),
+not downloaded first.
+"""
+from __future__ import print_function
+import os
+import uuid
+
+from gc_apps.geo_utils.file_field_helper import open_file_path_or_url
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024   # 64 KB
+
+CRLF = '\r\n'
+
+
+def to_bytes(val):
+    """Multipart values are sent as utf-8"""
+    if isinstance(val, unicode):
+        return val.encode('utf-8')
+    if isinstance(val, str):
+        return val
+    return str(val)
+
+
+def quote_header_param(val):
+    """e.g. the name or filename in the Content-Disposition header"""
+    return to_bytes(val).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class MultipartFileStream(object):
+    """
+    A multipart/form-data body made of form fields and a single file,
+    read incrementally.  Has a __len__ so requests sends a Content-Length.
+    """
+
+    def __init__(self, fields, file_param_name, file_name, file_object, file_size,
+                 file_content_type='application/octet-stream',
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param fields: dict of form fields.  Values may be lists; None is skipped
+        :param file_param_name: e.g. 'uploaded_file'
+        :param file_name: file name sent to the server
+        :param file_object: open file-like object with a read(size) method
+        :param file_size: size of the file in bytes
+        """
+        self.boundary = uuid.uuid4().hex
+        self.file_object = file_object
+        self.chunk_size = chunk_size
+
+        self.preamble = self.get_fields_bytes(fields or {}) +\
+                        self.get_file_header_bytes(file_param_name,
+                                                   file_name,
+                                                   file_content_type)
+        self.epilogue = '%s--%s--%s' % (CRLF, self.boundary, CRLF)
+
+        self.total_length = len(self.preamble) + file_size + len(self.epilogue)
+
+        # Parts still to be read: bytes or the file
+        self.parts = [self.preamble, file_object, self.epilogue]
+        self.part_offset = 0    # position within the current bytes part
+        self.num_bytes_read = 0
+
+    @classmethod
+    def from_field_file(cls, fields, file_param_name, field_file,
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Build a MultipartFileStream from a Django FieldFile.
+        (local storage or S3).  Returns None if the file isn't available
+        """
+        file_object = open_file_path_or_url(field_file)
+        if file_object is None:
+            return None
+
+        return cls(fields,
+                   file_param_name,
+                   os.path.basename(field_file.name),
+                   file_object,
+                   field_file.size,
+                   chunk_size=chunk_size)
+
+    @property
+    def content_type(self):
+        """Value for the request's Content-Type header"""
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def get_fields_bytes(self, fields):
+        """Encode the form fields, in sorted order"""
+        lines = []
+        for name in sorted(fields.keys()):
+            vals = fields[name]
+            if not isinstance(vals, (list, tuple)):
+                vals = [vals]
+
+            for val in vals:
+                if val is None:
+                    continue
+                lines.append('--%s' % self.boundary)
+                lines.append('Content-Disposition: form-data; name="%s"'\
+                             % quote_header_param(name))
+                lines.append('')
+                lines.append(to_bytes(val))
+
+        if not lines:
+            return ''
+        return CRLF.join(lines) + CRLF
+
+    def get_file_header_bytes(self, file_param_name, file_name, file_content_type):
+        """Part headers for the file"""
+        lines = ['--%s' % self.boundary,
+                 'Content-Disposition: form-data; name="%s"; filename="%s"'\
+                    % (quote_header_param(file_param_name),
+                       quote_header_param(file_name)),
+                 'Content-Type: %s' % file_content_type,
+                 '',
+                 '']
+        return CRLF.join(lines)
+
+    def __len__(self):
+        return self.total_length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        """
+        Read up to "size" bytes of the body.
+        The file is never read more than "size" (or chunk_size) at a time
+        """
+        if size is None or size < 0:
+            size = self.chunk_size
+
+        while self.parts:
+            part = self.parts[0]
+
+            if isinstance(part, str):
+                chunk = part[self.part_offset:self.part_offset + size]
+                self.part_offset += len(chunk)
+                if self.part_offset >= len(part):
+                    self.parts.pop(0)
+                    self.part_offset = 0
+            else:
+                chunk = part.read(size)
+                if not chunk:
+                    self.parts.pop(0)
+
+            if chunk:
+                self.num_bytes_read += len(chunk)
+                return chunk
+
+        return ''
+
+    def close(self):
+        """Close the file being uploaded"""
+        if self.file_object is not None:
+            self.file_object.close()
+            self.file_object = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
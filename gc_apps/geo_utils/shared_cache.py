@@ -0,0 +1,181 @@
+"""
+Namespaced cache for geoconnect data shared across processes.
+
+Uses the Django cache named by settings.GEOCONNECT_CACHE_ALIAS.  For
+deployments with several processes (e.g. gunicorn workers), that cache
+should be shared, e.g. the database cache (no external service needed):
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'geoconnect_cache',
+        }
+    }
+
+    (create the table with: python manage.py createcachetable)
+
+Usage:
+    JOIN_TARGET_CACHE = SharedCache('join_targets', default_timeout=None)
+
+    JOIN_TARGET_CACHE.set('latest', join_target)
+    join_target = JOIN_TARGET_CACHE.get('latest')
+    branch_info = GIT_CACHE.get_or_set('branch_info', get_branch_info)
+
+- Keys are prefixed: "geoconnect:join_targets:latest"
+- A namespace's timeout may be overridden in settings.GEOCONNECT_CACHE_TIMEOUTS
+- Hit/miss counts are kept per namespace, per process:
+    get_cache_metrics(), log_cache_metrics(LOGGER)
+"""
+from __future__ import print_function
+from collections import OrderedDict
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CACHE_ALIAS = 'default'
+DEFAULT_KEY_PREFIX = 'geoconnect'
+
+# Hit/miss counts by namespace
+_CACHE_METRICS = {}
+_LOCK = threading.Lock()
+
+# Distinguishes a miss from a cached None
+_MISSING = object()
+
+
+class CacheMetric(object):
+    """Hit/miss counts for a single namespace"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_sets = 0
+        self.num_deletes = 0
+
+    def as_dict(self):
+        """For reporting"""
+        num_gets = self.num_hits + self.num_misses
+        return OrderedDict([\
+                    ('namespace', self.namespace),
+                    ('num_hits', self.num_hits),
+                    ('num_misses', self.num_misses),
+                    ('num_sets', self.num_sets),
+                    ('num_deletes', self.num_deletes),
+                    ('hit_rate', float(self.num_hits) / num_gets\
+                                 if num_gets else None),
+                    ])
+
+
+def record_cache_event(namespace, attr_name):
+    """Add 1 to a count, e.g. record_cache_event('join_targets', 'num_hits')"""
+    with _LOCK:
+        metric = _CACHE_METRICS.get(namespace)
+        if metric is None:
+            metric = CacheMetric(namespace)
+            _CACHE_METRICS[namespace] = metric
+        setattr(metric, attr_name, getattr(metric, attr_name) + 1)
+
+
+def get_cache_metrics():
+    """
+    Return a list of dicts--one per namespace--sorted by namespace.
+    Metrics are per process.
+    """
+    with _LOCK:
+        metrics = [m.as_dict() for m in _CACHE_METRICS.values()]
+
+    return sorted(metrics, key=lambda x: x['namespace'])
+
+
+def reset_cache_metrics():
+    """Clear the metrics"""
+    with _LOCK:
+        _CACHE_METRICS.clear()
+
+
+def log_cache_metrics(logger=LOGGER):
+    """Write one line per namespace to the log"""
+    for metric in get_cache_metrics():
+        logger.info('Cache %(namespace)s: hits: %(num_hits)s, misses: %(num_misses)s,'
+                    ' sets: %(num_sets)s, deletes: %(num_deletes)s', metric)
+
+
+class SharedCache(object):
+    """
+    A namespace within the geoconnect cache
+    """
+
+    def __init__(self, namespace, default_timeout=DEFAULT_TIMEOUT):
+        """
+        :param namespace: added to each key, e.g. 'join_targets'
+        :param default_timeout: seconds, None for no expiration.  Defaults
+            to the backend's TIMEOUT
+        """
+        self.namespace = namespace
+        self.default_timeout = default_timeout
+
+    @property
+    def cache(self):
+        """The Django cache (looked up on use, settings may change in tests)"""
+        return caches[getattr(settings, 'GEOCONNECT_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+    @property
+    def timeout(self):
+        """Default timeout: settings.GEOCONNECT_CACHE_TIMEOUTS or the one given"""
+        timeouts = getattr(settings, 'GEOCONNECT_CACHE_TIMEOUTS', None) or {}
+        return timeouts.get(self.namespace, self.default_timeout)
+
+    def make_key(self, key):
+        """e.g. 'geoconnect:join_targets:latest'"""
+        return '%s:%s:%s' % (getattr(settings, 'GEOCONNECT_CACHE_KEY_PREFIX',
+                                     DEFAULT_KEY_PREFIX),
+                             self.namespace,
+                             key)
+
+    def get(self, key, default=None):
+        val = self.cache.get(self.make_key(key), _MISSING)
+        if val is _MISSING:
+            record_cache_event(self.namespace, 'num_misses')
+            return default
+
+        record_cache_event(self.namespace, 'num_hits')
+        return val
+
+    def set(self, key, val, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        self.cache.set(self.make_key(key), val, timeout)
+        record_cache_event(self.namespace, 'num_sets')
+
+    def add(self, key, val, timeout=DEFAULT_TIMEOUT):
+        """Set the key only if it's not already there.  returns True if set"""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        was_added = self.cache.add(self.make_key(key), val, timeout)
+        if was_added:
+            record_cache_event(self.namespace, 'num_sets')
+        return was_added
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+        record_cache_event(self.namespace, 'num_deletes')
+
+    def get_or_set(self, key, func, timeout=DEFAULT_TIMEOUT):
+        """
+        Return the cached value.  On a miss, cache and return func()
+        (None results are not cached)
+        """
+        val = self.get(key, _MISSING)
+        if val is not _MISSING:
+            return val
+
+        val = func()
+        if val is not None:
+            self.set(key, val, timeout)
+        return val
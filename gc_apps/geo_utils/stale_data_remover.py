@@ -1,9 +1,21 @@
 """
 Delete stale geoconnect objects and related files (including S3)
+
+bulk=True: stale objects are selected in SQL ("modified" older than the
+stale age) and deleted in batches, one transaction per batch.  Their
+files are then removed in parallel.  Only counts are reported.
+
+    stale_data_remover = StaleDataRemover(really_delete=True, bulk=True)
+    stale_data_remover.remove_stale_data()
 """
+from collections import OrderedDict
+from datetime import timedelta
+
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.mail import send_mail
 
@@ -12,8 +24,11 @@ from gc_apps.gis_shapefiles.models import ShapefileInfo,\
 from gc_apps.gis_tabular.models import TabularFileInfo,\
                                        WorldMapJoinLayerInfo,\
                                        WorldMapLatLngInfo
+from gc_apps.gis_tabular.tabular_file_cache import TabularFileCache
 from gc_apps.geo_utils.msg_util import msg, msgt
-from gc_apps.worldmap_connect.models import JoinTargetInformation
+from gc_apps.worldmap_connect.models import JoinTargetInformation,\
+                                            WorldMapLayerJob,\
+                                            JOB_STATUSES_UNFINISHED
 
 GEOCONNECT_OBJECTS_TO_CHECK = [\
                             ShapefileInfo,
@@ -22,6 +37,16 @@ GEOCONNECT_OBJECTS_TO_CHECK = [\
                             WorldMapJoinLayerInfo,
                             WorldMapLatLngInfo]
 
+# bulk mode
+DEFAULT_DELETE_BATCH_SIZE = 500
+DEFAULT_FILE_DELETE_WORKERS = 8
+
+# S3 check: the FileField "upload_to" directories
+S3_KEY_PREFIXES = ('dv_files/',)
+S3_LIST_PAGE_SIZE = 1000
+S3_DELETE_BATCH_SIZE = 1000     # delete_objects maximum
+
+
 class StaleDataRemover(object):
     """
     Delete old files and related geoconnect objects.
@@ -30,14 +55,36 @@ class StaleDataRemover(object):
     Note: "really_delete" must be True for actual deletion to happen
     """
     def __init__(self, really_delete=False, **kwargs):
+        """
+        optional kwargs (bulk mode):
+            - bulk: True to select and delete stale objects with querysets
+            - batch_size: objects deleted per transaction
+            - num_file_workers: threads used to delete files
+        """
         self.num_objects_checked = 0
         self.num_objects_removed = 0
+        self.num_files_removed = 0
+        self.num_file_errors = 0
         self.message_lines = []
 
+        # S3 check counts
+        self.num_s3_checked = 0
+        self.num_s3_orphans = 0
+        self.num_s3_removed = 0
+        self.num_s3_errors = 0
+
         assert really_delete in (True, False),\
             'really_delete must be True or False'
         self.really_delete = really_delete
 
+        self.bulk = kwargs.get('bulk', False)
+        self.batch_size = kwargs.get('batch_size', DEFAULT_DELETE_BATCH_SIZE)
+        self.num_file_workers = kwargs.get('num_file_workers',
+                                           DEFAULT_FILE_DELETE_WORKERS)
+
+        # bulk mode: model name -> number deleted (includes cascades)
+        self.removed_counts = OrderedDict()
+
 
     def using_s3_file_storage(self):
         """Is S3 being used for file storage?"""
@@ -80,6 +127,98 @@ class StaleDataRemover(object):
                 self.num_objects_removed += 1
 
 
+    @staticmethod
+    def get_file_fields(model_class):
+        """FileFields (e.g. "dv_file") of the model, including inherited ones"""
+        return [field for field in model_class._meta.concrete_fields\
+                if isinstance(field, models.FileField)]
+
+    def bulk_remove_stale_objects(self, model_class, stale_age_in_seconds):
+        """
+        Delete objects not modified within "stale_age_in_seconds"
+        without loading them:
+            - stale ids are selected in SQL, "batch_size" at a time
+            - each batch is deleted in its own transaction
+            - the batch's files are deleted after the transaction commits
+        """
+        time_threshold = timezone.now() - timedelta(seconds=stale_age_in_seconds)
+        stale_objects = model_class.objects.filter(modified__lt=time_threshold)
+
+        num_stale = stale_objects.count()
+        self.num_objects_checked += model_class.objects.count()
+        self.add_message_line("  > Stale objects found: %s" % num_stale)
+        if num_stale == 0:
+            return
+
+        if not self.really_delete:
+            self.add_message_line('    > (test, not really deleting)')
+            return
+
+        file_fields = self.get_file_fields(model_class)
+        num_removed = 0
+        num_files_before = self.num_files_removed
+
+        while True:
+            stale_ids = list(stale_objects.order_by('pk')\
+                                .values_list('pk', flat=True)[:self.batch_size])
+            if not stale_ids:
+                break
+
+            with transaction.atomic():
+                batch = model_class.objects.filter(pk__in=stale_ids)
+                files_to_remove = []
+                for field in file_fields:
+                    files_to_remove += [(field.storage, name)\
+                                        for name in batch.values_list(field.name, flat=True)\
+                                        if name]
+
+                (_total, counts_by_model) = batch.delete()
+
+            for model_label, cnt in counts_by_model.items():
+                self.removed_counts[model_label] =\
+                            self.removed_counts.get(model_label, 0) + cnt
+
+            num_batch_removed = counts_by_model.get(model_class._meta.label, 0)
+            num_removed += num_batch_removed
+
+            self.remove_files(files_to_remove)
+
+            if num_batch_removed == 0:
+                # Nothing deleted: don't keep selecting the same ids
+                break
+
+        self.num_objects_removed += num_removed
+        self.add_message_line("  > Old objects deleted: %s" % num_removed)
+        self.add_message_line("  > Files deleted: %s" %\
+                              (self.num_files_removed - num_files_before))
+
+    @staticmethod
+    def remove_file(storage_and_name):
+        """
+        Delete a single file (run in a worker thread)
+        returns True if deleted, False if not found, None on error
+        """
+        (storage, name) = storage_and_name
+        try:
+            if not storage.exists(name):
+                return False
+            storage.delete(name)
+        except Exception as ex_obj:
+            msg('  > Failed to delete file: %s (%s)' % (name, ex_obj))
+            return None
+        return True
+
+    def remove_files(self, files_to_remove):
+        """Delete (storage, name) pairs, "num_file_workers" at a time"""
+        if not files_to_remove:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.num_file_workers) as executor:
+            results = list(executor.map(self.remove_file, files_to_remove))
+
+        self.num_files_removed += results.count(True)
+        self.num_file_errors += results.count(None)
+
     def remove_stale_data(self, stale_age_in_seconds=None):
         """Main method called for running stale data removal process"""
         if stale_age_in_seconds is None:
@@ -94,6 +233,9 @@ class StaleDataRemover(object):
         # Reset object counters
         self.num_objects_checked = 0
         self.num_objects_removed = 0
+        self.num_files_removed = 0
+        self.num_file_errors = 0
+        self.removed_counts = OrderedDict()
 
         # Remove Geoconnect objects
         self.remove_geoconnect_objects(stale_age_in_seconds)
@@ -102,10 +244,24 @@ class StaleDataRemover(object):
         # Remove older JoinTarget information retrieved from the WorldMap
         self.remove_old_join_target_information(len(GEOCONNECT_OBJECTS_TO_CHECK)+2)
 
+        # Remove cached DataFrames for old/deleted TabularFileInfo objects
+        self.remove_parsed_table_cache(stale_age_in_seconds,
+                                       len(GEOCONNECT_OBJECTS_TO_CHECK)+3)
+
+        # Remove finished WorldMapLayerJob objects
+        self.remove_finished_layer_jobs(stale_age_in_seconds,
+                                        len(GEOCONNECT_OBJECTS_TO_CHECK)+4)
+
         # Add message notes
         self.add_message_title_line(' -- Final counts  --')
         self.add_message_line("Count of objects Checked: %s" % self.num_objects_checked)
         self.add_message_line("Count of objects Removed: %s" % self.num_objects_removed)
+        if self.bulk:
+            for model_label, cnt in self.removed_counts.items():
+                self.add_message_line("  > %s: %s" % (model_label, cnt))
+            self.add_message_line("Count of files Removed: %s" % self.num_files_removed)
+            if self.num_file_errors:
+                self.add_message_line("Count of file delete errors: %s" % self.num_file_errors)
 
 
     def remove_old_join_target_information(self, msg_cnt=''):
@@ -139,23 +295,145 @@ class StaleDataRemover(object):
 
 
 
+    def remove_finished_layer_jobs(self, stale_age_in_seconds, msg_cnt=''):
+        """Delete finished WorldMapLayerJob objects (success or failed)
+        that have not been modified within the stale age"""
+        self.add_message_title_line(\
+            '(%s) %s' %  (msg_cnt, self.remove_finished_layer_jobs.__doc__))
+
+        time_threshold = timezone.now() - timedelta(seconds=stale_age_in_seconds)
+        stale_jobs = WorldMapLayerJob.objects.exclude(\
+                            status__in=JOB_STATUSES_UNFINISHED\
+                        ).filter(modified__lt=time_threshold)
+
+        job_cnt = stale_jobs.count()
+        self.num_objects_checked += job_cnt
+        self.add_message_line("  > Number of finished WorldMapLayerJob objects found: %s" % job_cnt)
+        if job_cnt == 0:
+            return
+
+        if self.really_delete:
+            del_result = stale_jobs.delete()
+
+            self.num_objects_removed += del_result[0]
+            self.add_message_line("  > Old objects deleted: %s" % del_result[0])
+        else:
+            self.add_message_line('    > (test, not really deleting)')
+
+
+    def remove_parsed_table_cache(self, stale_age_in_seconds, msg_cnt=''):
+        """Delete cached tabular DataFrames (TabularFileCache) that are stale
+        or no longer have an associated TabularFileInfo object"""
+        self.add_message_title_line(\
+            '(%s) %s' %  (msg_cnt, self.remove_parsed_table_cache.__doc__))
+
+        valid_md5s = TabularFileInfo.objects.values_list('md5', flat=True)
+
+        (num_checked, num_removed) = TabularFileCache.remove_stale_files(\
+                                        stale_age_in_seconds,
+                                        valid_md5s=valid_md5s,
+                                        really_delete=self.really_delete)
+
+        self.num_objects_checked += num_checked
+        self.num_objects_removed += num_removed
+
+        self.add_message_line("  > Cache files checked: %s" % num_checked)
+        if self.really_delete:
+            self.add_message_line("  > Cache files deleted: %s" % num_removed)
+        else:
+            self.add_message_line('    > (test, not really deleting)')
+
+
     def get_existing_file_names_for_s3_check(self):
-        """Retrieve legit file names for S3 check
+        """Retrieve legit file names for S3 check, as a set
         - Called by "remove_s3_data()"
+        - Names are streamed from the database, not loaded as objects
         """
+        ok_names = set()
 
-        ok_names = [obj.dv_file.name\
-                    for obj in ShapefileInfo.objects.only('dv_file')\
-                    if obj.dv_file and obj.dv_file.name]
+        name_querysets = [\
+            ShapefileInfo.objects.values_list('dv_file', flat=True),
+            TabularFileInfo.objects.values_list('dv_file', flat=True),
+            TabularFileInfo.objects.values_list('dv_join_file', flat=True)]
 
-        for obj in TabularFileInfo.objects.only('dv_file', 'dv_join_file'):
-            if obj.dv_file and obj.dv_file.name:
-                ok_names.append(obj.dv_file.name)
-            if obj.dv_join_file and obj.dv_join_file.name:
-                ok_names.append(obj.dv_join_file.name)
+        for name_qs in name_querysets:
+            ok_names.update([name for name in name_qs.iterator() if name])
 
         return ok_names
 
+    @staticmethod
+    def get_s3_key_prefixes():
+        """
+        Bucket prefixes checked for orphaned files: the "upload_to"
+        directories of the geoconnect FileFields (settings.AWS_LOCATION + 'dv_files/')
+        """
+        location = getattr(settings, 'AWS_LOCATION', '') or ''
+        if location and not location.endswith('/'):
+            location += '/'
+        return [location + prefix for prefix in S3_KEY_PREFIXES]
+
+    @staticmethod
+    def get_s3_client():
+        """boto3 S3 client using the settings credentials"""
+        return boto3.client(\
+                's3',
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=getattr(settings, 'AWS_S3_REGION_NAME', None))
+
+    @staticmethod
+    def get_s3_file_name(key):
+        """Bucket key -> FileField name (remove settings.AWS_LOCATION)"""
+        location = getattr(settings, 'AWS_LOCATION', '') or ''
+        if location:
+            location = location.rstrip('/') + '/'
+            if key.startswith(location):
+                return key[len(location):]
+        return key
+
+    def iter_orphaned_s3_keys(self, s3_client, ok_names, stale_age_in_seconds):
+        """
+        Page through the bucket listing, by prefix, and yield the keys
+        of files that:
+            - were last modified before the stale age
+            - are not used by a ShapefileInfo or TabularFileInfo
+        """
+        time_threshold = timezone.now() - timedelta(seconds=stale_age_in_seconds)
+
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for prefix in self.get_s3_key_prefixes():
+            for page in paginator.paginate(\
+                            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                            Prefix=prefix,
+                            PaginationConfig={'PageSize': S3_LIST_PAGE_SIZE}):
+                for s3_obj in page.get('Contents', []):
+                    self.num_objects_checked += 1
+                    self.num_s3_checked += 1
+                    if s3_obj['LastModified'] >= time_threshold:
+                        continue
+                    if self.get_s3_file_name(s3_obj['Key']) in ok_names:
+                        continue
+                    yield s3_obj['Key']
+
+    def delete_s3_keys(self, s3_client, keys):
+        """Delete keys with a single delete_objects request
+        (at most S3_DELETE_BATCH_SIZE keys)"""
+        if not keys:
+            return
+
+        resp = s3_client.delete_objects(\
+                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                    Delete={'Objects': [{'Key': key} for key in keys],
+                            'Quiet': True})
+
+        errors = resp.get('Errors', [])
+        for err_info in errors[:10]:
+            self.add_message_line('    > Failed to delete %s: %s' %\
+                                  (err_info.get('Key'), err_info.get('Message')))
+
+        self.num_s3_errors += len(errors)
+        self.num_s3_removed += len(keys) - len(errors)
+        self.num_objects_removed += len(keys) - len(errors)
 
     def remove_s3_data(self, stale_age_in_seconds, msg_cnt=''):
         """Check for old S3 objects that no longer have
@@ -168,40 +446,43 @@ class StaleDataRemover(object):
             # S3 not in use, don't check
             return
 
+        self.num_s3_checked = 0
+        self.num_s3_orphans = 0
+        self.num_s3_removed = 0
+        self.num_s3_errors = 0
+
         # ------------------------
         # Get the names of legitimate files
         # ------------------------
         ok_names = self.get_existing_file_names_for_s3_check()
 
-        #msgt(ok_names)
         # ------------------------
-        # load the S3 resource
+        # Check the files in the bucket, deleting orphans in batches
         # ------------------------
-        s3_resource = boto3.resource(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+        s3_client = self.get_s3_client()
 
-        # ------------------------
-        # Check the files in the bucket
-        # ------------------------
-        bucket = s3_resource.Bucket(settings.AWS_STORAGE_BUCKET_NAME)
+        keys_to_delete = []
+        for key in self.iter_orphaned_s3_keys(s3_client, ok_names, stale_age_in_seconds):
+            self.num_s3_orphans += 1
+            if not self.really_delete:
+                continue
 
-        for obj in bucket.objects.all():
-            self.num_objects_checked += 1
+            keys_to_delete.append(key)
+            if len(keys_to_delete) == S3_DELETE_BATCH_SIZE:
+                self.delete_s3_keys(s3_client, keys_to_delete)
+                keys_to_delete = []
 
-            self.add_message_line('  > Checking %s' % obj.key)
-            if obj.key in ok_names:
-                self.add_message_line('    > File ok to stay')
-                continue
-            else:
-                if self.really_delete:
-                    self.add_message_line('    > Try to delete')
-                    info_object.delete()
-                    self.add_message_line('    > Deleted!')
-                    self.num_objects_removed += 1
-                else:
-                    self.add_message_line('    > Expired (test, not really deleting)')
+        if self.really_delete:
+            self.delete_s3_keys(s3_client, keys_to_delete)
+
+        self.add_message_line("  > S3 files checked: %s" % self.num_s3_checked)
+        self.add_message_line("  > Orphaned files found: %s" % self.num_s3_orphans)
+        if self.really_delete:
+            self.add_message_line("  > Orphaned files deleted: %s" % self.num_s3_removed)
+            if self.num_s3_errors:
+                self.add_message_line("  > Delete errors: %s" % self.num_s3_errors)
+        else:
+            self.add_message_line('    > (test, not really deleting)')
 
 
     def remove_geoconnect_objects(self, stale_age_in_seconds):
@@ -215,7 +496,10 @@ class StaleDataRemover(object):
             cnt += 1
             self.add_message_title_line(\
                 '(%s) checking: %s' % (cnt, model_type.__name__))
-            self.check_for_stale_objects(model_type, stale_age_in_seconds)
+            if self.bulk:
+                self.bulk_remove_stale_objects(model_type, stale_age_in_seconds)
+            else:
+                self.check_for_stale_objects(model_type, stale_age_in_seconds)
 
 
 
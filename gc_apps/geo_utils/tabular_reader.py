@@ -0,0 +1,110 @@
+"""
+Shared pandas reader for Dataverse tabular files.
+
+Compared to a plain pd.read_csv:
+    - "usecols": parse only the columns that are needed
+    - census id columns (STRING_COLUMN_NAMES) are read as strings:
+      no float conversion, no lost zero padding
+    - "compact": after the read, repeated strings become categoricals
+      and integers use the smallest integer dtype
+
+    df = read_tabular_file(get_file_path_or_url(tabular_info.dv_file),
+                           tabular_info.delimiter,
+                           column_names=tabular_info.column_names,
+                           compact=True)
+
+    join_column = read_tabular_file(path, '\t', usecols=['tract'],
+                                    string_columns=())['tract']
+
+Note: the text of compacted values is unchanged--e.g. DataFrame.to_csv
+output is the same--but code that checks dtypes (e.g. object vs. category)
+should read the columns it needs without "compact".
+"""
+import pandas as pd
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+# Treat census block groups and tracts as strings instead of numbers
+#   - numeric codes that may receive zero-padding
+#
+STRING_COLUMN_NAMES = ('BG_ID_10', 'CT_ID_10')
+
+# Convert string columns to categoricals if the
+# number of unique values is under this fraction of the rows
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def get_string_column_names(column_names=None, string_columns=STRING_COLUMN_NAMES):
+    """
+    Return the names of columns to read as strings.
+    Names are matched without regard to case: normalized
+    column names are lowercase--e.g. "bg_id_10"
+
+    If the file's column names are unknown, return both cases
+    (pandas ignores dtypes for columns that aren't in the file)
+    """
+    if not string_columns:
+        return []
+
+    lower_names = set([x.lower() for x in string_columns])
+
+    if column_names is None:
+        return list(string_columns) + sorted(lower_names)
+
+    return [x for x in column_names if x.lower() in lower_names]
+
+
+def read_tabular_file(path_or_buffer, delimiter, usecols=None, column_names=None,\
+    string_columns=STRING_COLUMN_NAMES, compact=False, **kwargs):
+    """
+    Read a tabular file with pandas.  Parse errors are passed on to the caller.
+
+    :param usecols: list of column names to parse (default: all)
+    :param column_names: the file's column names, if known--e.g.
+        TabularFileInfo.column_names
+    :param string_columns: names of columns to read as strings
+    :param compact: use categoricals and smaller integer dtypes (see "compact_data_frame")
+    :param kwargs: passed to pd.read_csv--e.g. chunksize, nrows
+    """
+    dtype = dict(kwargs.pop('dtype', None) or {})     # don't change the caller's dict
+    for column_name in get_string_column_names(column_names, string_columns):
+        dtype.setdefault(column_name, str)
+
+    df = pd.read_csv(path_or_buffer,
+                     sep=delimiter,
+                     usecols=usecols,
+                     dtype=dtype or None,
+                     **kwargs)
+
+    if compact and not kwargs.get('chunksize'):
+        compact_data_frame(df)
+
+    return df
+
+
+def compact_data_frame(df, category_max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """
+    Reduce the memory used by a DataFrame, in place:
+        - string columns with repeated values become categoricals
+        - integer columns are downcast--e.g. int64 -> int16
+
+    Floats are not changed: float32 values don't print the same.
+    """
+    if df is None or len(df.index) == 0:
+        return df
+
+    max_unique = len(df.index) * category_max_unique_ratio
+
+    for column_name, dtype in df.dtypes.iteritems():
+        if (df.columns == column_name).sum() > 1:
+            continue    # duplicate name
+
+        if dtype.kind == 'i':
+            df[column_name] = pd.to_numeric(df[column_name], downcast='integer')
+
+        elif dtype.kind == 'O':
+            if df[column_name].nunique() < max_unique:
+                df[column_name] = df[column_name].astype('category')
+
+    return df
@@ -1,6 +1,8 @@
 from django.template.defaultfilters import slugify
 from string import digits
 
+import numpy as np
+
 
 FORMATTED_COLUMN_EXTENSION = '_formatted'
 
@@ -32,6 +34,80 @@ def is_pandas_dtype_numeric(dtype):
     if dtype in get_pandas_numeric_dtypes():
         return True
 
+def get_column_dtype(chunk_dtypes):
+    """
+    Given the dtypes pandas chose for each chunk of a column, return
+    the dtype it chooses when the whole column is read at once:
+        - all the same: that dtype
+        - ints and floats (e.g. a chunk with blanks): float64
+        - anything else: object
+    """
+    chunk_dtypes = set([np.dtype(x) for x in chunk_dtypes])
+    assert len(chunk_dtypes) > 0, "chunk_dtypes cannot be empty"
+
+    if len(chunk_dtypes) == 1:
+        return chunk_dtypes.pop()
+
+    if all([x.kind in 'iuf' for x in chunk_dtypes]):
+        return np.dtype(np.float64)
+
+    return np.dtype(np.object_)
+
+
+def format_join_column(series, zero_pad_length=None, whole_numbers=None):
+    """
+    Vectorized formatting of a join column as strings, optionally zero-padded.
+
+    Returns a tuple: (formatted pandas Series, True/False)
+        - the boolean indicates whether the formatted column differs
+          from the original--e.g. is a new join column needed?
+
+    Notes:
+        - Float columns holding whole numbers--e.g. integer ids that pandas
+          read as float b/c of blank values--are formatted as integers:
+              25025010100.0 -> "25025010100"
+        - Blank (null) values are formatted as empty strings
+        - Zero padding matches '{0:0>N}'.format(x)
+
+    :param whole_numbers: for float columns formatted in chunks, whether
+        the *whole* column holds whole numbers.  (None: check this series)
+    """
+    assert series is not None, "series cannot be None"
+
+    null_mask = series.isnull()
+    is_string_column = series.dtype == np.object_
+
+    if series.dtype.kind == 'f':
+        if whole_numbers is None:
+            whole_numbers = is_whole_number_column(series)
+        if whole_numbers:
+            series = series.fillna(0).astype(np.int64)
+
+    formatted = series.astype(str)
+
+    if zero_pad_length is not None and zero_pad_length > 0:
+        formatted = formatted.str.rjust(zero_pad_length, '0')
+
+    if null_mask.any():
+        formatted[null_mask] = ''
+
+    # Numeric columns always need a string column
+    if not is_string_column:
+        return formatted, True
+
+    # Did formatting change any (non-blank) values?
+    needs_formatting = bool((formatted[~null_mask] != series[~null_mask]).any())
+
+    return formatted, needs_formatting
+
+
+def is_whole_number_column(series):
+    """Are all the (non-null) values of a numeric column whole numbers?"""
+    non_null_vals = series[series.notnull()]
+
+    return bool((non_null_vals % 1 == 0).all())
+
+
 def normalize_colname(colname, position=1):
     """
     Return a string that complies with the characters PostgreSQL allows as column names.
@@ -4,15 +4,15 @@ Set attributes used for nearly all views
 from __future__ import print_function
 
 from django.conf import settings
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 
 from gc_apps.geo_utils.geoconnect_step_names import GEOCONNECT_STEPS,\
     STEP1_EXAMINE, STEP2_STYLE
 from gc_apps.geo_utils.git_info import get_branch_info
+from gc_apps.geo_utils.shared_cache import SharedCache
 from gc_apps.geo_utils.time_util import get_last_microsecond
 
-CACHE_KEY_BRANCH_INFO = 'CACHE_KEY_BRANCH_INFO'
+GIT_INFO_CACHE = SharedCache('git_info', default_timeout=7200)  # 2 hour cache
+CACHE_KEY_BRANCH_INFO = 'branch_info'
 
 def get_common_lookup(request, **kwargs):
     """
@@ -64,10 +64,4 @@ def get_git_branch_info_dict(request):
     """Return a dict containing git branch info--if available
     If not, returns an empty dict
     """
-    branch_info = cache.get(CACHE_KEY_BRANCH_INFO)
-
-    if branch_info is None:
-        branch_info = get_branch_info()
-        cache.set(CACHE_KEY_BRANCH_INFO, branch_info, 7200) # 2 hour cache
-
-    return branch_info
+    return GIT_INFO_CACHE.get_or_set(CACHE_KEY_BRANCH_INFO, get_branch_info)
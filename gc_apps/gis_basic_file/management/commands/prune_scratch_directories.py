@@ -0,0 +1,121 @@
+"""
+Delete old scratch directories and keep the scratch space under a quota.
+(Replaces task_scripts/prune_scratch_directories.py)
+
+# crontab, e.g.:
+9 * * * * (python) (geoconnect)/manage.py prune_scratch_directories --really-delete --email-notice
+"""
+from __future__ import print_function
+from django.core.management.base import BaseCommand
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.conf import settings
+
+from gc_apps.gis_basic_file.scratch_workspace import ScratchWorkspace,\
+    DEFAULT_MAX_HOURS, DEFAULT_DELETE_WORKERS
+from gc_apps.geo_utils.msg_util import msg, msgt, dashes
+
+
+class Command(BaseCommand):
+    # Show this when the user types help
+    help = """Delete scratch directories (settings.GISFILE_SCRATCH_WORK_DIRECTORY) not used within settings.GISFILE_SCRATCH_MAX_HOURS.  If the remaining directories are larger than settings.GISFILE_SCRATCH_MAX_BYTES, the least recently used are also deleted."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--really-delete',
+            action='store_true',
+            dest='really_delete',
+            default=False,
+            help='Default is to list the directories to delete.  Set this to delete them',
+        )
+        parser.add_argument(
+            '--max-hours',
+            type=float,
+            dest='max_hours',
+            default=None,
+            help='Delete directories not used within this time (default: settings.GISFILE_SCRATCH_MAX_HOURS)',
+        )
+        parser.add_argument(
+            '--max-mb',
+            type=float,
+            dest='max_mb',
+            default=None,
+            help='Scratch space quota in MB (default: settings.GISFILE_SCRATCH_MAX_BYTES)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            dest='num_workers',
+            default=DEFAULT_DELETE_WORKERS,
+            help='Threads used to delete directories (default: %s)' % DEFAULT_DELETE_WORKERS,
+        )
+        parser.add_argument(
+            '--email-notice',
+            action='store_true',
+            dest='email_notice',
+            default=False,
+            help='Email the results to the Django ADMINS specified in settings',
+        )
+
+    def handle(self, *args, **options):
+
+        if not settings.GISFILE_SCRATCH_WORK_DIRECTORY:
+            msg('settings.GISFILE_SCRATCH_WORK_DIRECTORY is not set')
+            return
+
+        max_hours = options.get('max_hours')
+        if max_hours is None:
+            max_hours = getattr(settings, 'GISFILE_SCRATCH_MAX_HOURS', DEFAULT_MAX_HOURS)
+
+        max_total_bytes = getattr(settings, 'GISFILE_SCRATCH_MAX_BYTES', None)
+        if options.get('max_mb') is not None:
+            max_total_bytes = int(options['max_mb'] * 1024 * 1024)
+
+        really_delete = options.get('really_delete', False)
+
+        dashes()
+        msg('Scratch directory: %s' % settings.GISFILE_SCRATCH_WORK_DIRECTORY)
+        msg('Max hours: %s, Max bytes: %s' % (max_hours, max_total_bytes))
+        if not really_delete:
+            msg('Check only: DO NOT delete')
+
+        prune_info = ScratchWorkspace().prune(\
+                            max_hours=max_hours,
+                            max_total_bytes=max_total_bytes,
+                            num_workers=options.get('num_workers', DEFAULT_DELETE_WORKERS),
+                            really_delete=really_delete)
+
+        msg('Directories: %s (%0.1f MB)' % (prune_info['num_directories'],
+                                            prune_info['total_bytes'] / (1024.0 * 1024)))
+        msg('Tabular file cache: %0.1f MB' % (prune_info['cache_bytes'] / (1024.0 * 1024)))
+        msg('Directories to delete: %s' % len(prune_info['deleted']))
+        if really_delete:
+            msg('MB removed: %0.1f' % (prune_info['bytes_removed'] / (1024.0 * 1024)))
+        msg('Failed to delete: %s' % len(prune_info['failed']))
+
+        if options.get('email_notice', False):
+            self.send_email_notice(prune_info['deleted'], prune_info['failed'])
+
+    def send_email_notice(self, names_of_deleted_dirs, names_failed_delete_dirs):
+        """Send email notice to settings.ADMINS"""
+        msgt('Send email notice!')
+
+        if len(names_failed_delete_dirs) > 0:
+            subject = '(err) GeoConnect: prune_scratch_directories'
+        else:
+            subject = '(ok) GeoConnect: prune_scratch_directories'
+
+        if len(settings.ADMINS) == 0:
+            msg('No one to email! (no one in settings.ADMINS)')
+            return
+
+        to_addresses = [x[1] for x in settings.ADMINS]
+
+        d = dict(names_of_deleted_dirs=names_of_deleted_dirs,
+                 names_failed_delete_dirs=names_failed_delete_dirs)
+        email_msg = render_to_string('task_scripts/prune_scratch_directories_email.txt', d)
+        from_email = to_addresses[0]
+
+        send_mail(subject, email_msg, from_email, to_addresses, fail_silently=False)
+
+        msg('email sent to: %s' % to_addresses)
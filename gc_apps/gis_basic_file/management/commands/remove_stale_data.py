@@ -5,7 +5,8 @@ from __future__ import print_function
 from django.core.management.base import BaseCommand#, CommandError
 from django.conf import settings
 
-from gc_apps.geo_utils.stale_data_remover import StaleDataRemover
+from gc_apps.geo_utils.stale_data_remover import StaleDataRemover,\
+    DEFAULT_DELETE_BATCH_SIZE, DEFAULT_FILE_DELETE_WORKERS
 from gc_apps.geo_utils.msg_util import msg, msgt, dashes
 
 class Command(BaseCommand):
@@ -27,6 +28,27 @@ class Command(BaseCommand):
             default=False,
             help='Email the results to the Django ADMINS specified in settings',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            dest='bulk',
+            default=False,
+            help='Select and delete stale objects in batches, reporting counts only.  (For large tables)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=DEFAULT_DELETE_BATCH_SIZE,
+            help='With --bulk, objects deleted per transaction (default: %s)' % DEFAULT_DELETE_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--file-workers',
+            type=int,
+            dest='num_file_workers',
+            default=DEFAULT_FILE_DELETE_WORKERS,
+            help='With --bulk, threads used to delete files (default: %s)' % DEFAULT_FILE_DELETE_WORKERS,
+        )
 
     def handle(self, *args, **options):
 
@@ -38,7 +60,12 @@ class Command(BaseCommand):
             msg('Check for old objects and DELETE them')
         else:
             msg('Check for old objects but DO NOT delete them')
-        stale_data_remover = StaleDataRemover(really_delete=really_delete)
+        stale_data_remover = StaleDataRemover(\
+                                really_delete=really_delete,
+                                bulk=options.get('bulk', False),
+                                batch_size=options.get('batch_size', DEFAULT_DELETE_BATCH_SIZE),
+                                num_file_workers=options.get('num_file_workers',
+                                                             DEFAULT_FILE_DELETE_WORKERS))
 
         stale_data_remover.remove_stale_data(\
             settings.STALE_DATA_SECONDS_TO_EXPIRATION)
@@ -1,6 +1,6 @@
 """Model for GISDataFile"""
-from hashlib import md5
 import socket
+import uuid
 
 from django.template.loader import render_to_string
 
@@ -120,9 +120,17 @@ class GISDataFile(DataverseInfo):
         return ScratchDirectoryHelper.delete_scratch_work_directory(self)
 
     def save(self, *args, **kwargs):
-        """Save with md5 hash"""
-        if not self.id:
-            super(GISDataFile, self).save(*args, **kwargs)
+        """
+        Set the md5--used to identify the object in urls, etc.--before
+        the first insert: a single write per save
+        """
+        if not self.md5:
+            self.md5 = uuid.uuid4().hex
+
+        # New ShapefileInfo, TabularFileInfo, etc: without force_insert,
+        #   Django tries an UPDATE of the subclass table before the INSERT
+        if self.pk is None:
+            kwargs.setdefault('force_insert', True)
 
         # Only used for running locally!
         # Makes dataverse installation name unique
@@ -131,13 +139,6 @@ class GISDataFile(DataverseInfo):
         #    if socket.gethostname():
         #        self.dataverse_installation_name = socket.gethostname()
 
-
-        string_to_hash = '%s%s%s' % (\
-                            self.id,
-                            self.datafile_id,
-                            self.dataverse_installation_name)
-        self.md5 = md5(string_to_hash).hexdigest()
-
         super(GISDataFile, self).save(*args, **kwargs)
 
 
@@ -1,11 +1,10 @@
 import shutil
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
-from django.utils import timezone
-import re
 import logging
 from gc_apps.geo_utils.time_util import TIME_FORMAT_STRING
+from gc_apps.gis_basic_file.scratch_workspace import ScratchWorkspace
 
 logger = logging.getLogger(__name__)
 
@@ -16,31 +15,28 @@ class ScratchDirectoryHelper:
     #TIME_FORMAT_STRING = '%Y-%m%d-%H%M'
 
     @staticmethod
-    def clear_scratch_directories(max_hours=6):
+    def clear_scratch_directories(max_hours=6, max_total_bytes=None):
         """Delete all scratch directories not used within the 'max_hours'
         (A negative number could be used to delete all directories regardless of time)
-        """
-
-        # Deleting all older directories as defined by their folder name
-        l = os.listdir(settings.GISFILE_SCRATCH_WORK_DIRECTORY)
-        l = [x for x in l if re.search('\d{4}(-\d{4}){2}', x)]
 
-        names_of_deleted_dirs = []
-        names_failed_delete_dirs = []
+        If "max_total_bytes" is set, the least recently used directories
+        are also deleted until the total is under it.  See ScratchWorkspace
+        """
+        prune_info = ScratchWorkspace().prune(max_hours=max_hours,
+                                              max_total_bytes=max_total_bytes)
 
-        current_time = timezone.now()
-        for dirname in l:
-            dir_to_remove = os.path.join(settings.GISFILE_SCRATCH_WORK_DIRECTORY, dirname )
-            try:
-                dt = datetime.strptime(dirname[:14], TIME_FORMAT_STRING)
-                time_diff = current_time - dt
-                if time_diff.days > 0 or (time_diff.seconds/3600) > max_hours:
-                    shutil.rmtree(dir_to_remove)
-                    names_of_deleted_dirs.append(dir_to_remove)
-            except:
-                names_failed_delete_dirs.append(dir_to_remove)
+        return (prune_info['deleted'], prune_info['failed'])
 
-        return  (names_of_deleted_dirs, names_failed_delete_dirs)
+    @staticmethod
+    def update_workspace(method_name, dirpath):
+        """Record a directory change in the ScratchWorkspace manifest.
+        A manifest failure shouldn't stop the file processing"""
+        if not settings.GISFILE_SCRATCH_WORK_DIRECTORY:
+            return
+        try:
+            getattr(ScratchWorkspace(), method_name)(dirpath)
+        except (IOError, OSError) as ex_obj:
+            logger.error('Failed to update the scratch manifest: %s (%s)', dirpath, ex_obj)
 
     @staticmethod
     def delete_scratch_work_directory(gis_data_file):
@@ -59,6 +55,8 @@ class ScratchDirectoryHelper:
 
         try:
             shutil.rmtree(gis_data_file.gis_scratch_work_directory)
+            ScratchDirectoryHelper.update_workspace('unregister_directory',
+                                    gis_data_file.gis_scratch_work_directory)
             return True
         except:
             logger.error('Failed to delete directory: %s:' % gis_data_file.gis_scratch_work_directory)
@@ -75,6 +73,8 @@ class ScratchDirectoryHelper:
 
         # If directory exists, return it
         if ScratchDirectoryHelper._does_scratch_work_directory_exist(gis_data_file):
+            ScratchDirectoryHelper.update_workspace('touch_directory',
+                                    gis_data_file.gis_scratch_work_directory)
             return gis_data_file.gis_scratch_work_directory
 
         # If directory doesn't exist, create it
@@ -123,6 +123,7 @@ class ScratchDirectoryHelper:
             os.makedirs(dirname)
             gis_data_file.gis_scratch_work_directory = dirname
             gis_data_file.save()
+            ScratchDirectoryHelper.update_workspace('register_directory', dirname)
             return True
         except:
             logger.critical('Failed to create directory: %s:' % dirname)
@@ -0,0 +1,361 @@
+"""
+Track and prune the GISDataFile scratch directories.
+
+A small manifest in settings.GISFILE_SCRATCH_WORK_DIRECTORY records each
+scratch directory's creation time, last use and size:
+
+    (GISFILE_SCRATCH_WORK_DIRECTORY)/.scratch_manifest.json
+        {"2017-0105-1312__45": {"created": 1483639920.1,
+                                "last_used": 1483640100.6,
+                                "size": 2101233}, ...}
+
+Pruning reads the manifest instead of listing and parsing the whole
+scratch directory:
+    - directories not used within "max_hours" are deleted
+    - if the total size is over "max_total_bytes", the least recently
+      used directories are deleted until it is under
+    - deletions run in parallel
+
+The manifest lock is only held to read and update the manifest--not
+while directory sizes are measured or directories are deleted.
+
+The parsed tabular file cache, (GISFILE_SCRATCH_WORK_DIRECTORY)/parsed_tabular_cache/,
+counts against "max_total_bytes" but isn't deleted here.  Its stale
+files are removed by TabularFileCache.remove_stale_files.
+
+    workspace = ScratchWorkspace()
+    workspace.prune(max_hours=6, max_total_bytes=5 * 1024**3)
+
+Times are epoch seconds: no naive vs. timezone-aware comparisons.
+Only directories in the manifest are deleted.  (When the manifest is
+created, existing "(timestamp)__(id)" directories are added to it.)
+"""
+from __future__ import print_function
+from contextlib import contextmanager
+import copy
+import fcntl
+import json
+import os
+from os.path import getmtime, isdir, isfile, islink, join
+import re
+import shutil
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from gc_apps.gis_tabular.tabular_file_cache import CACHE_DIRECTORY_NAME
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = '.scratch_manifest.json'
+MANIFEST_LOCK_FILE_NAME = '.scratch_manifest.lock'
+
+# Scratch directory names: (TIME_FORMAT_STRING)__(GISDataFile id)
+SCRATCH_DIRECTORY_NAME_PATTERN = re.compile(r'^\d{4}(-\d{4}){2}__\d+$')
+
+DEFAULT_MAX_HOURS = 6
+DEFAULT_DELETE_WORKERS = 4
+
+# Don't rewrite the manifest for each use of a directory
+LAST_USED_RESOLUTION_SECONDS = 60
+
+
+def get_directory_size(dirpath):
+    """Total size, in bytes, of the files under a directory"""
+    total_size = 0
+    for root, _dirs, fnames in os.walk(dirpath):
+        for fname in fnames:
+            fullpath = join(root, fname)
+            if islink(fullpath):
+                continue
+            try:
+                total_size += os.path.getsize(fullpath)
+            except OSError:
+                pass    # e.g. deleted while walking
+    return total_size
+
+
+def remove_directory(dirpath):
+    """Delete a directory (run in a worker thread).  returns (dirpath, error or None)"""
+    try:
+        shutil.rmtree(dirpath)
+    except OSError as ex_obj:
+        if isdir(dirpath):
+            return (dirpath, str(ex_obj))
+    return (dirpath, None)
+
+
+class ScratchWorkspace(object):
+    """
+    The manifest of scratch directories under a base directory
+    (default: settings.GISFILE_SCRATCH_WORK_DIRECTORY)
+    """
+
+    def __init__(self, base_directory=None):
+        self.base_directory = base_directory or settings.GISFILE_SCRATCH_WORK_DIRECTORY
+        assert self.base_directory, 'A base directory is required'\
+                                    ' (settings.GISFILE_SCRATCH_WORK_DIRECTORY)'
+
+        self.manifest_path = join(self.base_directory, MANIFEST_FILE_NAME)
+        self.lock_path = join(self.base_directory, MANIFEST_LOCK_FILE_NAME)
+
+    # ----------------------------------------------
+    # Manifest read/write
+    # ----------------------------------------------
+    @contextmanager
+    def locked_manifest(self):
+        """
+        Load the manifest, yield it for changes, and write it back.
+        An exclusive file lock is held throughout (several processes
+        create scratch directories)
+        """
+        if not isdir(self.base_directory):
+            os.makedirs(self.base_directory)
+
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if isfile(self.manifest_path):
+                    manifest = self.read_manifest()
+                else:
+                    # First use: add directories made before the manifest
+                    manifest = {}
+                    self.add_existing_directories(manifest)
+                original_manifest = copy.deepcopy(manifest)
+
+                yield manifest
+
+                if manifest != original_manifest or not isfile(self.manifest_path):
+                    self.write_manifest(manifest)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_manifest(self):
+        """returns the manifest dict.  (empty if missing or unreadable)"""
+        if not isfile(self.manifest_path):
+            return {}
+
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                return json.load(manifest_file)
+        except (IOError, ValueError) as ex_obj:
+            LOGGER.error('Failed to read scratch manifest: %s (%s)',
+                         self.manifest_path, ex_obj)
+            return {}
+
+    def write_manifest(self, manifest):
+        """Write to a temp file and rename: readers never see a partial file"""
+        tmp_path = '%s.%s.tmp' % (self.manifest_path, os.getpid())
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.rename(tmp_path, self.manifest_path)
+
+    def get_dirname(self, dirpath):
+        """Manifest key: the name of a directory directly under the base directory"""
+        dirpath = dirpath.rstrip(os.sep)
+        if os.path.dirname(dirpath) != self.base_directory.rstrip(os.sep):
+            return None
+        return os.path.basename(dirpath)
+
+    # ----------------------------------------------
+    # Called as scratch directories are created, used and deleted
+    # ----------------------------------------------
+    def register_directory(self, dirpath):
+        """Add a new scratch directory"""
+        dirname = self.get_dirname(dirpath)
+        if dirname is None:
+            return
+
+        current_time = time.time()
+        with self.locked_manifest() as manifest:
+            manifest[dirname] = dict(created=current_time,
+                                     last_used=current_time,
+                                     size=0)
+
+    def touch_directory(self, dirpath):
+        """Record the use of a scratch directory (for LRU eviction)"""
+        dirname = self.get_dirname(dirpath)
+        if dirname is None:
+            return
+
+        current_time = time.time()
+        with self.locked_manifest() as manifest:
+            dir_info = manifest.get(dirname)
+            if dir_info is None:
+                manifest[dirname] = dict(created=current_time,
+                                         last_used=current_time,
+                                         size=0)
+            elif current_time - dir_info['last_used'] > LAST_USED_RESOLUTION_SECONDS:
+                dir_info['last_used'] = current_time
+
+    def unregister_directory(self, dirpath):
+        """Remove a deleted scratch directory"""
+        dirname = self.get_dirname(dirpath)
+        if dirname is None:
+            return
+
+        with self.locked_manifest() as manifest:
+            manifest.pop(dirname, None)
+
+    # ----------------------------------------------
+    # Pruning
+    # ----------------------------------------------
+    def add_existing_directories(self, manifest):
+        """
+        Add scratch directories created before the manifest existed.
+        Their modification time is used for "created" and "last_used"
+        """
+        for dirname in os.listdir(self.base_directory):
+            if dirname in manifest:
+                continue
+            if not SCRATCH_DIRECTORY_NAME_PATTERN.match(dirname):
+                continue
+
+            dirpath = join(self.base_directory, dirname)
+            if not isdir(dirpath):
+                continue
+
+            mod_time = getmtime(dirpath)
+            manifest[dirname] = dict(created=mod_time, last_used=mod_time, size=0)
+
+    def get_directory_sizes(self, dirnames):
+        """
+        returns { dirname : size in bytes }.
+        Missing directories have a size of None
+        """
+        dir_sizes = {}
+        for dirname in dirnames:
+            dirpath = join(self.base_directory, dirname)
+            if isdir(dirpath):
+                dir_sizes[dirname] = get_directory_size(dirpath)
+            else:
+                dir_sizes[dirname] = None
+        return dir_sizes
+
+    @staticmethod
+    def update_sizes(manifest, dir_sizes):
+        """Update the size of each directory.  Missing directories are removed"""
+        for dirname, size in dir_sizes.items():
+            if dirname not in manifest:
+                continue    # unregistered while measuring
+            if size is None:
+                del manifest[dirname]
+            else:
+                manifest[dirname]['size'] = size
+
+    def get_cache_size(self):
+        """Size of the parsed tabular file cache (not in the manifest)"""
+        cache_dir = join(self.base_directory, CACHE_DIRECTORY_NAME)
+        if not isdir(cache_dir):
+            return 0
+        return get_directory_size(cache_dir)
+
+    @staticmethod
+    def get_directories_to_remove(manifest, max_hours, max_total_bytes=None,
+                                  current_time=None, reserved_bytes=0):
+        """
+        returns the names of directories:
+            - not used within "max_hours" (negative: all directories), then
+            - least recently used, until the total size is under "max_total_bytes"
+
+        :param reserved_bytes: space, e.g. the tabular file cache, counted
+            against "max_total_bytes" that isn't in the manifest
+        """
+        if current_time is None:
+            current_time = time.time()
+
+        # least recently used first
+        lru_names = sorted(manifest.keys(), key=lambda x: manifest[x]['last_used'])
+
+        oldest_time_allowed = current_time - (max_hours * 60 * 60)
+        names_to_remove = [dirname for dirname in lru_names\
+                           if max_hours < 0 or\
+                              manifest[dirname]['last_used'] < oldest_time_allowed]
+
+        if max_total_bytes is None:
+            return names_to_remove
+
+        # Over the quota?  Remove the least recently used directories
+        expired_names = set(names_to_remove)
+        remaining_names = [dirname for dirname in lru_names\
+                           if dirname not in expired_names]
+        total_size = reserved_bytes +\
+                     sum([manifest[dirname]['size'] for dirname in remaining_names])
+
+        for dirname in remaining_names:
+            if total_size <= max_total_bytes:
+                break
+            names_to_remove.append(dirname)
+            total_size -= manifest[dirname]['size']
+
+        return names_to_remove
+
+    def prune(self, max_hours=DEFAULT_MAX_HOURS, max_total_bytes=None,
+              num_workers=DEFAULT_DELETE_WORKERS, really_delete=True):
+        """
+        Delete stale directories and enforce the disk quota.
+
+        :param max_hours: delete directories not used within this time.
+            (A negative number deletes all directories)
+        :param max_total_bytes: overall quota, None for no quota
+
+        returns a dict:
+            deleted: list of deleted directory paths
+            failed: list of directory paths that could not be deleted
+            num_directories: directories in the manifest, before pruning
+            total_bytes: their size plus "cache_bytes", before pruning
+            cache_bytes: size of the tabular file cache (counted, not deleted)
+            bytes_removed: size of the deleted directories
+        """
+        # Measure the directories without holding the lock
+        with self.locked_manifest() as manifest:
+            dirnames = list(manifest.keys())
+
+        dir_sizes = self.get_directory_sizes(dirnames)
+        cache_bytes = self.get_cache_size()
+
+        # Choose the directories to delete
+        with self.locked_manifest() as manifest:
+            self.update_sizes(manifest, dir_sizes)
+
+            names_to_remove = self.get_directories_to_remove(\
+                                    manifest, max_hours, max_total_bytes,
+                                    reserved_bytes=cache_bytes)
+            removed_sizes = dict([(x, manifest[x]['size']) for x in names_to_remove])
+
+            prune_info = dict(deleted=[],
+                              failed=[],
+                              num_directories=len(manifest),
+                              total_bytes=cache_bytes +\
+                                          sum([x['size'] for x in manifest.values()]),
+                              cache_bytes=cache_bytes,
+                              bytes_removed=0)
+
+        if not really_delete:
+            prune_info['deleted'] = [join(self.base_directory, x)\
+                                     for x in names_to_remove]
+            return prune_info
+
+        # Delete them, without the lock
+        dirpaths = [join(self.base_directory, x) for x in names_to_remove]
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(remove_directory, dirpaths))
+
+        for (dirpath, err_msg) in results:
+            if err_msg is None:
+                prune_info['deleted'].append(dirpath)
+                prune_info['bytes_removed'] += removed_sizes[os.path.basename(dirpath)]
+            else:
+                LOGGER.error('Failed to delete directory: %s (%s)', dirpath, err_msg)
+                prune_info['failed'].append(dirpath)
+
+        # Remove the deleted directories from the manifest
+        if prune_info['deleted']:
+            with self.locked_manifest() as manifest:
+                for dirpath in prune_info['deleted']:
+                    manifest.pop(os.path.basename(dirpath), None)
+
+        return prune_info
@@ -1,4 +1,140 @@
-from django.test import TestCase
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import shutil
+import tempfile
+import time
+import fcntl
+
+from django.core import management
+from django.test import SimpleTestCase
+
+from gc_apps.geo_utils.msg_util import msgt, msg
+from gc_apps.gis_basic_file import scratch_workspace
+from gc_apps.gis_basic_file.scratch_workspace import ScratchWorkspace,\
+    MANIFEST_FILE_NAME
+
+
+class ScratchWorkspaceTestCase(SimpleTestCase):
+    """
+    Test the scratch directory manifest and pruning
+    """
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='gc_scratch_test_')
+        self.workspace = ScratchWorkspace(self.base_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def make_directory(self, dirname, num_bytes, hours_since_used=0, register=True):
+        dirpath = join(self.base_dir, dirname)
+        os.makedirs(join(dirpath, 'sub'))
+        with open(join(dirpath, 'sub', 'data.bin'), 'wb') as data_file:
+            data_file.write('x' * num_bytes)
+
+        if register:
+            self.workspace.register_directory(dirpath)
+            with self.workspace.locked_manifest() as manifest:
+                manifest[dirname]['last_used'] -= hours_since_used * 60 * 60
+        return dirpath
+
+    def test_01_prune_by_age(self):
+        """Directories not used within max_hours are deleted"""
+        msgt(self.test_01_prune_by_age.__doc__)
+
+        # Made before the manifest: "timestamp__id" names are added
+        legacy_dir = self.make_directory('2016-1205-1030__12', 10, register=False)
+        old_time = time.time() - 10 * 60 * 60
+        os.utime(legacy_dir, (old_time, old_time))
+        other_dir = self.make_directory('parsed_tabular_cache', 10, register=False)
+
+        old_dir = self.make_directory('2017-0101-0000__1', 100, hours_since_used=8)
+        new_dir = self.make_directory('2017-0101-0000__2', 100, hours_since_used=1)
+        self.assertTrue(isfile(join(self.base_dir, MANIFEST_FILE_NAME)))
+
+        msg('check only')
+        prune_info = self.workspace.prune(max_hours=6, really_delete=False)
+        self.assertEqual(sorted(prune_info['deleted']), sorted([legacy_dir, old_dir]))
+        self.assertTrue(isdir(old_dir))
+
+        prune_info = self.workspace.prune(max_hours=6, num_workers=2)
+        self.assertEqual(sorted(prune_info['deleted']), sorted([legacy_dir, old_dir]))
+        self.assertEqual(prune_info['failed'], [])
+        self.assertEqual(prune_info['num_directories'], 3)
+        self.assertEqual(prune_info['bytes_removed'], 110)
+        self.assertFalse(isdir(old_dir))
+        self.assertTrue(isdir(new_dir))
+        self.assertTrue(isdir(other_dir))
+        self.assertEqual(self.workspace.read_manifest().keys(), ['2017-0101-0000__2'])
+
+    def test_02_prune_by_quota(self):
+        """Over the quota: least recently used directories are deleted"""
+        msgt(self.test_02_prune_by_quota.__doc__)
+
+        dirs = [self.make_directory('2017-0101-0000__%s' % idx, 100, hours_since_used=hours)\
+                for idx, hours in enumerate([3, 1, 2, 0])]
+
+        prune_info = self.workspace.prune(max_hours=6, max_total_bytes=250)
+        self.assertEqual(prune_info['total_bytes'], 400)
+        self.assertEqual(prune_info['deleted'], [dirs[0], dirs[2]])
+        self.assertTrue(isdir(dirs[1]) and isdir(dirs[3]))
+
+        msg('directories deleted elsewhere are dropped from the manifest')
+        self.workspace.touch_directory(dirs[1])
+        shutil.rmtree(dirs[3])
+        prune_info = self.workspace.prune(max_hours=-1)
+        self.assertEqual(prune_info['num_directories'], 1)
+        self.assertEqual(prune_info['deleted'], [dirs[1]])
+
+    def test_03_command(self):
+        """The prune_scratch_directories command"""
+        msgt(self.test_03_command.__doc__)
+
+        old_dir = self.make_directory('2017-0101-0000__1', 100, hours_since_used=8)
+        with self.settings(GISFILE_SCRATCH_WORK_DIRECTORY=self.base_dir):
+            management.call_command('prune_scratch_directories', max_hours=4)
+            self.assertTrue(isdir(old_dir))
+
+            management.call_command('prune_scratch_directories', max_hours=4,
+                                    really_delete=True)
+            self.assertFalse(isdir(old_dir))
+
+    def test_04_cache_and_lock(self):
+        """The tabular file cache counts toward the quota; deletes run unlocked"""
+        msgt(self.test_04_cache_and_lock.__doc__)
+
+        cache_dir = self.make_directory('parsed_tabular_cache', 200, register=False)
+        dirs = [self.make_directory('2017-0101-0000__%s' % idx, 100, hours_since_used=hours)\
+                for idx, hours in enumerate([2, 1])]
+
+        lock_states = []
+        original_remove_directory = scratch_workspace.remove_directory
+
+        def remove_directory(dirpath):
+            """Is the manifest lock free while deleting?"""
+            with open(self.workspace.lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_states.append(True)
+                except IOError:
+                    lock_states.append(False)
+            return original_remove_directory(dirpath)
+
+        scratch_workspace.remove_directory = remove_directory
+        try:
+            prune_info = self.workspace.prune(max_hours=6, max_total_bytes=350)
+        finally:
+            scratch_workspace.remove_directory = original_remove_directory
+
+        self.assertEqual(lock_states, [True])
+        self.assertEqual(prune_info['cache_bytes'], 200)
+        self.assertEqual(prune_info['total_bytes'], 400)
+        self.assertEqual(prune_info['deleted'], [dirs[0]])
+        self.assertEqual(prune_info['bytes_removed'], 100)
+        self.assertTrue(isdir(dirs[1]) and isdir(cache_dir))
+        self.assertEqual(self.workspace.read_manifest().keys(), ['2017-0101-0000__1'])
 
 """
 from django.core.files.storage import default_storage
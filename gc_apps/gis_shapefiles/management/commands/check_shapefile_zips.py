@@ -0,0 +1,101 @@
+"""
+Validate many zipped shapefiles in parallel
+
+    # ShapefileInfo objects not yet checked
+    python manage.py check_shapefile_zips --unchecked
+
+    # .zip files on disk (nothing is saved)
+    python manage.py check_shapefile_zips /data/dataset_123/*.zip --workers 8
+"""
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gc_apps.gis_shapefiles.models import ShapefileInfo
+from gc_apps.gis_shapefiles.shapefile_batch_check import ShapefileBatchCheck,\
+    get_default_num_workers
+from gc_apps.gis_shapefiles.shapefile_stats import DEFAULT_NUM_SHAPES_TO_VALIDATE
+from gc_apps.geo_utils.msg_util import msg, dashes
+
+class Command(BaseCommand):
+    # Show this when the user types help
+    help = ('Validate zipped shapefiles and read their metadata using a pool of'
+            ' worker processes.  Check .zip paths or ShapefileInfo objects.'
+            '  ShapefileInfo results are saved unless "--dry-run" is used.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('zip_paths', nargs='*',
+                            help='.zip files to check')
+        parser.add_argument(
+            '--unchecked',
+            action='store_true',
+            dest='unchecked',
+            default=False,
+            help='Check ShapefileInfo objects where "zipfile_checked" is False',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='check_all',
+            default=False,
+            help='Check all ShapefileInfo objects',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Check ShapefileInfo objects but do not save the results',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            dest='num_workers',
+            default=get_default_num_workers(),
+            help='Number of worker processes. (Default is the number of cpus)')
+
+        parser.add_argument(
+            '--validate-shapes',
+            type=int,
+            dest='num_shapes_to_validate',
+            default=DEFAULT_NUM_SHAPES_TO_VALIDATE,
+            help='Geometry records to check per shapefile. (Default is %s)'\
+                 % DEFAULT_NUM_SHAPES_TO_VALIDATE)
+
+    def show_result(self, result):
+        """Print each invalid file as it's checked"""
+        if result['is_valid']:
+            return
+        msg('Invalid: %s (%s)' % (result.get('path') or result.get('dv_file_name'),
+                                  result['error_msg']))
+
+    def handle(self, *args, **options):
+
+        zip_paths = options.get('zip_paths')
+        if options.get('check_all'):
+            shapefile_infos = ShapefileInfo.objects.all()
+        elif options.get('unchecked'):
+            shapefile_infos = ShapefileInfo.objects.filter(zipfile_checked=False)
+        else:
+            shapefile_infos = None
+
+        if not zip_paths and shapefile_infos is None:
+            raise CommandError('Specify .zip paths, "--unchecked", or "--all"')
+
+        batch_check = ShapefileBatchCheck(\
+                        num_workers=options.get('num_workers'),
+                        num_shapes_to_validate=options.get('num_shapes_to_validate'),
+                        progress_callback=self.show_result)
+
+        dashes()
+        if zip_paths:
+            msg('Check .zip files: %s' % len(zip_paths))
+            batch_check.check_paths(zip_paths)
+
+        if shapefile_infos is not None:
+            msg('Check ShapefileInfo objects: %s' % shapefile_infos.count())
+            batch_check.check_shapefile_infos(shapefile_infos,
+                                              save=not options.get('dry_run'))
+
+        dashes()
+        msg(batch_check.get_summary_lines())
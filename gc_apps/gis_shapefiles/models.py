@@ -1,5 +1,4 @@
 import os
-from hashlib import md5
 import logging
 
 from django.db import models
@@ -73,16 +72,6 @@ class ShapefileInfo(GISDataFile):
     def get_basename(self):
         return os.path.basename(self.name)
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            super(ShapefileInfo, self).save(*args, **kwargs)
-        self.md5 = md5('%s%s%s' % (\
-                       self.id,
-                       self.datafile_id,
-                       self.dataverse_installation_name)).hexdigest()
-
-        super(ShapefileInfo, self).save(*args, **kwargs)
-
     def __unicode__(self):
         if self.name:
             return self.name
@@ -102,20 +91,6 @@ class WorldMapShapefileLayerInfo(WorldMapLayerInfo):
     """
     shapefile_info = models.ForeignKey(ShapefileInfo)
 
-    def save(self, *args, **kwargs):
-        """When saving, set layer_name and md5"""
-
-        if not self.id:
-            super(WorldMapShapefileLayerInfo, self).save(*args, **kwargs)
-
-        self.layer_name = self.core_data.get('layer_typename', None)
-        if self.layer_name is None:
-            self.layer_name = self.core_data.get('layer_name')
-
-        self.md5 = md5('%s-%s' % (self.id, self.layer_name)).hexdigest()
-        super(WorldMapShapefileLayerInfo, self).save(*args, **kwargs)
-
-
     class Meta:
         ordering = ('-created',)
         verbose_name = 'WorldMapShapefileLayerInfo'
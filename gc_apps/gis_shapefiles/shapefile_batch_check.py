@@ -0,0 +1,238 @@
+"""
+Check many zipped shapefiles in parallel--e.g. to pre-validate the
+shapefiles in a Dataverse dataset.
+
+Each .zip is run through ShapefileZipCheck.validate() and
+load_shapefile_from_open_zip() in a worker process.  The workers
+don't use the database: ShapefileInfo results are written by the
+calling process, in batches.
+
+    batch_check = ShapefileBatchCheck(num_workers=4)
+
+    # ShapefileInfo objects: results are saved
+    batch_check.check_shapefile_infos(ShapefileInfo.objects.filter(zipfile_checked=False))
+
+    # .zip files on disk: results are returned
+    batch_check.check_paths(['/data/roads.zip', '/data/rivers.zip'])
+
+    print(batch_check.get_summary_lines())
+"""
+from __future__ import print_function
+from collections import Counter
+import multiprocessing
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections, transaction
+
+from gc_apps.gis_shapefiles.models import ShapefileInfo
+from gc_apps.gis_shapefiles.shapefile_zip_check import ShapefileZipCheck
+from gc_apps.gis_shapefiles.shapefile_stats import DEFAULT_NUM_SHAPES_TO_VALIDATE
+from gc_apps.geo_utils.template_constants import ZIPCHECK_NO_SHAPEFILES_FOUND,\
+        ZIPCHECK_MULTIPLE_SHAPEFILES,\
+        ZIPCHECK_NO_FILE_TO_CHECK
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SAVE_BATCH_SIZE = 100
+
+# Same ShapefileInfo names as shown by the shapefile view
+ERROR_TYPE_NAMES = {ZIPCHECK_NO_FILE_TO_CHECK: '(no file to check)',
+                    ZIPCHECK_NO_SHAPEFILES_FOUND: '(not a shapefile)',
+                    ZIPCHECK_MULTIPLE_SHAPEFILES: '(multiple shapefiles found)'}
+
+# ShapefileInfo attributes set by the check
+RESULT_FIELDS = ('name', 'zipfile_checked', 'has_shapefile', 'number_of_features',
+                 'bounding_box', 'column_names', 'column_info')
+
+
+def get_default_num_workers():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def check_shapefile_zip(check_params):
+    """
+    Check a single .zip.  Runs in a worker process: no database calls.
+
+    check_params: dict with either:
+        - 'path': full path to a .zip
+        - 'shapefile_info_id' and 'dv_file_name': a ShapefileInfo's file
+
+    returns a dict with the check_params plus:
+        'is_valid', 'error_type', 'error_msg', 'seconds',
+        'fields' (ShapefileInfo attributes, see RESULT_FIELDS)
+    """
+    start_time = time.time()
+    result = dict(check_params, is_valid=False, error_type=None, error_msg=None)
+
+    # Not saved--the ShapefileInfo only collects the results
+    shapefile_info = ShapefileInfo(dv_file=check_params.get('dv_file_name'))
+    shapefile_info.zipfile_checked = True
+
+    zip_checker = None
+    try:
+        if 'path' in check_params:
+            zip_checker = ShapefileZipCheck(check_params['path'])
+        else:
+            zip_checker = ShapefileZipCheck(shapefile_info.dv_file,
+                                            **{'is_django_file_field': True})
+        if zip_checker.validate():
+            zip_checker.load_shapefile_from_open_zip(\
+                        zip_checker.get_shapefile_setnames()[0],
+                        shapefile_info,
+                        num_shapes_to_validate=check_params.get(\
+                                'num_shapes_to_validate', DEFAULT_NUM_SHAPES_TO_VALIDATE),
+                        save=False)
+    except Exception as ex_obj:
+        LOGGER.error('Shapefile check failed: %s (%s)', check_params, ex_obj)
+        result['error_msg'] = 'Shapefile check failed: %s' % ex_obj
+    else:
+        if zip_checker.has_err:
+            result['error_type'] = zip_checker.error_type
+            result['error_msg'] = zip_checker.error_msg
+        else:
+            result['is_valid'] = True
+    finally:
+        if zip_checker is not None:
+            zip_checker.close_zip()
+
+    shapefile_info.has_shapefile = result['is_valid']
+    if result['error_type'] in ERROR_TYPE_NAMES:
+        shapefile_info.name = ERROR_TYPE_NAMES[result['error_type']]
+
+    result['fields'] = dict([(attr, getattr(shapefile_info, attr))\
+                             for attr in RESULT_FIELDS])
+    result['seconds'] = time.time() - start_time
+    return result
+
+
+class ShapefileBatchCheck(object):
+    """
+    Run check_shapefile_zip over many .zip files using a process pool
+    """
+
+    def __init__(self, num_workers=None, num_shapes_to_validate=DEFAULT_NUM_SHAPES_TO_VALIDATE,
+                 save_batch_size=DEFAULT_SAVE_BATCH_SIZE, progress_callback=None):
+        """
+        :param num_workers: worker processes (default: number of cpus).
+            With 1, the checks run in this process
+        :param progress_callback: called with each result as it arrives
+        """
+        self.num_workers = num_workers or get_default_num_workers()
+        self.num_shapes_to_validate = num_shapes_to_validate
+        self.save_batch_size = save_batch_size
+        self.progress_callback = progress_callback
+
+        self.results = []
+        self.num_saved = 0
+        self.elapsed_seconds = 0
+
+    def run_checks(self, check_params_list):
+        """Check each .zip and return the results, in no particular order"""
+        start_time = time.time()
+
+        for check_params in check_params_list:
+            check_params['num_shapes_to_validate'] = self.num_shapes_to_validate
+
+        results = []
+        if self.num_workers == 1 or len(check_params_list) < 2:
+            for check_params in check_params_list:
+                self.add_result(results, check_shapefile_zip(check_params))
+        else:
+            # Workers are forked: don't share this process's db connections
+            #   (unless in a transaction, the workers don't use them)
+            for conn in connections.all():
+                if not conn.in_atomic_block:
+                    conn.close()
+
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = [executor.submit(check_shapefile_zip, check_params)\
+                           for check_params in check_params_list]
+                for future in as_completed(futures):
+                    self.add_result(results, future.result())
+
+        self.results.extend(results)
+        self.elapsed_seconds += time.time() - start_time
+        return results
+
+    def add_result(self, results, result):
+        results.append(result)
+        if self.progress_callback is not None:
+            self.progress_callback(result)
+
+    def check_paths(self, zip_paths):
+        """Check .zip files on disk.  returns the results"""
+        return self.run_checks([dict(path=zip_path) for zip_path in zip_paths])
+
+    def check_shapefile_infos(self, shapefile_infos, save=True):
+        """
+        Check ShapefileInfo objects (a queryset or list).
+        If "save" is True, the results are written to the database.
+        returns the results
+        """
+        if hasattr(shapefile_infos, 'values_list'):
+            id_names = list(shapefile_infos.values_list('id', 'dv_file'))
+        else:
+            id_names = [(info.id, info.dv_file.name) for info in shapefile_infos]
+
+        results = self.run_checks([dict(shapefile_info_id=info_id, dv_file_name=dv_file_name)\
+                                   for info_id, dv_file_name in id_names])
+        if save:
+            self.save_results(results)
+        return results
+
+    def save_results(self, results):
+        """
+        Update the ShapefileInfo objects, "save_batch_size" per transaction.
+        A queryset update() per object: no extra md5 save or reload
+        """
+        results = [r for r in results if r.get('shapefile_info_id')]
+
+        for idx in range(0, len(results), self.save_batch_size):
+            with transaction.atomic():
+                for result in results[idx:idx + self.save_batch_size]:
+                    self.num_saved += ShapefileInfo.objects.filter(\
+                                        id=result['shapefile_info_id']\
+                                        ).update(**result['fields'])
+
+    def get_summary(self):
+        """Counts and timing for the results so far"""
+        num_checked = len(self.results)
+        num_valid = len([r for r in self.results if r['is_valid']])
+        error_counts = Counter([r['error_type'] or 'ERROR' for r in self.results\
+                                if not r['is_valid']])
+        files_per_second = None
+        if self.elapsed_seconds > 0:
+            files_per_second = num_checked / self.elapsed_seconds
+
+        return dict(num_checked=num_checked,
+                    num_valid=num_valid,
+                    num_invalid=num_checked - num_valid,
+                    num_saved=self.num_saved,
+                    num_features=sum([r['fields']['number_of_features']\
+                                      for r in self.results if r['is_valid']]),
+                    error_counts=dict(error_counts),
+                    num_workers=self.num_workers,
+                    elapsed_seconds=self.elapsed_seconds,
+                    files_per_second=files_per_second)
+
+    def get_summary_lines(self):
+        """Summary report as text"""
+        summary = self.get_summary()
+        lines = ['Checked: %s' % summary['num_checked'],
+                 'Valid: %s' % summary['num_valid'],
+                 'Invalid: %s' % summary['num_invalid']]
+        for error_type, cnt in sorted(summary['error_counts'].items()):
+            lines.append('    %s: %s' % (error_type, cnt))
+        lines += ['Features: %s' % summary['num_features'],
+                  'Saved: %s' % summary['num_saved'],
+                  'Workers: %s' % summary['num_workers'],
+                  'Seconds: %0.2f' % summary['elapsed_seconds']]
+        if summary['files_per_second']:
+            lines.append('Files/second: %0.1f' % summary['files_per_second'])
+        return '\n'.join(lines)
@@ -0,0 +1,180 @@
+"""
+Shapefile metadata read from file headers--geometries aren't decoded.
+
+    - feature count: from the .shx header (the .dbf record count as a fallback)
+    - bounding box: from the .shp header
+    - column info: from the .dbf header (already read by shapefile.Reader)
+
+Optionally, a sample of the geometry records is checked against the .shx
+index: record number, content length, and shape type.
+
+Usage:
+    shp_stats = ShapefileStats(shp_reader)
+    shp_stats.validate_sample(10)   # optional
+    if shp_stats.has_error:
+        ...
+    shp_stats.update_shapefile_info(shapefile_info)
+"""
+from struct import unpack, error as StructError
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+SHP_HEADER_LENGTH = 100     # same for .shp and .shx
+SHX_RECORD_LENGTH = 8       # offset + content length
+SHP_RECORD_HEADER_LENGTH = 8    # record number + content length
+SHAPE_TYPE_NULL = 0
+
+DEFAULT_NUM_SHAPES_TO_VALIDATE = 10
+
+
+class ShapefileStats(object):
+    """
+    Feature count, bounding box, and column info for an open shapefile.Reader
+    (pyshp only reads the .shp and .dbf headers when the Reader is created)
+    """
+
+    def __init__(self, shp_reader):
+        self.shp_reader = shp_reader
+
+        self.has_error = False
+        self.error_msg = None
+
+        self.num_features = self.get_feature_count()
+
+    def add_error(self, err_msg):
+        self.has_error = True
+        self.error_msg = err_msg
+        LOGGER.error(err_msg)
+
+    def get_shx_record_count(self):
+        """
+        Count of records in the .shx index: (file length - header) / 8
+        returns None if there's no .shx
+        """
+        shx = self.shp_reader.shx
+        if not shx:
+            return None
+
+        shx.seek(24)
+        # File length is in 16-bit words
+        shx_length = unpack('>i', shx.read(4))[0] * 2
+        return max(shx_length - SHP_HEADER_LENGTH, 0) // SHX_RECORD_LENGTH
+
+    def get_feature_count(self):
+        """
+        Feature count from the .shx header, or the .dbf header if there's no .shx
+        """
+        try:
+            shx_count = self.get_shx_record_count()
+        except (StructError, IOError):
+            self.add_error('The .shx header could not be read')
+            return 0
+
+        dbf_count = self.shp_reader.numRecords
+
+        if shx_count is None:
+            return dbf_count or 0
+
+        if dbf_count is not None and dbf_count != shx_count:
+            LOGGER.warn('Shapefile feature count differs: .shx %s, .dbf %s',
+                        shx_count, dbf_count)
+        return shx_count
+
+    def get_bounding_box(self):
+        """[xmin, ymin, xmax, ymax] from the .shp header, or '' """
+        try:
+            return list(self.shp_reader.bbox)
+        except:
+            return ''
+
+    def get_sample_indexes(self, sample_size):
+        """Evenly spaced feature indexes, always including the first and last"""
+        if self.num_features == 0 or sample_size < 1:
+            return []
+
+        if sample_size >= self.num_features:
+            return range(self.num_features)
+
+        if sample_size == 1:
+            return [0]
+
+        step = (self.num_features - 1) / float(sample_size - 1)
+        return sorted(set([int(round(x * step)) for x in range(sample_size)]))
+
+    def validate_shape_record(self, idx):
+        """
+        Check a single geometry record using its .shx entry:
+            - the record header has the expected record number and length
+            - the record is within the .shp file
+            - the shape type is the file's shape type (or null)
+
+        Only the record header and shape type are read.
+        returns True or False
+        """
+        shx = self.shp_reader.shx
+        shp = self.shp_reader.shp
+
+        try:
+            shx.seek(SHP_HEADER_LENGTH + idx * SHX_RECORD_LENGTH)
+            (offset, content_length) = unpack('>2i', shx.read(SHX_RECORD_LENGTH))
+            offset = offset * 2
+            content_length = content_length * 2
+
+            if offset < SHP_HEADER_LENGTH or\
+                offset + SHP_RECORD_HEADER_LENGTH + content_length > self.shp_reader.shpLength:
+                self.add_error('Shape %s is outside of the .shp file' % idx)
+                return False
+
+            shp.seek(offset)
+            (rec_num, rec_length, shape_type) = self.read_record_header(shp)
+        except StructError:
+            self.add_error('Shape %s could not be read' % idx)
+            return False
+
+        if rec_num != idx + 1 or rec_length * 2 != content_length:
+            self.add_error('Shape %s does not match the .shx index' % idx)
+            return False
+
+        if shape_type not in (SHAPE_TYPE_NULL, self.shp_reader.shapeType):
+            self.add_error('Shape %s has an unexpected shape type: %s'\
+                           % (idx, shape_type))
+            return False
+
+        return True
+
+    @staticmethod
+    def read_record_header(shp):
+        """(record number, content length in words, shape type)"""
+        (rec_num, rec_length) = unpack('>2i', shp.read(SHP_RECORD_HEADER_LENGTH))
+        shape_type = unpack('<i', shp.read(4))[0]
+        return (rec_num, rec_length, shape_type)
+
+    def validate_sample(self, sample_size=DEFAULT_NUM_SHAPES_TO_VALIDATE):
+        """
+        Check "sample_size" geometry records, spread across the file.
+        Skipped if there's no .shx index
+        returns True or False
+        """
+        if self.has_error:
+            return False
+
+        if not self.shp_reader.shx:
+            return True
+
+        for idx in self.get_sample_indexes(sample_size):
+            if not self.validate_shape_record(idx):
+                return False
+        return True
+
+    def update_shapefile_info(self, shapefile_info):
+        """
+        Set number_of_features, bounding_box, column_info and column_names.
+        (shapefile_info is not saved)
+        """
+        shapefile_info.number_of_features = self.num_features
+
+        shapefile_info.add_column_info(self.shp_reader.fields[1:])
+        shapefile_info.add_column_names_using_fields(self.shp_reader.fields)
+
+        shapefile_info.add_bounding_box(self.get_bounding_box())
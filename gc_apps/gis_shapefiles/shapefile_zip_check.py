@@ -5,8 +5,13 @@ import shapefile
 import zipfile
 import cStringIO
 
+from django.conf import settings
+
 from gc_apps.geo_utils.msg_util import msg, msgt
-from gc_apps.gis_shapefiles.models import WORLDMAP_MANDATORY_IMPORT_EXTENSIONS, SHAPEFILE_EXTENSION_SHP
+from gc_apps.gis_shapefiles.models import WORLDMAP_MANDATORY_IMPORT_EXTENSIONS,\
+    SHAPEFILE_MANDATORY_EXTENSIONS, SHAPEFILE_EXTENSION_SHP
+from gc_apps.gis_shapefiles.shapefile_stats import ShapefileStats,\
+    DEFAULT_NUM_SHAPES_TO_VALIDATE
 from gc_apps.geo_utils.template_constants import ZIPCHECK_NO_SHAPEFILES_FOUND,\
         ZIPCHECK_MULTIPLE_SHAPEFILES,\
         ZIPCHECK_NO_FILE_TO_CHECK,\
@@ -15,6 +20,9 @@ from gc_apps.geo_utils.template_constants import ZIPCHECK_NO_SHAPEFILES_FOUND,\
 import logging
 LOGGER = logging.getLogger(__name__)
 
+# Default for settings.SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES
+DEFAULT_MAX_IN_ARCHIVE_READ_BYTES = 100 * 1024**2   # 100MB
+
 """
 import zipfile
 
@@ -32,7 +40,9 @@ class ZipToStringIOConverter(object):
 
     @staticmethod
     def from_django_file_field(django_field_file_obj):
-        """Given a Django FieldFile object, return a cStringIO.StringIO with the contents of the related file
+        """Given a Django FieldFile object, return a seekable file object for the related file
+            - local storage: the open file (no copy)
+            - other storage (e.g. S3): a cStringIO.StringIO with the contents of the file
             ff_obj  FieldFile object with a pointer to a valid file
         """
         if django_field_file_obj is None:
@@ -43,7 +53,10 @@ class ZipToStringIOConverter(object):
             LOGGER.debug('class name: %s', django_field_file_obj.__class__.__name__)
             return None
 
-        #return django_field_file_obj.read()
+        try:
+            return open(django_field_file_obj.path, 'rb')
+        except NotImplementedError:
+            pass
 
         return cStringIO.StringIO(django_field_file_obj.read())
 
@@ -58,6 +71,13 @@ class ShapefileZipCheck(object):
     ERR_MSG_NO_SHAPEFILES_IN_ZIP_ARCHIVE = 'No shapefiles found in this .zip file'
     ERR_MULTIPLE_SHAPEFILES_IN_ZIP_ARCHIVE = 'Multiple shapefiles were in this .zip file'
 
+    # How load_shapefile_from_open_zip reads the shapefile
+    #   - in archive: .shp/.shx/.dbf are read from the .zip into memory
+    #   - extracted: files are extracted to the scratch directory first
+    #       (used for in archive reads over settings.SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES)
+    READ_IN_ARCHIVE = 'in_archive'
+    READ_EXTRACTED = 'extracted'
+
     def __init__(self, zip_input, **kwargs):
         """
         Inspect a .zip archive  to see if it contains a single shapefile set.
@@ -159,14 +179,104 @@ class ShapefileZipCheck(object):
             # log something!!
             return
 
+        # An open file passed to zipfile.ZipFile isn't closed by the ZipFile
+        if isinstance(self.zip_input, file):
+            self.zip_input.close()
+
+    def get_archived_part_names(self, name_to_extract):
+        """
+        For a shapefile set in the .zip, return a dict of
+        lowercase extension to archived file name.
+            e.g. { '.shp' : 'roads/Roads.SHP', '.dbf' : 'roads/Roads.dbf', ...}
+        """
+        part_names = {}
+        for part_name in self.potential_shapefile_sets.get(name_to_extract, []):
+            part_names[part_name[-4:].lower()] = part_name
+        return part_names
+
+    def get_in_archive_read_bytes(self, name_to_extract):
+        """
+        Uncompressed size of the .shp, .shx, and .dbf files--the memory
+        used by "get_shapefile_reader_in_archive"
+        """
+        part_names = self.get_archived_part_names(name_to_extract)
+
+        num_bytes = 0
+        for shp_ext in SHAPEFILE_MANDATORY_EXTENSIONS:
+            part_name = part_names.get(shp_ext, name_to_extract + shp_ext)
+            num_bytes += self.zip_obj.getinfo(part_name).file_size
+        return num_bytes
+
+    def get_read_mode(self, name_to_extract, read_mode):
+        """
+        Use READ_EXTRACTED for in archive reads that are too large
+        to hold in memory.  (settings.SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES)
+        """
+        if read_mode != ShapefileZipCheck.READ_IN_ARCHIVE:
+            return read_mode
+
+        max_bytes = getattr(settings,
+                            'SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES',
+                            DEFAULT_MAX_IN_ARCHIVE_READ_BYTES)
+        if max_bytes is None:
+            return read_mode
+
+        num_bytes = self.get_in_archive_read_bytes(name_to_extract)
+        if num_bytes > max_bytes:
+            LOGGER.info('Shapefile parts are %s bytes (limit: %s). Extracting: %s',
+                        num_bytes, max_bytes, name_to_extract)
+            return ShapefileZipCheck.READ_EXTRACTED
+
+        return read_mode
+
+    def get_shapefile_reader_in_archive(self, name_to_extract):
+        """
+        Open a shapefile.Reader using the .shp, .shx, and .dbf files
+        read directly from the .zip--nothing is written to disk.
+
+        pyshp needs seekable files, so each part is read into a buffer.
+        """
+        part_names = self.get_archived_part_names(name_to_extract)
+
+        part_buffers = {}
+        for shp_ext in SHAPEFILE_MANDATORY_EXTENSIONS:
+            part_name = part_names.get(shp_ext, name_to_extract + shp_ext)
+            part_buffers[shp_ext[1:]] = cStringIO.StringIO(self.zip_obj.read(part_name))
+
+        return shapefile.Reader(**part_buffers)
+
+    def get_shapefile_reader_extracted(self, name_to_extract, scratch_directory):
+        """
+        Extract the zipped files into a scratch directory and
+        open a shapefile.Reader
+            - Only extract the 4 files necessary for WorldMap
+        """
+        for shp_ext in WORLDMAP_MANDATORY_IMPORT_EXTENSIONS:
+            shp_part_name = name_to_extract + shp_ext
+
+            # Extract the file to a scratch directory
+            self.zip_obj.extract(shp_part_name, scratch_directory)
+
+        full_shp_fname = os.path.join(scratch_directory, name_to_extract) +\
+                         SHAPEFILE_EXTENSION_SHP
+        if not isfile(full_shp_fname):
+            raise IOError(".shp file not found! Tried: %s" % full_shp_fname)
+
+        return shapefile.Reader(full_shp_fname)
+
 
-    def load_shapefile_from_open_zip(self, shapefile_basename, shapefile_info):
+    def load_shapefile_from_open_zip(self, shapefile_basename, shapefile_info, read_mode=READ_IN_ARCHIVE, num_shapes_to_validate=DEFAULT_NUM_SHAPES_TO_VALIDATE, save=True):
         """
         Assumes that self.zip_obj has opened an archive that contains a valid shapefile set
 
         param: shapefile_basename: Name of shapefile basename to remove from .zip.
             Will be stripped of any preceding directory "foo/bar" becomes "bar"
         type: shapefile_basename: str
+        param: read_mode: READ_IN_ARCHIVE (default) or READ_EXTRACTED.
+            Large shapefiles are always extracted (see "get_read_mode")
+        param: num_shapes_to_validate: number of geometry records to check, 0 to skip
+        param: save: save shapefile_info.  (With READ_IN_ARCHIVE and save=False,
+            the database isn't used)
         """
         if self.has_err:
             return False
@@ -212,74 +322,64 @@ class ShapefileZipCheck(object):
         # Update shapefilename using the basename
         # ------------------------------------
         shapefile_info.name = shapefile_basename
-        shapefile_info.save()
-
-        # ------------------------------------
-        # Extract the zipped file into a scratch directory
-        #   - Only extract the 4 files necessary for WorldMap
-        # ------------------------------------
-        scratch_directory = shapefile_info.get_scratch_work_directory()
-        for shp_ext in WORLDMAP_MANDATORY_IMPORT_EXTENSIONS:
-            shp_part_name = name_to_extract + shp_ext
-
-            # Extract the file to a scratch directory
-            zip_part_path = self.zip_obj.extract(shp_part_name, scratch_directory)
-
-        # ------------------------------------
-        # Can we read the '.shp' file?
-        # ------------------------------------
-        extracted_shapefile_load_path = os.path.join(scratch_directory, name_to_extract)
-        shapefile_info.extracted_shapefile_load_path = extracted_shapefile_load_path
-
-        full_shp_fname = extracted_shapefile_load_path + SHAPEFILE_EXTENSION_SHP
-        if not isfile(full_shp_fname):
-            self.add_error(".shp file not found! Tried: %s" % full_shp_fname)
-            return False
+        if save:
+            shapefile_info.save()
 
         # ------------------------------------
         # Try to process/pull info from the .shp file
         # ------------------------------------
+        scratch_directory = None
         try:
-            shp_reader = shapefile.Reader(full_shp_fname)
+            read_mode = self.get_read_mode(name_to_extract, read_mode)
+            if read_mode == ShapefileZipCheck.READ_EXTRACTED:
+                scratch_directory = shapefile_info.get_scratch_work_directory()
+                shp_reader = self.get_shapefile_reader_extracted(name_to_extract,
+                                                                 scratch_directory)
+            else:
+                shp_reader = self.get_shapefile_reader_in_archive(name_to_extract)
         except:
-            err_msg = 'Shapefile reader failed for file: %s' % (full_shp_fname)
+            err_msg = 'Shapefile reader failed for file: %s%s' %\
+                      (name_to_extract, SHAPEFILE_EXTENSION_SHP)
             self.add_error(err_msg, ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE)
+            if scratch_directory and isdir(scratch_directory):
+                shutil.rmtree(scratch_directory)
             return False
 
 
         # ------------------------------------
         # Extract feature count, column names, bounding box
         # ------------------------------------
-        shapefile_info.number_of_features = len(shp_reader.shapes())
-        if shapefile_info.number_of_features == 0:
-            err_msg = "This shapefile does not have any geospatial features"
-            self.add_error(err_msg, ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE)
-            return False
-
-        # add column names
-        # -----------------
-        shapefile_info.add_column_info(shp_reader.fields[1:])
-        shapefile_info.add_column_names_using_fields(shp_reader.fields)
-
-        # add bounding box
-        # -----------------
-        try:
-            shapefile_info.add_bounding_box(list(shp_reader.bbox))
-        except:
-            shapefile_info.add_bounding_box('')
+        #   - Read from the file headers, geometries aren't loaded
+        # ------------------------------------
+        shp_stats = ShapefileStats(shp_reader)
+        shp_stats.validate_sample(num_shapes_to_validate)
 
         # ----------------------
-        # Remove the scratch directory
+        # Remove the scratch directory, if used
         # ----------------------
         shp_reader = None
-        if isdir(scratch_directory):
+        if scratch_directory and isdir(scratch_directory):
             shutil.rmtree(scratch_directory)
-            shapefile_info.extracted_shapefile_load_path = ''
+
+        if shp_stats.has_error:
+            err_msg = 'Shapefile reader failed for file: %s%s (%s)' %\
+                      (name_to_extract, SHAPEFILE_EXTENSION_SHP, shp_stats.error_msg)
+            self.add_error(err_msg, ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE)
+            return False
+
+        if shp_stats.num_features == 0:
+            err_msg = "This shapefile does not have any geospatial features"
+            self.add_error(err_msg, ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE)
+            return False
+
+        shp_stats.update_shapefile_info(shapefile_info)
+        shapefile_info.extracted_shapefile_load_path = ''
 
         # ----------------------
         # Save the metadata!!
         # ----------------------
-        shapefile_info.save()
+        if save:
+            shapefile_info.save()
 
         return True
 
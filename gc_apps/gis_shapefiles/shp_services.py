@@ -3,17 +3,13 @@
 - Given a ShapefileInfo object, check for and
     return a WorldMapLayerInfo object, if available
 """
-import urllib2
-
-from django.core.files import File
-from django.core.files.temp import NamedTemporaryFile
-
 from shared_dataverse_information.dataverse_info.forms import DataverseInfoValidationForm
 from gc_apps.registered_dataverse.registered_dataverse_helper import find_registered_dataverse
 
 from gc_apps.geo_utils.msg_util import msg, msgt
 from gc_apps.geo_utils.error_result_msg import ErrResultMsg,\
     FAILED_NOT_A_REGISTERED_DATAVERSE
+from gc_apps.geo_utils.file_downloader import download_to_file_field
 
 from gc_apps.gis_shapefiles.models import ShapefileInfo
 
@@ -146,18 +142,14 @@ def get_shapefile_from_dv_api_info(dv_session_token, dv_info_dict):
     LOGGER.debug('datafile_download_url: %s' % datafile_download_url)
     datafile_filename = dv_info_dict.get('datafile_label', '')
 
-    tmp_shapefile = NamedTemporaryFile(delete=True)
-
-    try:
-        tmp_shapefile.write(urllib2.urlopen(datafile_download_url).read())
-    except urllib2.HTTPError as e:
+    # Stream the file into storage (this saves shapefile_info)
+    #
+    success, err_msg = download_to_file_field(datafile_download_url,
+                                              shapefile_info.dv_file,
+                                              datafile_filename)
+    if not success:
         shapefile_info.delete() # clear shapefile
-        err_msg = 'Failed to download shapefile. HTTPError: %s \n\nurl: %s' % (str(e), datafile_download_url)
+        err_msg = 'Failed to download shapefile. %s \n\nurl: %s' % (err_msg, datafile_download_url)
         return False, ErrResultMsg(None, err_msg)
 
-    tmp_shapefile.flush()
-
-    shapefile_info.dv_file.save(datafile_filename, File(tmp_shapefile))
-    shapefile_info.save()
-
     return True, shapefile_info.md5
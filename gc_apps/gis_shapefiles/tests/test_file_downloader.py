@@ -0,0 +1,158 @@
+"""
+Test streaming Dataverse file downloads against a local HTTP server
+"""
+from __future__ import print_function
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import threading
+
+from django.test import SimpleTestCase
+
+from gc_apps.geo_utils.msg_util import msgt
+from gc_apps.geo_utils import file_downloader
+from gc_apps.geo_utils.file_downloader import ResumableDownload,\
+    DownloadError, DownloadTooLargeError, download_to_file_field
+from gc_apps.geo_utils.http_client import close_sessions
+from gc_apps.gis_shapefiles.models import ShapefileInfo
+
+FILE_CONTENT = ''.join([chr(x % 251) for x in range(500000)])
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """
+    Serve FILE_CONTENT, with Range support.
+        /drop: the first response stops halfway and closes the connection
+        /no-range: Range headers are ignored
+    """
+    def do_GET(self):
+        self.server.num_requests += 1
+        self.server.range_headers.append(self.headers.getheader('Range'))
+
+        start = 0
+        range_header = self.headers.getheader('Range')
+        if range_header and not self.path.startswith('/no-range'):
+            start = int(range_header.split('=')[1].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %s-%s/%s'\
+                             % (start, len(FILE_CONTENT) - 1, len(FILE_CONTENT)))
+        else:
+            self.send_response(200)
+
+        content = FILE_CONTENT[start:]
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+
+        if self.path.startswith(('/drop', '/no-range')) and self.server.num_requests == 1:
+            content = content[:len(content) / 2]
+
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FileDownloaderTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadedHTTPServer(('127.0.0.1', 0), FileHandler)
+        self.server.num_requests = 0
+        self.server.range_headers = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%s' % self.server.server_port
+
+        self.orig_wait = file_downloader.RESUME_WAIT_SECONDS
+        file_downloader.RESUME_WAIT_SECONDS = 0
+
+    def tearDown(self):
+        file_downloader.RESUME_WAIT_SECONDS = self.orig_wait
+        close_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def read_all(self, download):
+        chunks = []
+        while True:
+            chunk = download.read(10000)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        download.close()
+        return ''.join(chunks)
+
+    def test_01_download(self):
+        """Chunks are read with progress updates"""
+        msgt(self.test_01_download.__doc__)
+
+        progress = []
+        download = ResumableDownload(self.base_url + '/file.zip',
+                                     progress_callback=lambda n, t: progress.append((n, t)))
+        self.assertEqual(self.read_all(download), FILE_CONTENT)
+        self.assertEqual(download.num_resumes, 0)
+        self.assertEqual(len(progress), 50)
+        self.assertEqual(progress[-1], (len(FILE_CONTENT), len(FILE_CONTENT)))
+
+    def test_02_resume(self):
+        """A dropped transfer is resumed with a Range request"""
+        msgt(self.test_02_resume.__doc__)
+
+        download = ResumableDownload(self.base_url + '/drop.zip')
+        self.assertEqual(self.read_all(download), FILE_CONTENT)
+        self.assertEqual(download.num_resumes, 1)
+        self.assertEqual(self.server.range_headers,
+                         [None, 'bytes=%s-' % (len(FILE_CONTENT) / 2)])
+
+        # Range ignored: the bytes already read are skipped
+        self.server.num_requests = 0
+        download = ResumableDownload(self.base_url + '/no-range.zip')
+        self.assertEqual(self.read_all(download), FILE_CONTENT)
+        self.assertEqual(download.num_resumes, 1)
+
+        # No more retries
+        self.server.num_requests = 0
+        download = ResumableDownload(self.base_url + '/drop.zip', max_resumes=0)
+        self.assertRaises(DownloadError, self.read_all, download)
+
+    def test_03_max_size(self):
+        """Files larger than max_bytes aren't downloaded"""
+        msgt(self.test_03_max_size.__doc__)
+
+        download = ResumableDownload(self.base_url + '/file.zip', max_bytes=1000)
+        self.assertRaises(DownloadTooLargeError, download.read, 100)
+
+    def test_04_download_to_file_field(self):
+        """The file is streamed into storage"""
+        msgt(self.test_04_download_to_file_field.__doc__)
+
+        shapefile_info = ShapefileInfo()
+        success, err_msg = download_to_file_field(self.base_url + '/drop.zip',
+                                                  shapefile_info.dv_file,
+                                                  'test_download.zip',
+                                                  save=False)
+        self.assertTrue(success)
+        self.assertEqual(err_msg, None)
+        try:
+            shapefile_info.dv_file.open('rb')
+            self.assertEqual(shapefile_info.dv_file.read(), FILE_CONTENT)
+            shapefile_info.dv_file.close()
+        finally:
+            shapefile_info.dv_file.delete(save=False)
+
+        # Too large: nothing is left in storage
+        shapefile_info = ShapefileInfo()
+        storage = shapefile_info.dv_file.storage
+        success, err_msg = download_to_file_field(self.base_url + '/file.zip',
+                                                  shapefile_info.dv_file,
+                                                  'test_download.zip',
+                                                  max_bytes=1000,
+                                                  save=False)
+        self.assertFalse(success)
+        self.assertTrue(err_msg.find('maximum download size') > -1)
+        self.assertFalse(shapefile_info.dv_file)
+        self.assertFalse(storage.exists(shapefile_info.dv_file.field.generate_filename(\
+                                            shapefile_info, 'test_download.zip')))
@@ -0,0 +1,112 @@
+"""
+Test checking many shapefile .zips with ShapefileBatchCheck
+"""
+from __future__ import print_function
+from os.path import abspath, dirname, isdir, join
+import json
+
+from django.conf import settings
+from django.core.files import File
+from django.test import TestCase
+
+from gc_apps.geo_utils.msg_util import msgt, msgd
+from gc_apps.geo_utils.template_constants import ZIPCHECK_NO_SHAPEFILES_FOUND,\
+        ZIPCHECK_MULTIPLE_SHAPEFILES,\
+        ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE
+from gc_apps.gis_shapefiles.models import ShapefileInfo
+from gc_apps.gis_shapefiles.shapefile_batch_check import ShapefileBatchCheck
+from gc_apps.registered_dataverse.models import RegisteredDataverse
+
+GOOD_ZIP = 't-05-good-shp-social_disorder_in_boston.zip'
+
+
+class ShapefileBatchCheckTestCase(TestCase):
+
+    def setUp(self):
+        self.test_files_dirname = join(settings.PROJECT_TEST_FILES_DIR, 'shapefiles')
+        if not isdir(self.test_files_dirname):
+            raise IOError('Test directory not found: %s' % self.test_files_dirname)
+
+    def get_shp_params(self):
+        test_data_file = join(dirname(dirname(abspath(__file__))),
+                              'fixtures',
+                              'dataverse_info_test_fixtures_01.json')
+        return json.loads(open(test_data_file, 'r').read())
+
+    def get_test_paths(self, fnames):
+        return [join(self.test_files_dirname, fname) for fname in fnames]
+
+    def test_01_check_paths(self):
+        """Check .zip files using 2 worker processes"""
+        msgt(self.test_01_check_paths.__doc__)
+
+        batch_check = ShapefileBatchCheck(num_workers=2)
+        results = batch_check.check_paths(self.get_test_paths(\
+                        [GOOD_ZIP,
+                         't-02-not-a-zip-bad-ext.zip',
+                         't-03-zip-but-not-shp.zip',
+                         't-03a-2shapes.zip',
+                         't-04-right-extensions-but-zeroK-files.zip',
+                         GOOD_ZIP]))
+        self.assertEqual(len(results), 6)
+
+        results = dict([(r['path'].split('/')[-1], r) for r in results])
+        self.assertTrue(results[GOOD_ZIP]['is_valid'])
+        self.assertEqual(results[GOOD_ZIP]['fields']['number_of_features'], 544)
+        self.assertEqual(results[GOOD_ZIP]['fields']['name'],
+                         'social_disorder_in_boston_yqh')
+        self.assertEqual(results['t-03a-2shapes.zip']['error_type'],
+                         ZIPCHECK_MULTIPLE_SHAPEFILES)
+        self.assertEqual(results['t-03-zip-but-not-shp.zip']['fields']['name'],
+                         '(not a shapefile)')
+        self.assertEqual(results['t-04-right-extensions-but-zeroK-files.zip']['error_type'],
+                         ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE)
+
+        msgd('Summary')
+        summary = batch_check.get_summary()
+        self.assertEqual(summary['num_checked'], 6)
+        self.assertEqual(summary['num_valid'], 2)
+        self.assertEqual(summary['num_features'], 544 * 2)
+        self.assertEqual(summary['error_counts'],
+                         {ZIPCHECK_NO_SHAPEFILES_FOUND: 2,
+                          ZIPCHECK_MULTIPLE_SHAPEFILES: 1,
+                          ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE: 1})
+        self.assertTrue(batch_check.get_summary_lines().startswith('Checked: 6'))
+
+    def test_02_check_shapefile_infos(self):
+        """Results are saved to the ShapefileInfo objects"""
+        msgt(self.test_02_check_shapefile_infos.__doc__)
+
+        registered_dataverse = RegisteredDataverse.objects.create(\
+                                    name='Test Dataverse',
+                                    dataverse_url='http://localhost:8080')
+
+        shapefile_infos = []
+        for idx, fname in enumerate([GOOD_ZIP, 't-03a-2shapes.zip']):
+            shp_params = self.get_shp_params()
+            shp_params.update(dict(registered_dataverse_id=registered_dataverse.id,
+                                   datafile_id=idx + 1))
+            shapefile_info = ShapefileInfo(**shp_params)
+            with open(join(self.test_files_dirname, fname), 'rb') as zip_file:
+                shapefile_info.dv_file.save(fname, File(zip_file))
+            shapefile_infos.append(shapefile_info)
+
+        try:
+            batch_check = ShapefileBatchCheck(num_workers=1, save_batch_size=1)
+            batch_check.check_shapefile_infos(ShapefileInfo.objects.filter(\
+                                                    zipfile_checked=False))
+            self.assertEqual(batch_check.num_saved, 2)
+
+            good_info = ShapefileInfo.objects.get(id=shapefile_infos[0].id)
+            self.assertTrue(good_info.zipfile_checked)
+            self.assertTrue(good_info.has_shapefile)
+            self.assertEqual(good_info.number_of_features, 544)
+            self.assertEqual(good_info.column_names[:3], ['OBJECTID', 'AREA', 'PERIMETER'])
+
+            bad_info = ShapefileInfo.objects.get(id=shapefile_infos[1].id)
+            self.assertTrue(bad_info.zipfile_checked)
+            self.assertFalse(bad_info.has_shapefile)
+            self.assertEqual(bad_info.name, '(multiple shapefiles found)')
+        finally:
+            for shapefile_info in shapefile_infos:
+                shapefile_info.dv_file.delete(save=False)
@@ -2,13 +2,19 @@ from os.path import abspath, dirname, isfile, join, isdir
 
 import unittest
 import json
+import zipfile
+from cStringIO import StringIO
+from struct import pack
 
-from django.test import TestCase
+import shapefile
+
+from django.test import TestCase, override_settings
 from django.conf import settings
 
 from gc_apps.geo_utils.msg_util import *
 from gc_apps.gis_shapefiles.shapefile_zip_check import ShapefileZipCheck
 from gc_apps.gis_shapefiles.models import ShapefileInfo
+from gc_apps.gis_shapefiles.shapefile_stats import ShapefileStats
 
 from gc_apps.geo_utils.template_constants import ZIPCHECK_NO_SHAPEFILES_FOUND,\
         ZIPCHECK_MULTIPLE_SHAPEFILES,\
@@ -146,3 +152,143 @@ class ShapefileBasicTests(TestCase):
         msgd('Check feature count')
         self.assertEqual(self.shp_set.number_of_features, 544)
         #self.assertEqual(zip_checker.get_shapefile_setnames(), ['buses'])
+
+    def test_03_read_modes(self):
+        """In-archive and extracted reads give the same results"""
+        msgt(self.test_03_read_modes.__doc__)
+
+        shp_name = 'social_disorder_in_boston/social_disorder_in_boston_yqh'
+        shp_results = {}
+        for read_mode in (ShapefileZipCheck.READ_IN_ARCHIVE, ShapefileZipCheck.READ_EXTRACTED):
+            msgd('Read mode: %s' % read_mode)
+            shp_set = ShapefileInfo(**self.get_shp_params())
+
+            zip_checker = ShapefileZipCheck(self.get_test_file('t-05-good-shp-social_disorder_in_boston.zip'))
+            zip_checker.validate()
+            was_success = zip_checker.load_shapefile_from_open_zip(shp_name, shp_set, read_mode)
+            zip_checker.close_zip()
+            self.assertEqual(was_success, True)
+
+            if read_mode == ShapefileZipCheck.READ_IN_ARCHIVE:
+                # Nothing extracted
+                self.assertEqual(shp_set.gis_scratch_work_directory, '')
+
+            self.assertFalse(isdir(shp_set.gis_scratch_work_directory))
+            self.assertEqual(shp_set.extracted_shapefile_load_path, '')
+
+            shp_results[read_mode] = (shp_set.number_of_features,
+                                      shp_set.column_names,
+                                      shp_set.column_info,
+                                      shp_set.bounding_box)
+
+        self.assertEqual(shp_results[ShapefileZipCheck.READ_IN_ARCHIVE],
+                         shp_results[ShapefileZipCheck.READ_EXTRACTED])
+        self.assertEqual(shp_results[ShapefileZipCheck.READ_IN_ARCHIVE][0], 544)
+
+    def get_test_shapefile_parts(self, num_features):
+        """Write a point shapefile into buffers: { 'shp': ..., 'shx': ..., 'dbf': ...}"""
+        shp_writer = shapefile.Writer(shapefile.POINT)
+        shp_writer.field('NAME', 'C', 20)
+        for idx in range(num_features):
+            shp_writer.point(idx, idx * 2)
+            shp_writer.record('point_%s' % idx)
+
+        parts = dict(shp=StringIO(), shx=StringIO(), dbf=StringIO())
+        shp_writer.save(**parts)
+        return dict([(k, StringIO(v.getvalue())) for k, v in parts.items()])
+
+    def test_04_header_stats(self):
+        """Feature count and bounding box come from the file headers"""
+        msgt(self.test_04_header_stats.__doc__)
+
+        shp_reader = shapefile.Reader(**self.get_test_shapefile_parts(101))
+        shp_stats = ShapefileStats(shp_reader)
+        self.assertEqual(shp_stats.num_features, 101)
+        self.assertEqual(shp_stats.get_bounding_box(), [0, 0, 100, 200])
+        self.assertEqual(shp_stats.get_sample_indexes(5), [0, 25, 50, 75, 100])
+        self.assertTrue(shp_stats.validate_sample(5))
+
+        shp_set = ShapefileInfo(name='points')
+        shp_stats.update_shapefile_info(shp_set)
+        self.assertEqual(shp_set.number_of_features, 101)
+        self.assertEqual(shp_set.column_names, ['NAME'])
+        self.assertEqual(shp_set.column_info, [['NAME', 'C', 20, 0]])
+        self.assertEqual(shp_set.bounding_box, [0, 0, 100, 200])
+
+        msgd('Same count as reading the shapes')
+        self.assertEqual(shp_stats.num_features, len(shp_reader.shapes()))
+
+        msgd('A corrupt record is found by the sample')
+        parts = self.get_test_shapefile_parts(101)
+        shp_bytes = parts['shp'].getvalue()
+        # point records are 28 bytes: overwrite the record number of the last one
+        rec_offset = 100 + 100 * 28
+        parts['shp'] = StringIO(shp_bytes[:rec_offset] + pack('>i', 7) +\
+                                shp_bytes[rec_offset + 4:])
+        shp_stats = ShapefileStats(shapefile.Reader(**parts))
+        self.assertFalse(shp_stats.validate_sample(5))
+        self.assertEqual(shp_stats.error_msg, 'Shape 100 does not match the .shx index')
+
+    def test_05_large_shapefile_extracted(self):
+        """In-archive reads over the size limit are extracted instead"""
+        msgt(self.test_05_large_shapefile_extracted.__doc__)
+
+        shp_name = 'social_disorder_in_boston/social_disorder_in_boston_yqh'
+        zip_checker = ShapefileZipCheck(self.get_test_file('t-05-good-shp-social_disorder_in_boston.zip'))
+        zip_checker.validate()
+
+        num_bytes = zip_checker.get_in_archive_read_bytes(shp_name)
+        self.assertTrue(num_bytes > 0)
+
+        msgd('Under the limit: read in archive')
+        with override_settings(SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES=num_bytes):
+            self.assertEqual(zip_checker.get_read_mode(shp_name, ShapefileZipCheck.READ_IN_ARCHIVE),
+                             ShapefileZipCheck.READ_IN_ARCHIVE)
+
+        with override_settings(SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES=None):
+            self.assertEqual(zip_checker.get_read_mode(shp_name, ShapefileZipCheck.READ_IN_ARCHIVE),
+                             ShapefileZipCheck.READ_IN_ARCHIVE)
+
+        msgd('Over the limit: extracted')
+        with override_settings(SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES=num_bytes - 1):
+            self.assertEqual(zip_checker.get_read_mode(shp_name, ShapefileZipCheck.READ_IN_ARCHIVE),
+                             ShapefileZipCheck.READ_EXTRACTED)
+
+            shp_set = ShapefileInfo(**self.get_shp_params())
+            was_success = zip_checker.load_shapefile_from_open_zip(shp_name, shp_set)
+            zip_checker.close_zip()
+            self.assertEqual(was_success, True)
+
+        # The scratch directory was used, then removed
+        self.assertTrue(shp_set.gis_scratch_work_directory)
+        self.assertFalse(isdir(shp_set.gis_scratch_work_directory))
+        self.assertEqual(shp_set.number_of_features, 544)
+
+    def test_06_truncated_shx(self):
+        """A truncated .shx is a validation error, not an exception"""
+        msgt(self.test_06_truncated_shx.__doc__)
+
+        parts = self.get_test_shapefile_parts(10)
+        parts['shx'] = StringIO(parts['shx'].getvalue()[:20])
+
+        shp_stats = ShapefileStats(shapefile.Reader(**parts))
+        self.assertTrue(shp_stats.has_error)
+        self.assertEqual(shp_stats.error_msg, 'The .shx header could not be read')
+        self.assertEqual(shp_stats.num_features, 0)
+
+        msgd('Loaded from a .zip')
+        zip_buffer = StringIO()
+        zip_obj = zipfile.ZipFile(zip_buffer, 'w')
+        for shp_ext, part in parts.items():
+            zip_obj.writestr('points.%s' % shp_ext, part.getvalue())
+        zip_obj.writestr('points.prj', 'GEOGCS["WGS 84"]')
+        zip_obj.close()
+
+        zip_checker = ShapefileZipCheck(StringIO(zip_buffer.getvalue()))
+        self.assertTrue(zip_checker.validate())
+        was_success = zip_checker.load_shapefile_from_open_zip(\
+                            'points', ShapefileInfo(name='points'), save=False)
+        zip_checker.close_zip()
+        self.assertEqual(was_success, False)
+        self.assertEqual(zip_checker.error_type, ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE)
+        self.assertTrue(zip_checker.error_msg.find('.shx header') > -1)
@@ -29,7 +29,7 @@ from gc_apps.gis_tabular.forms_delete import DeleteMapForm
 from gc_apps.gis_tabular.models import TabularFileInfo
 from gc_apps.gis_tabular.forms import SELECT_LABEL
 
-from gc_apps.dv_notify.metadata_updater import MetadataUpdater
+from gc_apps.dv_notify.notification_outbox import NotificationOutbox
 
 
 from gc_apps.geo_utils.geoconnect_step_names import GEOCONNECT_STEP_KEY,\
@@ -151,7 +151,7 @@ def view_shapefile(request, shp_md5, **kwargs):
         if worldmap_layerinfo is None:
             return HttpResponse('<br />'.join(shp_service.err_msgs))
         else:
-            MetadataUpdater.run_update_via_popen(worldmap_layerinfo)
+            NotificationOutbox.queue_update(worldmap_layerinfo)
             return view_classify_shapefile(request, worldmap_layerinfo, first_time_notify)
 
     # -------------------------------------------
@@ -199,11 +199,11 @@ def view_shapefile(request, shp_md5, **kwargs):
 
         if not success:
             d['Err_Found'] = True
-            if zip_checker.err_type == ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE:
+            if zip_checker.error_type == ZIPCHECK_FAILED_TO_PROCCESS_SHAPEFILE:
                 d['Err_Shapefile_Could_Not_Be_Opened'] = True
                 d['zip_name_list'] = zip_checker.get_zipfile_names()
             else:
-                d['Err_Msg'] = zip_checker.err_msg
+                d['Err_Msg'] = zip_checker.error_msg
 
             shapefile_info.has_shapefile = False
             shapefile_info.save()
@@ -211,6 +211,8 @@ def view_shapefile(request, shp_md5, **kwargs):
             zip_checker.close_zip()
             return render(request, 'shapefiles/main_outline_shp.html', d)
 
+        zip_checker.close_zip()
+
     # -------------------------------------------
     # The examination failed
     # No shapefile was found in this .zip
@@ -237,7 +239,7 @@ def view_shapefile(request, shp_md5, **kwargs):
         if worldmap_layerinfo is None:
             return HttpResponse('<br />'.join(shp_service.err_msgs))
         else:
-            MetadataUpdater.run_update_via_popen(worldmap_layerinfo)
+            NotificationOutbox.queue_update(worldmap_layerinfo)
             return view_classify_shapefile(request, worldmap_layerinfo, first_time_notify)
 
     return render(request, 'shapefiles/main_outline_shp.html', d)
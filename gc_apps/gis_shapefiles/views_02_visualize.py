@@ -3,6 +3,8 @@ import logging
 
 from django.http import HttpResponse
 from django.views.generic import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
 from django.template.loader import render_to_string
 
 from django.conf import settings
@@ -10,7 +12,8 @@ from django.conf import settings
 from gc_apps.gis_shapefiles.models import ShapefileInfo
 from gc_apps.worldmap_layers.models import WorldMapLayerInfo
 
-from gc_apps.worldmap_connect.send_shapefile_service import SendShapefileService
+from gc_apps.worldmap_connect.layer_job_service import LayerJobService
+from gc_apps.worldmap_connect.views_layer_job import start_layer_job
 
 from gc_apps.geo_utils.geoconnect_step_names import GEOCONNECT_STEP_KEY, STEP2_STYLE,\
     PANEL_TITLE_MAP_DATA_FILE, PANEL_TITLE_STYLE_MAP
@@ -54,70 +57,33 @@ class ViewAjaxVisualizeShapefile(View):
 
     Return a JSON response
     """
+    @method_decorator(never_cache)
     def get(self, request, shp_md5):
-        """Use the SendShapefileService to create a map from a shapefile.
+        """Create a WorldMapLayerJob to map the shapefile.
 
-        - SendShapefileService takes care of details starting with retrieving
-        the ShapefileInfo object
+        - The job uses the SendShapefileService which takes care of
+        details starting with retrieving the ShapefileInfo object
+        - The JSON response includes the job status url to poll
+        - never_cache: skip the site-wide cache middleware.  A retry
+        must create a new job, not return the response for an old one
         """
-
-        # OK if shp_md5 is None, SendShapefileService creates error message
-        #
-        send_shp_service = SendShapefileService(**dict(shp_md5=shp_md5))
-
-        # Send the shapefile to WorldMap
+        # Does the shapefile exist?
         #
-        success = send_shp_service.send_shapefile_to_worldmap()
-
-
-        # -----------------------------------
-        # Did it work? NOPE!  Failed along the way!
-        # -----------------------------------
-        if not success:
+        if not ShapefileInfo.objects.filter(md5=shp_md5).exists():
             err_note = ('Sorry! The shapefile mapping did not work.'
                         '<br /><span class="small">{0}</span>').format(\
-                            '<br />'.join(send_shp_service.err_msgs))
+                            'Sorry, the shapefile was not found')
             LOGGER.error(err_note)
 
-            err_note_html = render_ajax_basic_err_msg(err_note,\
-                                            send_shp_service.shapefile_info)
+            err_note_html = render_ajax_basic_err_msg(err_note)
 
             json_msg = MessageHelperJSON.get_json_fail_msg(err_note_html, dict(id_main_panel_content=err_note_html))
 
             return HttpResponse(json_msg, content_type="application/json", status=200)
 
-
         # -----------------------------------
-        # Yes!  We have a new map layer
+        # Send the shapefile to WorldMap via a job
         # -----------------------------------
-        worldmap_shapefile_layerinfo = send_shp_service.get_worldmap_layerinfo()
-        shapefile_info = worldmap_shapefile_layerinfo.get_gis_data_info()
-
-        assert worldmap_shapefile_layerinfo is not None,\
-            "Failure in SendShapefileService!  Said success but not worldmap_layerinfo (WorldMapShapefileLayerInfo)"
-
-        # -----------------------------------------
-        # Build the Map HTML to replace the form
-        # -----------------------------------------
-        map_html, user_message_html = build_map_html(request, worldmap_shapefile_layerinfo)
-        if map_html is None:    # Failed!  Send an error
-            LOGGER.error("Failed to create map HTML using WorldMapShapefileLayerInfo: %s (%d)",\
-                worldmap_shapefile_layerinfo, worldmap_shapefile_layerinfo.id)
-
-            user_msg = 'Sorry! Failed to create map. Please try again. (code: s3)'
-            json_msg = MessageHelperJSON.get_json_fail_msg(user_msg)
-            return HttpResponse(json_msg, content_type="application/json", status=200)
-
-        # -----------------------------------------
-        # Looks good.  In the JSON response, send
-        #   back the map HTML
-        # -----------------------------------------
-        data_dict = dict(\
-                    map_html=map_html,
-                    user_message_html=user_message_html,
-                    id_main_panel_title=PANEL_TITLE_STYLE_MAP,
-                    message='Success! The shapefile was successfully mapped!')
-
-        json_msg = MessageHelperJSON.get_json_success_msg("great job", data_dict=data_dict)
+        layer_job = LayerJobService.create_shapefile_job(shp_md5)
 
-        return HttpResponse(json_msg, content_type="application/json", status=200)
+        return start_layer_job(request, layer_job)
@@ -39,7 +39,7 @@ class TabularFileInfoAdmin(GISDataFileAdmin):
                     })\
                     , ('Tabular Info', {
                        'fields': (('num_rows', 'num_columns'),\
-                            'has_header_row', 'column_names',\
+                            'has_header_row', 'column_names', 'column_profile',\
                             'chosen_column', 'dv_join_file')
                     })\
                  ] + fs
@@ -7,5 +7,6 @@ class TabularInfoAdminForm(forms.ModelForm):
         widgets = {  'datafile_description': forms.Textarea(attrs={'rows': 2, 'cols':70})\
                     , 'dataset_description': forms.Textarea(attrs={'rows': 2, 'cols':70})\
                     , 'column_names': forms.Textarea(attrs={'rows': 3, 'cols':80})\
+                    , 'column_profile': forms.Textarea(attrs={'rows': 3, 'cols':80})\
         #            , 'column_info': forms.Textarea(attrs={'rows': 3, 'cols':80})\
             }
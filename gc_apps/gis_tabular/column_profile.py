@@ -0,0 +1,473 @@
+"""
+Per-column profile of a tabular file, computed during TabFileStats ingest.
+
+The profile is a list of dicts--one per column, in file order--saved to
+TabularFileInfo.column_profile.  It's used by the column chooser forms
+to suggest join and lat/lng columns and to reject columns that can't
+map--before a job is sent to the WorldMap.
+
+    profiler = ColumnProfiler()
+    for chunk in reader:
+        profiler.add_chunk(chunk)       # vectorized, per column
+    column_profile = profiler.get_profile(column_names)
+
+Example column:
+
+    {"name": "bg_id_10",
+     "dtype": "object",
+     "num_values": 554,         # non-null values
+     "num_nulls": 0,
+     "num_distinct": 554,
+     "distinct_is_estimate": false,
+     "num_numeric": 554,        # values that are numbers
+     "num_whole_numbers": 554,
+     "min": 250250001001.0,     # numeric values only, else null
+     "max": 250251101004.0,
+     "min_length": 12,          # lengths of the values as text, in utf-8
+     "max_length": 12,          #   bytes (numbers: whole numbers only)
+     "length_counts": [[12, 554]],     # [length, count], most common first
+     "num_latitude": 0,         # numbers between -90 and 90
+     "num_longitude": 0}        # numbers between -180 and 180
+
+Read in chunks, a column may be numbers in one chunk and text in
+another.  Its lengths then count the text values as read and, from the
+numeric chunks, the whole numbers.
+
+Text columns are profiled by unique value, weighted by the number of
+rows.  If none of a chunk's first NUMERIC_SAMPLE_SIZE unique values are
+numbers, the chunk's values are all counted as text.
+
+Distinct counts are exact up to DISTINCT_SKETCH_SIZE values.  Beyond
+that, they're estimated from the smallest value hashes seen ("k minimum
+values") so memory stays bounded when a file is read in chunks.
+Text values that are numbers hash as numbers: "123" and 123 are the
+same value.
+"""
+import numpy as np
+import pandas as pd
+
+from gc_apps.geo_utils.tabular_util import get_column_dtype
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+# Number of value hashes kept per column to count distinct values
+DISTINCT_SKETCH_SIZE = 2048
+
+# Number of [length, count] pairs saved per column
+MAX_LENGTH_COUNTS = 10
+
+# Name hints for column suggestions
+LATITUDE_NAMES = ('lat', 'latitude', 'y')
+LONGITUDE_NAMES = ('lng', 'lon', 'long', 'longitude', 'x')
+JOIN_NAME_HINTS = ('id', 'fips', 'geoid', 'tract', 'zip', 'code')
+
+# Join suggestions: minimum fraction of unique values
+JOIN_MIN_DISTINCT_RATIO = 0.9
+
+HASH_SPACE = float(2 ** 64)
+
+# Whole numbers at least this large aren't counted in the text lengths
+MAX_INT_LENGTH_VALUE = 1e18
+
+# Digit counts: 10, 100, ... 10**18
+POWERS_OF_TEN = 10 ** np.arange(1, 19, dtype=np.int64)
+
+# Text columns: if none of the first values are numbers, skip
+# the number checks--e.g. a column of names
+NUMERIC_SAMPLE_SIZE = 100
+
+
+class ColumnStats(object):
+    """Running stats for a single column, updated a chunk at a time"""
+
+    def __init__(self):
+        self.dtypes = []
+        self.num_values = 0
+        self.num_nulls = 0
+        self.num_numeric = 0
+        self.num_whole_numbers = 0
+        self.num_latitude = 0
+        self.num_longitude = 0
+        self.min_val = None
+        self.max_val = None
+        self.length_counts = None
+        self.hash_sketch = np.array([], dtype=np.uint64)
+
+    def add_series(self, series):
+        """Update the stats with a chunk of the column (pandas Series)"""
+        series = get_plain_series(series)
+        self.dtypes.append(series.dtype)
+
+        non_null = series[series.notnull()]
+        self.num_nulls += len(series.index) - len(non_null.index)
+        self.num_values += len(non_null.index)
+        if len(non_null.index) == 0:
+            return
+
+        if non_null.dtype.kind in 'iuf':
+            # Each row
+            values = non_null.astype(np.float64)
+            counts = None
+            hashes = pd.util.hash_array(values.values)
+        else:
+            # Text: each unique value, with its number of rows
+            codes, uniques = pd.factorize(non_null.values)
+            values = pd.Series(uniques)
+            counts = np.bincount(codes, minlength=len(uniques))
+
+        numbers = get_numbers(values)
+        whole_numbers = numbers[np.floor(numbers) == numbers]
+        self.add_numbers(numbers, whole_numbers, counts)
+
+        if counts is None:
+            # As the join formatter writes them: whole numbers only
+            lengths = get_number_lengths(whole_numbers)
+        else:
+            text = get_utf8_text(values)
+            lengths = text.str.len()
+            hashes = hash_text_values(text, numbers)
+
+        self.add_lengths(lengths, counts)
+        self.add_hashes(hashes)
+
+    def add_numbers(self, numbers, whole_numbers, counts=None):
+        """
+        Count numbers, whole numbers and plausible latitudes/longitudes
+        (counts: the number of rows for each value, if not 1)
+        """
+        if len(numbers.index) == 0:
+            return
+
+        self.num_numeric += get_row_count(numbers, counts)
+        self.num_whole_numbers += get_row_count(whole_numbers, counts)
+        self.num_latitude += get_row_count(numbers[numbers.between(-90, 90)], counts)
+        self.num_longitude += get_row_count(numbers[numbers.between(-180, 180)], counts)
+
+        min_val, max_val = float(numbers.min()), float(numbers.max())
+        if self.min_val is None or min_val < self.min_val:
+            self.min_val = min_val
+        if self.max_val is None or max_val > self.max_val:
+            self.max_val = max_val
+
+    def add_lengths(self, lengths, counts=None):
+        """Merge the row counts of the text lengths"""
+        if len(lengths.index) == 0:
+            return
+
+        if counts is None:
+            length_counts = lengths.value_counts()
+        else:
+            length_counts = pd.Series(counts[lengths.index.values]).groupby(\
+                                                        lengths.values).sum()
+        if self.length_counts is None:
+            self.length_counts = length_counts
+        else:
+            self.length_counts = self.length_counts.add(length_counts, fill_value=0)
+
+    def add_hashes(self, hashes):
+        """Keep the DISTINCT_SKETCH_SIZE smallest unique hashes"""
+        hashes = pd.unique(hashes)
+        if len(hashes) > DISTINCT_SKETCH_SIZE:
+            # partial sort: no need to order them all
+            hashes = np.partition(hashes, DISTINCT_SKETCH_SIZE - 1)[:DISTINCT_SKETCH_SIZE]
+
+        self.hash_sketch = np.unique(np.concatenate(\
+                                [self.hash_sketch, hashes]))[:DISTINCT_SKETCH_SIZE]
+
+    def get_num_distinct(self):
+        """Return a tuple: (number of distinct values, True if estimated)"""
+        num_hashes = len(self.hash_sketch)
+        if num_hashes < DISTINCT_SKETCH_SIZE:
+            return num_hashes, False
+
+        kth_fraction = (float(self.hash_sketch[-1]) + 1) / HASH_SPACE
+        estimate = int(round((DISTINCT_SKETCH_SIZE - 1) / kth_fraction))
+
+        return max(min(estimate, self.num_values), num_hashes), True
+
+    def as_dict(self, column_name):
+        """Return the profile of the column, JSON ready"""
+        num_distinct, distinct_is_estimate = self.get_num_distinct()
+
+        min_length = max_length = None
+        length_counts = []
+        if self.length_counts is not None:
+            min_length = int(self.length_counts.index.min())
+            max_length = int(self.length_counts.index.max())
+            # most common first, then shortest
+            length_counts = sorted([[int(length), int(cnt)] for length, cnt\
+                                    in self.length_counts.iteritems()],
+                                   key=lambda x: (-x[1], x[0]))[:MAX_LENGTH_COUNTS]
+
+        return dict(name=column_name,
+                    dtype=get_column_dtype(self.dtypes).name,
+                    num_values=self.num_values,
+                    num_nulls=self.num_nulls,
+                    num_distinct=num_distinct,
+                    distinct_is_estimate=distinct_is_estimate,
+                    num_numeric=self.num_numeric,
+                    num_whole_numbers=self.num_whole_numbers,
+                    min=self.min_val,
+                    max=self.max_val,
+                    min_length=min_length,
+                    max_length=max_length,
+                    length_counts=length_counts,
+                    num_latitude=self.num_latitude,
+                    num_longitude=self.num_longitude)
+
+
+class ColumnProfiler(object):
+    """Build a column profile from the DataFrame chunks of a file"""
+
+    def __init__(self):
+        self.column_stats = None
+        self.num_rows = 0
+
+    def add_chunk(self, df):
+        """
+        Update the profile with a DataFrame: the whole file or a chunk.
+        Columns are matched by position--names may be normalized later
+        """
+        if df is None:
+            return
+
+        if self.column_stats is None:
+            self.column_stats = [ColumnStats() for _ in df.columns]
+
+        assert len(df.columns) == len(self.column_stats),\
+            "Each chunk must have the same number of columns"
+
+        for idx, stats in enumerate(self.column_stats):
+            stats.add_series(df.iloc[:, idx])
+
+        self.num_rows += len(df.index)
+
+    def get_profile(self, column_names):
+        """Return the column profile: a list of dicts, one per column"""
+        if self.column_stats is None:
+            return []
+
+        assert len(column_names) == len(self.column_stats),\
+            "column_names must have a name for each column"
+
+        return [stats.as_dict(column_name)\
+                for column_name, stats in zip(column_names, self.column_stats)]
+
+
+# ----------------------------------------------
+# Vectorized helpers
+# ----------------------------------------------
+def get_plain_series(series):
+    """
+    Undo DataFrame compaction (see tabular_reader.compact_data_frame):
+    categoricals become their values and integers int64--as in the file
+    """
+    if series.dtype.name == 'category':
+        return series.astype(series.cat.categories.dtype)
+
+    if series.dtype.kind in 'iu':
+        return series.astype(np.int64)
+
+    return series
+
+
+def get_row_count(values, counts=None):
+    """Return the number of rows: 1 per value or the sum of the value's "counts" """
+    if counts is None:
+        return len(values.index)
+
+    return int(counts[values.index.values].sum())
+
+
+def get_numbers(non_null):
+    """Return the values that are numbers, as float64"""
+    if non_null.dtype.kind in 'iuf':
+        return non_null.astype(np.float64)
+
+    if non_null.dtype.kind != 'O':
+        return pd.Series([], dtype=np.float64)      # e.g. bool
+
+    sample = pd.to_numeric(non_null.iloc[:NUMERIC_SAMPLE_SIZE], errors='coerce')
+    if sample.dtype.kind not in 'iuf' or sample.isnull().all():
+        return pd.Series([], dtype=np.float64)
+
+    try:
+        # all numbers: a direct conversion is faster
+        numbers = pd.Series(non_null.values.astype(np.float64), index=non_null.index)
+    except (ValueError, TypeError):
+        numbers = pd.to_numeric(non_null, errors='coerce')
+        if numbers.dtype.kind not in 'iuf':
+            return pd.Series([], dtype=np.float64)
+
+    # Skip True/False values within object columns
+    numbers = numbers[numbers.notnull() & ~non_null.isin([True, False])]
+
+    return numbers[np.isfinite(numbers)].astype(np.float64)
+
+
+def get_utf8_text(values):
+    """Return the values as utf-8 encoded text (a Series of str)"""
+    if pd.api.types.infer_dtype(values, skipna=True) == 'string':
+        return values
+
+    # e.g. unicode or True/False values
+    try:
+        return values.astype(str)
+    except UnicodeEncodeError:
+        return values.map(lambda x: x.encode('utf-8')\
+                          if isinstance(x, unicode) else str(x))
+
+
+def hash_text_values(text, numbers):
+    """
+    Return 64 bit hashes of unique text values (see "get_utf8_text").
+
+    Values that are numbers are hashed as in numeric chunks--so "123"
+    and 123, in different chunks of a column, are one distinct value
+    """
+    hashes = pd.util.hash_array(text.values, categorize=False)
+    if len(numbers.index) > 0:
+        hashes[numbers.index.values] = pd.util.hash_array(numbers.values)
+    return hashes
+
+
+def get_number_lengths(whole_numbers):
+    """Return the number of characters of each whole number--e.g. -105 is 4"""
+    whole_numbers = whole_numbers[whole_numbers.abs() < MAX_INT_LENGTH_VALUE]
+    int_vals = whole_numbers.values.astype(np.int64)
+
+    num_digits = np.searchsorted(POWERS_OF_TEN, np.abs(int_vals), side='right') + 1
+
+    return pd.Series(num_digits + (int_vals < 0), index=whole_numbers.index)
+
+
+# ----------------------------------------------
+# Use the profile in the column chooser
+# ----------------------------------------------
+def get_column_info(column_profile, column_name):
+    """Return the profile dict for "column_name" or None"""
+    if not column_profile:
+        return None
+
+    for info in column_profile:
+        if info.get('name') == column_name:
+            return info
+
+    return None
+
+
+def get_name_parts(column_name):
+    """Split a column name--e.g. "GEOID10_Tract"--into lowercase words"""
+    name_parts = column_name.lower().replace('-', '_').replace(' ', '_').split('_')
+    return [x.rstrip('0123456789') for x in name_parts]
+
+
+def is_join_candidate(info):
+    """Could the column be a join key?  Mostly unique, no fractions"""
+    if not info['num_values']:
+        return False
+
+    if info['num_whole_numbers'] < info['num_numeric']:
+        return False    # fractions: e.g. measurements
+
+    return info['num_distinct'] >= info['num_values'] * JOIN_MIN_DISTINCT_RATIO
+
+
+def get_join_column_suggestions(column_profile):
+    """
+    Return names of likely join columns--mostly unique values, no
+    fractions--ranked by:
+        - names like "tract" or "geoid"
+        - values with a single length, e.g. 11 digit census tracts
+        - fewest blanks
+    """
+    if not column_profile:
+        return []
+
+    ranked = []
+    for position, info in enumerate(column_profile):
+        if not is_join_candidate(info):
+            continue
+
+        has_hint = len(set(get_name_parts(info['name'])) & set(JOIN_NAME_HINTS)) > 0
+        fixed_length = info['min_length'] is not None and\
+                        info['min_length'] == info['max_length']
+
+        ranked.append(((not has_hint, not fixed_length, info['num_nulls'], position),
+                       info['name']))
+
+    return [name for _rank, name in sorted(ranked)]
+
+
+def get_lat_lng_suggestions(column_profile):
+    """
+    Return a tuple of lists: (latitude column names, longitude column names)
+
+    Suggested columns have a latitude/longitude name--e.g. "lat", "Longitude"--and
+    every value is a number in range: -90 to 90 for latitude, -180 to 180 for longitude
+    """
+    latitude_names = []
+    longitude_names = []
+    if not column_profile:
+        return latitude_names, longitude_names
+
+    for info in column_profile:
+        if not info['num_values'] or info['num_numeric'] < info['num_values']:
+            continue
+
+        name_parts = get_name_parts(info['name'])
+        if set(name_parts) & set(LATITUDE_NAMES) and\
+            info['num_latitude'] == info['num_values']:
+            latitude_names.append(info['name'])
+        elif set(name_parts) & set(LONGITUDE_NAMES) and\
+            info['num_longitude'] == info['num_values']:
+            longitude_names.append(info['name'])
+
+    return latitude_names, longitude_names
+
+
+def check_join_column(column_profile, column_name, zero_pad_length=None):
+    """
+    Return an error message if no row could join using the column, else None
+        - the column is blank
+        - every value is longer than the layer's (zero padded) join values
+    """
+    info = get_column_info(column_profile, column_name)
+    if info is None:
+        return None     # no profile: let the WorldMap decide
+
+    if not info['num_values']:
+        return 'The column "%s" has no values.' % column_name
+
+    if zero_pad_length and info['min_length'] is not None and\
+        info['min_length'] > zero_pad_length:
+        return ('The values in column "%s" are too long for this layer.'
+                ' This layer expects values of %d characters.'
+               ) % (column_name, zero_pad_length)
+
+    return None
+
+
+def check_lat_lng_column(column_profile, column_name, is_latitude=True):
+    """
+    Return an error message if no row has a usable latitude (or longitude) in
+    the column, else None
+    """
+    info = get_column_info(column_profile, column_name)
+    if info is None:
+        return None     # no profile: let the WorldMap decide
+
+    if is_latitude:
+        label, num_in_range, min_max = 'Latitude', info['num_latitude'], 90
+    else:
+        label, num_in_range, min_max = 'Longitude', info['num_longitude'], 180
+
+    if not info['num_numeric']:
+        return 'The %s column "%s" does not contain numbers.' % (label, column_name)
+
+    if not num_in_range:
+        return ('The %s column "%s" has no values between -%d and %d.'
+               ) % (label, column_name, min_max, min_max)
+
+    return None
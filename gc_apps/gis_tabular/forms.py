@@ -7,9 +7,15 @@ Form for:
     - clean
         - column 2 optional
         - column 1 cannot be same as column 2
+        - columns that can't map (see column_profile.py)
+
+Both column forms take an optional "column_profile" kwarg--the
+TabularFileInfo.column_profile--used to suggest columns
 """
 from django import forms
 from gc_apps.gis_tabular.models import TabularFileInfo
+from gc_apps.gis_tabular.column_profile import get_join_column_suggestions,\
+    get_lat_lng_suggestions, check_join_column, check_lat_lng_column
 #from gc_apps.worldmap_connect.jointarget_formatter import JoinTargetFormatter
 
 
@@ -18,6 +24,20 @@ GEO_TYPE_LATITUDE_LONGITUDE = 'latitude-longitude'
 SELECT_LABEL = 'Select...'
 INITIAL_SELECT_CHOICE = ('', SELECT_LABEL)
 
+# Number of suggested column names shown in the help text
+MAX_SUGGESTED_COLUMNS = 3
+
+
+def set_suggested_columns(field, suggested_names):
+    """Preselect the best suggestion and list the others in the help text"""
+    if not suggested_names:
+        return
+
+    suggested_names = suggested_names[:MAX_SUGGESTED_COLUMNS]
+    field.initial = suggested_names[0]
+    field.help_text = 'Suggested: %s' % ', '.join(suggested_names)
+
+
 class TabularFileInfoForm(forms.ModelForm):
     class Meta:
         model = TabularFileInfo
@@ -33,6 +53,11 @@ class ChooseSingleColumnForm(forms.Form):
     chosen_column = forms.ChoiceField(label="Column Name", choices=())
 
     def __init__(self, tabular_file_info_id, layer_choices, column_names, *args, **kwargs):
+        self.column_profile = kwargs.pop('column_profile', None)
+
+        # JoinTargetInformation: used to check the join column's length
+        self.join_target_info = kwargs.pop('join_target_info', None)
+
         super(ChooseSingleColumnForm, self).__init__(*args, **kwargs)
         assert column_names is not None, "You must initiate this form with column names"
 
@@ -46,6 +71,9 @@ class ChooseSingleColumnForm(forms.Form):
         self.fields['chosen_column'].choices = colname_choices
         self.fields['chosen_column'].widget.attrs.update({'class' : 'form-control'})
 
+        set_suggested_columns(self.fields['chosen_column'],
+                              get_join_column_suggestions(self.column_profile))
+
 
     def clean_chosen_layer(self):
 
@@ -58,6 +86,28 @@ class ChooseSingleColumnForm(forms.Form):
         except ValueError:
             ValidationError(_('The layer does not have a valid id. (talk to the admin)'))
 
+    def clean(self):
+        """
+        Check that rows could join using the chosen column
+        """
+        cleaned_data = super(ChooseSingleColumnForm, self).clean()
+
+        chosen_column = cleaned_data.get('chosen_column')
+        chosen_layer_id = cleaned_data.get('chosen_layer')
+        if not chosen_column:
+            return cleaned_data
+
+        zero_pad_length = None
+        if self.join_target_info is not None and chosen_layer_id is not None:
+            zero_pad_length = self.join_target_info.get_formatting_zero_pad_length(\
+                                                        chosen_layer_id)
+
+        err_msg = check_join_column(self.column_profile, chosen_column, zero_pad_length)
+        if err_msg:
+            self.add_error('chosen_column', err_msg)
+
+        return cleaned_data
+
 
 class LatLngColumnsForm(forms.Form):
     """
@@ -70,6 +120,8 @@ class LatLngColumnsForm(forms.Form):
     longitude = forms.ChoiceField(label='Column Name (Longitude)', choices=())
 
     def __init__(self, tabular_file_info_id, column_names, *args, **kwargs):
+        self.column_profile = kwargs.pop('column_profile', None)
+
         super(LatLngColumnsForm, self).__init__(*args, **kwargs)
         assert column_names is not None, "You must initiate this form with column names"
 
@@ -83,6 +135,10 @@ class LatLngColumnsForm(forms.Form):
         self.fields['latitude'].widget.attrs.update({'class' : 'form-control'})
         self.fields['longitude'].widget.attrs.update({'class' : 'form-control'})
 
+        (latitude_names, longitude_names) = get_lat_lng_suggestions(self.column_profile)
+        set_suggested_columns(self.fields['latitude'], latitude_names)
+        set_suggested_columns(self.fields['longitude'], longitude_names)
+
     def get_latitude_colname(self):
         assert self.cleaned_data is not None, "Do not call this unless .is_valid() is True"
 
@@ -98,6 +154,10 @@ class LatLngColumnsForm(forms.Form):
         if not data:
             raise forms.ValidationError("Please select a Latitude column")
 
+        err_msg = check_lat_lng_column(self.column_profile, data, is_latitude=True)
+        if err_msg:
+            raise forms.ValidationError(err_msg)
+
         return data
 
     def clean_longitude(self):
@@ -106,6 +166,10 @@ class LatLngColumnsForm(forms.Form):
         if not data:
             raise forms.ValidationError("Please select a Longitude column")
 
+        err_msg = check_lat_lng_column(self.column_profile, data, is_latitude=False)
+        if err_msg:
+            raise forms.ValidationError(err_msg)
+
         return data
 
     def clean(self):
@@ -114,8 +178,10 @@ class LatLngColumnsForm(forms.Form):
         """
         cleaned_data = super(LatLngColumnsForm, self).clean()
 
-        latitude = self.clean_latitude()  #cleaned_data.get('latitude')
-        longitude = self.clean_longitude()  # cleaned_data.get('longitude')
+        latitude = cleaned_data.get('latitude')
+        longitude = cleaned_data.get('longitude')
+        if not (latitude and longitude):
+            return cleaned_data     # field errors already added
 
         if latitude == longitude:
             err_msg = 'The Longitude column cannot be the same as the Latitude column.'
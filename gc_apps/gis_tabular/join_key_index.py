@@ -0,0 +1,208 @@
+"""
+Join key index for a WorldMapJoinLayerInfo.
+
+WorldMap only sends back the join key values that failed to match.
+Rather than re-formatting and scanning the whole join column for each
+preview or download of the unmatched rows, the row offsets of each key
+are computed once and pickled next to the parsed table:
+
+    (settings.GISFILE_SCRATCH_WORK_DIRECTORY)/parsed_tabular_cache/
+        (tabular_info.md5)__(layer_info.md5)__(hash of file, join column).keys.pkl
+
+The index is three numpy arrays:
+    - keys: the unique join key values, sorted
+    - row_offsets: row positions, grouped by key, in file order
+    - starts: row_offsets[starts[i]:starts[i+1]] are the rows for keys[i]
+
+The arrays are plain numbers or fixed width strings, so loading the
+index is a copy rather than rebuilding millions of Python objects.
+Each unmatched value is then a binary search of the keys.
+
+Files share the TabularFileCache prefix, so TabularFileCache.clear and
+TabularFileCache.remove_stale_files remove them as well.
+"""
+from hashlib import md5
+import os
+from os.path import isfile, join
+
+import numpy as np
+import pandas as pd
+
+from gc_apps.gis_tabular.tabular_file_cache import TabularFileCache
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE_EXTENSION = '.keys.pkl'
+
+
+class JoinKeyIndex(object):
+    """Map join key values to row offsets"""
+
+    def __init__(self, keys, starts, row_offsets):
+        self.keys = keys
+        self.starts = starts
+        self.row_offsets = row_offsets
+
+    @staticmethod
+    def build(key_series):
+        """
+        Build the index from a join column (pandas Series).
+        Null values are not indexed
+        """
+        assert key_series is not None, "key_series cannot be None"
+
+        codes, keys = pd.factorize(key_series, sort=True)
+
+        # Group row positions by key, keeping the file order within each key
+        row_offsets = np.argsort(codes, kind='mergesort')
+        sorted_codes = codes[row_offsets]
+        not_null = sorted_codes >= 0
+        row_offsets = row_offsets[not_null]
+
+        counts = np.bincount(sorted_codes[not_null], minlength=len(keys))
+        starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return JoinKeyIndex(get_key_array(keys.values),
+                            starts,
+                            row_offsets.astype(np.int64))
+
+    def is_numeric(self):
+        """Are the keys numbers?"""
+        return self.keys.dtype.kind in 'iuf'
+
+    def get_key_positions(self, key_values):
+        """Return the positions of the key values in self.keys.  Unknown values are skipped"""
+        if self.is_numeric():
+            key_values = convert_values_to_numeric(key_values)
+        else:
+            key_values = get_key_array(key_values)
+
+        if len(key_values) == 0 or len(self.keys) == 0:
+            return np.array([], dtype=np.int64)
+
+        # Binary search the sorted keys
+        positions = np.searchsorted(self.keys, key_values)
+        positions[positions == len(self.keys)] = 0
+        positions = positions[self.keys[positions] == key_values]
+
+        return np.unique(positions)
+
+    def lookup(self, key_values):
+        """
+        Find the rows for a list of key values.  Unknown values are skipped.
+
+        Returns a tuple of numpy arrays, in file order:
+            (row offsets, key value of each row)
+        """
+        positions = self.get_key_positions(key_values)
+
+        if len(positions) == 0:
+            return (np.array([], dtype=np.int64), self.keys[:0])
+
+        counts = self.starts[positions + 1] - self.starts[positions]
+        row_offsets = np.concatenate(\
+                        [self.row_offsets[self.starts[pos]:self.starts[pos + 1]]\
+                         for pos in positions])
+        row_keys = np.repeat(self.keys[positions], counts)
+
+        file_order = np.argsort(row_offsets, kind='mergesort')
+
+        return (row_offsets[file_order], row_keys[file_order])
+
+    # ----------------------------------------------
+    # Persist next to the parsed table
+    # ----------------------------------------------
+    @staticmethod
+    def get_index_filepath(worldmap_info, join_column, zero_pad_length=None):
+        """
+        Return the full path to the index file or None if
+        the index can't be saved for this object
+        """
+        tabular_info = worldmap_info.tabular_info
+        if not (tabular_info.md5 and worldmap_info.md5):
+            return None
+
+        cache_dir = TabularFileCache.get_cache_directory()
+        if cache_dir is None:
+            return None
+
+        signature = TabularFileCache.get_file_signature(tabular_info)
+        if signature is None:
+            return None
+
+        index_signature = '%s|%s|%s' % (signature, join_column, zero_pad_length)
+        if isinstance(index_signature, unicode):
+            index_signature = index_signature.encode('utf-8')
+
+        fname = '%s__%s__%s%s' % (tabular_info.md5,
+                                  worldmap_info.md5,
+                                  md5(index_signature).hexdigest(),
+                                  INDEX_FILE_EXTENSION)
+
+        return join(cache_dir, fname)
+
+    @staticmethod
+    def load(index_filepath):
+        """Return the saved JoinKeyIndex or None"""
+        if index_filepath is None or not isfile(index_filepath):
+            return None
+
+        try:
+            index_info = pd.read_pickle(index_filepath)
+            return JoinKeyIndex(index_info['keys'],
+                                index_info['starts'],
+                                index_info['row_offsets'])
+        except Exception as ex_obj:
+            LOGGER.error('Failed to read join key index %s: %s', index_filepath, ex_obj)
+            TabularFileCache.remove_file(index_filepath)
+            return None
+
+    def save(self, index_filepath):
+        """Pickle the index.  Returns True if the file was written"""
+        if index_filepath is None:
+            return False
+
+        index_info = dict(keys=self.keys,
+                          starts=self.starts,
+                          row_offsets=self.row_offsets)
+
+        # Write to a temp name, then rename
+        #
+        tmp_filepath = '%s.%s.tmp' % (index_filepath, os.getpid())
+        try:
+            pd.to_pickle(index_info, tmp_filepath)
+            os.rename(tmp_filepath, index_filepath)
+        except Exception as ex_obj:
+            LOGGER.error('Failed to write join key index %s: %s', index_filepath, ex_obj)
+            TabularFileCache.remove_file(tmp_filepath)
+            return False
+
+        return True
+
+
+def convert_values_to_numeric(val_list):
+    """
+    Convert a list of values--e.g. strings sent back by the WorldMap--to numbers.
+    Values that aren't numbers are dropped.
+    """
+    assert val_list is not None, 'val_list cannot be None'
+
+    numeric_vals = pd.to_numeric(pd.Series(val_list), errors='coerce')
+
+    return numeric_vals[numeric_vals.notnull()].values
+
+
+def get_key_array(val_list):
+    """
+    Return a numpy array of key values.
+    Strings are stored as utf-8 bytes (fixed width): compact
+    to save and load, and they can be binary searched
+    """
+    key_array = np.asarray(val_list)
+    if key_array.dtype.kind in 'iufS':
+        return key_array
+
+    return np.array([val.encode('utf-8') if isinstance(val, unicode) else str(val)\
+                     for val in val_list],
+                    dtype=np.bytes_)
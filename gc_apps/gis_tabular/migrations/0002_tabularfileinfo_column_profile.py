@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 11:20
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gis_tabular', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tabularfileinfo',
+            name='column_profile',
+            field=jsonfield.fields.JSONField(blank=True, help_text=b'Per column stats, saved as a json list. See gis_tabular/column_profile.py', null=True),
+        ),
+    ]
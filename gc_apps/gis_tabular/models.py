@@ -2,7 +2,6 @@
 Models to save the Tabular information from Dataverse
 as well as the mapping results from WorldMap
 """
-from hashlib import md5
 from abc import abstractmethod
 
 import jsonfield  # using jsonfield.JSONField
@@ -36,6 +35,9 @@ class TabularFileInfo(GISDataFile):
 
     column_names = jsonfield.JSONField(blank=True, help_text='Saved as a json list')
 
+    column_profile = jsonfield.JSONField(blank=True, null=True,\
+                help_text='Per column stats, saved as a json list. See gis_tabular/column_profile.py')
+
     # User mediated choices
     has_header_row = models.BooleanField(default=True)
     chosen_column = models.CharField(max_length=155, blank=True)
@@ -54,14 +56,6 @@ class TabularFileInfo(GISDataFile):
             return 0
         return len(self.column_names)
 
-    def save(self, *args, **kwargs):
-        """Set the md5 attribute on save"""
-        if not self.id:
-            super(TabularFileInfo, self).save(*args, **kwargs)
-        self.md5 = md5('%s%s' % (self.id, self.name)).hexdigest()
-
-        super(TabularFileInfo, self).save(*args, **kwargs)
-
     def __unicode__(self):
         if self.name:
             return self.name
@@ -185,19 +179,6 @@ class WorldMapJoinLayerInfo(WorldMapTabularLayerInfo):
     #                    max_length=255,\
     #                    help_text="Join attribute created")
 
-    def save(self, *args, **kwargs):
-
-        if not self.id:
-            super(WorldMapJoinLayerInfo, self).save(*args, **kwargs)
-
-        self.layer_name = self.core_data.get('layer_typename', None)
-        if self.layer_name is None:
-            self.layer_name = self.core_data.get('layer_name')
-
-
-        self.md5 = md5('%s-%s' % (self.id, self.layer_name)).hexdigest()
-        super(WorldMapJoinLayerInfo, self).save(*args, **kwargs)
-
     class Meta:
         verbose_name = 'WorldMap Tabular Join Layer Information'
         verbose_name_plural = verbose_name
@@ -270,21 +251,6 @@ class WorldMapLatLngInfo(WorldMapTabularLayerInfo):
     """
     New Layer created by Joining a DataTable to an Existing Layer
     """
-    def save(self, *args, **kwargs):
-        """
-        - Set the layer_name based on the JSON core_data
-        - Create an md5 value
-        """
-        if not self.id:
-            super(WorldMapLatLngInfo, self).save(*args, **kwargs)
-
-        self.layer_name = self.core_data.get('layer_typename', None)
-        if self.layer_name is None:
-            self.layer_name = self.core_data.get('layer_name')
-
-        self.md5 = md5('%s-%s' % (self.id, self.layer_name)).hexdigest()
-        super(WorldMapLatLngInfo, self).save(*args, **kwargs)
-
     class Meta:
         verbose_name = 'WorldMap Latitude/Longitude Layer Information'
         verbose_name_plural = verbose_name
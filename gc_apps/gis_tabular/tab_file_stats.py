@@ -1,14 +1,23 @@
 """
 Gather tabular file information: number of rows, column names, etc
 """
-from csv import QUOTE_NONNUMERIC
+import csv
+from csv import QUOTE_NONNUMERIC, QUOTE_MINIMAL
+from shutil import copyfileobj
 import pandas as pd
 
+from django.core.files import File
 from django.core.files.base import ContentFile
+from django.core.files.temp import NamedTemporaryFile
 
 from gc_apps.gis_tabular.models import TabularFileInfo
-from gc_apps.geo_utils.file_field_helper import get_file_path_or_url
+from gc_apps.gis_tabular.tabular_file_cache import TabularFileCache
+from gc_apps.gis_tabular.column_profile import ColumnProfiler
+from gc_apps.geo_utils.file_field_helper import get_file_path_or_url,\
+    open_file_path_or_url
 from gc_apps.geo_utils.tabular_util import normalize_colname
+from gc_apps.geo_utils.tabular_reader import read_tabular_file,\
+    get_string_column_names, compact_data_frame
 from gc_apps.geo_utils.msg_util import msg
 
 import logging
@@ -17,10 +26,24 @@ LOGGER = logging.getLogger(__name__)
 
 NUM_PREVIEW_ROWS = 5
 
+# Files at least this size are read in chunks ("streaming" mode)
+STREAMING_MIN_FILE_SIZE = 50 * 1024 * 1024    # 50 MB
+
+# Rows per chunk when streaming.  Bounds the memory used
+STREAMING_CHUNK_SIZE = 20000
+
+# Bytes per read when copying a file
+FILE_COPY_CHUNK_SIZE = 1024 * 1024
+
 class TabFileStats(object):
     """Gather tabular file information: number of rows, column names, etc"""
 
-    def __init__(self, file_object, delim=',', tabular_info=None):
+    def __init__(self, file_object, delim=',', tabular_info=None, streaming=None):
+        """
+        streaming - True: read the file in chunks, keeping memory bounded
+                    False: read the entire file into a DataFrame
+                    None: decide based on the file size
+        """
 
         assert hasattr(file_object, 'read'),\
             "TabFileStats.  file_object does not have .read() function: %s" % file_object
@@ -36,14 +59,22 @@ class TabFileStats(object):
         self.num_rows = 0
         self.num_cols = 0
         self.preview_rows = []
+        self.column_profile = []
 
         self.error_found = False
         self.error_message = None
 
         self.stats_collected = False
+        self.columns_renamed = False
+
+        # Number of times the file was parsed by pandas
+        self.num_parse_passes = 0
 
-        self.rename_columns()
-        self.collect_stats()
+        if streaming is None:
+            streaming = self.is_streaming_size(file_object)
+        self.streaming = streaming
+
+        self.ingest_file()
         self.update_tabular_info_object()
 
 
@@ -60,7 +91,15 @@ class TabFileStats(object):
         self.error_message = message
 
     @staticmethod
-    def create_from_tabular_info(tabular_info):
+    def is_streaming_size(file_object):
+        """Is the file large enough to read in chunks?"""
+        try:
+            return file_object.size >= STREAMING_MIN_FILE_SIZE
+        except (OSError, IOError, AttributeError):
+            return False
+
+    @staticmethod
+    def create_from_tabular_info(tabular_info, streaming=None):
         assert isinstance(tabular_info, TabularFileInfo)\
             , 'tabular_info must be a TabularFileInfo object'
 
@@ -69,20 +108,131 @@ class TabFileStats(object):
         #   tabular_info.dv_file.file.name\
         return TabFileStats(file_object=tabular_info.dv_file,
                             delim=tabular_info.delimiter,
-                            tabular_info=tabular_info)
+                            tabular_info=tabular_info,
+                            streaming=streaming)
 
-    def rename_columns(self):
+    def ingest_file(self):
+        """
+        Single pass over the file:
+            (1) read it into a DataFrame, once
+            (2) normalize the column names
+            (3) rewrite the file--only if columns were renamed
+            (4) collect num_rows, num_cols and preview_row data
+            (5) profile each column (see column_profile.py)
+
+        For large files, see "ingest_file_streaming"
+        """
         if self.has_error():
             return
+
+        if self.streaming:
+            self.ingest_file_streaming()
+            return
+
+        df, from_cache = self.read_data_frame()
+        if df is None:
+            return
+
+        if self.rename_columns(df):
+            self.save_renamed_file(df)
+            from_cache = False
+
+        # Profile the columns--unless the cached file was already profiled
+        profiler = None
+        if not (from_cache and self.has_saved_profile(df)):
+            profiler = ColumnProfiler()
+            profiler.add_chunk(df)
+
+        # Cache the DataFrame for later use (e.g. unmatched rows)
+        if self.tabular_info and not from_cache:
+            compact_data_frame(df)
+            TabularFileCache.save_data_frame(self.tabular_info, df)
+
+        self.collect_stats(df)
+        self.set_column_profile(profiler)
+
+    def ingest_file_streaming(self):
+        """
+        Single pass over the file, reading STREAMING_CHUNK_SIZE rows at a time:
+            (1) the first chunk supplies the column names and preview rows
+            (2) every chunk is counted, profiled and then discarded
+            (3) if columns were renamed, rewrite only the header line
+
+        Works for local files as well as urls (e.g. AWS S3)
+        """
+        fh = open_file_path_or_url(self.file_object)
+        if fh is None:
+            self.add_error('The file could not be found.')
+            return
+
+        first_chunk = None
+        num_rows = 0
+        profiler = ColumnProfiler()
         try:
-            df = pd.read_csv(get_file_path_or_url(self.file_object),
-                             sep=self.delimiter)
-        except pd.parser.CParserError as ex_obj:
+            reader = read_tabular_file(fh,
+                                       self.delimiter,
+                                       chunksize=STREAMING_CHUNK_SIZE)
+            for chunk in reader:
+                if first_chunk is None:
+                    first_chunk = chunk.head(NUM_PREVIEW_ROWS)
+                num_rows += len(chunk.index)
+                profiler.add_chunk(chunk)
+        except pd.errors.ParserError as ex_obj:
             err_msg = ('Could not process the file. '
                        'At least one row had too many values. '
                        '(error: %s)') % ex_obj.message
             self.add_error(err_msg)
             return
+        finally:
+            fh.close()
+
+        self.num_parse_passes += 1
+
+        if first_chunk is None:
+            self.add_error('No data rows in the file')
+            return
+
+        if self.rename_columns(first_chunk):
+            self.save_renamed_header(first_chunk.columns.values.tolist())
+
+        self.collect_stats(first_chunk)
+        self.num_rows = num_rows
+        self.set_column_profile(profiler)
+
+    def read_data_frame(self):
+        """
+        Return a tuple: (DataFrame, True if the DataFrame came from the cache)
+
+        Use the TabularFileCache, if available.  Otherwise open
+        the file with pandas.
+
+        On failure, add an error and return (None, False)
+        """
+        if self.tabular_info:
+            df = TabularFileCache.get_data_frame(self.tabular_info)
+            if df is not None:
+                return df, True
+
+        try:
+            df = read_tabular_file(get_file_path_or_url(self.file_object),
+                                   self.delimiter)
+        except pd.errors.ParserError as ex_obj:
+            err_msg = ('Could not process the file. '
+                       'At least one row had too many values. '
+                       '(error: %s)') % ex_obj.message
+            self.add_error(err_msg)
+            return None, False
+
+        self.num_parse_passes += 1
+
+        return df, False
+
+    def rename_columns(self, df):
+        """
+        Normalize the DataFrame column names in place.
+
+        Return True if any columns were renamed
+        """
         count = 0
         columns_renamed = {}
         for column in df.columns.values.tolist():
@@ -102,39 +252,79 @@ class TabFileStats(object):
                 columns_renamed[column] = normalized
             count += 1
 
-        if len(columns_renamed) > 0:
-            df.rename(columns=columns_renamed, inplace=True)
+        if len(columns_renamed) == 0:
+            return False
 
-            # http://stackoverflow.com/questions/36519086/pandas-how-to-get-rid-of-unnamed-column-in-a-dataframe
-            fh_csv = df.to_csv(quoting=QUOTE_NONNUMERIC,
-                               sep=self.delimiter,
-                               index=False)
+        df.rename(columns=columns_renamed, inplace=True)
+        self.columns_renamed = True
 
-            content_file = ContentFile(fh_csv)
+        return True
 
-            # Save the ContentFile in the tabular_info object
-            # ----------------------------------
-            self.tabular_info.dv_file.save(self.tabular_info.datafile_label,
-                                           content_file)
+    def save_renamed_file(self, df):
+        """
+        Write the DataFrame--with the normalized column names--back
+        to the tabular_info's dv_file
+        """
+        if not self.tabular_info:
+            return
+
+        # http://stackoverflow.com/questions/36519086/pandas-how-to-get-rid-of-unnamed-column-in-a-dataframe
+        fh_csv = df.to_csv(quoting=QUOTE_NONNUMERIC,
+                           sep=self.delimiter,
+                           index=False)
+
+        content_file = ContentFile(fh_csv)
 
+        # Save the ContentFile in the tabular_info object
+        # ----------------------------------
+        self.tabular_info.dv_file.save(self.tabular_info.datafile_label,
+                                       content_file)
 
 
-    def collect_stats(self):
+    def save_renamed_header(self, column_names):
         """
-        Open the file: collect num_rows, num_cols and preview_row data
+        Write the normalized column names as the header line, then
+        copy the rest of the file as is--a chunk at a time
+
+        Unlike "save_renamed_file", the rows aren't rewritten, so they
+        keep their original quoting.  The header is written the same
+        way: quoted only where needed (QUOTE_MINIMAL)
         """
-        if self.has_error():
+        if not self.tabular_info:
             return
-        try:
-            df = pd.read_csv(get_file_path_or_url(self.file_object),
-                             sep=self.delimiter)
-        except pd.parser.CParserError as ex_obj:
-            err_msg = ('Could not process the file. '
-                       'At least one row had too many values. '
-                       '(error: %s)') % ex_obj.message
-            self.add_error(err_msg)
+
+        fh = open_file_path_or_url(self.file_object)
+        if fh is None:
+            self.add_error('The file could not be found.')
             return
 
+        tmp_file = NamedTemporaryFile(delete=True)
+        try:
+            # skip the original header
+            fh.readline()
+
+            header_writer = csv.writer(tmp_file,
+                                       delimiter=self.delimiter,
+                                       quoting=QUOTE_MINIMAL,
+                                       lineterminator='\n')
+            header_writer.writerow([x.encode('utf-8') if isinstance(x, unicode) else x
+                                    for x in column_names])
+
+            copyfileobj(fh, tmp_file, FILE_COPY_CHUNK_SIZE)
+            tmp_file.flush()
+            tmp_file.seek(0)
+
+            self.tabular_info.dv_file.save(self.tabular_info.datafile_label,
+                                           File(tmp_file))
+        finally:
+            fh.close()
+            tmp_file.close()
+
+
+    def collect_stats(self, df):
+        """
+        Using the DataFrame: collect num_rows, num_cols and preview_row data
+        """
         self.special_case_col_formatting(df)
 
         self.column_names = df.columns.values.tolist()
@@ -150,6 +340,30 @@ class TabFileStats(object):
         self.stats_collected = True
 
 
+    def has_saved_profile(self, df):
+        """Does the tabular_info have a column profile for these columns?"""
+        if not (self.tabular_info and self.tabular_info.column_profile):
+            return False
+
+        profile_names = [x.get('name') for x in self.tabular_info.column_profile]
+
+        return profile_names == df.columns.values.tolist()
+
+
+    def set_column_profile(self, profiler=None):
+        """
+        Set the column profile, using the normalized column names.
+        If there's no profiler, use the tabular_info's saved profile
+        """
+        if not self.stats_collected:
+            return
+
+        if profiler is None:
+            self.column_profile = self.tabular_info.column_profile
+        else:
+            self.column_profile = profiler.get_profile(self.column_names)
+
+
     def special_case_col_formatting(self, df):
         """Will eventually need to be factored out"""
         if df is None:
@@ -158,10 +372,8 @@ class TabFileStats(object):
         # Treat census block groups as string instead of numbers
         #   - 12-digit numeric code that may receive zero-padding
         #
-        keep_as_string_cols = ['BG_ID_10', 'CT_ID_10']
-        for col_name in keep_as_string_cols:
-            if col_name in  df.columns:
-                df[col_name] = df[col_name].astype(str)
+        for col_name in get_string_column_names(df.columns.tolist()):
+            df[col_name] = df[col_name].astype(str)
 
 
     def update_tabular_info_object(self):
@@ -179,6 +391,7 @@ class TabFileStats(object):
         self.tabular_info.num_rows = self.num_rows
         self.tabular_info.num_columns = self.num_cols
         self.tabular_info.column_names = self.column_names
+        self.tabular_info.column_profile = self.column_profile
 
 
         self.tabular_info.save()
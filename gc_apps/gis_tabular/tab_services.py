@@ -5,11 +5,6 @@
 """
 from __future__ import print_function
 
-import urllib2
-
-from django.core.files import File
-from django.core.files.temp import NamedTemporaryFile
-
 from shared_dataverse_information.dataverse_info.forms import DataverseInfoValidationForm
 from gc_apps.registered_dataverse.registered_dataverse_helper import find_registered_dataverse
 from gc_apps.gis_tabular.models import TabularFileInfo
@@ -17,6 +12,7 @@ from gc_apps.gis_tabular.models import WorldMapTabularLayerInfo
 
 from gc_apps.geo_utils.msg_util import msg, msgt
 from gc_apps.geo_utils.error_result_msg import ErrResultMsg, FAILED_NOT_A_REGISTERED_DATAVERSE
+from gc_apps.geo_utils.file_downloader import download_to_file_field
 
 from gc_apps.worldmap_connect.dataverse_layer_services import get_layer_info_using_dv_info
 
@@ -205,18 +201,15 @@ def get_tabular_file_from_dv_api_info(dv_session_token, dataverse_info_dict):
     msg('datafile_download_url: %s' % datafile_download_url)
     datafile_filename = dataverse_info_dict.get('datafile_label', '')
 
-    img_temp = NamedTemporaryFile(delete=True)
-
-    try:
-        img_temp.write(urllib2.urlopen(datafile_download_url).read())
-    except urllib2.HTTPError as e:
+    # Stream the file into storage (this saves tabular_info)
+    #
+    success, err_msg = download_to_file_field(datafile_download_url,
+                                              tabular_info.dv_file,
+                                              datafile_filename)
+    if not success:
         tabular_info.delete() # clear tabular info
-        err_msg = 'Failed to download tabular file. HTTPError: %s \n\nurl: %s' % (str(e), datafile_download_url)
+        err_msg = 'Failed to download tabular file. %s \n\nurl: %s' % (err_msg, datafile_download_url)
         return False, ErrResultMsg(None, err_msg)
-    img_temp.flush()
-
-    tabular_info.dv_file.save(datafile_filename, File(img_temp))
-    tabular_info.save()
     add_worldmap_layerinfo_if_exists(tabular_info)
 
     return True, tabular_info.md5
@@ -0,0 +1,238 @@
+"""
+Cache of parsed tabular files.
+
+Pandas DataFrames are pickled to the scratch directory so that
+repeat operations on the same Dataverse file--e.g. join attempts,
+viewing or downloading unmatched rows--don't re-parse the CSV.
+
+Cache files are keyed by the TabularFileInfo.md5 plus the
+file's name, size and modification time:
+
+    (settings.GISFILE_SCRATCH_WORK_DIRECTORY)/parsed_tabular_cache/
+        (tabular_info.md5)__(hash of name, size, mtime, delimiter).pkl
+
+If the dv_file changes, the key changes and older cache files
+for that TabularFileInfo are removed.
+"""
+from hashlib import md5
+import os
+from os.path import getmtime, isdir, isfile, join
+import time
+
+import pandas as pd
+
+from django.conf import settings
+
+from gc_apps.geo_utils.file_field_helper import get_file_path_or_url
+from gc_apps.geo_utils.tabular_reader import read_tabular_file
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+CACHE_DIRECTORY_NAME = 'parsed_tabular_cache'
+CACHE_FILE_EXTENSION = '.pkl'
+
+
+class TabularFileCache(object):
+    """Read/write pickled DataFrames of TabularFileInfo.dv_file objects"""
+
+    @staticmethod
+    def get_cache_directory(create_if_missing=True):
+        """
+        Return the cache directory or None if
+        settings.GISFILE_SCRATCH_WORK_DIRECTORY is not set
+        """
+        if not settings.GISFILE_SCRATCH_WORK_DIRECTORY:
+            return None
+
+        cache_dir = join(settings.GISFILE_SCRATCH_WORK_DIRECTORY,
+                         CACHE_DIRECTORY_NAME)
+
+        if create_if_missing and not isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not isdir(cache_dir):
+                    LOGGER.error('Failed to create cache directory: %s', cache_dir)
+                    return None
+
+        return cache_dir
+
+    @staticmethod
+    def get_file_signature(tabular_info):
+        """
+        Return a string describing the current dv_file:
+        name, size, modification time and delimiter
+        """
+        dv_file = tabular_info.dv_file
+        if not dv_file:
+            return None
+
+        try:
+            file_size = dv_file.size
+        except (OSError, IOError, NotImplementedError):
+            return None
+
+        try:
+            modified_time = dv_file.storage.get_modified_time(dv_file.name)
+        except (OSError, IOError, NotImplementedError, AttributeError):
+            modified_time = ''
+
+        return '%s|%s|%s|%s' % (dv_file.name,
+                                file_size,
+                                modified_time,
+                                tabular_info.delimiter)
+
+    @staticmethod
+    def get_cache_filepath(tabular_info):
+        """
+        Return the full path to the cache file or None if caching
+        isn't available for this object
+        """
+        if tabular_info is None or not tabular_info.md5:
+            return None
+
+        cache_dir = TabularFileCache.get_cache_directory()
+        if cache_dir is None:
+            return None
+
+        signature = TabularFileCache.get_file_signature(tabular_info)
+        if signature is None:
+            return None
+        if isinstance(signature, unicode):
+            signature = signature.encode('utf-8')
+
+        fname = '%s__%s%s' % (tabular_info.md5,
+                              md5(signature).hexdigest(),
+                              CACHE_FILE_EXTENSION)
+
+        return join(cache_dir, fname)
+
+    @staticmethod
+    def get_data_frame(tabular_info):
+        """Return the cached DataFrame or None"""
+        cache_filepath = TabularFileCache.get_cache_filepath(tabular_info)
+        if cache_filepath is None or not isfile(cache_filepath):
+            return None
+
+        try:
+            return pd.read_pickle(cache_filepath)
+        except Exception as ex_obj:
+            LOGGER.error('Failed to read cache file %s: %s', cache_filepath, ex_obj)
+            TabularFileCache.remove_file(cache_filepath)
+            return None
+
+    @staticmethod
+    def save_data_frame(tabular_info, df):
+        """
+        Pickle the DataFrame and remove any older
+        cache files for this TabularFileInfo.
+
+        Returns True if the file was written
+        """
+        cache_filepath = TabularFileCache.get_cache_filepath(tabular_info)
+        if cache_filepath is None or df is None:
+            return False
+
+        TabularFileCache.clear(tabular_info)
+
+        # Write to a temp name, then rename
+        #
+        tmp_filepath = '%s.%s.tmp' % (cache_filepath, os.getpid())
+        try:
+            df.to_pickle(tmp_filepath)
+            os.rename(tmp_filepath, cache_filepath)
+        except Exception as ex_obj:
+            LOGGER.error('Failed to write cache file %s: %s', cache_filepath, ex_obj)
+            TabularFileCache.remove_file(tmp_filepath)
+            return False
+
+        return True
+
+    @staticmethod
+    def read_data_frame(tabular_info):
+        """
+        Return a DataFrame for the tabular_info's dv_file.
+            - Use the cache, if available
+            - Otherwise, read the file with pandas and cache the result.
+              The DataFrame is compacted: see geo_utils.tabular_reader
+
+        Parse errors from pd.read_csv are passed on to the caller
+        """
+        df = TabularFileCache.get_data_frame(tabular_info)
+        if df is not None:
+            return df
+
+        df = read_tabular_file(get_file_path_or_url(tabular_info.dv_file),
+                               tabular_info.delimiter,
+                               column_names=tabular_info.column_names or None,
+                               compact=True)
+
+        TabularFileCache.save_data_frame(tabular_info, df)
+
+        return df
+
+    @staticmethod
+    def clear(tabular_info):
+        """Remove all cache files for this TabularFileInfo"""
+        if tabular_info is None or not tabular_info.md5:
+            return 0
+
+        cache_dir = TabularFileCache.get_cache_directory(create_if_missing=False)
+        if cache_dir is None or not isdir(cache_dir):
+            return 0
+
+        prefix = '%s__' % tabular_info.md5
+        num_removed = 0
+        for fname in os.listdir(cache_dir):
+            if fname.startswith(prefix):
+                if TabularFileCache.remove_file(join(cache_dir, fname)):
+                    num_removed += 1
+
+        return num_removed
+
+    @staticmethod
+    def remove_stale_files(stale_age_in_seconds, valid_md5s=None, really_delete=True):
+        """
+        Remove cache files that are:
+            - older than "stale_age_in_seconds" OR
+            - not tied to a TabularFileInfo md5 in "valid_md5s" (if given)
+
+        return (number of files checked, number of files removed)
+        """
+        cache_dir = TabularFileCache.get_cache_directory(create_if_missing=False)
+        if cache_dir is None or not isdir(cache_dir):
+            return (0, 0)
+
+        if valid_md5s is not None:
+            valid_md5s = set(valid_md5s)
+
+        current_time = time.time()
+        num_checked = 0
+        num_removed = 0
+        for fname in os.listdir(cache_dir):
+            fullpath = join(cache_dir, fname)
+            num_checked += 1
+
+            try:
+                is_stale = (current_time - getmtime(fullpath)) > stale_age_in_seconds
+            except OSError:
+                continue
+
+            if not is_stale and valid_md5s is not None:
+                is_stale = fname.split('__', 1)[0] not in valid_md5s
+
+            if is_stale and really_delete:
+                if TabularFileCache.remove_file(fullpath):
+                    num_removed += 1
+
+        return (num_checked, num_removed)
+
+    @staticmethod
+    def remove_file(fullpath):
+        """Remove a file, if it exists"""
+        try:
+            os.remove(fullpath)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,292 @@
+from __future__ import print_function
+from os.path import dirname, join
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.core import management
+from django.core.files import File
+from django.core.files.base import ContentFile
+
+from gc_apps.gis_tabular.models import TabularFileInfo
+from gc_apps.gis_tabular.tab_file_stats import TabFileStats
+from gc_apps.gis_tabular.forms import ChooseSingleColumnForm, LatLngColumnsForm
+from gc_apps.gis_tabular.column_profile import ColumnProfiler,\
+    DISTINCT_SKETCH_SIZE, get_column_info, get_join_column_suggestions,\
+    get_lat_lng_suggestions, check_join_column, check_lat_lng_column
+from gc_apps.geo_utils.tabular_reader import read_tabular_file
+from gc_apps.geo_utils.msg_util import msgt, msg
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix='gc_profile_test_')
+
+CBG_FILEPATH = join(dirname(__file__),
+                    'input',
+                    'CBG_Annual_and_Longitudinal_Measures.tab')
+
+# Column types change from chunk to chunk (chunk_size=2)
+PLACES_TABLE = """place_id\ttract\tname\tLatitude\tLongitude\tscore\tflag\tblank
+1\t25025010100\tcat\t42.35\t-71.06\t1\tTrue\t
+2\t25025010200\tdog\t42.36\t-71.05\t2\tFalse\t
+3\t\tcow\t42.37\t-191.04\t3.5\tTrue\t
+4\t25025010400\tcat\t\tunknown\t4\t\t
+5\t25025010500\tcat\t42.39\t-71.02\t\tFalse\t
+"""
+
+LAYER_CHOICES = [(1, 'Census Tracts'), (2, 'Zip codes')]
+
+
+def get_profile(content, chunk_size=None):
+    """Profile a tab delimited file, optionally in chunks"""
+    profiler = ColumnProfiler()
+    df = read_tabular_file(ContentFile(content), '\t', chunksize=chunk_size)
+    if chunk_size is None:
+        profiler.add_chunk(df)
+        column_names = df.columns.tolist()
+    else:
+        for chunk in df:
+            profiler.add_chunk(chunk)
+            column_names = chunk.columns.tolist()
+
+    return profiler.get_profile(column_names)
+
+
+class JoinTargetInfoForTest(object):
+    """Join target info: layer 1 expects 11 characters"""
+
+    def get_formatting_zero_pad_length(self, layer_id):
+        return {1: 11}.get(layer_id)
+
+
+class ColumnProfileTestCase(SimpleTestCase):
+    """
+    Test the per-column profile
+    """
+
+    def test_01_profile(self):
+        """Profile values, whole file and chunked"""
+        msgt(self.test_01_profile.__doc__)
+
+        column_profile = get_profile(PLACES_TABLE)
+        self.assertEqual([x['name'] for x in column_profile],
+                         ['place_id', 'tract', 'name', 'Latitude', 'Longitude',
+                          'score', 'flag', 'blank'])
+
+        msg('chunked profile is the same')
+        chunked_profile = get_profile(PLACES_TABLE, chunk_size=2)
+        for info, chunked_info in zip(column_profile, chunked_profile):
+            if info['name'] == 'Longitude':
+                # numbers in the 1st chunk: only the text lengths are counted
+                self.assertEqual(chunked_info['length_counts'], [[7, 2]])
+                info = dict(info, min_length=7, length_counts=[[7, 2]])
+            self.assertEqual(chunked_info, info)
+
+        tract = get_column_info(column_profile, 'tract')
+        self.assertEqual(tract['dtype'], 'float64')
+        self.assertEqual((tract['num_values'], tract['num_nulls']), (4, 1))
+        self.assertEqual(tract['num_distinct'], 4)
+        self.assertEqual((tract['min_length'], tract['max_length']), (11, 11))
+        self.assertEqual(tract['length_counts'], [[11, 4]])
+        self.assertEqual(tract['min'], 25025010100.0)
+
+        name = get_column_info(column_profile, 'name')
+        self.assertEqual((name['dtype'], name['num_distinct'], name['num_numeric']),
+                         ('object', 3, 0))
+        self.assertEqual(name['length_counts'], [[3, 5]])
+        self.assertEqual(name['min'], None)
+
+        longitude = get_column_info(column_profile, 'Longitude')
+        self.assertEqual(longitude['dtype'], 'object')
+        self.assertEqual((longitude['num_values'], longitude['num_numeric']), (5, 4))
+        self.assertEqual((longitude['num_latitude'], longitude['num_longitude']), (3, 3))
+
+        score = get_column_info(column_profile, 'score')
+        self.assertEqual((score['num_whole_numbers'], score['num_numeric']), (3, 4))
+
+        flag = get_column_info(column_profile, 'flag')
+        self.assertEqual((flag['num_values'], flag['num_numeric']), (4, 0))
+
+        blank = get_column_info(column_profile, 'blank')
+        self.assertEqual((blank['num_values'], blank['min_length']), (0, None))
+
+    def test_02_distinct_estimate(self):
+        """Distinct counts: exact for small columns, estimated for large ones"""
+        msgt(self.test_02_distinct_estimate.__doc__)
+
+        num_rows = 100000
+        df = pd.DataFrame(dict(uid=np.arange(num_rows),
+                               repeats=np.arange(num_rows) % 500))
+
+        profiler = ColumnProfiler()
+        for start in range(0, num_rows, 20000):
+            profiler.add_chunk(df.iloc[start:start + 20000])
+        column_profile = profiler.get_profile(df.columns.tolist())
+
+        repeats = get_column_info(column_profile, 'repeats')
+        self.assertEqual((repeats['num_distinct'], repeats['distinct_is_estimate']),
+                         (500, False))
+
+        uid = get_column_info(column_profile, 'uid')
+        msg('estimate: %s' % uid['num_distinct'])
+        self.assertTrue(uid['distinct_is_estimate'])
+        self.assertTrue(abs(uid['num_distinct'] - num_rows) < num_rows * 0.1)
+        self.assertTrue(uid['num_distinct'] >= DISTINCT_SKETCH_SIZE)
+
+        msg('the same value as a number and as text is counted once')
+        profiler = ColumnProfiler()
+        profiler.add_chunk(pd.DataFrame(dict(code=[123, 456])))
+        profiler.add_chunk(pd.DataFrame(dict(code=['123', 'abc', u'a\xf1o', 'x' * 5000])))
+        code = profiler.get_profile(['code'])[0]
+        self.assertEqual((code['num_values'], code['num_distinct']), (6, 5))
+        self.assertEqual((code['min_length'], code['max_length']), (3, 5000))
+        self.assertEqual(sorted(code['length_counts']), [[3, 4], [4, 1], [5000, 1]])
+
+        msg('unicode and True/False in one text column')
+        profiler = ColumnProfiler()
+        profiler.add_chunk(pd.DataFrame(dict(mixed=pd.Series([u'a\xf1o', True, 'b', u'a\xf1o'],
+                                                             dtype=object))))
+        mixed = profiler.get_profile(['mixed'])[0]
+        self.assertEqual((mixed['num_values'], mixed['num_distinct']), (4, 3))
+        self.assertEqual(sorted(mixed['length_counts']), [[1, 1], [4, 3]])
+
+    def test_03_suggestions_and_checks(self):
+        """Suggest columns; reject columns that can't map"""
+        msgt(self.test_03_suggestions_and_checks.__doc__)
+
+        column_profile = get_profile(PLACES_TABLE)
+
+        self.assertEqual(get_join_column_suggestions(column_profile),
+                         ['place_id', 'tract'])
+        self.assertEqual(get_lat_lng_suggestions(column_profile),
+                         (['Latitude'], []))
+
+        self.assertEqual(check_join_column(column_profile, 'tract', 11), None)
+        self.assertTrue(check_join_column(column_profile, 'tract', 5).find('too long') > -1)
+        self.assertTrue(check_join_column(column_profile, 'blank').find('no values') > -1)
+
+        self.assertEqual(check_lat_lng_column(column_profile, 'Latitude'), None)
+        self.assertEqual(check_lat_lng_column(column_profile, 'Longitude', False), None)
+        self.assertTrue(check_lat_lng_column(column_profile, 'tract').find('between') > -1)
+        self.assertTrue(check_lat_lng_column(column_profile, 'name').find('numbers') > -1)
+
+        # No profile, no opinion
+        self.assertEqual(get_join_column_suggestions(None), [])
+        self.assertEqual(check_join_column(None, 'tract', 5), None)
+
+    def test_04_forms(self):
+        """Column chooser forms use the profile"""
+        msgt(self.test_04_forms.__doc__)
+
+        column_profile = get_profile(PLACES_TABLE)
+        column_names = [x['name'] for x in column_profile]
+
+        msg('suggestions')
+        form = ChooseSingleColumnForm(1, LAYER_CHOICES, column_names,
+                                      column_profile=column_profile)
+        self.assertEqual(form.fields['chosen_column'].initial, 'place_id')
+        self.assertEqual(form.fields['chosen_column'].help_text, 'Suggested: place_id, tract')
+
+        form = LatLngColumnsForm(1, column_names, column_profile=column_profile)
+        self.assertEqual(form.fields['latitude'].initial, 'Latitude')
+        self.assertEqual(form.fields['longitude'].initial, None)
+
+        msg('join column checks')
+        for chosen_column, chosen_layer, is_valid in [('tract', 1, True),
+                                                      ('tract', 2, True),
+                                                      ('blank', 2, False),
+                                                      ('name', 1, True),
+                                                      ('place_id', 1, True)]:
+            form = ChooseSingleColumnForm(1, LAYER_CHOICES, column_names,
+                                          dict(tabular_file_info_id=1,
+                                               chosen_layer=chosen_layer,
+                                               chosen_column=chosen_column),
+                                          column_profile=column_profile,
+                                          join_target_info=JoinTargetInfoForTest())
+            self.assertEqual(form.is_valid(), is_valid)
+
+        # A 12 character column for an 11 character layer
+        column_profile = get_profile('bg_id_10\n250250001001\n250250001002\n')
+        form = ChooseSingleColumnForm(1, LAYER_CHOICES, ['bg_id_10'],
+                                      dict(tabular_file_info_id=1,
+                                           chosen_layer=1,
+                                           chosen_column='bg_id_10'),
+                                      column_profile=column_profile,
+                                      join_target_info=JoinTargetInfoForTest())
+        self.assertFalse(form.is_valid())
+        self.assertTrue('chosen_column' in form.errors)
+
+        msg('lat/lng checks')
+        column_profile = get_profile(PLACES_TABLE)
+        for latitude, longitude, is_valid in [('Latitude', 'Longitude', True),
+                                              ('tract', 'Longitude', False),
+                                              ('Latitude', 'name', False),
+                                              ('Latitude', 'Latitude', False)]:
+            form = LatLngColumnsForm(1, column_names,
+                                     dict(tabular_file_info_id=1,
+                                          latitude=latitude,
+                                          longitude=longitude),
+                                     column_profile=column_profile)
+            self.assertEqual(form.is_valid(), is_valid)
+
+
+@override_settings(GISFILE_SCRATCH_WORK_DIRECTORY=SCRATCH_DIR)
+class TabFileStatsProfileTestCase(TestCase):
+    """
+    The profile is computed during TabFileStats ingest
+    """
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+
+        self.tab_file_info = TabularFileInfo.objects.get(pk=14)
+        self.tab_file_info.dv_file.save(\
+                        'CBG_Annual_and_Longitudinal_Measures',
+                        File(open(CBG_FILEPATH, 'r')),
+                        save=False)
+        self.tab_file_info.column_names = None
+        self.tab_file_info.column_profile = None
+        self.tab_file_info.save()
+
+    def tearDown(self):
+        self.tab_file_info.dv_file.delete(save=False)
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    def test_01_ingest_profile(self):
+        """Full and streaming ingest save the same profile"""
+        msgt(self.test_01_ingest_profile.__doc__)
+
+        tab_file_stats = TabFileStats.create_from_tabular_info(self.tab_file_info,
+                                                               streaming=True)
+        self.assertTrue(not tab_file_stats.has_error())
+        self.assertEqual(len(tab_file_stats.column_profile), tab_file_stats.num_cols)
+
+        tabular_info = TabularFileInfo.objects.get(pk=14)
+        self.assertEqual(tabular_info.column_profile, tab_file_stats.column_profile)
+
+        bg_id = get_column_info(tabular_info.column_profile, 'bg_id_10')
+        self.assertEqual((bg_id['dtype'], bg_id['num_values'], bg_id['num_distinct']),
+                         ('object', 554, 554))
+        self.assertEqual(bg_id['length_counts'], [[12, 553], [13, 1]])
+        self.assertEqual(get_join_column_suggestions(tabular_info.column_profile)[0],
+                         'bg_id_10')
+
+        msg('whole file read: same profile')
+        tab_file_stats2 = TabFileStats.create_from_tabular_info(self.tab_file_info,
+                                                                streaming=False)
+        self.assertEqual(tab_file_stats2.num_parse_passes, 1)
+        self.assertEqual(tab_file_stats2.column_profile, tab_file_stats.column_profile)
+
+        msg('cached DataFrame: the saved profile is reused')
+        tab_file_stats3 = TabFileStats.create_from_tabular_info(self.tab_file_info,
+                                                                streaming=False)
+        self.assertEqual(tab_file_stats3.num_parse_passes, 0)
+        self.assertEqual(tab_file_stats3.column_profile, tab_file_stats.column_profile)
+
+        msg('cached (compacted) DataFrame: same profile')
+        self.tab_file_info.column_profile = None
+        tab_file_stats4 = TabFileStats.create_from_tabular_info(self.tab_file_info,
+                                                                streaming=False)
+        self.assertEqual(tab_file_stats4.num_parse_passes, 0)
+        self.assertEqual(tab_file_stats4.column_profile, tab_file_stats.column_profile)
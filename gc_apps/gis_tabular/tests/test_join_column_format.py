@@ -0,0 +1,63 @@
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+from django.test import SimpleTestCase
+
+from gc_apps.geo_utils.tabular_util import format_join_column
+from gc_apps.geo_utils.msg_util import msgt
+
+
+class JoinColumnFormatTestCase(SimpleTestCase):
+    """
+    Test the vectorized join column formatting
+    """
+
+    def test_01_numeric_columns(self):
+        """Numeric columns are converted to strings and zero padded"""
+        msgt(self.test_01_numeric_columns.__doc__)
+
+        series = pd.Series([25025010100, 6037101110, 1001020100])
+        formatted, needs_formatting = format_join_column(series, 11)
+        self.assertTrue(needs_formatting)
+        self.assertEqual(formatted.tolist(),
+                         ['25025010100', '06037101110', '01001020100'])
+
+        # No zero padding: plain conversion to string
+        formatted, needs_formatting = format_join_column(series)
+        self.assertTrue(needs_formatting)
+        self.assertEqual(formatted.tolist(),
+                         ['25025010100', '6037101110', '1001020100'])
+
+    def test_02_float_columns(self):
+        """Whole number floats (e.g. columns with blanks) format as integers"""
+        msgt(self.test_02_float_columns.__doc__)
+
+        series = pd.Series([25025010100.0, np.nan, 6037101110.0])
+        formatted, needs_formatting = format_join_column(series, 11)
+        self.assertTrue(needs_formatting)
+        self.assertEqual(formatted.tolist(),
+                         ['25025010100', '', '06037101110'])
+
+        # Real fractions are left as is
+        series = pd.Series([1.5, 22.25])
+        formatted, _needs_formatting = format_join_column(series, 5)
+        self.assertEqual(formatted.tolist(), ['001.5', '22.25'])
+
+    def test_03_string_columns(self):
+        """String columns only need formatting if padding changes a value"""
+        msgt(self.test_03_string_columns.__doc__)
+
+        series = pd.Series(['02138', '02139', None], dtype=object)
+        formatted, needs_formatting = format_join_column(series, 5)
+        self.assertFalse(needs_formatting)
+        self.assertEqual(formatted.tolist(), ['02138', '02139', ''])
+
+        formatted, needs_formatting = format_join_column(series)
+        self.assertFalse(needs_formatting)
+
+        series = pd.Series(['2138', '02139'], dtype=object)
+        formatted, needs_formatting = format_join_column(series, 5)
+        self.assertTrue(needs_formatting)
+        self.assertEqual(formatted.tolist(), ['02138', '02139'])
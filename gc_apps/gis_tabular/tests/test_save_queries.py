@@ -0,0 +1,105 @@
+"""
+Each save() of a geoconnect model is a single write:
+the md5 is set before the first insert
+"""
+from __future__ import print_function
+
+from django.test import TestCase
+from django.core import management
+
+from shared_dataverse_information.dataverse_info.models import DataverseInfo
+
+from gc_apps.gis_basic_file.models import GISDataFile
+from gc_apps.gis_shapefiles.models import ShapefileInfo, WorldMapShapefileLayerInfo
+from gc_apps.gis_tabular.models import TabularFileInfo,\
+    WorldMapJoinLayerInfo, WorldMapLatLngInfo
+from gc_apps.worldmap_connect.models import JoinTargetInformation
+from gc_apps.geo_utils.msg_util import msgt, msg
+
+
+class SaveQueryCountTestCase(TestCase):
+    """
+    Count the queries for creating and updating objects.
+    (Multi-table inheritance: ShapefileInfo and TabularFileInfo
+    also write to the GISDataFile table)
+    """
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+        self.tabular_info = TabularFileInfo.objects.get(pk=14)
+        self.join_layer_info = WorldMapJoinLayerInfo.objects.get(pk=1)
+
+    def get_gis_data_params(self, datafile_id):
+        """Dataverse params copied from the fixture's TabularFileInfo"""
+        params = dict([(field.name, getattr(self.tabular_info, field.name))\
+                       for field in DataverseInfo._meta.fields])
+        params.update(dict(datafile_id=datafile_id,
+                           registered_dataverse=self.tabular_info.registered_dataverse))
+        return params
+
+    def get_layer_params(self):
+        return dict(core_data=self.join_layer_info.core_data,
+                    attribute_data=self.join_layer_info.attribute_data,
+                    download_links=self.join_layer_info.download_links)
+
+    def test_01_gis_data_files(self):
+        """GISDataFile, ShapefileInfo, TabularFileInfo"""
+        msgt(self.test_01_gis_data_files.__doc__)
+
+        for model_class, num_tables, datafile_id in [(GISDataFile, 1, 9001),
+                                                     (ShapefileInfo, 2, 9002),
+                                                     (TabularFileInfo, 2, 9003)]:
+            msg(model_class.__name__)
+            gis_data_file = model_class(**self.get_gis_data_params(datafile_id))
+            with self.assertNumQueries(num_tables):
+                gis_data_file.save()
+
+            md5 = gis_data_file.md5
+            self.assertEqual(len(md5), 32)
+            self.assertEqual(model_class.objects.get(md5=md5).id, gis_data_file.id)
+
+            # Update: same md5
+            gis_data_file.datafile_label = 'updated'
+            with self.assertNumQueries(num_tables):
+                gis_data_file.save()
+            self.assertEqual(model_class.objects.get(pk=gis_data_file.id).md5, md5)
+
+    def test_02_md5s_unique(self):
+        """Different objects, different md5s"""
+        msgt(self.test_02_md5s_unique.__doc__)
+
+        md5s = set([TabularFileInfo.objects.create(**self.get_gis_data_params(9010)).md5\
+                    for _ in range(3)])
+        self.assertEqual(len(md5s), 3)
+
+    def test_03_layer_infos(self):
+        """WorldMap layer info objects"""
+        msgt(self.test_03_layer_infos.__doc__)
+
+        shapefile_info = ShapefileInfo.objects.create(**self.get_gis_data_params(9004))
+
+        layer_infos = [\
+            WorldMapShapefileLayerInfo(shapefile_info=shapefile_info, **self.get_layer_params()),
+            WorldMapJoinLayerInfo(tabular_info=self.tabular_info, **self.get_layer_params()),
+            WorldMapLatLngInfo(tabular_info=self.tabular_info, **self.get_layer_params())]
+
+        for layer_info in layer_infos:
+            msg(layer_info.__class__.__name__)
+            with self.assertNumQueries(1):
+                layer_info.save()
+            self.assertEqual(layer_info.layer_name, 'geonode:j_election_pr_election_wa')
+            self.assertEqual(len(layer_info.md5), 32)
+
+            md5 = layer_info.md5
+            with self.assertNumQueries(1):
+                layer_info.save()
+            self.assertEqual(layer_info.md5, md5)
+
+    def test_04_join_target_information(self):
+        """JoinTargetInformation"""
+        msgt(self.test_04_join_target_information.__doc__)
+
+        jt_info = JoinTargetInformation(name='test', target_info={})
+        with self.assertNumQueries(1):
+            jt_info.save()
+        self.assertTrue(jt_info.id is not None)
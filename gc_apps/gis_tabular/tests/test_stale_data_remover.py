@@ -0,0 +1,160 @@
+from __future__ import print_function
+from datetime import timedelta
+from unittest import skipIf
+
+import boto3
+try:
+    from moto import mock_s3
+except ImportError:
+    mock_s3 = None
+
+from django.test import TestCase, override_settings
+from django.core import management
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from gc_apps.gis_tabular.models import TabularFileInfo, WorldMapJoinLayerInfo
+from gc_apps.geo_utils import stale_data_remover
+from gc_apps.geo_utils.stale_data_remover import StaleDataRemover
+from gc_apps.geo_utils.msg_util import msgt, msg
+
+STALE_SECONDS = 60 * 60
+
+
+class StaleDataRemoverTestCase(TestCase):
+    """
+    Test bulk (queryset) stale data removal
+    """
+
+    def setUp(self):
+        # Fixture objects were last modified in 2016
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+
+        # Recently used
+        TabularFileInfo.objects.filter(pk=14).update(modified=timezone.now())
+
+        # Stale, with a file
+        self.stale_info = TabularFileInfo.objects.get(pk=15)
+        self.stale_info.dv_file.save('stale_file.tab', ContentFile('a\tb\n1\t2\n'))
+        TabularFileInfo.objects.filter(pk=15).update(\
+                        modified=timezone.now() - timedelta(seconds=STALE_SECONDS * 2))
+        self.stale_file_name = self.stale_info.dv_file.name
+
+    def tearDown(self):
+        storage = self.stale_info.dv_file.storage
+        if storage.exists(self.stale_file_name):
+            storage.delete(self.stale_file_name)
+
+    def test_01_bulk_check_only(self):
+        """Without really_delete, stale objects are only counted"""
+        msgt(self.test_01_bulk_check_only.__doc__)
+
+        remover = StaleDataRemover(really_delete=False, bulk=True)
+        remover.remove_geoconnect_objects(STALE_SECONDS)
+
+        self.assertEqual(TabularFileInfo.objects.count(), 7)
+        self.assertEqual(remover.num_objects_removed, 0)
+        self.assertTrue('  > Stale objects found: 6' in remover.message_lines)
+        self.assertTrue(self.stale_info.dv_file.storage.exists(self.stale_file_name))
+
+    def test_02_bulk_delete(self):
+        """Stale objects are deleted in batches, with their files"""
+        msgt(self.test_02_bulk_delete.__doc__)
+
+        remover = StaleDataRemover(really_delete=True, bulk=True,
+                                   batch_size=4, num_file_workers=2)
+        remover.remove_geoconnect_objects(STALE_SECONDS)
+
+        self.assertEqual(list(TabularFileInfo.objects.values_list('pk', flat=True)), [14])
+        self.assertEqual(WorldMapJoinLayerInfo.objects.count(), 0)
+
+        self.assertEqual(remover.removed_counts['gis_tabular.TabularFileInfo'], 6)
+        self.assertEqual(remover.removed_counts['gis_tabular.WorldMapJoinLayerInfo'], 1)
+        self.assertEqual(remover.num_files_removed, 1)
+        self.assertEqual(remover.num_file_errors, 0)
+        self.assertFalse(self.stale_info.dv_file.storage.exists(self.stale_file_name))
+
+        # No per-object lines
+        self.assertTrue(len(remover.message_lines) < 40)
+
+
+TEST_BUCKET = 'geoconnect-test-bucket'
+
+
+@skipIf(mock_s3 is None, 'moto is not installed')
+@override_settings(\
+    DEFAULT_FILE_STORAGE='storages.backends.s3boto3.S3Boto3Storage',
+    AWS_ACCESS_KEY_ID='test-key',
+    AWS_SECRET_ACCESS_KEY='test-secret',
+    AWS_STORAGE_BUCKET_NAME=TEST_BUCKET,
+    AWS_S3_REGION_NAME='us-east-1')
+class StaleS3DataRemoverTestCase(TestCase):
+    """
+    Test the S3 orphaned file check against a mock S3 (moto)
+    """
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+
+        TabularFileInfo.objects.filter(pk=14).update(\
+                        dv_file='dv_files/2016/12/05/keep.tab',
+                        dv_join_file='dv_files/join/2016/12/05/keep_join.tab')
+
+        self.mock_s3 = mock_s3()
+        self.mock_s3.start()
+
+        self.s3_client = boto3.client('s3', region_name='us-east-1')
+        self.s3_client.create_bucket(Bucket=TEST_BUCKET)
+
+        self.keep_keys = ['dv_files/2016/12/05/keep.tab',
+                          'dv_files/join/2016/12/05/keep_join.tab',
+                          'other/not_checked.txt']
+        self.orphan_keys = ['dv_files/2016/12/05/orphan_%s.tab' % idx\
+                            for idx in range(5)]
+        for key in self.keep_keys + self.orphan_keys:
+            self.s3_client.put_object(Bucket=TEST_BUCKET, Key=key, Body='a\tb\n')
+
+    def tearDown(self):
+        self.mock_s3.stop()
+
+    def get_bucket_keys(self):
+        resp = self.s3_client.list_objects_v2(Bucket=TEST_BUCKET)
+        return sorted([s3_obj['Key'] for s3_obj in resp.get('Contents', [])])
+
+    def test_01_recent_files_kept(self):
+        """Files modified within the stale age are kept"""
+        msgt(self.test_01_recent_files_kept.__doc__)
+
+        remover = StaleDataRemover(really_delete=True)
+        remover.remove_s3_data(STALE_SECONDS)
+
+        self.assertEqual(remover.num_s3_checked, 7)
+        self.assertEqual(remover.num_s3_orphans, 0)
+        self.assertEqual(len(self.get_bucket_keys()), 8)
+
+    def test_02_orphans_deleted(self):
+        """Orphaned files under dv_files/ are deleted in batches"""
+        msgt(self.test_02_orphans_deleted.__doc__)
+
+        ok_names = StaleDataRemover().get_existing_file_names_for_s3_check()
+        self.assertTrue(isinstance(ok_names, set))
+        self.assertTrue('dv_files/2016/12/05/keep.tab' in ok_names)
+
+        msg('check only')
+        remover = StaleDataRemover(really_delete=False)
+        remover.remove_s3_data(-1)
+        self.assertEqual(remover.num_s3_orphans, 5)
+        self.assertEqual(len(self.get_bucket_keys()), 8)
+
+        msg('delete: 2 keys per request')
+        delete_batch_size = stale_data_remover.S3_DELETE_BATCH_SIZE
+        stale_data_remover.S3_DELETE_BATCH_SIZE = 2
+        try:
+            remover = StaleDataRemover(really_delete=True)
+            remover.remove_s3_data(-1)
+        finally:
+            stale_data_remover.S3_DELETE_BATCH_SIZE = delete_batch_size
+
+        self.assertEqual(remover.num_s3_removed, 5)
+        self.assertEqual(remover.num_s3_errors, 0)
+        self.assertEqual(self.get_bucket_keys(), sorted(self.keep_keys))
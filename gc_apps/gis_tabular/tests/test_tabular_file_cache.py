@@ -0,0 +1,106 @@
+from __future__ import print_function
+from os.path import dirname, isfile, join
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.core import management
+from django.core.files import File
+
+from gc_apps.gis_tabular.models import TabularFileInfo
+from gc_apps.gis_tabular.tab_file_stats import TabFileStats
+from gc_apps.gis_tabular.tabular_file_cache import TabularFileCache
+from gc_apps.geo_utils.msg_util import msgt
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix='gc_cache_test_')
+
+
+@override_settings(GISFILE_SCRATCH_WORK_DIRECTORY=SCRATCH_DIR)
+class TabularFileCacheTestCase(TestCase):
+    """
+    Test the parsed DataFrame cache
+    """
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+
+        self.tab_file_info = TabularFileInfo.objects.get(pk=14)
+        cbg_filepath = join(dirname(__file__),
+                            'input',
+                            'CBG_Annual_and_Longitudinal_Measures.tab')
+        self.tab_file_info.dv_file.save(\
+                        'CBG_Annual_and_Longitudinal_Measures',
+                        File(open(cbg_filepath, 'r')),
+                        save=False)
+        self.tab_file_info.column_names = None
+        self.tab_file_info.save()
+
+    def tearDown(self):
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    def test_01_stats_use_cache(self):
+        """TabFileStats caches the DataFrame and reuses it"""
+        msgt(self.test_01_stats_use_cache.__doc__)
+
+        tab_file_stats = TabFileStats.create_from_tabular_info(self.tab_file_info)
+        self.assertTrue(not tab_file_stats.has_error())
+        self.assertEqual(tab_file_stats.num_parse_passes, 1)
+
+        # The key includes the rewritten (renamed columns) file
+        cache_filepath = TabularFileCache.get_cache_filepath(self.tab_file_info)
+        self.assertTrue(cache_filepath.startswith(SCRATCH_DIR))
+        self.assertTrue(isfile(cache_filepath))
+
+        # 2nd time: no parsing
+        tab_file_stats2 = TabFileStats.create_from_tabular_info(self.tab_file_info)
+        self.assertTrue(not tab_file_stats2.has_error())
+        self.assertEqual(tab_file_stats2.num_parse_passes, 0)
+        self.assertEqual(tab_file_stats2.num_rows, 554)
+        self.assertEqual(tab_file_stats2.column_names,
+                         tab_file_stats.column_names)
+
+        df = TabularFileCache.read_data_frame(self.tab_file_info)
+        self.assertEqual(len(df.index), 554)
+
+    def test_02_remove_stale_files(self):
+        """Cache files are removed when the file changes or is orphaned"""
+        msgt(self.test_02_remove_stale_files.__doc__)
+
+        TabularFileCache.read_data_frame(self.tab_file_info)
+        cache_filepath = TabularFileCache.get_cache_filepath(self.tab_file_info)
+        self.assertTrue(isfile(cache_filepath))
+
+        # Not stale
+        self.assertEqual(TabularFileCache.remove_stale_files(\
+                            60, valid_md5s=[self.tab_file_info.md5]),
+                         (1, 0))
+
+        # Not tied to a TabularFileInfo md5
+        self.assertEqual(TabularFileCache.remove_stale_files(\
+                            60, valid_md5s=[]),
+                         (1, 1))
+        self.assertTrue(not isfile(cache_filepath))
+
+        # Remove everything for a TabularFileInfo
+        TabularFileCache.read_data_frame(self.tab_file_info)
+        self.assertEqual(TabularFileCache.clear(self.tab_file_info), 1)
+        self.assertEqual(os.listdir(TabularFileCache.get_cache_directory()), [])
+
+    def test_03_non_ascii_file_name(self):
+        """A non-ASCII file name in the cache key"""
+        msgt(self.test_03_non_ascii_file_name.__doc__)
+
+        # e.g. dv_file.name of u'tabla_a\xf1o.tab'
+        original_get_file_signature = TabularFileCache.__dict__['get_file_signature']
+        TabularFileCache.get_file_signature =\
+            staticmethod(lambda tabular_info: u'tabla_a\xf1o_\u0434\u0430.tab|2048|1483639920.0|\t')
+        try:
+            cache_filepath = TabularFileCache.get_cache_filepath(self.tab_file_info)
+            self.assertTrue(cache_filepath.startswith(SCRATCH_DIR))
+
+            df = TabularFileCache.read_data_frame(self.tab_file_info)
+            self.assertEqual(len(df.index), 554)
+            self.assertTrue(isfile(cache_filepath))
+        finally:
+            TabularFileCache.get_file_signature = original_get_file_signature
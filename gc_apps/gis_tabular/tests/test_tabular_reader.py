@@ -0,0 +1,89 @@
+from __future__ import print_function
+from csv import QUOTE_NONNUMERIC
+from os.path import dirname, join
+
+import numpy as np
+import pandas as pd
+
+from django.test import SimpleTestCase
+from django.core.files.base import ContentFile
+
+from gc_apps.geo_utils.tabular_reader import read_tabular_file,\
+    get_string_column_names, compact_data_frame
+from gc_apps.geo_utils.msg_util import msgt, msg
+
+CBG_FILEPATH = join(dirname(__file__),
+                    'input',
+                    'CBG_Annual_and_Longitudinal_Measures.tab')
+
+TEST_TABLE = """bg_id_10\tCT_ID_10\tcount\tscore\tneighborhood
+0250250001001\t25025000100\t1\t0.5\tAllston
+\t25025000100\t2\t1.5\tAllston
+0250250001003\t\t300\t\tBrighton
+0250250001004\t25025000200\t4\t3.25\tAllston
+0250250001005\t25025000200\t5\t4.0\tAllston
+"""
+
+
+class TabularReaderTestCase(SimpleTestCase):
+    """
+    Test the shared tabular file reader
+    """
+
+    def test_01_string_columns(self):
+        """Census ids are read as strings"""
+        msgt(self.test_01_string_columns.__doc__)
+
+        self.assertEqual(get_string_column_names(['a', 'bg_id_10', 'CT_ID_10']),
+                         ['bg_id_10', 'CT_ID_10'])
+        self.assertEqual(get_string_column_names(['a', 'bg_id_10'], string_columns=()), [])
+
+        df = read_tabular_file(ContentFile(TEST_TABLE), '\t')
+        self.assertEqual(df['bg_id_10'].tolist()[:1] + df['bg_id_10'].tolist()[2:],
+                         ['0250250001001', '0250250001003',
+                          '0250250001004', '0250250001005'])
+        self.assertTrue(pd.isnull(df['bg_id_10'][1]))
+        self.assertEqual(df['CT_ID_10'][0], '25025000100')
+
+        msg('pandas defaults')
+        df = read_tabular_file(ContentFile(TEST_TABLE), '\t', string_columns=())
+        self.assertEqual(df['bg_id_10'].dtype, np.float64)
+
+    def test_02_usecols(self):
+        """Read only some columns"""
+        msgt(self.test_02_usecols.__doc__)
+
+        df = read_tabular_file(ContentFile(TEST_TABLE), '\t', usecols=['count'])
+        self.assertEqual(df.columns.tolist(), ['count'])
+        self.assertEqual(df['count'].tolist(), [1, 2, 300, 4, 5])
+
+        msg("the caller's dtype dict isn't changed")
+        dtype = dict(count=np.float64)
+        df = read_tabular_file(ContentFile(TEST_TABLE), '\t', column_names=['bg_id_10'],
+                               dtype=dtype)
+        self.assertEqual(dtype, dict(count=np.float64))
+        self.assertEqual(df['count'].dtype, np.float64)
+        self.assertEqual(df['bg_id_10'][0], '0250250001001')
+
+    def test_03_compact(self):
+        """Compacted DataFrames: less memory, same CSV output"""
+        msgt(self.test_03_compact.__doc__)
+
+        df = read_tabular_file(ContentFile(TEST_TABLE), '\t')
+        compact_df = read_tabular_file(ContentFile(TEST_TABLE), '\t', compact=True)
+
+        self.assertEqual(compact_df['count'].dtype, np.int16)
+        self.assertEqual(compact_df['neighborhood'].dtype.name, 'category')
+        self.assertEqual(compact_df['score'].dtype, np.float64)
+
+        csv_parms = dict(quoting=QUOTE_NONNUMERIC, sep='\t', index=False)
+        self.assertEqual(compact_df.to_csv(**csv_parms), df.to_csv(**csv_parms))
+
+        msg('Dataverse file')
+        df = read_tabular_file(CBG_FILEPATH, '\t')
+        memory_before = df.memory_usage(deep=True).sum()
+        csv_before = df.to_csv(**csv_parms)
+
+        compact_data_frame(df)
+        self.assertTrue(df.memory_usage(deep=True).sum() <= memory_before)
+        self.assertEqual(df.to_csv(**csv_parms), csv_before)
@@ -0,0 +1,169 @@
+from __future__ import print_function
+from os.path import isfile
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.core import management
+from django.core.files.base import ContentFile
+from django.core.urlresolvers import reverse
+
+from gc_apps.gis_tabular.models import WorldMapJoinLayerInfo, WorldMapLatLngInfo
+from gc_apps.gis_tabular import unmapped_row_util
+from gc_apps.gis_tabular.unmapped_row_util import UnmatchedRowHelper
+from gc_apps.gis_tabular.join_key_index import JoinKeyIndex
+from gc_apps.gis_tabular.tabular_file_cache import TabularFileCache
+from gc_apps.geo_utils.msg_util import msgt, msg
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix='gc_unmatched_test_')
+
+TEST_TABLE = """animal\telection_precinct_int\ttract
+cat\t76\t25025010100
+dog\t12\t25025010200
+cow\t76\t
+pig\t8\t5025010400
+"""
+
+
+@override_settings(GISFILE_SCRATCH_WORK_DIRECTORY=SCRATCH_DIR)
+class UnmatchedRowsTestCase(TestCase):
+    """
+    Test the unmatched row preview/download using the JoinKeyIndex
+    """
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+
+        self.worldmap_info = WorldMapJoinLayerInfo.objects.get(pk=1)
+        tabular_info = self.worldmap_info.tabular_info
+        tabular_info.delimiter = '\t'
+        tabular_info.dv_file.save('election_pr.tab',
+                                  ContentFile(TEST_TABLE),
+                                  save=True)
+
+    def tearDown(self):
+        self.worldmap_info.tabular_info.dv_file.delete(save=False)
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    def get_index_filepath(self, helper):
+        return JoinKeyIndex.get_index_filepath(self.worldmap_info,
+                                               helper.table_join_attribute,
+                                               helper.zero_pad_length)
+
+    def test_01_join_column(self):
+        """Numeric join column, no formatted column"""
+        msgt(self.test_01_join_column.__doc__)
+
+        failed_rows = self.worldmap_info.get_failed_rows()
+        self.assertEqual([row[:2] for row in failed_rows], [['cat', 76], ['cow', 76]])
+
+        helper = UnmatchedRowHelper(self.worldmap_info)
+        rows = helper.get_failed_rows_as_list()
+        self.assertEqual(helper.total_row_count, 2)
+        self.assertEqual(rows[0], ['animal', 'election_precinct_int', 'tract'])
+        self.assertEqual([row[:2] for row in rows[1:]], [['cat', 76], ['cow', 76]])
+
+        msg('The index was saved next to the table')
+        index_filepath = self.get_index_filepath(helper)
+        self.assertTrue(isfile(index_filepath))
+
+        msg('CSV: the saved index is used, the join column isn\'t formatted again')
+        orig_format_join_column = unmapped_row_util.format_join_column
+        unmapped_row_util.format_join_column = None
+        try:
+            csv_string = UnmatchedRowHelper(self.worldmap_info).get_failed_rows_as_csv()
+        finally:
+            unmapped_row_util.format_join_column = orig_format_join_column
+        self.assertEqual(csv_string.splitlines(),
+                         ['animal,election_precinct_int,tract',
+                          'cat,76,25025010100.0',
+                          'cow,76,'])
+
+        msg('Index files are removed with the table cache')
+        TabularFileCache.clear(self.worldmap_info.tabular_info)
+        self.assertTrue(not isfile(index_filepath))
+
+    def test_02_formatted_column(self):
+        """Zero-padded join column: rows include the formatted column"""
+        msgt(self.test_02_formatted_column.__doc__)
+
+        core_data = self.worldmap_info.core_data
+        core_data.update(dict(table_join_attribute='tract_formatted',
+                              was_formatted_column_created=True,
+                              zero_pad_length=11,
+                              unmatched_record_count=3,
+                              unmatched_records_list='05025010400,,99,25025010100'))
+        self.worldmap_info.core_data = core_data
+        self.worldmap_info.save()
+
+        helper = UnmatchedRowHelper(self.worldmap_info, include_header_row=False)
+        self.assertTrue(not helper.has_error)
+        rows = helper.get_failed_rows_as_list()
+
+        # blank values match rows with a blank join column
+        self.assertEqual(helper.total_row_count, 3)
+        self.assertEqual([(row[0], row[-1]) for row in rows],
+                         [('cat', '25025010100'), ('cow', ''), ('pig', '05025010400')])
+
+        msg('max rows')
+        helper = UnmatchedRowHelper(self.worldmap_info, max_failed_rows_to_build=1)
+        self.assertEqual(helper.get_failed_rows_as_csv().splitlines(),
+                         ['animal,election_precinct_int,tract,tract_formatted',
+                          'cat,76,25025010100.0,25025010100'])
+        self.assertEqual(helper.total_row_count, 3)
+
+    def test_03_csv_chunks(self):
+        """CSV download: streamed in chunks, no row limit"""
+        msgt(self.test_03_csv_chunks.__doc__)
+
+        # The file is read in chunks: the whole table is never loaded
+        orig_read_data_frame = TabularFileCache.__dict__['read_data_frame']
+        TabularFileCache.read_data_frame = None
+        try:
+            helper = UnmatchedRowHelper(self.worldmap_info)
+            csv_chunks = list(helper.get_failed_rows_as_csv_chunks(chunk_size=1))
+            self.assertEqual(csv_chunks, ['animal,election_precinct_int,tract\n',
+                                          'cat,76,25025010100.0\n',
+                                          'cow,76,\n'])
+
+            msg('column dtypes from the column profile')
+            tabular_info = self.worldmap_info.tabular_info
+            tabular_info.column_profile = [dict(name='animal', dtype='object'),
+                                           dict(name='election_precinct_int', dtype='int64'),
+                                           dict(name='tract', dtype='float64')]
+            tabular_info.save()
+            helper = UnmatchedRowHelper(self.worldmap_info)
+            self.assertEqual(helper.get_column_dtypes()['tract'].name, 'float64')
+            self.assertEqual(list(helper.get_failed_rows_as_csv_chunks(chunk_size=3)),
+                             ['animal,election_precinct_int,tract\n',
+                              'cat,76,25025010100.0\ncow,76,\n'])
+        finally:
+            TabularFileCache.read_data_frame = orig_read_data_frame
+
+        msg('view')
+        response = self.client.get(reverse('download_unmatched_join_rows',
+                                           args=(self.worldmap_info.md5,)))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(''.join(response.streaming_content), ''.join(csv_chunks))
+
+    def test_04_lat_lng_download(self):
+        """Lat/Lng CSV download is streamed"""
+        msgt(self.test_04_lat_lng_download.__doc__)
+
+        unmapped_rows = [['cat', 'x', 'y'], ['dog', 200, '']]
+        lat_lng_info = WorldMapLatLngInfo(\
+                        tabular_info=self.worldmap_info.tabular_info,
+                        core_data=dict(layer_name='geonode:lat_lng',
+                                       unmapped_records_list=unmapped_rows),
+                        attribute_data=[dict(name='animal'),
+                                        dict(name='lat'),
+                                        dict(name='lng')],
+                        download_links={})
+        lat_lng_info.save()
+
+        response = self.client.get(reverse('download_unmatched_lat_lng_rows',
+                                           args=(lat_lng_info.md5,)))
+        self.assertTrue(response.streaming)
+        self.assertEqual(''.join(response.streaming_content).splitlines(),
+                         ['animal,lat,lng', 'cat,x,y', 'dog,200,'])
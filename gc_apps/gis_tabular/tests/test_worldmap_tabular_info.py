@@ -10,6 +10,7 @@ from gc_apps.gis_tabular.models import TabularFileInfo, WorldMapTabularLayerInfo
 from gc_apps.gis_tabular.tab_file_stats import TabFileStats
 from gc_apps.geo_utils.msg_util import msgt, msg
 from django.core.files import File
+from django.core.files.base import ContentFile
 
 JSON_JOIN_TEST_FILENAME = join(dirname(__file__), 'input', 'core_data_join.json')
 
@@ -98,6 +99,10 @@ class WorldMapTabularInfoTestCase(TestCase):
         tab_file_stats = TabFileStats.create_from_tabular_info(tab_file_info)
         self.assertTrue(not tab_file_stats.has_error())
 
+        # The file is parsed once, even though the columns were renamed
+        self.assertTrue(tab_file_stats.columns_renamed)
+        self.assertEqual(tab_file_stats.num_parse_passes, 1)
+
         # Make sure num_rows and num_columns are the same
         self.assertEqual(tab_file_stats.tabular_info.num_rows, 554)
         self.assertEqual(tab_file_stats.tabular_info.num_columns, 49)
@@ -131,3 +136,66 @@ class WorldMapTabularInfoTestCase(TestCase):
 
     def test_03_test_static_method(self):
         msgt(self.test_03_test_static_method.__doc__)
+
+    def test_04_streaming_stats(self):
+        """Streaming (chunked) stats match the full DataFrame stats"""
+        msgt(self.test_04_streaming_stats.__doc__)
+
+        tab_file_info = TabularFileInfo.objects.get(pk=14)
+
+        cbg_filepath = join(dirname(__file__),
+                            'input',
+                            'CBG_Annual_and_Longitudinal_Measures.tab')
+        tab_file_info.dv_file.save(\
+                        'CBG_Annual_and_Longitudinal_Measures',
+                        File(open(cbg_filepath, 'r')),
+                        save=False)
+        tab_file_info.column_names = None
+        tab_file_info.save()
+
+        tab_file_stats = TabFileStats.create_from_tabular_info(tab_file_info,
+                                                               streaming=True)
+        self.assertTrue(not tab_file_stats.has_error())
+        self.assertTrue(tab_file_stats.streaming)
+        self.assertTrue(tab_file_stats.columns_renamed)
+        self.assertEqual(tab_file_stats.num_parse_passes, 1)
+
+        self.assertEqual(tab_file_info.num_rows, 554)
+        self.assertEqual(tab_file_info.num_columns, 49)
+        self.assertEqual(tab_file_info.column_names[:3],
+                         ['bg_id_10', 'dissens_2010', 'publicdenigration_2010'])
+        self.assertEqual(len(tab_file_stats.preview_rows), 5)
+
+        # Only the header was rewritten: quoted like the rows, only where needed
+        tab_file_info.dv_file.open('rb')
+        header_line = tab_file_info.dv_file.readline()
+        tab_file_info.dv_file.close()
+        self.assertTrue(header_line.startswith('bg_id_10\tdissens_2010\t'))
+        self.assertEqual(header_line.find('"'), -1)
+
+        # The rewritten file has the normalized header -- and the same stats
+        full_stats = TabFileStats.create_from_tabular_info(tab_file_info,
+                                                           streaming=False)
+        self.assertTrue(not full_stats.has_error())
+        self.assertTrue(not full_stats.columns_renamed)
+        self.assertEqual(full_stats.num_rows, tab_file_stats.num_rows)
+        self.assertEqual(full_stats.column_names, tab_file_stats.column_names)
+        self.assertEqual(full_stats.preview_rows, tab_file_stats.preview_rows)
+
+    def test_05_parse_error(self):
+        """A row with too many values is reported as an error"""
+        msgt(self.test_05_parse_error.__doc__)
+
+        tab_file_info = TabularFileInfo.objects.get(pk=14)
+        tab_file_info.dv_file.save('bad_rows.tab',
+                                   ContentFile('a\tb\n1\t2\n3\t4\t5\n'),
+                                   save=False)
+
+        for streaming in (False, True):
+            msg('streaming: %s' % streaming)
+            tab_file_stats = TabFileStats.create_from_tabular_info(tab_file_info,
+                                                                   streaming=streaming)
+            self.assertTrue(tab_file_stats.has_error())
+            self.assertTrue(tab_file_stats.error_message.find('too many values') > -1)
+
+        tab_file_info.dv_file.delete(save=False)
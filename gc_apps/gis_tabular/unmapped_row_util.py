@@ -6,20 +6,30 @@ of the keys that failed to map.
 - Was there a transform?
 -
 """
+import numpy as np
 import pandas as pd
 
 
 from gc_apps.gis_tabular.models import WorldMapJoinLayerInfo
-from gc_apps.geo_utils.file_field_helper import get_file_path_or_url
+from gc_apps.gis_tabular.tabular_file_cache import TabularFileCache
+from gc_apps.gis_tabular.join_key_index import JoinKeyIndex
 
 from gc_apps.geo_utils.tabular_util import get_orig_column_name,\
-        is_pandas_dtype_numeric
+        format_join_column, get_column_dtype, FORMATTED_COLUMN_EXTENSION
+from gc_apps.geo_utils.tabular_reader import read_tabular_file
+from gc_apps.geo_utils.file_field_helper import get_file_path_or_url,\
+        open_file_path_or_url
 from gc_apps.geo_utils.msg_util import msgt, msg
 
+import logging
+LOGGER = logging.getLogger(__name__)
+
 
-MAX_FAILED_ROWS_TO_BUILD = 5000
 MAX_FAILED_ROWS_TO_DISPLAY = 20
 
+# Rows per chunk when streaming the failed rows as CSV
+CSV_CHUNK_ROWS = 2000
+
 class UnmatchedRowHelper(object):
     """
     Used to display failed rows (limited number) as well as
@@ -30,8 +40,8 @@ class UnmatchedRowHelper(object):
             "worldmap_info must be a WorldMapJoinLayerInfo object"
 
         self.show_all_failed_rows = kwargs.get('show_all_failed_rows', False)
-        self.max_failed_rows_to_build =\
-            kwargs.get('max_failed_rows_to_build', MAX_FAILED_ROWS_TO_BUILD)
+        # default: no limit
+        self.max_failed_rows_to_build = kwargs.get('max_failed_rows_to_build', None)
 
         self.max_failed_rows_to_display =\
             kwargs.get('max_failed_rows_to_display', MAX_FAILED_ROWS_TO_DISPLAY)
@@ -62,6 +72,12 @@ class UnmatchedRowHelper(object):
         self.has_error = True
         self.error_message = err_msg
 
+    def add_parse_error(self, ex_obj):
+        """Set error message for a pandas parse error"""
+        self.add_error_msg(('Could not process the file.'
+                            ' At least one row had too many values.'
+                            ' (error: %s)') % ex_obj.message)
+
     def run_check(self):
         """Check for unmatched rows"""
         self.check_for_unmatched_rows()
@@ -126,113 +142,278 @@ class UnmatchedRowHelper(object):
             self.zero_pad_length = None
 
 
-    def build_failed_rows(self, as_csv=False):
+    def get_join_key_series(self, df):
         """
-        Scenario 1: Filter rows in the original file matching the join column
-                against the values list
+        Return the join column used for the WorldMap join or None
+        (df: see "read_join_key_columns")
+
+        Scenario 1: No formatted column--use the join column as is
 
-        Scenario 2: New column was created (zero-padded, etc).  Add that new column
-                    and then filter rows using that new column and the values list
+        Scenario 2: A formatted column was created (zero-padded, etc).
+                    Rebuild it, as the TableJoinMapMaker did
         """
-        if self.has_error:
+        if self.was_formatted_column_created is False and\
+            self.table_join_attribute in df.columns:
+            return df[self.table_join_attribute]
+
+        orig_column_name = get_orig_column_name(self.table_join_attribute)
+
+        # make sure the column name exists
+        if not orig_column_name in df.columns:
+            error_msg = ('Attempted to build failed rows but'
+                         ' original column name not found: [%s]')\
+                         % orig_column_name
+            LOGGER.error(error_msg)
+            self.add_error_msg(error_msg)
             return None
 
+        formatted_column, _needs_formatting = format_join_column(\
+                                            df[orig_column_name],
+                                            self.zero_pad_length)
+        return formatted_column
+
+    def read_join_key_columns(self):
+        """
+        Read only the join column--and its original column, if a formatted
+        column was created.  pandas' default types are used, as they are
+        when the TableJoinMapMaker formats the column
+        """
+        join_columns = set([self.table_join_attribute])
+        if self.table_join_attribute.endswith(FORMATTED_COLUMN_EXTENSION):
+            join_columns.add(get_orig_column_name(self.table_join_attribute))
+
         tabular_info = self.worldmap_info.tabular_info
 
+        # A list of names in the file: pandas raises a ValueError
+        # for names that aren't.  (If unknown, read every column)
+        usecols = [x for x in (tabular_info.column_names or [])\
+                   if x in join_columns]
+
+        return read_tabular_file(get_file_path_or_url(tabular_info.dv_file),
+                                 tabular_info.delimiter,
+                                 usecols=usecols or None,
+                                 string_columns=())
+
+    def get_join_key_index(self):
+        """
+        Return the JoinKeyIndex for this layer: load the saved index
+        or build it and save it for the next preview or download
+        """
+        index_filepath = JoinKeyIndex.get_index_filepath(\
+                                self.worldmap_info,
+                                self.table_join_attribute,
+                                self.zero_pad_length)
+
+        join_key_index = JoinKeyIndex.load(index_filepath)
+        if join_key_index is not None:
+            return join_key_index
+
+        key_series = self.get_join_key_series(self.read_join_key_columns())
+        if key_series is None:
+            return None
+
+        join_key_index = JoinKeyIndex.build(key_series)
+        join_key_index.save(index_filepath)
+
+        return join_key_index
+
+    def get_failed_row_lookup(self):
+        """
+        Look up the unmatched values in the JoinKeyIndex.
+
+        Returns (row offsets, join key of each row), in file order, or None
+        """
+        if self.has_error:
+            return None
+
         try:
-            df = pd.read_csv(get_file_path_or_url(tabular_info.dv_file),
-                             sep=tabular_info.delimiter)
-        except pd.parser.CParserError as ex_obj:
-            err_msg = ('Could not process the file.'
-                       ' At least one row had too many values.'
-                       ' (error: %s)' % ex_obj.message)
-            self.add_error(err_msg)
+            join_key_index = self.get_join_key_index()
+        except pd.errors.ParserError as ex_obj:
+            self.add_parse_error(ex_obj)
             return None
 
-        # ------------------------------------------------------
-        # No formatted column created! Filter values and return
-        # ------------------------------------------------------
+        if join_key_index is None:
+            return None
 
-        if self.was_formatted_column_created is False and self.table_join_attribute in df.columns:
+        row_offsets, row_keys = join_key_index.lookup(self.unmatched_record_values)
+        self.total_row_count = len(row_offsets)
 
+        return (row_offsets, row_keys)
 
-            if is_pandas_dtype_numeric(df[self.table_join_attribute].dtype):
-                unmatched_vals = self.convert_values_to_numeric(self.unmatched_record_values)
-            else:
-                unmatched_vals = self.unmatched_record_values
+    def get_failed_row_offsets(self):
+        """
+        For previews: the cached table and the failed rows' offsets.
 
-            df_filtered = df.loc[df[self.table_join_attribute].isin(unmatched_vals)]
-            self.total_row_count = len(df_filtered.index)
+        Returns (DataFrame, row offsets, join key of each row) or None
+        """
+        if self.has_error:
+            return None
 
-            if as_csv:
-                df_filtered = df_filtered[:self.max_failed_rows_to_build]
-                return df_filtered.to_csv(index=False, header=True)
+        # Read the table before the index: if the table cache is
+        # rebuilt, older index files are removed
+        try:
+            df = TabularFileCache.read_data_frame(self.worldmap_info.tabular_info)
+        except pd.errors.ParserError as ex_obj:
+            self.add_parse_error(ex_obj)
+            return None
 
-            # Return the data as a list of lists
-            #
-            if self.max_failed_rows_to_display and self.max_failed_rows_to_display > 0:
-                df_filtered = df_filtered[:self.max_failed_rows_to_display]
+        failed_row_info = self.get_failed_row_lookup()
+        if failed_row_info is None:
+            return None
 
-            return df_filtered.values.tolist()
+        return (df,) + failed_row_info
 
-        # ------------------------------------------------------
-        # Hasty attempt, only working with zero padded items
-        # ------------------------------------------------------
-        if self.zero_pad_length is None:
-            func_col_fmt = lambda x: '%s' % x
-        else:
-            zero_pad_fmt = '{0:0>%s}' % self.zero_pad_length
-            func_col_fmt = lambda x: zero_pad_fmt.format(x)
+    def get_failed_rows_frame(self, df, row_offsets, row_keys):
+        """
+        Pull rows from the table.
+        If a formatted column was created, it's added to the rows.
+        """
+        df_failed = df.take(row_offsets)
 
-        # ----------------------------------
-        # make the column
-        # ----------------------------------
-        orig_column_name = get_orig_column_name(self.table_join_attribute)
+        if not self.table_join_attribute in df_failed.columns:
+            df_failed.insert(len(df_failed.columns),
+                             self.table_join_attribute,
+                             row_keys)
 
-        # make sure the column name exists
-        if not orig_column_name in df.columns:
-            error_msg = ('Attempted to build failed rows but'
-                         ' original column name not found: [%s]')\
-                         % orig_column_name
-            LOGGER.error(error_msg)
+        return df_failed
+
+    def build_failed_rows(self, as_csv=False):
+        """
+        Return the failed rows as a list of lists or as a CSV string
+        """
+        failed_row_info = self.get_failed_row_offsets()
+        if failed_row_info is None:
             return None
+        (df, row_offsets, row_keys) = failed_row_info
 
-        df[self.table_join_attribute] = df[orig_column_name].apply(\
-                            lambda x: func_col_fmt(x))
+        if as_csv:
+            max_rows = self.max_failed_rows_to_build
+        else:
+            max_rows = self.max_failed_rows_to_display
+
+        if max_rows and max_rows > 0:
+            row_offsets = row_offsets[:max_rows]
+            row_keys = row_keys[:max_rows]
 
-        df2 = df.loc[df[self.table_join_attribute].isin(self.unmatched_record_values)]
-        self.total_row_count = len(df2.index)
+        df_failed = self.get_failed_rows_frame(df, row_offsets, row_keys)
 
         # Return the data as a CSV file
         #
         if as_csv:
-            df2 = df2[:self.max_failed_rows_to_build]
-
-            return df2.to_csv(index=False, header=self.include_header_row)
+            return df_failed.to_csv(index=False, header=self.include_header_row)
 
         # Return the data as a list of lists
         #
-        if self.max_failed_rows_to_display and self.max_failed_rows_to_display > 0:
-            df2 = df2[:self.max_failed_rows_to_display]
-
         if self.include_header_row:
-            return [df2.columns.tolist()] + df2.values.tolist()
-        else:
-            return df2.values.tolist()
-
-
-    def convert_values_to_numeric(self, val_list):
-        """If appropriate, convert values to numeric"""
-        assert val_list is not None, 'val_list cannot be None'
-
-        updated_list = []
-        for val in val_list:
-            if isinstance(val, (str, unicode)):
-                try:
-                    new_val = int(val)
-                except ValueError:
-                    new_val = float(val)
-                updated_list.append(new_val)
-            else:
-                updated_list.append(val)
-        return updated_list
+            return [df_failed.columns.tolist()] + df_failed.values.tolist()
+
+        return df_failed.values.tolist()
+
+    def read_table_chunks(self, dtype=None, chunk_size=CSV_CHUNK_ROWS):
+        """
+        Yield the table as DataFrames of "chunk_size" rows.
+        Parse errors are passed on to the caller
+        """
+        tabular_info = self.worldmap_info.tabular_info
+
+        fh = open_file_path_or_url(tabular_info.dv_file)
+        if fh is None:
+            raise IOError('The file could not be found.')
+
+        try:
+            reader = read_tabular_file(fh,
+                                       tabular_info.delimiter,
+                                       column_names=tabular_info.column_names or None,
+                                       dtype=dtype,
+                                       chunksize=chunk_size)
+            for chunk in reader:
+                yield chunk
+        finally:
+            fh.close()
+
+    def get_column_dtypes(self):
+        """
+        Return the dtype of each column--as if the whole table were
+        read--so every chunk is written the same way. e.g. an integer
+        column with blanks is always written as floats
+
+        Uses the TabularFileInfo.column_profile.  Files ingested
+        before there was a profile take an extra pass over the file
+        """
+        column_profile = self.worldmap_info.tabular_info.column_profile
+        if column_profile:
+            return dict((info['name'], np.dtype(info['dtype']))\
+                        for info in column_profile)
+
+        chunk_dtypes = {}
+        for chunk in self.read_table_chunks():
+            for column_name, dtype in chunk.dtypes.iteritems():
+                chunk_dtypes.setdefault(column_name, []).append(dtype)
+
+        return dict((column_name, get_column_dtype(dtypes))\
+                    for column_name, dtypes in chunk_dtypes.items())
+
+    def get_failed_rows_as_csv_chunks(self, chunk_size=CSV_CHUNK_ROWS):
+        """
+        Return a generator of CSV strings--e.g. for a StreamingHttpResponse.
+
+        The table is read "chunk_size" rows at a time and only the
+        failed rows of each chunk are kept, so memory stays the same
+        however large the table.  Every failed row may be downloaded.
+
+        Returns None if the rows can't be retrieved. (check "has_error")
+        """
+        assert self.has_unmatched_rows,\
+            'Before calling this, check that "has_unmatched_rows" is True'
+
+        failed_row_info = self.get_failed_row_lookup()
+        if failed_row_info is None:
+            return None
+        (row_offsets, row_keys) = failed_row_info
+
+        if self.max_failed_rows_to_build and self.max_failed_rows_to_build > 0:
+            row_offsets = row_offsets[:self.max_failed_rows_to_build]
+            row_keys = row_keys[:self.max_failed_rows_to_build]
+
+        try:
+            column_dtypes = self.get_column_dtypes()
+        except pd.errors.ParserError as ex_obj:
+            self.add_parse_error(ex_obj)
+            return None
+        except IOError as ex_obj:
+            self.add_error_msg(str(ex_obj))
+            return None
+
+        def csv_chunks():
+            """Yield the header and then the failed rows of each chunk"""
+            chunks = self.read_table_chunks(column_dtypes, chunk_size)
+            chunk_start = 0
+            try:
+                for chunk in chunks:
+                    if chunk_start == 0 and self.include_header_row:
+                        yield self.get_failed_rows_frame(chunk,
+                                                         row_offsets[:0],
+                                                         row_keys[:0])\
+                                .to_csv(index=False, header=True)
+
+                    # row_offsets are sorted: find the ones in this chunk
+                    chunk_end = chunk_start + len(chunk.index)
+                    start_idx, end_idx = np.searchsorted(row_offsets,
+                                                         [chunk_start, chunk_end])
+                    if end_idx > start_idx:
+                        df_chunk = self.get_failed_rows_frame(\
+                                        chunk,
+                                        row_offsets[start_idx:end_idx] - chunk_start,
+                                        row_keys[start_idx:end_idx])
+                        yield df_chunk.to_csv(index=False, header=False)
+
+                    if end_idx == len(row_offsets):
+                        break   # no more failed rows
+                    chunk_start = chunk_end
+            except (pd.errors.ParserError, IOError) as ex_obj:
+                # The response has started: log it and end the file
+                LOGGER.error('Failed to read unmatched rows: %s', ex_obj)
+            finally:
+                chunks.close()
+
+        return csv_chunks()
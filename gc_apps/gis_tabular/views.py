@@ -9,7 +9,7 @@ import csv
 
 from django.shortcuts import render
 
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.template.loader import render_to_string
 
 from gc_apps.gis_tabular.models import TabularFileInfo,\
@@ -25,7 +25,6 @@ from gc_apps.worldmap_layers.models import WorldMapLayerInfo
 
 from gc_apps.worldmap_connect.utils import get_latest_jointarget_information,\
         get_geocode_types_and_join_layers
-from gc_apps.gis_tabular.unmapped_row_util import MAX_FAILED_ROWS_TO_BUILD
 
 from gc_apps.geo_utils.geoconnect_step_names import GEOCONNECT_STEP_KEY,\
     GEOCONNECT_STEPS, STEP1_EXAMINE, STEP2_STYLE,\
@@ -106,8 +105,7 @@ def build_map_html(request, worldmap_info):
     template_dict = get_common_lookup(request)
 
     failed_records_list = worldmap_info.get_failed_rows()
-    num_failed_download_records = min(MAX_FAILED_ROWS_TO_BUILD,\
-                            worldmap_info.get_unmapped_record_count())
+    num_failed_download_records = worldmap_info.get_unmapped_record_count()
 
 
     template_dict.update(dict(\
@@ -203,19 +201,38 @@ def download_unmatched_join_rows(request, tab_md5):
 
     kwargs = dict(show_all_failed_rows=True)
     unmatched_row_helper = UnmatchedRowHelper(worldmap_info, **kwargs)
-    csv_string = unmatched_row_helper.get_failed_rows_as_csv()
+    csv_chunks = unmatched_row_helper.get_failed_rows_as_csv_chunks()
 
     if unmatched_row_helper.has_error:
         return HttpResponse(unmatched_row_helper.error_message)
 
-    response = HttpResponse(csv_string, content_type='text/csv')
+    if csv_chunks is None:
+        return HttpResponse("Failed to retrieve the unmatched records.")
+
+    # Stream the rows: every failed row, one chunk at a time
+    #
+    response = StreamingHttpResponse(csv_chunks, content_type='text/csv')
 
     file_name = 'unmapped_rows__%s.csv' % (get_datetime_string_for_file())
     response['Content-Disposition'] = 'attachment; filename="%s"' % file_name
 
     return response
 
-    #return HttpResponse(csv_string, content_type='text/csv')
+
+class CSVEchoBuffer(object):
+    """File-like object for csv.writer: write() returns the row instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_rows(column_names, rows):
+    """Yield each row, including the column names, as a CSV string"""
+    writer = csv.writer(CSVEchoBuffer())
+
+    yield writer.writerow(column_names)
+    for row_info in rows:
+        yield writer.writerow(row_info)
 
 
 def download_unmatched_lat_lng_rows(request, tab_md5):
@@ -242,17 +259,13 @@ def download_unmatched_lat_lng_rows(request, tab_md5):
     #
     unmatched_rows = worldmap_info.core_data.get('unmapped_records_list', [])
 
-    response = HttpResponse(content_type='text/csv')
+    response = StreamingHttpResponse(iter_csv_rows(column_names, unmatched_rows),
+                                     content_type='text/csv')
 
     file_name = 'unmapped_rows__%s.csv' % (get_datetime_string_for_file())
 
     response['Content-Disposition'] = 'attachment; filename="%s"' % file_name
 
-    writer = csv.writer(response)
-    writer.writerow(column_names)
-    for row_info in unmatched_rows:
-        writer.writerow(row_info)
-
     return response
 
 
@@ -378,7 +391,8 @@ def view_tabular_file(request, tab_md5):
         form_single_column = ChooseSingleColumnForm(\
                                     tabular_file_info_id=tabular_info.id,
                                     layer_choices=available_layers_list,
-                                    column_names=tab_file_stats.column_names)
+                                    column_names=tab_file_stats.column_names,
+                                    column_profile=tab_file_stats.column_profile)
     else:
         form_single_column = None
 
@@ -388,7 +402,8 @@ def view_tabular_file(request, tab_md5):
     if tab_file_stats:
         form_lat_lng = LatLngColumnsForm(\
                             tabular_file_info_id=tabular_info.id,\
-                            column_names=tab_file_stats.column_names)
+                            column_names=tab_file_stats.column_names,\
+                            column_profile=tab_file_stats.column_profile)
     else:
         form_lat_lng = None
 
@@ -10,24 +10,14 @@ from django.views.decorators.http import require_POST
 from gc_apps.geo_utils.message_helper_json import MessageHelperJSON, format_errors_as_text
 from gc_apps.geo_utils.msg_util import msg, msgt
 
-from gc_apps.gis_basic_file.dataverse_info_service import get_dataverse_info_dict
-
 from gc_apps.gis_tabular.models import TabularFileInfo # for testing
-from gc_apps.gis_tabular.models import WorldMapTabularLayerInfo
 from gc_apps.gis_tabular.forms import LatLngColumnsForm, ChooseSingleColumnForm
 
-from gc_apps.dv_notify.metadata_updater import MetadataUpdater
-
-from gc_apps.geo_utils.geoconnect_step_names import PANEL_TITLE_MAP_DATA_FILE,\
-    PANEL_TITLE_STYLE_MAP
-
-from gc_apps.worldmap_connect.utils import get_geocode_types_and_join_layers
-
-from gc_apps.worldmap_connect.lat_lng_service import create_map_from_datatable_lat_lng
-from gc_apps.worldmap_connect.table_join_map_maker import TableJoinMapMaker
+from gc_apps.worldmap_connect.utils import get_geocode_types_and_join_layers,\
+    get_latest_jointarget_information
 
-#from gc_apps.gis_tabular.dataverse_test_info import DataverseTestInfo
-from gc_apps.gis_tabular.views import build_map_html
+from gc_apps.worldmap_connect.layer_job_service import LayerJobService
+from gc_apps.worldmap_connect.views_layer_job import start_layer_job
 
 import logging
 LOGGER = logging.getLogger(__name__)
@@ -63,11 +53,15 @@ def view_map_tabular_file_form(request):
 
     # -----------------------------------------
     # Create form with initial + POST data
+    #   - the column profile and join target info are
+    #     used to reject columns that can't join
     # -----------------------------------------
     form_single_column = ChooseSingleColumnForm(tabular_info.id,\
                     available_layers_list,\
                     tabular_info.column_names,\
-                    request.POST)
+                    request.POST,\
+                    column_profile=tabular_info.column_profile,\
+                    join_target_info=get_latest_jointarget_information())
 
     # -----------------------------------------
     # Check the form's validity
@@ -80,71 +74,19 @@ def view_map_tabular_file_form(request):
     #print 'cleaned_data', form_single_column.cleaned_data
 
     # -----------------------------------------
-    # Get Dataverse info dict
-    # -----------------------------------------
-    dataverse_metadata_dict = get_dataverse_info_dict(tabular_info)
-
-    # -----------------------------------------
-    # Use the WorldMap API and
+    # Create a job to use the WorldMap API and
     # try to create a layer
     # -----------------------------------------
-    tj_map_maker = TableJoinMapMaker(tabular_info,
-                        dataverse_metadata_dict,
+    layer_job = LayerJobService.create_table_join_job(\
+                        tabular_info,
                         form_single_column.cleaned_data.get('chosen_column'),
-                        form_single_column.cleaned_data.get('chosen_layer'),
-                        )
-    success = tj_map_maker.run_map_create()
-    msg('success: %s' % success)
-    if not success:
-        json_msg = MessageHelperJSON.get_json_fail_msg(\
-                    'Sorry! ' + tj_map_maker.get_error_msg())
-        msg('error msg: %s' % json_msg)
-        return HttpResponse(json_msg, content_type="application/json", status=200)
-
-    # -----------------------------------------
-    # Succeeded!  Create a WorldMapTabularLayerInfo object
-    # -----------------------------------------
-    worldmap_tabular_info = WorldMapTabularLayerInfo.build_from_worldmap_json(tabular_info,\
-                                tj_map_maker.get_map_info())
-
-
-    if worldmap_tabular_info is None:
-        LOGGER.error("Failed to create WorldMapTabularLayerInfo using %s",\
-            tj_map_maker.get_map_info())
-        user_msg = 'Sorry! Failed to create map. Please try again. (code: s1)'
-        json_msg = MessageHelperJSON.get_json_fail_msg(user_msg)
-        return HttpResponse(json_msg, content_type="application/json", status=200)
+                        form_single_column.cleaned_data.get('chosen_layer'))
 
     # -----------------------------------------
-    # Notify Dataverse of the new map
+    # Return the job status (or the map HTML,
+    #   if the job has already run)
     # -----------------------------------------
-    MetadataUpdater.run_update_via_popen(worldmap_tabular_info)
-
-    # -----------------------------------------
-    # Build the Map HTML chunk to replace the form
-    # -----------------------------------------
-    map_html, user_message_html = build_map_html(request, worldmap_tabular_info)
-    if map_html is None:    # Failed!  Send an error
-        LOGGER.error("Failed to create map HTML using WorldMapTabularLayerInfo: %s (%d)",\
-            worldmap_tabular_info, worldmap_tabular_info.id)
-        user_msg = 'Sorry! Failed to create map. Please try again. (code: s2)'
-        json_msg = MessageHelperJSON.get_json_fail_msg(user_msg)
-        return HttpResponse(json_msg, content_type="application/json", status=200)
-
-    # -----------------------------------------
-    # Looks good.  In the JSON response, send
-    #   back the map HTML
-    # -----------------------------------------
-    data_dict = dict(map_html=map_html,
-                user_message_html=user_message_html,
-                id_main_panel_title=PANEL_TITLE_STYLE_MAP)
-
-    json_msg = MessageHelperJSON.get_json_success_msg("great job", data_dict=data_dict)
-
-    return HttpResponse(json_msg, content_type="application/json", status=200)
-
-    #json_msg = MessageHelperJSON.get_json_success_msg('You got here! (view_map_tabular_file_form)')
-    #return HttpResponse(json_msg, content_type="application/json", status=200)
+    return start_layer_job(request, layer_job)
 
 
 @require_POST
@@ -166,7 +108,8 @@ def view_process_lat_lng_form(request):
 
     form_lat_lng = LatLngColumnsForm(tabular_info.id,\
                         tabular_info.column_names,\
-                        request.POST)
+                        request.POST,\
+                        column_profile=tabular_info.column_profile)
     if not form_lat_lng.is_valid():
         json_msg = MessageHelperJSON.get_json_fail_msg(\
                     format_errors_as_text(form_lat_lng,\
@@ -176,80 +119,17 @@ def view_process_lat_lng_form(request):
         return HttpResponse(json_msg, content_type="application/json", status=200)
 
 
-    (success, worldmap_data_or_err_msg) = create_map_from_datatable_lat_lng(\
-                        tabular_info,\
-                        form_lat_lng.get_latitude_colname(),\
-                        form_lat_lng.get_longitude_colname(),\
-                        )
-
     # -----------------------------------------
-    # Failed! Send error message
-    # -----------------------------------------
-    if not success:
-        json_msg = MessageHelperJSON.get_json_fail_msg(\
-                'Sorry! ' + worldmap_data_or_err_msg)
-        return HttpResponse(json_msg, content_type="application/json", status=200)
-
-
-    # -----------------------------------------
-    # Succeeded!  Create a WorldMapTabularLayerInfo object
-    # -----------------------------------------
-    user_msg, response_data = worldmap_data_or_err_msg
-    #json_msg = MessageHelperJSON.get_json_success_msg(user_msg, data_dict=response_data)
-    #return HttpResponse(json_msg, content_type="application/json", status=200)
-
-    worldmap_latlng_info = WorldMapTabularLayerInfo.build_from_worldmap_json(tabular_info,\
-                            response_data)
-
-    if worldmap_latlng_info is None:
-        LOGGER.error("Failed to create WorldMapLatLngInfo using data: %s",\
-                    response_data)
-        user_msg = 'Sorry! Failed to create map. Please try again. (code: s4)'
-        json_msg = MessageHelperJSON.get_json_fail_msg(user_msg)
-        return HttpResponse(json_msg, content_type="application/json", status=200)
-
-
-    # -----------------------------------------
-    # Notify Dataverse of the new map
-    # -----------------------------------------
-    MetadataUpdater.run_update_via_popen(worldmap_latlng_info)
-
-    # -----------------------------------------
-    # Possible that this failed?
-    # Make sure at least 1 row mapped
-    # -----------------------------------------
-    # Skip for now!  Error in row counts for Lat/Lng!
-    """
-    if worldmap_latlng_info.did_any_rows_map() is False:
-        # Delete the worldmap_latlng_info object
-        worldmap_latlng_info.delete()
-
-        # Send back a user error message
-        user_msg = "Sorry!  We couldn't map any of those latitude and longitude values."
-        return HttpResponse(MessageHelperJSON.get_json_fail_msg(user_msg),\
-                content_type="application/json",\
-                status=200)
-    """
-    # -----------------------------------------
-    # Build the Map HTML chunk to replace the form
+    # Create a job to use the WorldMap API and
+    # try to create a layer
     # -----------------------------------------
-    map_html, user_message_html = build_map_html(request, worldmap_latlng_info)
-    if map_html is None:    # Failed!  Send an error
-        LOGGER.error("Failed to create map HTML using WorldMapLatLngInfo: %s (%d)",\
-            worldmap_latlng_info, worldmap_latlng_info.id)
-        user_msg = 'Sorry! Failed to create map. Please try again. (code: s5)'
-        json_msg = MessageHelperJSON.get_json_fail_msg(user_msg)
-        return HttpResponse(json_msg, content_type="application/json", status=200)
-
+    layer_job = LayerJobService.create_lat_lng_job(\
+                        tabular_info,
+                        form_lat_lng.get_latitude_colname(),
+                        form_lat_lng.get_longitude_colname())
 
     # -----------------------------------------
-    # Looks good.  In the JSON response, send
-    #   back the map HTML
+    # Return the job status (or the map HTML,
+    #   if the job has already run)
     # -----------------------------------------
-    data_dict = dict(map_html=map_html,
-                user_message_html=user_message_html,
-                id_main_panel_title=PANEL_TITLE_STYLE_MAP)
-
-    json_msg = MessageHelperJSON.get_json_success_msg("great job", data_dict=data_dict)
-
-    return HttpResponse(json_msg, content_type="application/json", status=200)
+    return start_layer_job(request, layer_job)
@@ -1,9 +1,20 @@
 from django.contrib import admin
 
-from gc_apps.worldmap_connect.models import JoinTargetInformation
+from gc_apps.worldmap_connect.models import JoinTargetInformation, WorldMapLayerJob
 
 class JoinTargetInformationAdmin(admin.ModelAdmin):
     save_on_top = True
     list_display = ('name', 'created', 'modified')
 
 admin.site.register(JoinTargetInformation, JoinTargetInformationAdmin)
+
+
+class WorldMapLayerJobAdmin(admin.ModelAdmin):
+    save_on_top = True
+    search_fields = ('md5', 'gis_data_md5', 'layer_md5')
+    list_display = ('job_type', 'status', 'gis_data_md5', 'worker_name',\
+                    'created', 'started', 'finished')
+    list_filter = ('status', 'job_type')
+    readonly_fields = ('md5', 'created', 'modified')
+
+admin.site.register(WorldMapLayerJob, WorldMapLayerJobAdmin)
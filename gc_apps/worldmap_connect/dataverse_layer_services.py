@@ -4,12 +4,14 @@ Calls to the WorldMap API to:
         - params: DV installation name, DV file id
     - Get layer information
         - params: DV installation name, DV file id
+        - results are cached, see "WorldMap layer lookup cache" below
     - Retrieve available join targets
 
 """
 from __future__ import print_function
 
 import sys
+import hashlib
 import logging
 import requests
 
@@ -28,6 +30,8 @@ from shared_dataverse_information.worldmap_api_helper.url_helper import\
         DELETE_TABLEJOIN
 
 from gc_apps.geo_utils.message_helper_json import MessageHelperJSON
+from gc_apps.geo_utils.http_client import http_get, http_post
+from gc_apps.geo_utils.shared_cache import SharedCache
 
 """
 Functions that interact with the WorldMap API to:
@@ -38,6 +42,50 @@ Functions that interact with the WorldMap API to:
 """
 LOGGER = logging.getLogger(__name__)
 
+# --------------------------------------
+# WorldMap layer lookup cache
+#   - Results of get_layer_info_using_dv_info by
+#     (dataverse_installation_name, datafile_id)
+#   - "Not found" results are cached for a shorter time
+#   - Cleared when a layer is created or deleted
+# --------------------------------------
+DEFAULT_LAYER_INFO_CACHE_SECONDS = 15 * 60
+DEFAULT_LAYER_NOT_FOUND_CACHE_SECONDS = 5 * 60
+
+LAYER_INFO_CACHE = SharedCache('worldmap_layer_info')
+
+
+def get_layer_info_cache_key(dataverse_installation_name, datafile_id):
+    """Hashed: installation names are urls or hostnames"""
+    key_str = '%s|%s' % (dataverse_installation_name, datafile_id)
+    if isinstance(key_str, unicode):
+        key_str = key_str.encode('utf-8')
+    return hashlib.md5(key_str).hexdigest()
+
+
+def get_layer_info_cache_timeout(layer_found):
+    """settings.WORLDMAP_LAYER_INFO_CACHE_SECONDS
+    or settings.WORLDMAP_LAYER_NOT_FOUND_CACHE_SECONDS"""
+    if layer_found:
+        return getattr(settings, 'WORLDMAP_LAYER_INFO_CACHE_SECONDS',
+                       DEFAULT_LAYER_INFO_CACHE_SECONDS)
+    return getattr(settings, 'WORLDMAP_LAYER_NOT_FOUND_CACHE_SECONDS',
+                   DEFAULT_LAYER_NOT_FOUND_CACHE_SECONDS)
+
+
+def clear_layer_info_cache(dataverse_installation_name, datafile_id):
+    """Call when a WorldMap layer is created or deleted"""
+    LAYER_INFO_CACHE.delete(\
+                get_layer_info_cache_key(dataverse_installation_name, datafile_id))
+
+
+def clear_layer_info_cache_for_gis_data(gis_data_info):
+    """clear_layer_info_cache for a GISDataFile (ShapefileInfo, TabularFileInfo, etc)"""
+    if gis_data_info is None:
+        return
+    clear_layer_info_cache(gis_data_info.dataverse_installation_name,
+                           gis_data_info.datafile_id)
+
 
 def delete_map_layer(gis_data_info, worldmap_layer_info):
     """
@@ -75,10 +123,11 @@ def delete_map_layer(gis_data_info, worldmap_layer_info):
 
     LOGGER.info('make delete request: %s', DELETE_LAYER_API_PATH)
     try:
-        r = requests.post(DELETE_LAYER_API_PATH\
+        r = http_post(DELETE_LAYER_API_PATH\
                         , data=data_params\
                         , auth=settings.WORLDMAP_ACCOUNT_AUTH\
-                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT)
+                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT\
+                        , endpoint_name='worldmap.delete_layer')
     except requests.exceptions.ConnectionError as exception_obj:
 
         err_msg = ('Failed to retrieve data from the WorldMap.'
@@ -90,6 +139,10 @@ def delete_map_layer(gis_data_info, worldmap_layer_info):
 
         return (False, err_msg)
 
+    # The layer may be gone, even if the response is an error
+    clear_layer_info_cache(data_params['dataverse_installation_name'],
+                           data_params['datafile_id'])
+
     LOGGER.debug(r.text)
     LOGGER.debug(r.status_code)
 
@@ -113,7 +166,7 @@ def delete_map_layer(gis_data_info, worldmap_layer_info):
 url = 'http://127.0.0.1:8000/dvn-layer/get-dataverse-user-layers/'
 url = 'http://127.0.0.1:8000/dvn-layer/get-existing-layer-info/'
 """
-def get_layer_info_using_dv_info(params_dict):
+def get_layer_info_using_dv_info(params_dict, use_cache=True):
     """
     Retrieve WorldMap layer information via API
 
@@ -123,6 +176,9 @@ def get_layer_info_using_dv_info(params_dict):
 
     Fail: (False, error message)
     Success: (True, python dict)
+
+    Successful results and "layer not found" results are cached.
+    (Connection errors, other status codes, etc. are not)
     """
     f = CheckForExistingLayerForm(params_dict)
     if not f.is_valid():
@@ -137,14 +193,27 @@ def get_layer_info_using_dv_info(params_dict):
     #--------------------------------------
     data_params = f.cleaned_data
 
+    #--------------------------------------
+    # Already retrieved?
+    #--------------------------------------
+    cache_key = get_layer_info_cache_key(data_params['dataverse_installation_name'],
+                                         data_params['datafile_id'])
+    if use_cache:
+        cached_result = LAYER_INFO_CACHE.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+
     #--------------------------------------
     # Make the request
     #--------------------------------------
     try:
-        resp = requests.post(GET_LAYER_INFO_BY_DATAVERSE_INSTALLATION_AND_FILE_API_PATH\
+        # Read-only POST: safe to retry
+        resp = http_post(GET_LAYER_INFO_BY_DATAVERSE_INSTALLATION_AND_FILE_API_PATH\
                         , data=data_params\
                         , auth=settings.WORLDMAP_ACCOUNT_AUTH\
-                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT)
+                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT\
+                        , endpoint_name='worldmap.get_layer_info'\
+                        , max_retries=settings.HTTP_CLIENT_MAX_RETRIES)
     except requests.exceptions.ConnectionError as exception_obj:
 
         err_msg = """Sorry! Failed to retrieve data from the WorldMap.
@@ -175,12 +244,24 @@ def get_layer_info_using_dv_info(params_dict):
             LOGGER.error(err_msg + "Status code: 200.\nResponse text: %s" % resp.text)
             return False, err_msg
 
-        return response_dict.get('success', False), response_dict
+        layer_found = response_dict.get('success', False)
+        LAYER_INFO_CACHE.set(cache_key,
+                             (layer_found, response_dict),
+                             get_layer_info_cache_timeout(layer_found))
+
+        return layer_found, response_dict
 
     #--------------------------------------
     # Response doesn't look good
     #--------------------------------------
     err_msg = "Status code: %s\nError: %s" % (resp.status_code, resp.text)
+
+    if resp.status_code == 404:
+        # Layer not found
+        LAYER_INFO_CACHE.set(cache_key,
+                             (False, err_msg),
+                             get_layer_info_cache_timeout(False))
+
     return False, err_msg
 
 
@@ -212,9 +293,10 @@ def get_join_targets():
     # Make the request
     #--------------------------------------
     try:
-        r = requests.get(GET_JOIN_TARGETS\
+        r = http_get(GET_JOIN_TARGETS\
                         , auth=settings.WORLDMAP_ACCOUNT_AUTH\
-                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT)
+                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT\
+                        , endpoint_name='worldmap.get_join_targets')
     except requests.exceptions.ConnectionError as exception_obj:
 
         err_msg = ('Sorry! Failed to retrieve data from the WorldMap.'
@@ -277,10 +359,11 @@ def delete_map_layer_by_cb_dict(dv_dict):
     """
 
     try:
-        r = requests.post(DELETE_LAYER_API_PATH\
+        r = http_post(DELETE_LAYER_API_PATH\
                         , data=dv_dict\
                         , auth=settings.WORLDMAP_ACCOUNT_AUTH\
-                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT)
+                        , timeout=settings.WORLDMAP_SHORT_TIMEOUT\
+                        , endpoint_name='worldmap.delete_layer')
     except requests.exceptions.ConnectionError as exception_obj:
 
         err_msg = ('Failed to retrieve data from the WorldMap.'
@@ -292,6 +375,10 @@ def delete_map_layer_by_cb_dict(dv_dict):
 
         return (False, err_msg)
 
+    # The layer may be gone, even if the response is an error
+    clear_layer_info_cache(dv_dict.get('dataverse_installation_name'),
+                           dv_dict.get('datafile_id'))
+
     print (r.text)
     print (r.status_code)
 
@@ -0,0 +1,282 @@
+"""
+Add a formatted join column to a tabular file, a chunk at a time.
+
+The file is never loaded as a whole:
+
+    pass 1: read the file in chunks to find each column's dtype--the
+            dtype pandas would choose reading the entire file--and
+            whether the join column's floats are all whole numbers.
+            Also decide if a formatted column is needed.  If not, stop
+    pass 2: read the file in chunks using those dtypes, format the
+            join column and append each chunk to a temp file
+
+The temp file is then saved to the TabularFileInfo.dv_join_file.
+The output is the same, byte for byte, as reading the whole file,
+adding the column and calling DataFrame.to_csv.
+
+    formatter = ChunkedJoinColumnFormatter(tabular_info, 'tract', zero_pad_length=11)
+    if formatter.write_join_file():
+        if formatter.needs_formatting:
+            # tabular_info.dv_join_file was saved
+            join_column = formatter.formatted_column_name
+    else:
+        err_msg = formatter.error_message
+"""
+from csv import QUOTE_NONNUMERIC
+from os.path import isdir
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.core.files import File
+
+from gc_apps.geo_utils.file_field_helper import open_file_path_or_url
+from gc_apps.geo_utils.tabular_reader import read_tabular_file
+from gc_apps.geo_utils.tabular_util import get_formatted_column_name,\
+    get_column_dtype, format_join_column, is_whole_number_column
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+JOIN_FILE_CHUNK_ROWS = 50000
+
+
+def is_bool_column(series):
+    """Are all the (non-null) values of a chunk's column True/False?"""
+    if series.dtype == np.bool_:
+        return True
+
+    non_null_vals = series[series.notnull()]
+    if series.dtype.kind == 'f' and len(non_null_vals) == 0:
+        return True     # all blank
+
+    if series.dtype != np.object_:
+        return False
+
+    return all(isinstance(val, (bool, np.bool_)) for val in non_null_vals)
+
+
+class ChunkedJoinColumnFormatter(object):
+    """
+    Write a copy of a TabularFileInfo.dv_file, with a formatted
+    join column, to TabularFileInfo.dv_join_file
+    """
+
+    def __init__(self, tabular_info, column_name, zero_pad_length=None, **kwargs):
+        self.tabular_info = tabular_info
+        self.column_name = column_name
+        self.formatted_column_name = get_formatted_column_name(column_name)
+        self.zero_pad_length = zero_pad_length
+        self.chunk_size = kwargs.get('chunk_size', JOIN_FILE_CHUNK_ROWS)
+
+        # set in pass 1
+        self.column_dtypes = None
+        self.object_bool_columns = []
+        self.whole_numbers = True
+        self.num_rows = 0
+
+        # set in pass 1 or, if pass 1 can't tell, in pass 2
+        self.needs_formatting = None
+
+        # error checking
+        self.has_error = False
+        self.error_message = None
+
+    def add_error(self, err_msg):
+        """Set error message"""
+        self.has_error = True
+        self.error_message = err_msg
+
+    def get_output_delimiter(self):
+        """The file is rewritten with the same delimiter"""
+        sep_char = str(self.tabular_info.delimiter)
+        if sep_char == '\\t':
+            sep_char = sep_char[1:]
+        return sep_char
+
+    def read_chunks(self, dtype=None):
+        """
+        Yield the file as DataFrames of "chunk_size" rows.
+        Parse errors are passed on to the caller
+        """
+        fh = open_file_path_or_url(self.tabular_info.dv_file)
+        if fh is None:
+            raise IOError('The file could not be found.')
+
+        try:
+            # pandas' default types: no string columns or categoricals
+            reader = read_tabular_file(fh,
+                                       self.tabular_info.delimiter,
+                                       string_columns=(),
+                                       dtype=dtype,
+                                       chunksize=self.chunk_size)
+            for chunk in reader:
+                yield chunk
+        finally:
+            fh.close()
+
+    def check_columns(self):
+        """
+        Pass 1: set the dtype of each column and, for a float join
+        column, whether all of its values are whole numbers
+        """
+        chunk_dtypes = {}
+        bool_column_names = None
+        columns = None
+        text_values_changed = False     # text join values that formatting changes
+        has_numeric_join_chunk = False
+        for chunk in self.read_chunks():
+            if columns is None:
+                columns = chunk.columns.tolist()
+                if not self.column_name in columns:
+                    self.add_error('Failed to find column "%s" for formatting.'\
+                                   % self.column_name)
+                    return False
+                bool_column_names = set(columns)
+
+            for column_name, dtype in chunk.dtypes.iteritems():
+                chunk_dtypes.setdefault(column_name, []).append(dtype)
+                if column_name in bool_column_names and\
+                    not is_bool_column(chunk[column_name]):
+                    bool_column_names.remove(column_name)
+
+            join_column = chunk[self.column_name]
+            if join_column.dtype.kind == 'f' and self.whole_numbers:
+                self.whole_numbers = is_whole_number_column(join_column)
+
+            if join_column.dtype == np.object_:
+                if not text_values_changed:
+                    text_values_changed = self.is_text_changed_by_formatting(join_column)
+            else:
+                has_numeric_join_chunk = True
+
+            self.num_rows += len(chunk.index)
+
+        if columns is None:
+            self.add_error('No data rows in the file')
+            return False
+
+        self.column_dtypes = {}
+        for column_name, dtypes in chunk_dtypes.items():
+            dtype = get_column_dtype(dtypes)
+            if dtype == np.object_ and column_name in bool_column_names:
+                # True/False with blanks: pandas keeps the bool
+                # values, as objects.  Read it as is and convert
+                self.object_bool_columns.append(column_name)
+                continue
+            self.column_dtypes[column_name] = dtype
+
+        self.needs_formatting = self.get_needs_formatting(text_values_changed,
+                                                          has_numeric_join_chunk)
+        return True
+
+    def is_text_changed_by_formatting(self, join_column):
+        """
+        For a chunk's text (object) join column: would formatting change
+        any values?  e.g. True/False values or values to zero pad
+        """
+        non_null_vals = join_column[join_column.notnull()]
+        try:
+            lengths = non_null_vals.str.len()
+        except AttributeError:
+            return True     # no strings
+
+        if lengths.isnull().any():
+            return True     # values that aren't strings
+
+        return bool(self.zero_pad_length and (lengths < self.zero_pad_length).any())
+
+    def get_needs_formatting(self, text_values_changed, has_numeric_join_chunk):
+        """
+        Decide, after pass 1, if a formatted join column is needed.
+        Follows "format_join_column":  True, False or None if pass 2
+        has to decide
+        """
+        if self.column_name in self.object_bool_columns:
+            return True
+
+        if self.column_dtypes[self.column_name] != np.object_:
+            return True     # numbers always need a string column
+
+        if text_values_changed:
+            return True
+
+        if has_numeric_join_chunk and self.zero_pad_length:
+            # Pass 2 reads these values as text: their lengths aren't known yet
+            return None
+
+        return False
+
+    def write_formatted_chunks(self, fh_out):
+        """
+        Pass 2: Format the join column and write each chunk to "fh_out"
+        """
+        csv_parms = dict(sep=self.get_output_delimiter(),
+                         quoting=QUOTE_NONNUMERIC,
+                         index=False)
+
+        needs_formatting = False
+        for chunk_num, chunk in enumerate(self.read_chunks(dtype=self.column_dtypes)):
+            for column_name in self.object_bool_columns:
+                chunk[column_name] = chunk[column_name].astype(np.object_)
+
+            formatted_column, chunk_needs_formatting = format_join_column(\
+                                                    chunk[self.column_name],
+                                                    self.zero_pad_length,
+                                                    self.whole_numbers)
+            if chunk_needs_formatting:
+                needs_formatting = True
+
+            chunk[self.formatted_column_name] = formatted_column
+
+            fh_out.write(chunk.to_csv(header=(chunk_num == 0),
+                                      columns=chunk.columns,
+                                      **csv_parms))
+
+        self.needs_formatting = needs_formatting
+
+    def write_join_file(self):
+        """
+        Format the join column.  If a formatted column is needed,
+        save the new file to the tabular_info.dv_join_file.
+
+        Returns False if there's an error.  (check "error_message")
+        """
+        try:
+            if not self.check_columns():
+                return False
+
+            if self.needs_formatting is False:
+                # The existing column may be used for the join
+                return True
+
+            scratch_dir = settings.GISFILE_SCRATCH_WORK_DIRECTORY
+            if not (scratch_dir and isdir(scratch_dir)):
+                scratch_dir = None  # system default
+
+            with tempfile.NamedTemporaryFile(prefix='join_file_',
+                                             dir=scratch_dir) as fh_out:
+
+                self.write_formatted_chunks(fh_out)
+                if not self.needs_formatting:
+                    # The existing column may be used for the join
+                    return True
+
+                fh_out.flush()
+                self.tabular_info.dv_join_file.save(\
+                        self.tabular_info.datafile_label,
+                        File(fh_out))
+
+        except pd.errors.ParserError as ex_obj:
+            err_msg = ('Could not process the file. '
+                       'At least one row had too many values. '
+                       '(error: {0})').format(ex_obj.message)
+            self.add_error(err_msg)
+            return False
+        except IOError as ex_obj:
+            self.add_error(str(ex_obj))
+            return False
+
+        return True
@@ -1,11 +1,11 @@
 import logging
-import requests
 import sys
 
 from django.conf import settings
 from requests.exceptions import ConnectionError as RequestsConnectionError
 
 from gc_apps.geo_utils.msg_util import msg, msgt
+from gc_apps.geo_utils.http_client import http_get
 
 from shared_dataverse_information.worldmap_api_helper.url_helper import\
     MAP_LAT_LNG_TABLE_API_PATH,\
@@ -32,10 +32,10 @@ def get_tablejoin_info(tablejoin_id):
     msg('api_url: %s' % api_url)
 
     try:
-        r = requests.get(api_url,
+        r = http_get(api_url,
                         auth=settings.WORLDMAP_ACCOUNT_AUTH,
-                        timeout=settings.WORLDMAP_SHORT_TIMEOUT
-                        )
+                        timeout=settings.WORLDMAP_SHORT_TIMEOUT,
+                        endpoint_name='worldmap.get_tablejoin_info')
     except RequestsConnectionError as e:
         err_msg = 'Error connecting to WorldMap server: %s' % e.message
         LOGGER.error('Error trying to retrieve TableJoin with id: %s', tablejoin_id)
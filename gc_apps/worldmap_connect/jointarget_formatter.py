@@ -45,7 +45,15 @@ class JoinTargetFormatter(object):
 
         self.target_info = target_info
 
-        self.initial_check()
+        # Lookups built once by build_indexes()
+        #   - targets_by_id: { join target id : info }
+        #   - targets_by_type: { geocode_type_slug : [info, info, ...] }
+        self.targets_by_id = {}
+        self.targets_by_type = OrderedDict()
+        self.geocode_types = []
+
+        if self.initial_check():
+            self.build_indexes()
 
     def is_valid(self):
         return self.err_found
@@ -98,6 +106,30 @@ class JoinTargetFormatter(object):
 
         return True
 
+    def build_indexes(self):
+        """
+        Index the 'data' list by join target id and geocode_type_slug
+        """
+        for info in self.target_info['data']:
+            if 'id' in info:
+                # As with a linear scan, the first match wins
+                self.targets_by_id.setdefault(info['id'], info)
+
+            gtype_slug = info['geocode_type_slug']
+            if gtype_slug not in self.targets_by_type:
+                self.targets_by_type[gtype_slug] = []
+                self.geocode_types.append((info['geocode_type'], gtype_slug))
+            self.targets_by_type[gtype_slug].append(info)
+
+    def get_targets_for_type(self, chosen_geocode_type=None):
+        """
+        Return the join target info dicts for a geocode_type_slug
+            - if chosen_geocode_type is None, return all of them
+        """
+        if chosen_geocode_type is None:
+            return self.target_info['data']
+
+        return self.targets_by_type.get(chosen_geocode_type, [])
 
     @staticmethod
     def get_formatted_name(geocode_type, year=None, title=None):
@@ -128,17 +160,11 @@ class JoinTargetFormatter(object):
         if target_layer_id is None:
             return (None, None, None)
 
-        for info in self.target_info['data']:
-            if 'id' in info and target_layer_id == info['id']:
-                return SingleJoinTargetInfo(info)
-                #return SingleJoinTargetInfo(
-                #                info['layer'],
-                #                info['attribute']['attribute'],
-                #                info['attribute']['type'],
-                #                self.get_formatting_zero_pad_length(target_layer_id)
-                #                    )
+        info = self.targets_by_id.get(target_layer_id)
+        if info is None:
+            return None
 
-        return None
+        return SingleJoinTargetInfo(info)
 
     def get_geocode_types(self):
         """
@@ -149,15 +175,7 @@ class JoinTargetFormatter(object):
         if self.err_found:
             return None
 
-        gtypes = []
-        type_dict = {}
-        for info in self.target_info['data']:
-            # Have we already added this type to the list?
-            if not info['geocode_type_slug'] in type_dict:
-                # Nope, add it
-                gtypes.append((info['geocode_type'], info['geocode_type_slug']))
-                type_dict.update({ info['geocode_type_slug']: 1 })
-        return gtypes
+        return list(self.geocode_types)
 
     def get_available_layers_list_by_type(self, chosen_geocode_type=None, for_json=False):
         """
@@ -180,28 +198,25 @@ class JoinTargetFormatter(object):
             return None
 
         join_targets = []
-        for info in self.target_info['data']:
-            gtype_slug = info['geocode_type_slug']
-            if chosen_geocode_type == gtype_slug or\
-                chosen_geocode_type is None:
+        for info in self.get_targets_for_type(chosen_geocode_type):
 
-                if 'name' not in info:
-                    continue
+            if 'name' not in info:
+                continue
 
-                join_target_id = info['id']
-                info_line = "{0} - {1}".format(info['year'], info['name'])
-                description = info.get('expected_format', {}).get('description', '')
+            join_target_id = info['id']
+            info_line = "{0} - {1}".format(info['year'], info['name'])
+            description = info.get('expected_format', {}).get('description', '')
 
-                if for_json:
-                    info_dict = OrderedDict()
-                    info_dict['join_target_id'] = info['id']
-                    info_dict['name'] = info_line
-                    info_dict['description'] = description
+            if for_json:
+                info_dict = OrderedDict()
+                info_dict['join_target_id'] = info['id']
+                info_dict['name'] = info_line
+                info_dict['description'] = description
 
-                    join_targets.append(info_dict)
+                join_targets.append(info_dict)
 
-                else:
-                    join_targets.append((join_target_id, info_line))
+            else:
+                join_targets.append((join_target_id, info_line))
 
         return join_targets
 
@@ -210,12 +225,11 @@ class JoinTargetFormatter(object):
         if target_layer_id is None:
             return None
 
-        for info in self.target_info['data']:
-            if 'id' in info and target_layer_id == info['id']:
-                if 'expected_format' in info:
-                    return info['expected_format']
+        info = self.targets_by_id.get(target_layer_id)
+        if info is None:
+            return None
 
-        return None
+        return info.get('expected_format')
 
     def get_formatting_zero_pad_length(self, target_layer_id):
         """
@@ -305,17 +319,14 @@ class JoinTargetFormatter(object):
         Note: if chosen_geocode_type is None, all identifiers will be retrieved
         """
         join_targets = []
-        for info in self.target_info['data']:
-
-            gtype_slug = info['geocode_type_slug']
-            if chosen_geocode_type == gtype_slug or\
-                chosen_geocode_type is None:
-                info_line = JoinTargetFormatter.get_formatted_name(
-                            info['geocode_type'])
-                            #info['year'])
-                gtype_tuple = (info['geocode_type_slug'], info_line)
-                if not gtype_tuple in join_targets:
-                    join_targets.append(gtype_tuple)
+        for info in self.get_targets_for_type(chosen_geocode_type):
+
+            info_line = JoinTargetFormatter.get_formatted_name(
+                        info['geocode_type'])
+                        #info['year'])
+            gtype_tuple = (info['geocode_type_slug'], info_line)
+            if not gtype_tuple in join_targets:
+                join_targets.append(gtype_tuple)
 
         # Sort list by geocode_type name
         join_targets.sort(key=lambda tup: tup[1])  # sorts in place
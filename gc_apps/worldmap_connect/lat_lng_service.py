@@ -1,12 +1,15 @@
 import sys
 import logging
-import requests
 import json
 from django.conf import settings
 from requests.exceptions import ConnectionError as RequestsConnectionError
 
 from shared_dataverse_information.worldmap_api_helper.url_helper import MAP_LAT_LNG_TABLE_API_PATH
 from gc_apps.gis_basic_file.dataverse_info_service import get_dataverse_info_dict
+from gc_apps.geo_utils.http_client import http_post
+from gc_apps.geo_utils.multipart_stream import MultipartFileStream
+from gc_apps.worldmap_connect.dataverse_layer_services import\
+    clear_layer_info_cache_for_gis_data
 
 LOGGER = logging.getLogger('gc_apps.worldmap_connect.lat_lng_service')
 
@@ -60,19 +63,22 @@ def create_map_from_datatable_lat_lng(tabular_info, lat_col, lng_col):
 
     print 'create_map_from_datatable_lat_lng 3'
 
-    #files = {'uploaded_file': open(tabular_info.dv_file.path,'rb')}
-    files = dict(uploaded_file=tabular_info.dv_file)
+    # Streamed: the file is read in chunks as it is sent
+    upload = MultipartFileStream.from_field_file(\
+                    map_params, 'uploaded_file', tabular_info.dv_file)
+    if upload is None:
+        return (False, "The file could not be opened.")
 
     print 'make request to', MAP_LAT_LNG_TABLE_API_PATH
     print '-' * 40
 
     try:
-        r = requests.post(MAP_LAT_LNG_TABLE_API_PATH,
-                        data=map_params,
-                        files=files,
+        r = http_post(MAP_LAT_LNG_TABLE_API_PATH,
+                        data=upload,
+                        headers={'Content-Type': upload.content_type},
                         auth=settings.WORLDMAP_ACCOUNT_AUTH,
-                        timeout=settings.WORLDMAP_DEFAULT_TIMEOUT
-                        )
+                        timeout=settings.WORLDMAP_DEFAULT_TIMEOUT,
+                        endpoint_name='worldmap.map_lat_lng_table')
     except RequestsConnectionError as e:
         print 'err', e
         err_msg = 'Error connecting to WorldMap server: %s' % e.message
@@ -83,6 +89,11 @@ def create_map_from_datatable_lat_lng(tabular_info, lat_col, lng_col):
         err_msg = "Unexpected error: %s" % sys.exc_info()[0]
         LOGGER.error(err_msg)
         return (False, err_msg)
+    finally:
+        upload.close()
+
+    # A layer may now exist: don't use a cached "not found"
+    clear_layer_info_cache_for_gis_data(tabular_info)
 
     try:
         rjson = r.json()
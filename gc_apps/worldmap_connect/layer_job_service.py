@@ -0,0 +1,361 @@
+"""
+Create WorldMap layers in the background.
+
+The web request creates a WorldMapLayerJob and returns its md5 (the job id).
+The "run_worldmap_layer_jobs" management command claims pending jobs
+and runs them:
+
+    - JOB_TYPE_SHAPEFILE: SendShapefileService.send_shapefile_to_worldmap
+    - JOB_TYPE_TABLE_JOIN: TableJoinMapMaker.run_map_create
+    - JOB_TYPE_LAT_LNG: create_map_from_datatable_lat_lng
+
+The browser polls "view_layer_job_status" until the job is finished.
+
+No external broker is needed.  A job is claimed with a conditional
+UPDATE (status "pending" -> "running") so several workers may share
+the same database.
+
+If settings.WORLDMAP_LAYER_JOBS_RUN_ASYNC is False, jobs are run
+within the web request.  (e.g. for local development)
+"""
+from __future__ import print_function
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from gc_apps.gis_tabular.models import TabularFileInfo, WorldMapTabularLayerInfo
+from gc_apps.gis_basic_file.dataverse_info_service import get_dataverse_info_dict
+from gc_apps.dv_notify.notification_outbox import NotificationOutbox
+
+from gc_apps.worldmap_connect.models import WorldMapLayerJob,\
+    JOB_TYPE_SHAPEFILE, JOB_TYPE_TABLE_JOIN, JOB_TYPE_LAT_LNG,\
+    JOB_STATUS_PENDING, JOB_STATUS_RUNNING, JOB_STATUS_FAILED,\
+    JOB_STATUSES_UNFINISHED
+from gc_apps.worldmap_connect.send_shapefile_service import SendShapefileService
+from gc_apps.worldmap_connect.lat_lng_service import create_map_from_datatable_lat_lng
+from gc_apps.worldmap_connect.table_join_map_maker import TableJoinMapMaker
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Running jobs older than this are assumed to belong to a dead worker
+DEFAULT_STALLED_JOB_SECONDS = 30 * 60
+
+
+def get_worker_name():
+    """Identify the worker: hostname + process id"""
+    return '%s-%s' % (socket.gethostname(), os.getpid())
+
+
+def is_async_enabled():
+    """Should layer jobs be run by the worker command?"""
+    return getattr(settings, 'WORLDMAP_LAYER_JOBS_RUN_ASYNC', True)
+
+
+class LayerJobService(object):
+    """
+    Create, claim, and run WorldMapLayerJob objects
+    """
+
+    # ----------------------------------------------
+    # Create jobs
+    # ----------------------------------------------
+    @staticmethod
+    def create_job(job_type, gis_data_md5, job_params=None):
+        """
+        Create a pending job.
+
+        If the same job is already pending or running--e.g. the user
+        clicked twice--return that job instead.
+        """
+        assert job_type in (JOB_TYPE_SHAPEFILE, JOB_TYPE_TABLE_JOIN, JOB_TYPE_LAT_LNG),\
+            "job_type not recognized: %s" % job_type
+
+        if job_params is None:
+            job_params = {}
+
+        unfinished_jobs = WorldMapLayerJob.objects.filter(\
+                                job_type=job_type,
+                                gis_data_md5=gis_data_md5,
+                                status__in=JOB_STATUSES_UNFINISHED)
+        for existing_job in unfinished_jobs:
+            if existing_job.job_params == job_params:
+                return existing_job
+
+        return WorldMapLayerJob.objects.create(\
+                                job_type=job_type,
+                                gis_data_md5=gis_data_md5,
+                                job_params=job_params)
+
+    @staticmethod
+    def create_shapefile_job(shapefile_info_md5):
+        """Send a shapefile to the WorldMap"""
+        return LayerJobService.create_job(JOB_TYPE_SHAPEFILE, shapefile_info_md5)
+
+    @staticmethod
+    def create_table_join_job(tabular_info, chosen_column, chosen_layer_id):
+        """Join a tabular file to an existing WorldMap layer"""
+        job_params = dict(chosen_column=chosen_column,
+                          chosen_layer=chosen_layer_id)
+
+        return LayerJobService.create_job(JOB_TYPE_TABLE_JOIN,
+                                          tabular_info.md5,
+                                          job_params)
+
+    @staticmethod
+    def create_lat_lng_job(tabular_info, lat_col, lng_col):
+        """Map a tabular file using its latitude and longitude columns"""
+        job_params = dict(lat_col=lat_col,
+                          lng_col=lng_col)
+
+        return LayerJobService.create_job(JOB_TYPE_LAT_LNG,
+                                          tabular_info.md5,
+                                          job_params)
+
+    # ----------------------------------------------
+    # Claim and run jobs (worker)
+    # ----------------------------------------------
+    @staticmethod
+    def claim_job(job, worker_name=None):
+        """
+        Move a pending job to "running".
+
+        The UPDATE only succeeds if the job is still pending, so
+        only one worker may claim a job.
+
+        returns True if the job was claimed
+        """
+        if worker_name is None:
+            worker_name = get_worker_name()
+
+        started = timezone.now()
+        num_updated = WorldMapLayerJob.objects.filter(\
+                            pk=job.pk,
+                            status=JOB_STATUS_PENDING\
+                        ).update(status=JOB_STATUS_RUNNING,
+                                 worker_name=worker_name,
+                                 started=started,
+                                 modified=started)
+        if num_updated != 1:
+            return False
+
+        job.status = JOB_STATUS_RUNNING
+        job.worker_name = worker_name
+        job.started = started
+        return True
+
+    @staticmethod
+    def claim_next_job(worker_name=None):
+        """
+        Claim the oldest pending job.  Returns the job or None
+        """
+        pending_ids = WorldMapLayerJob.objects.filter(\
+                            status=JOB_STATUS_PENDING\
+                        ).order_by('created').values_list('id', flat=True)[:10]
+
+        for job_id in pending_ids:
+            job = WorldMapLayerJob.objects.filter(pk=job_id).first()
+            if job is None:
+                continue
+            if LayerJobService.claim_job(job, worker_name):
+                return job
+
+        return None
+
+    @staticmethod
+    def run_job(job):
+        """
+        Run a claimed job and save the result.
+
+        returns True if a WorldMap layer was created
+        """
+        assert isinstance(job, WorldMapLayerJob), \
+            "job must be a WorldMapLayerJob"
+
+        job_runners = {JOB_TYPE_SHAPEFILE: LayerJobService.run_shapefile_job,
+                       JOB_TYPE_TABLE_JOIN: LayerJobService.run_table_join_job,
+                       JOB_TYPE_LAT_LNG: LayerJobService.run_lat_lng_job}
+
+        job_runner = job_runners.get(job.job_type)
+        if job_runner is None:
+            job.mark_failed('Job type not recognized: %s' % job.job_type)
+            return False
+
+        try:
+            worldmap_layerinfo, err_msg = job_runner(job)
+        except Exception as ex_obj:
+            LOGGER.exception('WorldMapLayerJob failed: %s (%s)', job.md5, ex_obj)
+            worldmap_layerinfo = None
+            err_msg = 'Sorry! The mapping failed. (code: j1)'
+
+        if worldmap_layerinfo is None:
+            job.mark_failed(err_msg)
+            return False
+
+        job.mark_success(worldmap_layerinfo)
+        return True
+
+    @staticmethod
+    def run_pending_jobs(worker_name=None, max_jobs=None):
+        """
+        Claim and run pending jobs until none are left
+        (or "max_jobs" is reached)
+
+        returns the number of jobs run
+        """
+        num_run = 0
+        while max_jobs is None or num_run < max_jobs:
+            job = LayerJobService.claim_next_job(worker_name)
+            if job is None:
+                break
+
+            LOGGER.info('Running WorldMapLayerJob: %s', job)
+            LayerJobService.run_job(job)
+            num_run += 1
+
+        return num_run
+
+    @staticmethod
+    def run_job_now(job):
+        """
+        Used when async is turned off: claim and run
+        the job within the current process
+        """
+        if LayerJobService.claim_job(job):
+            LayerJobService.run_job(job)
+        return job
+
+    @staticmethod
+    def fail_stalled_jobs(stalled_seconds=DEFAULT_STALLED_JOB_SECONDS):
+        """
+        Mark "running" jobs that started more than "stalled_seconds" ago
+        as failed--e.g. the worker was killed mid-job
+
+        returns the number of jobs marked as failed
+        """
+        time_threshold = timezone.now() - timedelta(seconds=stalled_seconds)
+
+        return WorldMapLayerJob.objects.filter(\
+                        status=JOB_STATUS_RUNNING,
+                        started__lt=time_threshold\
+                    ).update(status=JOB_STATUS_FAILED,
+                             error_message='Sorry! The mapping timed out. (code: j2)',
+                             finished=timezone.now())
+
+    @staticmethod
+    def fail_if_never_started(job):
+        """
+        Called when polling: if a pending job hasn't been picked up
+        within settings.WORLDMAP_LAYER_JOB_PENDING_TIMEOUT, the worker
+        is probably not running.  Mark the job as failed.
+
+        returns True if the job was marked as failed
+        """
+        if job.status != JOB_STATUS_PENDING:
+            return False
+
+        time_threshold = timezone.now() -\
+            timedelta(seconds=settings.WORLDMAP_LAYER_JOB_PENDING_TIMEOUT)
+        if job.created >= time_threshold:
+            return False
+
+        num_updated = WorldMapLayerJob.objects.filter(\
+                            pk=job.pk,
+                            status=JOB_STATUS_PENDING\
+                        ).update(status=JOB_STATUS_FAILED,
+                                 error_message='Sorry! The map request was not processed. Please try again. (code: j3)',
+                                 finished=timezone.now())
+        if num_updated != 1:
+            return False
+
+        LOGGER.error('WorldMapLayerJob not started. Is the worker running? %s', job.md5)
+        job.refresh_from_db()
+        return True
+
+    # ----------------------------------------------
+    # Job types.  Each returns (WorldMapLayerInfo or None, error message)
+    # ----------------------------------------------
+    @staticmethod
+    def run_shapefile_job(job):
+        """Send the shapefile to the WorldMap"""
+        send_shp_service = SendShapefileService(shp_md5=job.gis_data_md5)
+
+        if not send_shp_service.send_shapefile_to_worldmap():
+            err_msg = ('Sorry! The shapefile mapping did not work.'
+                       '<br /><span class="small">{0}</span>').format(\
+                            '<br />'.join(send_shp_service.err_msgs))
+            LOGGER.error(err_msg)
+            return None, err_msg
+
+        worldmap_layerinfo = send_shp_service.get_worldmap_layerinfo()
+        if worldmap_layerinfo is None:
+            return None, 'Sorry! Failed to create map. Please try again. (code: s3)'
+
+        return worldmap_layerinfo, None
+
+    @staticmethod
+    def get_tabular_info(job):
+        """Retrieve the TabularFileInfo for a tabular job"""
+        return TabularFileInfo.objects.filter(md5=job.gis_data_md5).first()
+
+    @staticmethod
+    def run_table_join_job(job):
+        """Join the tabular file to an existing WorldMap layer"""
+        tabular_info = LayerJobService.get_tabular_info(job)
+        if tabular_info is None:
+            return None, 'Sorry! The Tabular File was not found.'
+
+        dataverse_metadata_dict = get_dataverse_info_dict(tabular_info)
+
+        tj_map_maker = TableJoinMapMaker(tabular_info,
+                                         dataverse_metadata_dict,
+                                         job.job_params.get('chosen_column'),
+                                         job.job_params.get('chosen_layer'))
+        if not tj_map_maker.run_map_create():
+            return None, 'Sorry! ' + tj_map_maker.get_error_msg()
+
+        worldmap_tabular_info = WorldMapTabularLayerInfo.build_from_worldmap_json(\
+                                        tabular_info,
+                                        tj_map_maker.get_map_info())
+        if worldmap_tabular_info is None:
+            LOGGER.error("Failed to create WorldMapTabularLayerInfo using %s",\
+                tj_map_maker.get_map_info())
+            return None, 'Sorry! Failed to create map. Please try again. (code: s1)'
+
+        # Notify Dataverse of the new map
+        NotificationOutbox.queue_update(worldmap_tabular_info)
+
+        return worldmap_tabular_info, None
+
+    @staticmethod
+    def run_lat_lng_job(job):
+        """Map the tabular file using latitude and longitude columns"""
+        tabular_info = LayerJobService.get_tabular_info(job)
+        if tabular_info is None:
+            return None, 'Sorry! The Tabular File was not found.'
+
+        (success, worldmap_data_or_err_msg) = create_map_from_datatable_lat_lng(\
+                                    tabular_info,
+                                    job.job_params.get('lat_col'),
+                                    job.job_params.get('lng_col'))
+        if not success:
+            return None, 'Sorry! ' + worldmap_data_or_err_msg
+
+        _user_msg, response_data = worldmap_data_or_err_msg
+
+        worldmap_latlng_info = WorldMapTabularLayerInfo.build_from_worldmap_json(\
+                                        tabular_info,
+                                        response_data)
+        if worldmap_latlng_info is None:
+            LOGGER.error("Failed to create WorldMapLatLngInfo using data: %s",\
+                        response_data)
+            return None, 'Sorry! Failed to create map. Please try again. (code: s4)'
+
+        # Notify Dataverse of the new map
+        NotificationOutbox.queue_update(worldmap_latlng_info)
+
+        return worldmap_latlng_info, None
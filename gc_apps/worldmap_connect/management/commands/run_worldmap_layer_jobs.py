@@ -0,0 +1,84 @@
+"""
+Worker: run pending WorldMapLayerJob objects
+
+Layer creation requests are stored in the database by the web
+views.  Run this command (e.g. via supervisor) to process them:
+
+    python manage.py run_worldmap_layer_jobs
+
+More than one worker may run against the same database.
+"""
+from __future__ import print_function
+import time
+
+from django.core.management.base import BaseCommand#, CommandError
+from django.db import close_old_connections
+
+from gc_apps.worldmap_connect.layer_job_service import LayerJobService,\
+    get_worker_name, DEFAULT_STALLED_JOB_SECONDS
+from gc_apps.geo_utils.msg_util import msg, dashes
+from gc_apps.geo_utils.http_client import log_endpoint_metrics
+from gc_apps.geo_utils.shared_cache import log_cache_metrics
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    # Show this when the user types help
+    help = ('Run pending WorldMap layer jobs (shapefile, tabular join,'
+            ' lat/lng maps).  Keeps polling the database unless'
+            ' "--once" is used.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            dest='run_once',
+            default=False,
+            help='Run the pending jobs and then stop',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            dest='sleep_seconds',
+            default=1.0,
+            help='Seconds to wait before checking for new jobs. (Default is 1)')
+
+        parser.add_argument(
+            '--stalled-seconds',
+            type=int,
+            dest='stalled_seconds',
+            default=DEFAULT_STALLED_JOB_SECONDS,
+            help=('Mark "running" jobs older than this as failed.'
+                  ' (Default is %s)' % DEFAULT_STALLED_JOB_SECONDS))
+
+    def handle(self, *args, **options):
+
+        run_once = options.get('run_once', False)
+        sleep_seconds = options.get('sleep_seconds')
+        stalled_seconds = options.get('stalled_seconds')
+
+        worker_name = get_worker_name()
+
+        dashes()
+        msg('WorldMap layer job worker: %s' % worker_name)
+        dashes()
+
+        while True:
+            # Don't keep stale/broken db connections between checks
+            close_old_connections()
+
+            num_failed = LayerJobService.fail_stalled_jobs(stalled_seconds)
+            if num_failed:
+                msg('Stalled job(s) marked as failed: %s' % num_failed)
+
+            num_run = LayerJobService.run_pending_jobs(worker_name)
+            if num_run:
+                msg('Job(s) run: %s' % num_run)
+                log_endpoint_metrics(LOGGER)
+                log_cache_metrics(LOGGER)
+
+            if run_once:
+                break
+
+            time.sleep(sleep_seconds)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 10:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('worldmap_connect', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorldMapLayerJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('job_type', models.CharField(choices=[(b'shapefile', b'shapefile'), (b'table_join', b'table_join'), (b'lat_lng', b'lat_lng')], max_length=50)),
+                ('status', models.CharField(choices=[(b'pending', b'pending'), (b'running', b'running'), (b'success', b'success'), (b'failed', b'failed')], db_index=True, default=b'pending', max_length=50)),
+                ('gis_data_md5', models.CharField(db_index=True, max_length=40)),
+                ('job_params', jsonfield.fields.JSONField(blank=True)),
+                ('layer_type', models.CharField(blank=True, max_length=50)),
+                ('layer_md5', models.CharField(blank=True, max_length=40)),
+                ('error_message', models.TextField(blank=True)),
+                ('worker_name', models.CharField(blank=True, max_length=255)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('md5', models.CharField(help_text=b'auto-filled on save', max_length=40, unique=True)),
+            ],
+            options={
+                'ordering': ('-created',),
+                'verbose_name': 'WorldMap Layer Job',
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
+import uuid
 
 from django.db import models
+from django.utils import timezone
 
 from jsonfield import JSONField
 from gc_apps.core.models import TimeStampedModel
@@ -8,6 +10,12 @@ from gc_apps.core.models import TimeStampedModel
 from gc_apps.worldmap_connect.jointarget_formatter import JoinTargetFormatter
 
 
+# JoinTargetFormatters by JoinTargetInformation id: (modified, formatter)
+#   - Shared across requests.  A row's target_info only changes on save()
+_JOIN_TARGET_FORMATTERS = {}
+MAX_CACHED_JOIN_TARGET_FORMATTERS = 10
+
+
 class JoinTargetInformation(TimeStampedModel):
     """
     Store information retrieved from the WorldMap's JoinTarget API end point.
@@ -27,64 +35,205 @@ class JoinTargetInformation(TimeStampedModel):
         """
         Check if the JSON in target_info is valid
         """
-        if not self.id:
-            super(JoinTargetInformation, self).save(*args, **kwargs)
+        self.clear_formatter()
 
         jt_formatter = JoinTargetFormatter(self.target_info)
         self.is_valid_target_info = jt_formatter.is_valid()
 
         super(JoinTargetInformation, self).save(*args, **kwargs)
 
-    def get_geocode_types(self):
+        self.cache_formatter(jt_formatter)
+
+    def __getstate__(self):
+        """Don't pickle (e.g. cache) the memoized JoinTargetFormatter"""
+        state = super(JoinTargetInformation, self).__getstate__().copy()
+        state.pop('_jt_formatter', None)
+        return state
+
+    def clear_formatter(self):
+        """Remove the memoized JoinTargetFormatter"""
+        self._jt_formatter = None
+        if self.id:
+            _JOIN_TARGET_FORMATTERS.pop(self.id, None)
+
+    def cache_formatter(self, jt_formatter):
+        """Memoize the JoinTargetFormatter for this object and row"""
+        self._jt_formatter = jt_formatter
+        if not self.id:
+            return
+
+        if len(_JOIN_TARGET_FORMATTERS) >= MAX_CACHED_JOIN_TARGET_FORMATTERS:
+            _JOIN_TARGET_FORMATTERS.clear()
+        _JOIN_TARGET_FORMATTERS[self.id] = (self.modified, jt_formatter)
+
+    def get_formatter(self):
+        """
+        Return a JoinTargetFormatter for target_info, indexed by join target
+        id and geocode type.  Built once per row (and "modified" time)
+        """
+        jt_formatter = getattr(self, '_jt_formatter', None)
+        if jt_formatter is not None:
+            return jt_formatter
+
+        if self.id:
+            (modified, jt_formatter) = _JOIN_TARGET_FORMATTERS.get(self.id, (None, None))
+            if jt_formatter is not None and modified == self.modified:
+                self._jt_formatter = jt_formatter
+                return jt_formatter
+
         jt_formatter = JoinTargetFormatter(self.target_info)
-        return jt_formatter.get_join_targets_by_type()
+        self.cache_formatter(jt_formatter)
+        return jt_formatter
+
+    def get_geocode_types(self):
+        return self.get_formatter().get_join_targets_by_type()
 
     def get_available_layers_list(self):
-        jt_formatter = JoinTargetFormatter(self.target_info)
         # Get all the join targets
-        return jt_formatter.get_available_layers_list_by_type(None)
-        #return jt_formatter.get_all_target_layers()
+        return self.get_formatter().get_available_layers_list_by_type(None)
 
     def get_format_info_for_target_layer(self, layer_id):
         """
         Retrieve the WorldMap info related to the
         datatable model JoinTargetFormatType
         """
-        jt_formatter = JoinTargetFormatter(self.target_info)
-
-        return jt_formatter.get_format_info_for_target_layer(layer_id)
+        return self.get_formatter().get_format_info_for_target_layer(layer_id)
 
     def get_formatting_zero_pad_length(self, layer_id):
         """
         Helps with formatting columns that need zero padding
         """
-        jt_formatter = JoinTargetFormatter(self.target_info)
-
-        return jt_formatter.get_formatting_zero_pad_length(layer_id)
+        return self.get_formatter().get_formatting_zero_pad_length(layer_id)
 
     def get_available_layers_list_by_type(self, chosen_geocode_type, for_json=False):
-        jt_formatter = JoinTargetFormatter(self.target_info)
         # Get all the join targets
-        return jt_formatter.get_available_layers_list_by_type(chosen_geocode_type, for_json)
+        return self.get_formatter().get_available_layers_list_by_type(\
+                                        chosen_geocode_type, for_json)
 
     def get_single_join_target_info(self, target_layer_id):
         """
         Given a target layer id, retrieve the target name
         """
-        jt_formatter = JoinTargetFormatter(self.target_info)
-
-        return jt_formatter.get_single_join_target_info(target_layer_id)
+        return self.get_formatter().get_single_join_target_info(target_layer_id)
 
 
     def get_join_targets_by_type(self, chosen_geocode_type):
-        jt_formatter = JoinTargetFormatter(self.target_info)
-        return jt_formatter.get_join_targets_by_type(chosen_geocode_type)
+        return self.get_formatter().get_join_targets_by_type(chosen_geocode_type)
 
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Join Target information'
         verbose_name_plural = verbose_name
 
+
+# --------------------------------------
+# WorldMapLayerJob types and statuses
+# --------------------------------------
+JOB_TYPE_SHAPEFILE = 'shapefile'
+JOB_TYPE_TABLE_JOIN = 'table_join'
+JOB_TYPE_LAT_LNG = 'lat_lng'
+JOB_TYPES = (JOB_TYPE_SHAPEFILE, JOB_TYPE_TABLE_JOIN, JOB_TYPE_LAT_LNG)
+JOB_TYPE_CHOICES = [(x, x) for x in JOB_TYPES]
+
+JOB_STATUS_PENDING = 'pending'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_SUCCESS = 'success'
+JOB_STATUS_FAILED = 'failed'
+JOB_STATUSES = (JOB_STATUS_PENDING, JOB_STATUS_RUNNING,\
+                JOB_STATUS_SUCCESS, JOB_STATUS_FAILED)
+JOB_STATUS_CHOICES = [(x, x) for x in JOB_STATUSES]
+JOB_STATUSES_UNFINISHED = (JOB_STATUS_PENDING, JOB_STATUS_RUNNING)
+
+
+class WorldMapLayerJob(TimeStampedModel):
+    """
+    A request to create a WorldMap layer--run by the
+    "run_worldmap_layer_jobs" management command instead of
+    within the web request.
+
+    This model is the job queue: the database is the broker.
+    """
+    job_type = models.CharField(max_length=50, choices=JOB_TYPE_CHOICES)
+    status = models.CharField(max_length=50,\
+                    choices=JOB_STATUS_CHOICES,\
+                    default=JOB_STATUS_PENDING,\
+                    db_index=True)
+
+    # md5 of the ShapefileInfo or TabularFileInfo
+    gis_data_md5 = models.CharField(max_length=40, db_index=True)
+
+    # e.g. the chosen join column and layer
+    job_params = JSONField(blank=True)
+
+    # Results: Used to retrieve the WorldMapLayerInfo object
+    #   - see gc_apps.classification.utils.get_worldmap_info_object
+    layer_type = models.CharField(max_length=50, blank=True)
+    layer_md5 = models.CharField(max_length=40, blank=True)
+
+    error_message = models.TextField(blank=True)
+
+    worker_name = models.CharField(max_length=255, blank=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    # for object identification
+    md5 = models.CharField(max_length=40,\
+                    unique=True,\
+                    help_text='auto-filled on save')
+
+    def __str__(self):
+        return '%s (%s) %s' % (self.job_type, self.status, self.gis_data_md5)
+
+    def __unicode__(self):
+        return self.__str__()
+
+    def save(self, *args, **kwargs):
+        """
+        Set the md5--used as the job id--before the first insert
+        """
+        if not self.md5:
+            self.md5 = uuid.uuid4().hex
+
+        if self.job_params is None:
+            self.job_params = {}
+
+        super(WorldMapLayerJob, self).save(*args, **kwargs)
+
+    def is_finished(self):
+        """Has the job succeeded or failed?"""
+        return self.status not in JOB_STATUSES_UNFINISHED
+
+    def is_success(self):
+        return self.status == JOB_STATUS_SUCCESS
+
+    def get_elapsed_seconds(self):
+        """Seconds the job has been running (or ran)"""
+        if self.started is None:
+            return None
+
+        end_time = self.finished if self.finished else timezone.now()
+
+        return (end_time - self.started).total_seconds()
+
+    def mark_success(self, worldmap_layerinfo):
+        """Save the WorldMapLayerInfo identifiers and mark the job a success"""
+        self.layer_type = worldmap_layerinfo.get_layer_type()
+        self.layer_md5 = worldmap_layerinfo.md5
+        self.status = JOB_STATUS_SUCCESS
+        self.finished = timezone.now()
+        self.save()
+
+    def mark_failed(self, error_message):
+        """Save the error message and mark the job as failed"""
+        self.error_message = error_message
+        self.status = JOB_STATUS_FAILED
+        self.finished = timezone.now()
+        self.save()
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'WorldMap Layer Job'
+
 '''
 class APIValidationSchema(TimeStampedModel):
     """May be used to evaluate API results such as JoinTargetInformation"""
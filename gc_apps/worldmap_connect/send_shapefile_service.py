@@ -14,10 +14,11 @@ from gc_apps.gis_shapefiles.models import ShapefileInfo, WorldMapShapefileLayerI
 from gc_apps.gis_basic_file.dataverse_info_service import get_dataverse_info_dict
 
 from gc_apps.worldmap_connect.worldmap_importer import WorldMapImporter
-from gc_apps.worldmap_connect.dataverse_layer_services import get_layer_info_using_dv_info
+from gc_apps.worldmap_connect.dataverse_layer_services import get_layer_info_using_dv_info,\
+    clear_layer_info_cache_for_gis_data
 from shared_dataverse_information.shapefile_import.forms import ShapefileImportDataForm
 
-from gc_apps.dv_notify.metadata_updater import MetadataUpdater
+from gc_apps.dv_notify.notification_outbox import NotificationOutbox
 
 LOGGER = logging.getLogger(__name__)
 
@@ -231,6 +232,9 @@ class SendShapefileService:
                                 self.shapefile_info.dv_file)
         #                        self.shapefile_info.get_dv_file_fullpath())
 
+        # A layer may now exist: don't use a cached "not found"
+        clear_layer_info_cache_for_gis_data(self.shapefile_info)
+
         if not worldmap_response:
             self.add_err_msg('send_file_to_worldmap: worldmap_response was None!')
             return False
@@ -364,7 +368,7 @@ class SendShapefileService:
             LOGGER.warn("Attempted to send Worldmap info to Dataverse when 'worldmap_layerinfo_object' was None")
             return False
 
-        MetadataUpdater.run_update_via_popen(self.worldmap_layerinfo)
+        NotificationOutbox.queue_update(self.worldmap_layerinfo)
         #try:
 
         #except:
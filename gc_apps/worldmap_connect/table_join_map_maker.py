@@ -4,25 +4,20 @@ import sys
 import json
 import pprint
 import logging
-import requests
 
 from django.conf import settings
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from requests.exceptions import ConnectionError as RequestsConnectionError
-from csv import QUOTE_NONNUMERIC
 from gc_apps.geo_utils.msg_util import msg
-from gc_apps.geo_utils.tabular_util import get_formatted_column_name
-from gc_apps.geo_utils.file_field_helper import get_file_path_or_url
+from gc_apps.geo_utils.http_client import http_post
+from gc_apps.geo_utils.multipart_stream import MultipartFileStream
+from gc_apps.worldmap_connect.join_column_formatter import ChunkedJoinColumnFormatter
 
 from shared_dataverse_information.worldmap_api_helper.url_helper import\
     UPLOAD_JOIN_DATATABLE_API_PATH
 
 from gc_apps.worldmap_connect.utils import get_latest_jointarget_information
-
-# If a column needs formatting
-import pandas as pd
-import numpy as np
+from gc_apps.worldmap_connect.dataverse_layer_services import\
+    clear_layer_info_cache_for_gis_data
 
 LOGGER = logging.getLogger('gc_apps.worldmap_connect.join_layer_service')
 
@@ -114,66 +109,6 @@ class TableJoinMapMaker(object):
             self.add_error('The Tabular File object does not have a "delimiter"')
 
 
-    def is_formatted_column_needed(self, data_frame, single_join_target_info):
-        """
-        This is called by "format_data_table_for_join" -- it is only called
-        when the target column is a string and/or specifies zero-padding
-
-        Selected join column needs formatting if:
-            (a) It is type numeric
-            (b) The values do not meet the minimal length (zero padding)
-        """
-        assert isinstance(data_frame, pd.DataFrame),\
-            "data_frame must be a pandas DataFrame object"
-
-        df = data_frame
-
-        # --------------------------------------------
-        # (1) Is this a numeric column?
-        # If so, we need a formatted column b/c we're matching against a string.
-        # --------------------------------------------
-        col_dtype = df[self.table_attribute_for_join].dtype
-        if np.isreal(col_dtype) and col_dtype != 'object':
-            return True
-
-        #   Our chosen column is character but the target doesn't have
-        #   a zero padding requirement
-        #
-        if not single_join_target_info.requires_zero_padding():
-            return False
-
-        # --------------------------------------------
-        # (2) Are the values in our column the correct length for a join?
-        # --------------------------------------------
-        total_rows = len(df)
-
-        # Count how many columns meet the padding length
-        #   - convert our temp column to a string
-        # --------------------------------------------
-        temp_col = self.table_attribute_for_join + '_temp'
-        df[temp_col] = df[self.table_attribute_for_join].astype('str')
-
-        #   - Make a filter to count how many values have
-        #       the correct length
-        # --------------------------------------------
-        filter_criteria = (df[temp_col].str.len() == single_join_target_info.zero_pad_length)
-        num_short_rows = len(df.loc[filter_criteria])
-
-        # Drop the temp column
-        df = df.drop(temp_col, axis=1)
-
-
-        #   - Are all the rows the right length?
-        # --------------------------------------------
-        if num_short_rows == total_rows:    # Yes
-            # Looks ok, no formatting needed
-            return False
-
-        # We need a formatted column
-        return True
-
-
-
     def format_data_table_for_join(self, single_join_target_info):
         """
         Create a new file and add a formatted column that's zero-padded
@@ -190,10 +125,6 @@ class TableJoinMapMaker(object):
             self.add_error('single_join_target_info cannot be None')
             return False
 
-        # Set instance wide value for zero_pad_length
-        #
-        zero_pad_length = single_join_target_info.zero_pad_length
-
         # ----------------------------------------
         # Do we need to do any formatting at all?  (Looking at the target only)
         # ----------------------------------------
@@ -213,99 +144,31 @@ class TableJoinMapMaker(object):
         if self.datatable_obj.dv_join_file:
             self.datatable_obj.dv_join_file.delete()
 
-        # ============================================
-        # (1) Do we need a formatted column?
-        #   - Check the type of the selected column
-        # ============================================
-
-        # --------------------------------------------
-        # (1a) Open the dataverse tabular file with pandas
-        # --------------------------------------------
-        try:
-            df = pd.read_csv(\
-                        get_file_path_or_url(self.datatable_obj.dv_file),
-                        sep=self.datatable_obj.delimiter)
-        except pd.parser.CParserError as ex_obj:
-            err_msg = ('Could not process the file. '
-                       'At least one row had too many values. '
-                       '(error: {0})').format(ex_obj.message)
-            self.add_error(err_msg)
-            return False
+        # ----------------------------------------
+        # Read the file in chunks: check the join column's type,
+        # format it and, if needed, write the new file
+        # ----------------------------------------
+        if single_join_target_info.requires_zero_padding():
+            zero_pad_length = single_join_target_info.zero_pad_length
+        else:
+            zero_pad_length = None
 
-        # --------------------------------------------
-        # (1b) Is the join column in the data frame?
-        # --------------------------------------------
-        if not self.table_attribute_for_join in df.columns:
-            self.add_error('Failed to find column "%s" for formatting.'\
-                % self.table_attribute_for_join)
+        formatter = ChunkedJoinColumnFormatter(self.datatable_obj,
+                                               self.table_attribute_for_join,
+                                               zero_pad_length)
+        if not formatter.write_join_file():
+            self.add_error(formatter.error_message)
             return False
 
-        # --------------------------------------------
-        # (1c) Do we need a formatted column?
-        #   The data may already be formatted
-        # --------------------------------------------
-        if not self.is_formatted_column_needed(df, single_join_target_info):
+        if not formatter.needs_formatting:
             # The existing column may be used for the join
             return True
 
-        # Looks like we need a formatted column
-
-        # ----------------------------------
-        # (2) Add formatted column
-        # ----------------------------------
-        # new column name = existing name + "_formatted"
-        new_column_name = get_formatted_column_name(self.table_attribute_for_join)
-
-        # What type of column formatting?
-        #
-        if single_join_target_info.requires_zero_padding():
-            #
-            # zero pad formatting
-            #
-            zero_pad_fmt = '{0:0>%s}' % zero_pad_length
-            func_col_fmt = lambda x: zero_pad_fmt.format(x)
-        elif single_join_target_info.is_target_column_string():
-            #
-            # simple convert to string
-            #
-            func_col_fmt = lambda x: '%s' % x
-
-        # make the column
-        # ----------------------------------
-        #df[new_column_name] = df[self.table_attribute_for_join].apply(\
-        #                         lambda x: func_col_fmt(x))
-        df[new_column_name] = df[self.table_attribute_for_join].apply(\
-                                    func_col_fmt)
-
-        # (2b) set new join column name
-        # ----------------------------------
-        self.table_attribute_for_join = new_column_name
-
-        LOGGER.debug('new_column_name: %s', new_column_name)
-        # ----------------------------------
-        # (3) Save  new file
+        # set new join column name: existing name + "_formatted"
         # ----------------------------------
-        #msg('columns 4: %s' % df.columns)
+        self.table_attribute_for_join = formatter.formatted_column_name
 
-        # Write the DataFrame to a ContentFile
-        #
-        sep_char = str(self.datatable_obj.delimiter)
-        print 'DELIM: (%s) %d' % (sep_char, len(sep_char))
-        if sep_char == '\\t':
-            sep_char = sep_char[1:]
-        csv_parms = dict(sep=sep_char,
-                         quoting=QUOTE_NONNUMERIC,
-                         index=False,
-                         columns=df.columns)
-        LOGGER.debug('df.columns: %s', df.columns)
-        fh_csv = df.to_csv(**csv_parms)
-        content_file = ContentFile(fh_csv)#df.to_csv(**csv_parms))
-
-        # Save the ContentFile in the datatable_obj
-        # ----------------------------------
-        self.datatable_obj.dv_join_file.save(\
-                self.datatable_obj.datafile_label,\
-                content_file)
+        LOGGER.debug('new_column_name: %s', self.table_attribute_for_join)
 
         # Indicate that a formatted file has been created
         # ----------------------------------
@@ -319,28 +182,37 @@ class TableJoinMapMaker(object):
         """
         return self.formatted_file_created
 
-    def get_file_params(self):
+    def get_upload_stream(self, map_params):
         """
-        Return file params for the WorldMap API call
+        Return the streaming multipart body for the WorldMap API call
         """
         if self.err_found:
             return None
 
         if self.was_formatted_file_created():
-            return self.really_get_file_params(self.datatable_obj.dv_join_file)
+            return self.really_get_upload_stream(self.datatable_obj.dv_join_file,
+                                                 map_params)
         else:
-            return self.really_get_file_params(self.datatable_obj.dv_file)
+            return self.really_get_upload_stream(self.datatable_obj.dv_file,
+                                                 map_params)
 
 
-    def really_get_file_params(self, file_field):
-        """Format parameter for WorldMap API call"""
+    def really_get_upload_stream(self, file_field, map_params):
+        """
+        Format the params and file for the WorldMap API call.
+        The file is read in chunks as it is sent
+        """
         if not hasattr(file_field, 'read'):
             self.add_error('Failed to open file. FileField required.')
             return None
 
-        file_handler = file_field   #open(file_field.path, 'rb')
+        upload = MultipartFileStream.from_field_file(\
+                            map_params, 'uploaded_file', file_field)
+        if upload is None:
+            self.add_error('Failed to open file.')
+            return None
 
-        return {'uploaded_file': file_handler}
+        return upload
 
 
     def run_map_create(self):
@@ -398,19 +270,20 @@ class TableJoinMapMaker(object):
         # --------------------------------
         # Prepare file
         # --------------------------------
-        file_params = self.get_file_params()
-        if file_params is None:
+        upload = self.get_upload_stream(map_params)
+        if upload is None:
             return False
 
         LOGGER.info('make request to: %s', UPLOAD_JOIN_DATATABLE_API_PATH)
 
         try:
-            resp = requests.post(\
+            resp = http_post(\
                             UPLOAD_JOIN_DATATABLE_API_PATH,
-                            data=map_params,
-                            files=file_params,
+                            data=upload,
+                            headers={'Content-Type': upload.content_type},
                             auth=settings.WORLDMAP_ACCOUNT_AUTH,
-                            timeout=settings.WORLDMAP_DEFAULT_TIMEOUT)
+                            timeout=settings.WORLDMAP_DEFAULT_TIMEOUT,
+                            endpoint_name='worldmap.upload_join_datatable')
         except RequestsConnectionError as ex_obj:
             err_msg = 'Error connecting to WorldMap server: %s' % ex_obj.message
             LOGGER.error('Error trying to join to datatable with id: %s',\
@@ -423,6 +296,11 @@ class TableJoinMapMaker(object):
             LOGGER.error(err_msg)
             self.add_error(err_msg)
             return False
+        finally:
+            upload.close()
+
+        # A layer may now exist: don't use a cached "not found"
+        clear_layer_info_cache_for_gis_data(self.datatable_obj)
 
         try:
             rjson = resp.json()
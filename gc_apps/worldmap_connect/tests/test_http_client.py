@@ -0,0 +1,132 @@
+"""
+Test the shared HTTP client against a local HTTP server
+"""
+from __future__ import print_function
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from gc_apps.geo_utils.msg_util import msgt
+from gc_apps.geo_utils.http_client import http_get, http_post, get_session,\
+    close_sessions, get_endpoint_metrics, reset_endpoint_metrics
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    """
+    Keep-alive (HTTP/1.1) handler.
+    "/unavailable" returns a 503 the first 2 times
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def send_text(self, status_code, text):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        self.server.num_requests += 1
+        self.server.cookie_headers.append(self.headers.getheader('Cookie'))
+        if self.path == '/set-cookie':
+            self.send_response(200)
+            self.send_header('Set-Cookie', 'sessionid=user_a; Path=/')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write('ok')
+            return
+        if self.path == '/unavailable' and self.server.num_requests <= 2:
+            self.send_text(503, 'try again')
+            return
+        self.send_text(200, 'ok')
+
+    def do_POST(self):
+        self.server.client_ports.add(self.client_address[1])
+        self.server.num_requests += 1
+        self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+        self.send_text(503, 'try again')
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), CountingHandler)
+        self.server.client_ports = set()
+        self.server.num_requests = 0
+        self.server.cookie_headers = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%s' % self.server.server_port
+
+        close_sessions()
+        reset_endpoint_metrics()
+
+    def tearDown(self):
+        close_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_01_keep_alive(self):
+        """Calls to the same host reuse the session and connection"""
+        msgt(self.test_01_keep_alive.__doc__)
+
+        self.assertTrue(get_session(self.base_url + '/a') is\
+                        get_session(self.base_url + '/b?c=1'))
+
+        for _ in range(5):
+            resp = http_get(self.base_url + '/ok', endpoint_name='test.ok')
+            self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(self.server.num_requests, 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+        metrics = get_endpoint_metrics()
+        self.assertEqual(len(metrics), 1)
+        self.assertEqual(metrics[0]['endpoint_name'], 'test.ok')
+        self.assertEqual(metrics[0]['num_calls'], 5)
+        self.assertEqual(metrics[0]['num_errors'], 0)
+
+    @override_settings(HTTP_CLIENT_MAX_RETRIES=2, HTTP_CLIENT_BACKOFF_SECONDS=0)
+    def test_02_retries(self):
+        """GETs are retried on a 503, POSTs are not by default"""
+        msgt(self.test_02_retries.__doc__)
+
+        resp = http_get(self.base_url + '/unavailable')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.server.num_requests, 3)
+
+        resp = http_post(self.base_url + '/post', data=dict(a=1))
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(self.server.num_requests, 4)
+
+        resp = http_post(self.base_url + '/post', data=dict(a=1), max_retries=1)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(self.server.num_requests, 6)
+
+        metrics = dict([(m['method'], m) for m in get_endpoint_metrics()])
+        self.assertEqual(metrics['GET']['num_retries'], 2)
+        self.assertEqual(metrics['GET']['num_errors'], 0)
+        self.assertEqual(metrics['POST']['num_calls'], 2)
+        self.assertEqual(metrics['POST']['num_errors'], 2)
+        self.assertEqual(metrics['POST']['endpoint_name'], '127.0.0.1:%s/post'\
+                            % self.server.server_port)
+
+    def test_03_no_shared_cookies(self):
+        """A cookie set for one call is not sent with the next"""
+        msgt(self.test_03_no_shared_cookies.__doc__)
+
+        resp = http_get(self.base_url + '/set-cookie')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.cookies.get('sessionid'), 'user_a')
+
+        resp = http_get(self.base_url + '/ok')
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(self.server.cookie_headers, [None, None])
+        self.assertEqual(len(get_session(self.base_url).cookies), 0)
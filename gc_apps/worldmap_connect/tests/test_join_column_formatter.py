@@ -0,0 +1,149 @@
+"""
+The chunked join file must match the original, whole-file output
+"""
+from __future__ import print_function
+from csv import QUOTE_NONNUMERIC
+from os.path import dirname, join
+
+import pandas as pd
+
+from django.test import TestCase
+from django.core import management
+from django.core.files.base import ContentFile
+
+from gc_apps.gis_tabular.models import TabularFileInfo
+from gc_apps.geo_utils.tabular_util import format_join_column,\
+    get_formatted_column_name
+from gc_apps.worldmap_connect.join_column_formatter import ChunkedJoinColumnFormatter
+from gc_apps.geo_utils.msg_util import msgt, msg
+
+CBG_FILEPATH = join(dirname(dirname(dirname(__file__))),
+                    'gis_tabular', 'tests', 'input',
+                    'CBG_Annual_and_Longitudinal_Measures.tab')
+
+# Column types change from chunk to chunk (chunk_size=2)
+MIXED_TABLE = """tract\tfips\tcode\tflag\tscore\tname
+25025010100\t1001.0\t101\tTrue\t1\tcat
+25025010200\t1002.0\t102\tFalse\t2\tdog
+\t1003.0\tA103\tTrue\t3.5\tcow
+25025010400\t\t104\t\t4\t
+25025010500\t1005.5\t105\tFalse\t\t"pig, big"
+"""
+
+
+def get_whole_file_output(content, column_name, zero_pad_length):
+    """The original path: read the file, add the column, DataFrame.to_csv"""
+    df = pd.read_csv(ContentFile(content), sep='\t')
+    df[get_formatted_column_name(column_name)], needs_formatting =\
+        format_join_column(df[column_name], zero_pad_length)
+
+    return needs_formatting, df.to_csv(sep='\t',
+                                       quoting=QUOTE_NONNUMERIC,
+                                       index=False,
+                                       columns=df.columns)
+
+
+class ChunkedJoinColumnFormatterTestCase(TestCase):
+
+    def setUp(self):
+        management.call_command('loaddata', 'test_join_layer-2016-1205.json')
+        self.tabular_info = TabularFileInfo.objects.get(pk=14)
+        self.tabular_info.delimiter = '\t'
+        self.tabular_info.dv_join_file = None
+
+    def tearDown(self):
+        for file_field in (self.tabular_info.dv_file, self.tabular_info.dv_join_file):
+            if file_field:
+                file_field.delete(save=False)
+
+    def check_join_file(self, content, column_name, zero_pad_length=None, chunk_size=2):
+        """Compare the chunked output to the whole file output"""
+        self.tabular_info.dv_file.save('test_table.tab', ContentFile(content), save=False)
+
+        formatter = ChunkedJoinColumnFormatter(self.tabular_info,
+                                               column_name,
+                                               zero_pad_length,
+                                               chunk_size=chunk_size)
+        self.assertTrue(formatter.write_join_file())
+
+        needs_formatting, expected_output = get_whole_file_output(\
+                                                content, column_name, zero_pad_length)
+        self.assertEqual(formatter.needs_formatting, needs_formatting)
+
+        if needs_formatting:
+            self.tabular_info.dv_join_file.open('rb')
+            chunked_output = self.tabular_info.dv_join_file.read()
+            self.tabular_info.dv_join_file.close()
+            self.assertEqual(chunked_output, expected_output)
+            self.tabular_info.dv_join_file.delete(save=False)
+        else:
+            self.assertFalse(self.tabular_info.dv_join_file)
+
+        return formatter
+
+    def test_01_mixed_chunks(self):
+        """Column types that differ by chunk"""
+        msgt(self.test_01_mixed_chunks.__doc__)
+
+        for column_name, zero_pad_length in [('tract', 11),
+                                             ('tract', None),
+                                             ('fips', 6),
+                                             ('code', 5),
+                                             ('code', 3),
+                                             ('code', None),
+                                             ('score', None),
+                                             ('flag', None)]:
+            msg('%s, zero pad: %s' % (column_name, zero_pad_length))
+            self.check_join_file(MIXED_TABLE, column_name, zero_pad_length)
+
+    def test_02_no_formatting_needed(self):
+        """A string column that is already formatted: no join file"""
+        msgt(self.test_02_no_formatting_needed.__doc__)
+
+        formatter = self.check_join_file(MIXED_TABLE, 'name')
+        self.assertFalse(formatter.needs_formatting)
+        self.assertEqual(formatter.num_rows, 5)
+
+        formatter = ChunkedJoinColumnFormatter(self.tabular_info, 'not_a_column')
+        self.assertFalse(formatter.write_join_file())
+        self.assertTrue(formatter.error_message.find('not_a_column') > -1)
+
+    def test_03_dataverse_file(self):
+        """A Dataverse file, 554 rows"""
+        msgt(self.test_03_dataverse_file.__doc__)
+
+        content = open(CBG_FILEPATH, 'r').read()
+        for chunk_size in (100, 1000):
+            formatter = self.check_join_file(content, 'BG_ID_10', 12, chunk_size)
+            self.assertEqual(formatter.num_rows, 554)
+
+    def test_04_skip_pass_2(self):
+        """Pass 1 decides if formatting is needed"""
+        msgt(self.test_04_skip_pass_2.__doc__)
+
+        self.tabular_info.dv_file.save('test_table.tab', ContentFile(MIXED_TABLE), save=False)
+
+        def write_formatted_chunks(fh_out):
+            self.fail('pass 2 should not run')
+
+        for column_name, zero_pad_length in [('name', None),
+                                             ('code', None)]:
+            msg('%s, zero pad: %s' % (column_name, zero_pad_length))
+            formatter = ChunkedJoinColumnFormatter(self.tabular_info,
+                                                   column_name,
+                                                   zero_pad_length,
+                                                   chunk_size=2)
+            formatter.write_formatted_chunks = write_formatted_chunks
+            self.assertTrue(formatter.write_join_file())
+            self.assertFalse(formatter.needs_formatting)
+            self.assertFalse(self.tabular_info.dv_join_file)
+
+        msg('code, zero pad: 3.  Numeric chunks: pass 2 decides')
+        formatter = ChunkedJoinColumnFormatter(self.tabular_info, 'code', 3, chunk_size=2)
+        self.assertTrue(formatter.check_columns())
+        self.assertEqual(formatter.needs_formatting, None)
+
+        msg('code, zero pad: 5.  "A103" is padded')
+        formatter = ChunkedJoinColumnFormatter(self.tabular_info, 'code', 5, chunk_size=2)
+        self.assertTrue(formatter.check_columns())
+        self.assertEqual(formatter.needs_formatting, True)
@@ -1,10 +1,16 @@
 from os.path import join, dirname
 import json
 
+from datetime import timedelta
+
 from django.utils import timezone
 from django.test import TestCase
+from django.conf import settings
 from django.core import management
+from django.core.cache import cache
+from django.db.models import F
 
+from gc_apps.worldmap_connect import utils as jt_utils
 from gc_apps.worldmap_connect.models import JoinTargetInformation
 from gc_apps.worldmap_connect.single_join_target_info import SingleJoinTargetInfo
 from gc_apps.geo_utils.msg_util import msgt, msg
@@ -58,7 +64,153 @@ class JoinTargetInformationTestCase(TestCase):
                 self.assertEqual(target_info.get_zero_pad_length(), None)
                 self.assertEqual(target_info.does_join_column_potentially_need_formatting(), False)
 
+    def test_formatter_lookups(self):
+        """Indexed lookups match the target_info 'data' list"""
+        msgt(self.test_formatter_lookups.__doc__)
+
+        j = JoinTargetInformation(name='test', target_info=self.join_targets_json)
+        j.save()
+
+        for info in self.join_targets_json['data']:
+            single_info = j.get_single_join_target_info(info['id'])
+            self.assertEqual(single_info.target_layer_name, info['layer'])
+            self.assertEqual(j.get_format_info_for_target_layer(info['id']),
+                             info.get('expected_format'))
+        self.assertEqual(j.get_single_join_target_info(-99), None)
+        self.assertEqual(j.get_formatting_zero_pad_length(-99), None)
+
+        msg('layers by type')
+        type_slugs = set([x['geocode_type_slug'] for x in self.join_targets_json['data']])
+        for gtype_slug in type_slugs:
+            expected_ids = [x['id'] for x in self.join_targets_json['data']\
+                            if x['geocode_type_slug'] == gtype_slug and 'name' in x]
+            layers = j.get_available_layers_list_by_type(gtype_slug)
+            self.assertEqual([x[0] for x in layers], expected_ids)
+
+            layers = j.get_available_layers_list_by_type(gtype_slug, for_json=True)
+            self.assertEqual([x['join_target_id'] for x in layers], expected_ids)
+
+        self.assertEqual(len(j.get_available_layers_list()),
+                         len(self.join_targets_json['data']))
+        self.assertEqual(j.get_available_layers_list_by_type('not-a-type'), [])
+        self.assertEqual(sorted([x[0] for x in j.get_geocode_types()]), sorted(type_slugs))
+
+    def test_formatter_memoized(self):
+        """The formatter is built once per row and rebuilt after a save"""
+        msgt(self.test_formatter_memoized.__doc__)
+
+        j = JoinTargetInformation(name='test', target_info=self.join_targets_json)
+        j.save()
+        jt_formatter = j.get_formatter()
+        self.assertTrue(j.get_formatter() is jt_formatter)
+
+        msg('shared by other instances of the row')
+        j2 = JoinTargetInformation.objects.get(id=j.id)
+        self.assertTrue(j2.get_formatter() is jt_formatter)
+
+        msg('rebuilt after a save')
+        first_info = j.target_info['data'][0]
+        j.target_info = dict(success=True, data=[first_info])
+        j.save()
+        self.assertFalse(j.get_formatter() is jt_formatter)
+        self.assertEqual(len(j.get_available_layers_list()), 1)
+
+        j3 = JoinTargetInformation.objects.get(id=j.id)
+        self.assertEqual(len(j3.get_available_layers_list()), 1)
+
+        msg('rebuilt if the row was changed elsewhere')
+        JoinTargetInformation.objects.filter(id=j.id).update(\
+                        target_info=self.join_targets_json,
+                        modified=timezone.now())
+        j4 = JoinTargetInformation.objects.get(id=j.id)
+        self.assertEqual(len(j4.get_available_layers_list()),
+                         len(self.join_targets_json['data']))
+
+
+
+class LatestJoinTargetInformationTestCase(TestCase):
+    """
+    get_latest_jointarget_information: serve the cached copy, refresh when stale
+    """
+
+    def setUp(self):
+        json_data = open(JOIN_TARGETS_FILENAME, 'r').read()
+        self.join_targets_json = json.loads(json_data)
+        self.num_api_calls = 0
+        self.api_success = True
+
+        cache.clear()
+        self.orig_get_join_targets = jt_utils.dataverse_layer_services.get_join_targets
+        jt_utils.dataverse_layer_services.get_join_targets = self.get_join_targets
+        jt_utils.REFRESH_IN_BACKGROUND = False
+
+    def tearDown(self):
+        jt_utils.dataverse_layer_services.get_join_targets = self.orig_get_join_targets
+        jt_utils.REFRESH_IN_BACKGROUND = True
+        cache.clear()
+
+    def get_join_targets(self):
+        """Stands in for the WorldMap API call"""
+        self.num_api_calls += 1
+        if not self.api_success:
+            return (False, 'WorldMap is not available')
+        return (True, self.join_targets_json)
+
+    def make_cached_copy_stale(self):
+        JoinTargetInformation.objects.all().update(\
+            created=F('created') - timedelta(seconds=settings.JOIN_TARGET_UPDATE_TIME + 10))
+        jt_utils.JOIN_TARGET_CACHE.delete(jt_utils.CACHE_KEY_JOIN_TARGET_INFO)
+
+    def test_01_cached(self):
+        """The first call uses the API, then the cached copy"""
+        msgt(self.test_01_cached.__doc__)
+
+        jt = jt_utils.get_latest_jointarget_information()
+        self.assertEqual(self.num_api_calls, 1)
+        self.assertEqual(len(jt.get_available_layers_list()),
+                         len(self.join_targets_json['data']))
+
+        with self.assertNumQueries(0):
+            jt2 = jt_utils.get_latest_jointarget_information()
+        self.assertEqual(jt2.id, jt.id)
+        self.assertEqual(self.num_api_calls, 1)
+
+    def test_02_stale_while_revalidate(self):
+        """A stale copy is returned and refreshed"""
+        msgt(self.test_02_stale_while_revalidate.__doc__)
+
+        jt = jt_utils.get_latest_jointarget_information()
+        self.make_cached_copy_stale()
+
+        msg('stale copy returned, refreshed once')
+        jt_stale = jt_utils.get_latest_jointarget_information()
+        self.assertEqual(jt_stale.id, jt.id)
+        self.assertEqual(self.num_api_calls, 2)
+
+        jt_new = jt_utils.get_latest_jointarget_information()
+        self.assertNotEqual(jt_new.id, jt.id)
+        self.assertFalse(jt_utils.is_jointarget_information_stale(jt_new))
+        self.assertEqual(self.num_api_calls, 2)
+
+        msg('concurrent refresh: the other one is running')
+        self.make_cached_copy_stale()
+        jt_utils.JOIN_TARGET_CACHE.add(jt_utils.CACHE_KEY_JOIN_TARGET_REFRESH, True, 60)
+        jt_stale = jt_utils.get_latest_jointarget_information()
+        self.assertEqual(jt_stale.id, jt_new.id)
+        self.assertEqual(self.num_api_calls, 2)
+
+    def test_03_failed_refresh(self):
+        """The stale copy is served after a failed refresh--not retried right away"""
+        msgt(self.test_03_failed_refresh.__doc__)
+
+        jt = jt_utils.get_latest_jointarget_information()
+        self.make_cached_copy_stale()
+        self.api_success = False
 
+        for _ in range(3):
+            jt_stale = jt_utils.get_latest_jointarget_information()
+            self.assertEqual(jt_stale.id, jt.id)
+        self.assertEqual(self.num_api_calls, 2)
 
 """
 jt_name = 'tcase-{0}'.format(timezone.now().strftime("%Y-%m-%d %H:%M:%S"))
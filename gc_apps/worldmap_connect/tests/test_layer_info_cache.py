@@ -0,0 +1,106 @@
+"""
+Test caching of WorldMap existing layer lookups
+"""
+from __future__ import print_function
+
+from django.test import SimpleTestCase
+
+from gc_apps.geo_utils.msg_util import msgt, msg
+from gc_apps.worldmap_connect import dataverse_layer_services as layer_services
+
+DV_PARAMS = dict(dataverse_installation_name='http://localhost:8080',
+                 datafile_id=15)
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, json_dict):
+        self.status_code = status_code
+        self.json_dict = json_dict
+        self.text = str(json_dict)
+
+    def json(self):
+        return self.json_dict
+
+
+class LayerInfoCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.original_http_post = layer_services.http_post
+        layer_services.http_post = self.fake_http_post
+        self.responses = []
+        self.num_posts = 0
+        layer_services.clear_layer_info_cache(**DV_PARAMS)
+
+    def tearDown(self):
+        layer_services.http_post = self.original_http_post
+        layer_services.clear_layer_info_cache(**DV_PARAMS)
+
+    def fake_http_post(self, *args, **kwargs):
+        self.num_posts += 1
+        return self.responses.pop(0)
+
+    def get_layer_info(self):
+        return layer_services.get_layer_info_using_dv_info(dict(DV_PARAMS))
+
+    def test_01_not_found_cached(self):
+        """A "layer not found" is cached until a layer is created"""
+        msgt(self.test_01_not_found_cached.__doc__)
+
+        self.responses = [FakeResponse(200, dict(success=False, message='not found')),
+                          FakeResponse(200, dict(success=True, data=dict(layer_name='x')))]
+
+        self.assertFalse(self.get_layer_info()[0])
+        self.assertFalse(self.get_layer_info()[0])
+        self.assertEqual(self.num_posts, 1)
+
+        msg('layer created: lookup again')
+        layer_services.clear_layer_info_cache(**DV_PARAMS)
+        success, layer_dict = self.get_layer_info()
+        self.assertTrue(success)
+        self.assertEqual(layer_dict['data']['layer_name'], 'x')
+        self.assertEqual(self.get_layer_info()[1], layer_dict)
+        self.assertEqual(self.num_posts, 2)
+
+    def test_02_errors_not_cached(self):
+        """Failed requests are not cached, 404s are"""
+        msgt(self.test_02_errors_not_cached.__doc__)
+
+        self.responses = [FakeResponse(503, {}),
+                          FakeResponse(404, dict(success=False))]
+
+        self.assertFalse(self.get_layer_info()[0])
+        self.assertFalse(self.get_layer_info()[0])
+        self.assertFalse(self.get_layer_info()[0])
+        self.assertEqual(self.num_posts, 2)
+
+    def test_03_cache_skipped_and_cleared_on_delete(self):
+        """use_cache=False; a delete clears the cached layer"""
+        msgt(self.test_03_cache_skipped_and_cleared_on_delete.__doc__)
+
+        self.responses = [FakeResponse(200, dict(success=True)),
+                          FakeResponse(200, dict(success=True)),
+                          FakeResponse(200, dict(success=True)),
+                          FakeResponse(200, dict(success=False))]
+
+        self.get_layer_info()
+        layer_services.get_layer_info_using_dv_info(dict(DV_PARAMS), use_cache=False)
+        self.assertEqual(self.num_posts, 2)
+        self.assertTrue(self.get_layer_info()[0])
+        self.assertEqual(self.num_posts, 2)
+
+        layer_services.delete_map_layer_by_cb_dict(dict(DV_PARAMS))
+        self.assertEqual(self.num_posts, 3)
+        self.assertFalse(self.get_layer_info()[0])
+        self.assertEqual(self.num_posts, 4)
+
+    def test_04_unicode_installation_name(self):
+        """Installation names from forms are unicode"""
+        msgt(self.test_04_unicode_installation_name.__doc__)
+
+        self.assertEqual(layer_services.get_layer_info_cache_key(u'http://localhost:8080', 15),
+                         layer_services.get_layer_info_cache_key('http://localhost:8080', 15))
+
+        cache_key = layer_services.get_layer_info_cache_key(u'Dataverse M\xfcnchen', 15)
+        self.assertEqual(len(cache_key), 32)
+        layer_services.clear_layer_info_cache(u'Dataverse M\xfcnchen', 15)
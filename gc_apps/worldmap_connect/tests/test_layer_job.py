@@ -0,0 +1,124 @@
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.core.urlresolvers import reverse
+
+from gc_apps.worldmap_connect.models import WorldMapLayerJob,\
+    JOB_TYPE_TABLE_JOIN,\
+    JOB_STATUS_PENDING, JOB_STATUS_RUNNING, JOB_STATUS_FAILED
+from gc_apps.worldmap_connect.layer_job_service import LayerJobService
+from gc_apps.geo_utils.msg_util import msgt
+
+FAKE_MD5 = 'a' * 32
+
+
+class WorldMapLayerJobTestCase(TestCase):
+    """
+    Test the WorldMapLayerJob queue: create, claim, run, status
+    """
+
+    def test_01_create_and_claim(self):
+        """Jobs are de-duplicated and may only be claimed once"""
+        msgt(self.test_01_create_and_claim.__doc__)
+
+        job = LayerJobService.create_job(JOB_TYPE_TABLE_JOIN, FAKE_MD5,
+                                         dict(chosen_column='x', chosen_layer=2))
+        self.assertEqual(job.status, JOB_STATUS_PENDING)
+        self.assertEqual(len(job.md5), 32)
+
+        # Same request while the job is pending: same job
+        job2 = LayerJobService.create_job(JOB_TYPE_TABLE_JOIN, FAKE_MD5,
+                                          dict(chosen_column='x', chosen_layer=2))
+        self.assertEqual(job2.id, job.id)
+
+        # Different params: new job
+        job3 = LayerJobService.create_job(JOB_TYPE_TABLE_JOIN, FAKE_MD5,
+                                          dict(chosen_column='y', chosen_layer=2))
+        self.assertNotEqual(job3.id, job.id)
+
+        # Oldest job claimed first
+        claimed_job = LayerJobService.claim_next_job('worker-1')
+        self.assertEqual(claimed_job.id, job.id)
+        self.assertEqual(claimed_job.status, JOB_STATUS_RUNNING)
+
+        # Can't claim it twice
+        self.assertFalse(LayerJobService.claim_job(job, 'worker-2'))
+        self.assertEqual(WorldMapLayerJob.objects.get(pk=job.id).worker_name,
+                         'worker-1')
+
+    def test_02_run_failed_job(self):
+        """A job that fails records the error message"""
+        msgt(self.test_02_run_failed_job.__doc__)
+
+        LayerJobService.create_job(JOB_TYPE_TABLE_JOIN, FAKE_MD5,
+                                   dict(chosen_column='x', chosen_layer=2))
+
+        # The TabularFileInfo doesn't exist
+        self.assertEqual(LayerJobService.run_pending_jobs('worker-1'), 1)
+        self.assertEqual(LayerJobService.run_pending_jobs('worker-1'), 0)
+
+        job = WorldMapLayerJob.objects.get(gis_data_md5=FAKE_MD5)
+        self.assertEqual(job.status, JOB_STATUS_FAILED)
+        self.assertTrue(job.is_finished())
+        self.assertTrue(job.error_message.find('not found') > -1)
+        self.assertTrue(job.finished is not None)
+
+    def test_03_status_view(self):
+        """The status view reports pending and failed jobs"""
+        msgt(self.test_03_status_view.__doc__)
+
+        job = LayerJobService.create_shapefile_job(FAKE_MD5)
+        status_url = reverse('view_layer_job_status',
+                             kwargs=dict(job_md5=job.md5))
+
+        resp = self.client.get(status_url)
+        json_resp = json.loads(resp.content)
+        self.assertTrue(json_resp['success'])
+        self.assertFalse(json_resp['data']['is_finished'])
+        self.assertEqual(json_resp['data']['job_status_url'], status_url)
+
+        # The shapefile doesn't exist
+        LayerJobService.run_pending_jobs()
+
+        resp = self.client.get(status_url)
+        json_resp = json.loads(resp.content)
+        self.assertFalse(json_resp['success'])
+        self.assertTrue(json_resp['message'].find('shapefile was not found') > -1)
+
+        # Unknown job
+        resp = self.client.get(reverse('view_layer_job_status',
+                                       kwargs=dict(job_md5='b' * 32)))
+        self.assertFalse(json.loads(resp.content)['success'])
+
+        # Job status and job creation responses aren't cached
+        for url in (status_url,
+                    reverse('view_ajax_attempt_visualization',
+                            kwargs=dict(shp_md5=FAKE_MD5))):
+            resp = self.client.get(url)
+            self.assertTrue(resp['Cache-Control'].find('max-age=0') > -1)
+
+    @override_settings(WORLDMAP_LAYER_JOB_PENDING_TIMEOUT=60)
+    def test_04_stalled_jobs(self):
+        """Jobs never picked up, or abandoned by a worker, are marked failed"""
+        msgt(self.test_04_stalled_jobs.__doc__)
+
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+
+        # Pending too long
+        job = LayerJobService.create_shapefile_job(FAKE_MD5)
+        WorldMapLayerJob.objects.filter(pk=job.pk).update(created=an_hour_ago)
+        job.refresh_from_db()
+        self.assertTrue(LayerJobService.fail_if_never_started(job))
+        self.assertEqual(job.status, JOB_STATUS_FAILED)
+
+        # Running too long
+        job2 = LayerJobService.create_shapefile_job(FAKE_MD5)
+        LayerJobService.claim_job(job2, 'worker-1')
+        self.assertEqual(LayerJobService.fail_stalled_jobs(60 * 60 * 2), 0)
+
+        WorldMapLayerJob.objects.filter(pk=job2.pk).update(started=an_hour_ago)
+        self.assertEqual(LayerJobService.fail_stalled_jobs(60), 1)
+        self.assertEqual(WorldMapLayerJob.objects.get(pk=job2.pk).status,
+                         JOB_STATUS_FAILED)
@@ -0,0 +1,114 @@
+"""
+Test the streaming multipart body used for WorldMap uploads
+"""
+from __future__ import print_function
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from StringIO import StringIO
+import cgi
+import threading
+
+from django.test import SimpleTestCase
+
+from gc_apps.geo_utils.msg_util import msgt
+from gc_apps.geo_utils.http_client import http_post, close_sessions
+from gc_apps.geo_utils.multipart_stream import MultipartFileStream
+
+
+class ReadSizeFile(StringIO):
+    """Keeps track of the largest read"""
+    max_read_size = 0
+
+    def read(self, size=-1):
+        self.max_read_size = max(self.max_read_size, size)
+        return StringIO.read(self, size)
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    """Save the POST headers and body"""
+
+    def do_POST(self):
+        self.server.post_headers = self.headers
+        self.server.post_body = self.rfile.read(\
+                                    int(self.headers.getheader('Content-Length')))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class MultipartFileStreamTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.file_content = ''.join([chr(x % 256) for x in range(300000)])
+        self.fields = dict(title=u'Boston Income \xe9',
+                           abstract='Income levels',
+                           dv_file_id=12,
+                           tags=['a', 'b'],
+                           skip_me=None)
+
+    def get_upload(self, chunk_size=8192):
+        return MultipartFileStream(self.fields,
+                                   'uploaded_file',
+                                   'income.zip',
+                                   ReadSizeFile(self.file_content),
+                                   len(self.file_content),
+                                   chunk_size=chunk_size)
+
+    def parse_body(self, body, content_type):
+        """Use the cgi module to read the multipart body"""
+        return cgi.FieldStorage(fp=StringIO(body),
+                                environ=dict(REQUEST_METHOD='POST',
+                                             CONTENT_TYPE=content_type,
+                                             CONTENT_LENGTH=str(len(body))))
+
+    def test_01_encode(self):
+        """The body is read in chunks and matches its length"""
+        msgt(self.test_01_encode.__doc__)
+
+        upload = self.get_upload()
+        body = ''.join([chunk for chunk in upload])
+
+        self.assertEqual(len(body), len(upload))
+        self.assertEqual(upload.file_object.max_read_size, 8192)
+
+        form = self.parse_body(body, upload.content_type)
+        self.assertEqual(form.getfirst('title'), u'Boston Income \xe9'.encode('utf-8'))
+        self.assertEqual(form.getfirst('dv_file_id'), '12')
+        self.assertEqual(form.getlist('tags'), ['a', 'b'])
+        self.assertFalse('skip_me' in form)
+        self.assertEqual(form['uploaded_file'].filename, 'income.zip')
+        self.assertEqual(form['uploaded_file'].value, self.file_content)
+
+        upload.close()
+        self.assertEqual(upload.file_object, None)
+
+    def test_02_post(self):
+        """The body is sent with a Content-Length (not chunked)"""
+        msgt(self.test_02_post.__doc__)
+
+        server = HTTPServer(('127.0.0.1', 0), BodyHandler)
+        server_thread = threading.Thread(target=server.handle_request)
+        server_thread.daemon = True
+        server_thread.start()
+
+        upload = self.get_upload(chunk_size=1000)
+        try:
+            resp = http_post('http://127.0.0.1:%s/upload' % server.server_port,
+                             data=upload,
+                             headers={'Content-Type': upload.content_type})
+        finally:
+            upload.close()
+            close_sessions()
+            server.server_close()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(server.post_headers.getheader('Content-Length'),
+                         str(len(upload)))
+        self.assertEqual(server.post_headers.getheader('Transfer-Encoding'), None)
+
+        form = self.parse_body(server.post_body, upload.content_type)
+        self.assertEqual(form['uploaded_file'].value, self.file_content)
+        self.assertEqual(upload.num_bytes_read, len(upload))
@@ -0,0 +1,104 @@
+"""
+Test the namespaced SharedCache with backends that need no external service
+"""
+from __future__ import print_function
+import shutil
+import tempfile
+import time
+
+from django.core import management
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import TestCase, override_settings
+
+from gc_apps.geo_utils.msg_util import msgt, msg
+from gc_apps.geo_utils.shared_cache import SharedCache,\
+    get_cache_metrics, reset_cache_metrics
+
+DB_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'test_geoconnect_cache',
+    }
+}
+
+
+class SharedCacheTestCase(TestCase):
+
+    def setUp(self):
+        reset_cache_metrics()
+        self.cache_dir = tempfile.mkdtemp(prefix='test_shared_cache_')
+
+    def tearDown(self):
+        reset_cache_metrics()
+        shutil.rmtree(self.cache_dir)
+
+    def get_file_caches(self):
+        return {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                            'LOCATION': self.cache_dir}}
+
+    def run_cache_checks(self):
+        """Namespaces, timeouts, get_or_set, and metrics"""
+        layer_cache = SharedCache('layers', default_timeout=60)
+        other_cache = SharedCache('other')
+
+        msg('keys are namespaced')
+        self.assertEqual(layer_cache.make_key('abc'), 'geoconnect:layers:abc')
+        layer_cache.set('abc', {'name': 'roads'})
+        self.assertEqual(layer_cache.get('abc'), {'name': 'roads'})
+        self.assertEqual(other_cache.get('abc'), None)
+
+        msg('None can be cached')
+        layer_cache.set('none', None)
+        self.assertEqual(layer_cache.get('none', 'default'), None)
+
+        msg('add() only sets new keys')
+        self.assertFalse(layer_cache.add('abc', 'x'))
+        self.assertTrue(layer_cache.add('new_key', 'x'))
+
+        msg('timeouts')
+        layer_cache.set('short', 'x', timeout=1)
+        time.sleep(1.1)
+        self.assertEqual(layer_cache.get('short'), None)
+
+        msg('get_or_set')
+        self.assertEqual(other_cache.get_or_set('calc', lambda: 42), 42)
+        self.assertEqual(other_cache.get_or_set('calc', lambda: 99), 42)
+
+        layer_cache.delete('abc')
+        self.assertEqual(layer_cache.get('abc'), None)
+
+        metrics = dict([(m['namespace'], m) for m in get_cache_metrics()])
+        self.assertEqual(metrics['layers']['num_hits'], 2)
+        self.assertEqual(metrics['layers']['num_misses'], 2)
+        self.assertEqual(metrics['layers']['num_sets'], 4)
+        self.assertEqual(metrics['layers']['num_deletes'], 1)
+        self.assertEqual(metrics['other']['num_hits'], 1)
+        self.assertEqual(metrics['other']['num_misses'], 2)
+        self.assertEqual(metrics['other']['hit_rate'], 1 / 3.0)
+
+    def test_01_file_cache(self):
+        """File based cache"""
+        msgt(self.test_01_file_cache.__doc__)
+
+        with self.settings(CACHES=self.get_file_caches()):
+            self.run_cache_checks()
+
+            msg('visible to another backend instance (e.g. another process)')
+            SharedCache('files').set('abc', 1)
+            other_backend = FileBasedCache(self.cache_dir, {})
+            self.assertEqual(other_backend.get('geoconnect:files:abc'), 1)
+
+    @override_settings(CACHES=DB_CACHES, GEOCONNECT_CACHE_ALIAS='shared')
+    def test_02_database_cache(self):
+        """Database cache"""
+        msgt(self.test_02_database_cache.__doc__)
+
+        management.call_command('createcachetable', 'test_geoconnect_cache', verbosity=0)
+        self.run_cache_checks()
+
+        msg('timeout from settings.GEOCONNECT_CACHE_TIMEOUTS')
+        with self.settings(GEOCONNECT_CACHE_TIMEOUTS={'layers': 5}):
+            self.assertEqual(SharedCache('layers', default_timeout=60).timeout, 5)
@@ -1,6 +1,6 @@
 """Convenience urls for JoinTargets"""
 from django.conf.urls import url
-from gc_apps.worldmap_connect import views
+from gc_apps.worldmap_connect import views, views_layer_job
 
 urlpatterns = [
 
@@ -10,4 +10,8 @@ urlpatterns = [
 
     url(r'^test-err-log/$', views.view_test_err_log, name="view_test_err_log"),
 
+    url(r'^layer-job-status/(?P<job_md5>\w{32})/$',
+        views_layer_job.view_layer_job_status,
+        name="view_layer_job_status"),
+
 ]
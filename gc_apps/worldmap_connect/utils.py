@@ -1,57 +1,156 @@
 """
 Convenience methods for using the WorldMap API
 """
+import threading
+from datetime import timedelta
+
+from gc_apps.geo_utils.shared_cache import SharedCache
+from django.db import connection
 from django.utils import timezone
 from django.conf import settings
 from gc_apps.worldmap_connect.models import JoinTargetInformation
-from gc_apps.worldmap_connect.dataverse_layer_services import get_join_targets
-from datetime import timedelta
+from gc_apps.worldmap_connect import dataverse_layer_services
 import logging
 
 LOGGER = logging.getLogger('gc_apps.worldmap_connect.utils')
 
+# The latest JoinTargetInformation, cached with no expiration.
+#   A stale copy is served while it's refreshed in the background
+JOIN_TARGET_CACHE = SharedCache('join_targets', default_timeout=None)
+CACHE_KEY_JOIN_TARGET_INFO = 'latest'
 
+# Only one refresh at a time.  After a failed refresh, the lock is
+# kept until it expires: WorldMap isn't called again before then
+CACHE_KEY_JOIN_TARGET_REFRESH = 'refresh_lock'
+
+# Set to False to refresh within the calling thread (e.g. for tests)
+REFRESH_IN_BACKGROUND = True
+
+
+def get_refresh_lock_seconds():
+    """Max time for a refresh--also the wait after a failed one"""
+    return max(settings.JOIN_TARGET_UPDATE_TIME, settings.WORLDMAP_SHORT_TIMEOUT)
+
+
+def get_recent_time_window():
+    return timezone.now() - timedelta(seconds=settings.JOIN_TARGET_UPDATE_TIME)
+
+
+def is_jointarget_information_stale(join_target):
+    """Is this JoinTargetInformation older than settings.JOIN_TARGET_UPDATE_TIME?"""
+    return join_target.created < get_recent_time_window()
 
-def get_latest_jointarget_information():
-    """
-    Retrieve recent JoinTarget Information from the database.
 
-    If recent information is not available in the db, use the WorldMap API and store
-    the new information in the db.
+def cache_jointarget_information(join_target):
+    JOIN_TARGET_CACHE.set(CACHE_KEY_JOIN_TARGET_INFO, join_target)
+
+
+def refresh_jointarget_information():
     """
-    # ---------------------------------
-    # (1) Is available JoinTarget info from db
-    # ---------------------------------
-    recent_time_window = timezone.now() + timedelta(seconds=(-1 * settings.JOIN_TARGET_UPDATE_TIME))
+    Retrieve JoinTarget information from the WorldMap API, save it,
+    and update the cache.
 
+    If another process has already saved recent information, use that.
+
+    Returns a JoinTargetInformation object or None
+    """
     join_target = JoinTargetInformation.objects.filter(\
-                    created__gte=recent_time_window).first()
+                    created__gte=get_recent_time_window()).first()
     if join_target is not None:
+        cache_jointarget_information(join_target)
         return join_target
 
+    (success, dict_info_or_err) = dataverse_layer_services.get_join_targets()
+    if not success:
+        LOGGER.error('Failed to retrieve JoinTargetInformation from WorldMap: %s',
+                     dict_info_or_err)
+        return None
+
+    join_target = JoinTargetInformation(name=timezone.now().strftime("%Y-%m-%d %H:%M:%S"),\
+            target_info=dict_info_or_err)
+    join_target.save()
+
+    cache_jointarget_information(join_target)
+    return join_target
+
+
+def run_jointarget_refresh():
+    """
+    Refresh and release the lock.  On failure, the lock expires on its own
+    """
+    try:
+        join_target = refresh_jointarget_information()
+    except Exception as ex_obj:
+        LOGGER.exception('JoinTargetInformation refresh failed: %s', ex_obj)
+        join_target = None
+
+    if join_target is not None:
+        JOIN_TARGET_CACHE.delete(CACHE_KEY_JOIN_TARGET_REFRESH)
+
+
+def run_background_jointarget_refresh():
+    """Thread target: the thread has its own db connection, close it when done"""
+    try:
+        run_jointarget_refresh()
+    finally:
+        connection.close()
+
+
+def start_jointarget_refresh():
+    """
+    Refresh the JoinTarget information in a background thread.
+    Concurrent refreshes are collapsed into one.
+
+    Returns True if a refresh was started
+    """
+    if not JOIN_TARGET_CACHE.add(CACHE_KEY_JOIN_TARGET_REFRESH, True,
+                                 get_refresh_lock_seconds()):
+        return False
+
+    if not REFRESH_IN_BACKGROUND:
+        run_jointarget_refresh()
+        return True
+
+    refresh_thread = threading.Thread(target=run_background_jointarget_refresh,
+                                      name='jointarget-refresh')
+    refresh_thread.daemon = True
+    refresh_thread.start()
+    return True
+
+
+def get_latest_jointarget_information():
+    """
+    Retrieve recent JoinTarget Information: stale-while-revalidate
+
+    (1) Use the cached JoinTargetInformation, or the latest one in the db
+    (2) If it's older than settings.JOIN_TARGET_UPDATE_TIME, return it
+        anyway and refresh it from the WorldMap API in the background
+    (3) Only if there's nothing at all, wait for the WorldMap API
+    """
+    # ---------------------------------
+    # (1) Cached or latest JoinTarget info from db
     # ---------------------------------
-    # (2) Get JoinTarget info from the WorldMap API
-    #   and save it to the database
+    join_target = JOIN_TARGET_CACHE.get(CACHE_KEY_JOIN_TARGET_INFO)
+    if join_target is None:
+        join_target = JoinTargetInformation.objects.first()
+        if join_target is not None:
+            cache_jointarget_information(join_target)
+
+    # ---------------------------------
+    # (2) Serve it--if stale, refresh in the background
     # ---------------------------------
-    (success, dict_info_or_err) = get_join_targets()
-    if success:
-        join_target = JoinTargetInformation(name=timezone.now().strftime("%Y-%m-%d %H:%M:%S"),\
-                target_info=dict_info_or_err)
-        join_target.save()
+    if join_target is not None:
+        if is_jointarget_information_stale(join_target):
+            start_jointarget_refresh()
         return join_target
 
     # ---------------------------------
-    # (3) Get JoinTarget info from database --
-    #   even if it's old
+    # (3) Nothing available: get JoinTarget info from the WorldMap API
     # ---------------------------------
-    join_target = JoinTargetInformation.objects.first()
+    join_target = refresh_jointarget_information()
     if join_target is None:
         LOGGER.error('No JoinTargetInformation available in the database \
-        (failed attempt to retrieve it from WorldMap): %s', dict_info_or_err)
-        return None
-
-    LOGGER.error('Failed to retrieve timely JoinTargetInformation from WorldMap\
-     (used last avaialable from the database): %s', dict_info_or_err)
+        (failed attempt to retrieve it from WorldMap)')
 
     return join_target
 
@@ -0,0 +1,149 @@
+"""
+AJAX responses for WorldMapLayerJob objects
+
+- While a job is pending/running, the JSON response includes
+  the job status url.  The browser polls that url.
+- When a job succeeds, the JSON response includes the map HTML
+"""
+from django.conf import settings
+from django.http import HttpResponse
+from django.core.urlresolvers import reverse
+from django.views.decorators.cache import never_cache
+
+from gc_apps.classification.utils import get_worldmap_info_object
+from gc_apps.geo_utils.geoconnect_step_names import PANEL_TITLE_STYLE_MAP
+from gc_apps.geo_utils.message_helper_json import MessageHelperJSON
+from gc_apps.gis_shapefiles.models import ShapefileInfo
+from gc_apps.gis_tabular.views import build_map_html
+
+from gc_apps.worldmap_connect.models import WorldMapLayerJob, JOB_TYPE_SHAPEFILE
+from gc_apps.worldmap_connect.layer_job_service import LayerJobService,\
+    is_async_enabled
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+def get_json_response(json_msg):
+    """Convenience method, all responses are JSON w/ a 200 status"""
+    return HttpResponse(json_msg, content_type="application/json", status=200)
+
+
+def get_layer_job_failed_response(job):
+    """The job failed. Send the error message"""
+    err_note = job.error_message or\
+               'Sorry! Failed to create map. Please try again.'
+
+    if job.job_type == JOB_TYPE_SHAPEFILE:
+        # avoid a circular import
+        from gc_apps.gis_shapefiles.views_02_visualize import render_ajax_basic_err_msg
+
+        shapefile_info = ShapefileInfo.objects.filter(md5=job.gis_data_md5).first()
+        err_note_html = render_ajax_basic_err_msg(err_note, shapefile_info)
+
+        json_msg = MessageHelperJSON.get_json_fail_msg(\
+                        err_note_html,
+                        dict(id_main_panel_content=err_note_html))
+        return get_json_response(json_msg)
+
+    return get_json_response(MessageHelperJSON.get_json_fail_msg(err_note))
+
+
+def get_layer_job_response(request, job):
+    """
+    Return a JSON response describing the WorldMapLayerJob:
+        - pending/running: the status url to check again
+        - failed: the error message
+        - success: the map HTML
+    """
+    assert isinstance(job, WorldMapLayerJob), "job must be a WorldMapLayerJob"
+
+    LayerJobService.fail_if_never_started(job)
+
+    # -----------------------------------------
+    # Still working...
+    # -----------------------------------------
+    if not job.is_finished():
+        data_dict = dict(\
+                    job_md5=job.md5,
+                    job_status=job.status,
+                    is_finished=False,
+                    job_status_url=reverse('view_layer_job_status',
+                                           kwargs=dict(job_md5=job.md5)),
+                    poll_seconds=settings.WORLDMAP_LAYER_JOB_POLL_SECONDS)
+
+        json_msg = MessageHelperJSON.get_json_success_msg(\
+                        'Working...', data_dict=data_dict)
+        return get_json_response(json_msg)
+
+    # -----------------------------------------
+    # Failed along the way!
+    # -----------------------------------------
+    if not job.is_success():
+        return get_layer_job_failed_response(job)
+
+    # -----------------------------------------
+    # Yes!  We have a new map layer
+    # -----------------------------------------
+    worldmap_layerinfo = get_worldmap_info_object(job.layer_type, job.layer_md5)
+    if worldmap_layerinfo is None:
+        LOGGER.error("WorldMapLayerJob succeeded but layer not found: %s", job.md5)
+        user_msg = 'Sorry! Failed to create map. Please try again. (code: j4)'
+        return get_json_response(MessageHelperJSON.get_json_fail_msg(user_msg))
+
+    # -----------------------------------------
+    # Build the Map HTML to replace the form
+    # -----------------------------------------
+    map_html, user_message_html = build_map_html(request, worldmap_layerinfo)
+    if map_html is None:    # Failed!  Send an error
+        LOGGER.error("Failed to create map HTML using %s: %s (%d)",\
+            type(worldmap_layerinfo).__name__,
+            worldmap_layerinfo, worldmap_layerinfo.id)
+        user_msg = 'Sorry! Failed to create map. Please try again. (code: s2)'
+        return get_json_response(MessageHelperJSON.get_json_fail_msg(user_msg))
+
+    # -----------------------------------------
+    # Looks good.  In the JSON response, send
+    #   back the map HTML
+    # -----------------------------------------
+    data_dict = dict(\
+                job_md5=job.md5,
+                job_status=job.status,
+                is_finished=True,
+                map_html=map_html,
+                user_message_html=user_message_html,
+                id_main_panel_title=PANEL_TITLE_STYLE_MAP)
+
+    if job.job_type == JOB_TYPE_SHAPEFILE:
+        data_dict['message'] = 'Success! The shapefile was successfully mapped!'
+
+    json_msg = MessageHelperJSON.get_json_success_msg("great job", data_dict=data_dict)
+
+    return get_json_response(json_msg)
+
+
+@never_cache
+def view_layer_job_status(request, job_md5):
+    """
+    AJAX call: Check on a WorldMapLayerJob
+        - never_cache: skip the site-wide cache middleware
+    """
+    job = WorldMapLayerJob.objects.filter(md5=job_md5).first()
+    if job is None:
+        err_msg = 'Sorry! The map request was not found.'
+        return get_json_response(MessageHelperJSON.get_json_fail_msg(err_msg))
+
+    return get_layer_job_response(request, job)
+
+
+def start_layer_job(request, job):
+    """
+    Called by the views that create WorldMap layers.
+
+    Async (default): return the job status so the browser can poll.
+    Otherwise: run the job now and return the result
+    """
+    if not is_async_enabled():
+        LayerJobService.run_job_now(job)
+
+    return get_layer_job_response(request, job)
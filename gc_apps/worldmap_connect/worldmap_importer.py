@@ -10,6 +10,8 @@ if __name__ == '__main__':
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geoconnect.settings")
 
 from gc_apps.geo_utils.message_helper_json import MessageHelperJSON
+from gc_apps.geo_utils.http_client import http_post
+from gc_apps.geo_utils.multipart_stream import MultipartFileStream
 from django.conf import settings
 
 from shared_dataverse_information.worldmap_api_helper.url_helper import ADD_SHAPEFILE_API_PATH
@@ -66,8 +68,9 @@ class WorldMapImporter:
                         , 'shapefile_name' : 'zipfile_name.zip'\
                         }
         :type layer_params
-        :param fullpath_to_file: file name, including path, to shapefile in .zip format
-        :type fullpath_to_file: str or unicode
+        :param file_object: the shapefile in .zip format.  It is streamed
+            to WorldMap, not read into memory
+        :type file_object: Django FieldFile (local or S3 storage)
 
         :returns: python dict with keys for "success" as well as messages, meteadata, etc.
                 see https://github.com/IQSS/geoconnect/blob/master/docs/api_worldmap_connect.md
@@ -93,22 +96,28 @@ class WorldMapImporter:
             LOGGER.error(err_msg)
             return self.get_result_msg(False, err_msg)
 
-        shp_file_param = {'content': file_object}
+        upload = MultipartFileStream.from_field_file(\
+                                layer_params, 'content', file_object)
+        if upload is None:
+            err_msg = 'The file_object could not be opened'
+            LOGGER.error(err_msg)
+            return self.get_result_msg(False, err_msg)
 
         # Send the request to WorldMap
         #
         LOGGER.debug('import url: %s', self.api_import_url)
         LOGGER.debug('layer_params: %s', layer_params)
         LOGGER.debug ('self.timeout_seconds: %s', self.timeout_seconds)
+        LOGGER.debug('upload size: %s', len(upload))
 
         r = None
         try:
-            r = requests.post(self.api_import_url,
-                               data=layer_params,
-                               files=shp_file_param,
-                               auth=settings.WORLDMAP_ACCOUNT_AUTH,
-                               timeout=settings.WORLDMAP_DEFAULT_TIMEOUT
-                            )
+            r = http_post(self.api_import_url,
+                          data=upload,
+                          headers={'Content-Type': upload.content_type},
+                          auth=settings.WORLDMAP_ACCOUNT_AUTH,
+                          timeout=settings.WORLDMAP_DEFAULT_TIMEOUT,
+                          endpoint_name='worldmap.add_shapefile')
         except requests.exceptions.ConnectionError as exception_obj:
             err_msg = """<br /><p><b>Details for administrator:</b> Could not contact the
                     WorldMap server: %s</p>"""\
@@ -126,6 +135,9 @@ class WorldMapImporter:
             LOGGER.error(err_msg)
             return self.get_result_msg(False, err_msg)
 
+        finally:
+            upload.close()
+
         if r.status_code == 200:
             wm_response_dict = r.json()
             LOGGER.debug('response: %s', wm_response_dict)
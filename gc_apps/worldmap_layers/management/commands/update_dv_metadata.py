@@ -16,7 +16,8 @@ class Command(BaseCommand):
     # Show this when the user types help
     help = ('Update the WorldMap metadata on Dataverse via a Dataverse API'
             ' endpoint.  Using the md5 of the WorldMapLayerInfo.'
-            ' Note: This is used internally in lieu of a task queue')
+            ' Note: Updates are normally queued and sent by the'
+            ' "run_dv_notifier" command.  Use this for a one-off update.')
 
     def add_arguments(self, parser):
         #parser.add_argument('poll_id', nargs='\d', type=str)
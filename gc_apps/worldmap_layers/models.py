@@ -3,6 +3,7 @@ from __future__ import print_function
 from abc import abstractmethod
 from urlparse import urlparse
 import logging
+import uuid
 
 from django.conf import settings
 from django.db import models
@@ -54,6 +55,20 @@ class WorldMapLayerInfo(TimeStampedModel):
         """string representation"""
         return self.layer_name
 
+    def save(self, *args, **kwargs):
+        """
+        - Set the layer_name based on the JSON core_data
+        - Set the md5 before the first insert: a single write per save
+        """
+        self.layer_name = self.core_data.get('layer_typename', None)
+        if self.layer_name is None:
+            self.layer_name = self.core_data.get('layer_name')
+
+        if not self.md5:
+            self.md5 = uuid.uuid4().hex
+
+        super(WorldMapLayerInfo, self).save(*args, **kwargs)
+
     @abstractmethod
     def get_layer_type(self):
         """return type such as:
@@ -14,15 +14,23 @@ function attempt_visualization(){
             console.log(json_resp);
          })
          .done(function(json_resp) {
-             if (json_resp.success){
-                 show_map_update_titles(json_resp);
-             }else{
-                 logit(json_resp.message);
-                 $('#id_main_panel_content').show().empty().append(get_alert('danger', json_resp.message));
-             }
+             // The map is created by a background job
+             wait_for_layer_job(json_resp, show_visualization_result);
           })
   }
 
+/*
+  Show the map or the error message
+*/
+function show_visualization_result(json_resp){
+     if (json_resp.success){
+         show_map_update_titles(json_resp);
+     }else{
+         logit(json_resp.message);
+         $('#id_main_panel_content').show().empty().append(get_alert('danger', json_resp.message));
+     }
+}
+
 $(document).ready(function() {
       $("#id_link_visualize_worldmap").on( "click", attempt_visualization );
  });
@@ -49,31 +49,39 @@
             logit2(json_resp);
         })
         .done(function(json_resp) {
-            if (json_resp.success){
-                // Show map, update titles
-                show_map_update_titles(json_resp);
-                $('#id_preview_table_panel').hide();    // hide the preview table
-                hide_setup_form_submit_buttons();
-                window.scrollTo(0, 0);
-            }else{
-                logit2(json_resp.message);
-                // form error, display message
-                //$('#msg_form_lat_lng').html(json_resp.message);
-                $('#id_alert_container').show().empty().append(get_alert('danger', json_resp.message));
-
-            }
+            // The map is created by a background job
+            wait_for_layer_job(json_resp, show_lat_lng_form_result);
           })
         .fail(function(json_resp) {
              //$('#simple_msg_div').empty().append(get_alert('danger', 'The classification failed.  Please try again.'));
-        })
-        .always(function() {
-             // Enable submit button
-             if ($('#id_frm_lat_lng_submit').length){
-                 $('#id_frm_lat_lng_submit').removeClass('disabled').html('Submit Latitude & Longitude columns');
-             }
+             enable_lat_lng_submit_button();
         });
     }
 
+    function show_lat_lng_form_result(json_resp){
+        if (json_resp.success){
+            // Show map, update titles
+            show_map_update_titles(json_resp);
+            $('#id_preview_table_panel').hide();    // hide the preview table
+            hide_setup_form_submit_buttons();
+            window.scrollTo(0, 0);
+        }else{
+            logit2(json_resp.message);
+            // form error, display message
+            //$('#msg_form_lat_lng').html(json_resp.message);
+            $('#id_alert_container').show().empty().append(get_alert('danger', json_resp.message));
+
+        }
+        enable_lat_lng_submit_button();
+    }
+
+    function enable_lat_lng_submit_button(){
+         // Enable submit button
+         if ($('#id_frm_lat_lng_submit').length){
+             $('#id_frm_lat_lng_submit').removeClass('disabled').html('Submit Latitude & Longitude columns');
+         }
+    }
+
 
 
     /**
@@ -180,29 +188,37 @@
             logit2(json_resp);
         })
         .done(function(json_resp) {
-            if (json_resp.success){
-                $('#id_preview_table_panel').hide();    // hide the preview table
-                show_map_update_titles(json_resp);
-                hide_setup_form_submit_buttons();
-                window.scrollTo(0, 0);
-            }else{
-
-                logit2(json_resp.message);
-                $('#id_alert_container').show().empty().append(get_alert('danger', json_resp.message));
-
-            }
+            // The map is created by a background job
+            wait_for_layer_job(json_resp, show_single_column_form_result);
           })
         .fail(function(json_resp) {
              //$('#simple_msg_div').empty().append(get_alert('danger', 'The classification failed.  Please try again.'));
-        })
-        .always(function() {
-             // Enable submit button
-             if ($('#id_frm_single_column_submit').length){
-                 $('#id_frm_single_column_submit').removeClass('disabled').html(SUBMIT_BUTTON_TEXT);
-             }
+             enable_single_column_submit_button();
         });
     }
 
+    function show_single_column_form_result(json_resp){
+        if (json_resp.success){
+            $('#id_preview_table_panel').hide();    // hide the preview table
+            show_map_update_titles(json_resp);
+            hide_setup_form_submit_buttons();
+            window.scrollTo(0, 0);
+        }else{
+
+            logit2(json_resp.message);
+            $('#id_alert_container').show().empty().append(get_alert('danger', json_resp.message));
+
+        }
+        enable_single_column_submit_button();
+    }
+
+    function enable_single_column_submit_button(){
+         // Enable submit button
+         if ($('#id_frm_single_column_submit').length){
+             $('#id_frm_single_column_submit').removeClass('disabled').html(SUBMIT_BUTTON_TEXT);
+         }
+    }
+
     function bind_form_submit_buttons(){
         logit2('bind_submit_lat_lng_form');
         $("#id_frm_lat_lng_submit").on( "click", submit_lat_lng_form );
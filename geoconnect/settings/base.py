@@ -206,6 +206,7 @@ LOCAL_APPS = (
     'gc_apps.gis_shapefiles',
     'gc_apps.gis_tabular',
     'gc_apps.worldmap_connect',
+    'gc_apps.dv_notify',
 )
 
 # See: https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
@@ -281,8 +282,21 @@ SESSION_COOKIE_NAME = 'geoconnect_local'
 ########## GISFILE_SCRATCH_WORK_DIRECTORY
 # Used for opening up files for processing, etc
 GISFILE_SCRATCH_WORK_DIRECTORY = None
+
+# "prune_scratch_directories" command (see gc_apps.gis_basic_file.scratch_workspace)
+#   - remove directories not used within this time
+GISFILE_SCRATCH_MAX_HOURS = 6
+#   - then remove least recently used directories until the total
+#     is under this size.  None: no limit
+#     (The "parsed_tabular_cache" directory counts toward the total)
+GISFILE_SCRATCH_MAX_BYTES = None    # e.g. 5 * 1024**3 for 5GB
 ########## END GISFILE_SCRATCH_WORK_DIRECTORY
 
+# Shapefiles are read from the .zip in memory unless the .shp, .shx
+# and .dbf files total more than this.  Larger files are extracted
+# to the scratch directory.  None: no limit
+SHAPEFILE_MAX_IN_ARCHIVE_READ_BYTES = 100 * 1024**2     # 100MB
+
 # Time used by scripts to remove stale data objects
 #   e.g. Objects removed if they were created more
 #   than 'x' minutes ago--where 'x' is the variable below
@@ -308,6 +322,9 @@ DATAVERSE_METADATA_UPDATE_API_PATH =  '/api/worldmap/update-layer-metadata/' #DA
 #
 DV_DATAFILE_DIRECTORY = None
 
+# Dataverse files larger than this are not downloaded
+DV_FILE_MAX_DOWNLOAD_BYTES = 4 * 1024 * 1024 * 1024 # 4 GB
+
 ########## END DATAVERSE_SERVER_URL
 
 BROKER_URL = 'django://'
@@ -325,5 +342,37 @@ WORLDMAP_LAYER_EXPIRATION = 15 * 60 # 15 minutes
 
 JOIN_TARGET_UPDATE_TIME = 1 * 60 # 10 minutes
 
+# Cache WorldMap "existing layer" lookups by Dataverse installation + file id
+#   - cleared when geoconnect creates or deletes the layer
+WORLDMAP_LAYER_INFO_CACHE_SECONDS = 15 * 60
+WORLDMAP_LAYER_NOT_FOUND_CACHE_SECONDS = 5 * 60
+
+# Create WorldMap layers via the "run_worldmap_layer_jobs" command
+#   - If False, layers are created within the web request
+WORLDMAP_LAYER_JOBS_RUN_ASYNC = True
+# Fail jobs not picked up by a worker within this time
+WORLDMAP_LAYER_JOB_PENDING_TIMEOUT = 10 * 60 # seconds
+# How often the browser checks a job's status
+WORLDMAP_LAYER_JOB_POLL_SECONDS = 2
+
+# Shared HTTP client for WorldMap/Dataverse calls (gc_apps.geo_utils.http_client)
+#   - one pooled, keep-alive session per host
+HTTP_CLIENT_POOL_CONNECTIONS = 10   # pools (hosts) cached per session
+HTTP_CLIENT_POOL_MAXSIZE = 10       # connections kept per host
+# Retries after a connection error, timeout, or status code below.
+#   Only GET/HEAD/OPTIONS are retried unless a call asks otherwise
+HTTP_CLIENT_MAX_RETRIES = 2
+HTTP_CLIENT_BACKOFF_SECONDS = 0.5   # doubles with each retry
+HTTP_CLIENT_RETRY_STATUS_CODES = (502, 503, 504)
+HTTP_CLIENT_DEFAULT_TIMEOUT = 2 * 60 # seconds, if a call doesn't set one
+
+# Namespaced cache shared by geoconnect processes (gc_apps.geo_utils.shared_cache)
+#   - For multiple processes, the CACHES backend should be shared,
+#     e.g. DatabaseCache or FileBasedCache--not LocMemCache
+GEOCONNECT_CACHE_ALIAS = 'default'
+GEOCONNECT_CACHE_KEY_PREFIX = 'geoconnect'
+# Override a namespace's timeout (seconds), e.g. {'git_info': 3600}
+GEOCONNECT_CACHE_TIMEOUTS = {}
+
 # Make sure links to the embedded map and legend use https
 WORLDMAP_EMBED_FORCE_HTTPS = True
@@ -68,6 +68,10 @@ CACHES = {
 }
 ########## END CACHE CONFIGURATION
 
+# Create WorldMap layers within the web request--no need to
+# run the "run_worldmap_layer_jobs" command
+WORLDMAP_LAYER_JOBS_RUN_ASYNC = False
+
 ########## TOOLBAR CONFIGURATION
 # See: http://django-debug-toolbar.readthedocs.org/en/latest/installation.html#explicit-setup
 INSTALLED_APPS += (
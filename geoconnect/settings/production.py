@@ -101,10 +101,15 @@ DATABASES = {
 
 ########## CACHE CONFIGURATION
 # See: https://docs.djangoproject.com/en/dev/ref/settings/#caches
+#   - Shared by all processes (e.g. gunicorn workers) and kept across restarts
+#   - Create the table with: python manage.py createcachetable
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'geo-prod-snowflake',
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'geoconnect_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        }
     }
 }
 ########## END CACHE CONFIGURATION
@@ -0,0 +1,121 @@
+"""
+Benchmark: per-request work to find the unmatched rows of a table join
+
+Compares, for each preview or download request:
+    - "before": format the whole join column (zero-pad) and filter
+        the table with .isin()
+    - "after": load the saved JoinKeyIndex and look up the
+        unmatched values
+
+The one-time cost of building and saving the index is also shown.
+(Reading the cached table is the same for both and isn't timed.)
+
+usage (from the repository root):
+
+    python scripts/benchmark_unmatched_rows.py
+    python scripts/benchmark_unmatched_rows.py --rows 2000000 --unmatched 500
+"""
+from __future__ import print_function
+import os, sys
+from os.path import abspath, dirname, join
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = dirname(dirname(abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geoconnect.settings.local")
+
+from gc_apps.geo_utils.tabular_util import format_join_column
+from gc_apps.gis_tabular.join_key_index import JoinKeyIndex
+
+DEFAULT_NUM_ROWS = 1000000
+DEFAULT_NUM_UNMATCHED = 200
+DEFAULT_NUM_REQUESTS = 5
+ZERO_PAD_LENGTH = 12
+
+
+def make_data_frame(num_rows):
+    """A table with a numeric join column that needs zero padding"""
+    return pd.DataFrame(dict(\
+                bg_id_10=np.arange(num_rows, dtype=np.int64) + 50250001001,
+                value=np.arange(num_rows) * 0.5,
+                name=['name_%d' % (idx % 50) for idx in xrange(num_rows)]))
+
+
+def get_unmatched_values(df, num_unmatched):
+    """The formatted values of random rows, as sent back by the WorldMap"""
+    row_offsets = np.random.choice(len(df.index), num_unmatched, replace=False)
+    return [('%d' % val).rjust(ZERO_PAD_LENGTH, '0')\
+            for val in df['bg_id_10'].values[row_offsets]]
+
+
+def run_before(df, unmatched_values):
+    """Format the join column and scan the table"""
+    df = df.copy()
+    df['bg_id_10_formatted'], _needs_formatting = format_join_column(\
+                                        df['bg_id_10'], ZERO_PAD_LENGTH)
+    df_failed = df.loc[df['bg_id_10_formatted'].isin(unmatched_values)]
+    return len(df_failed.index)
+
+
+def run_after(df, index_filepath, unmatched_values):
+    """Load the saved index and take the rows"""
+    join_key_index = JoinKeyIndex.load(index_filepath)
+    row_offsets, row_keys = join_key_index.lookup(unmatched_values)
+    df_failed = df.take(row_offsets)
+    df_failed.insert(len(df_failed.columns), 'bg_id_10_formatted', row_keys)
+    return len(df_failed.index)
+
+
+def time_requests(num_requests, func, *args):
+    """returns (result, average seconds per call)"""
+    start = time.time()
+    for _ in xrange(num_requests):
+        result = func(*args)
+    return result, (time.time() - start) / num_requests
+
+
+def run_benchmark(num_rows, num_unmatched, num_requests):
+    """Time each mode"""
+    df = make_data_frame(num_rows)
+    unmatched_values = get_unmatched_values(df, num_unmatched)
+    print('rows: %d, unmatched values: %d, requests: %d' %\
+          (num_rows, num_unmatched, num_requests))
+
+    work_dir = tempfile.mkdtemp(prefix='unmatched_rows_bench_')
+    try:
+        index_filepath = join(work_dir, 'bench.keys.pkl')
+
+        start = time.time()
+        key_series, _needs_formatting = format_join_column(df['bg_id_10'],
+                                                           ZERO_PAD_LENGTH)
+        JoinKeyIndex.build(key_series).save(index_filepath)
+        print('build + save index (once): %0.3f secs (%0.1f MB)' %\
+              (time.time() - start, os.path.getsize(index_filepath) / 1048576.0))
+
+        print('mode\trows found\tsecs/request')
+        num_found, secs = time_requests(num_requests, run_before,
+                                        df, unmatched_values)
+        print('before\t%d\t%0.4f' % (num_found, secs))
+
+        num_found, secs = time_requests(num_requests, run_after,
+                                        df, index_filepath, unmatched_values)
+        print('after\t%d\t%0.4f' % (num_found, secs))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=DEFAULT_NUM_ROWS)
+    parser.add_argument('--unmatched', type=int, default=DEFAULT_NUM_UNMATCHED)
+    parser.add_argument('--requests', type=int, default=DEFAULT_NUM_REQUESTS)
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.unmatched, args.requests)
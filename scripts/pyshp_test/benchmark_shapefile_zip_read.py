@@ -0,0 +1,140 @@
+"""
+Benchmark: ShapefileZipCheck.load_shapefile_from_open_zip read modes
+
+Compares:
+    - "extracted": the original flow.  Extract .shp/.shx/.dbf/.prj to
+        the scratch directory, open with shapefile.Reader, rmtree
+    - "in_archive": read .shp/.shx/.dbf from the .zip into buffers
+
+Reports seconds per load and bytes written to disk.
+
+usage (from the repository root):
+
+    python scripts/pyshp_test/benchmark_shapefile_zip_read.py
+    python scripts/pyshp_test/benchmark_shapefile_zip_read.py --features 200000 --runs 3
+"""
+from __future__ import print_function
+import os, sys
+from os.path import abspath, dirname, join
+import argparse
+import shutil
+import tempfile
+import time
+import zipfile
+
+PROJECT_ROOT = dirname(dirname(dirname(abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geoconnect.settings.local")
+
+DEFAULT_NUM_FEATURES = 50000
+DEFAULT_NUM_RUNS = 5
+SHAPEFILE_BASENAME = 'benchmark_polygons'
+
+
+def make_test_zip(work_dir, num_features):
+    """Write a polygon shapefile set and zip it"""
+    import shapefile
+
+    shp_writer = shapefile.Writer(shapefile.POLYGON)
+    shp_writer.field('NAME', 'C', 40)
+    shp_writer.field('VALUE', 'N', 18, 4)
+    for idx in xrange(num_features):
+        x, y = idx % 1000, idx / 1000
+        shp_writer.poly(parts=[[[x, y], [x, y + 1], [x + 1, y + 1], [x + 1, y], [x, y]]])
+        shp_writer.record('feature_%d' % idx, idx * 0.5)
+
+    shp_basepath = join(work_dir, SHAPEFILE_BASENAME)
+    shp_writer.save(shp_basepath)
+    with open(shp_basepath + '.prj', 'w') as fh:
+        fh.write('GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",'
+                 'SPHEROID["WGS_1984",6378137,298.257223563]],'
+                 'PRIMEM["Greenwich",0],UNIT["Degree",0.017453292519943295]]')
+
+    zip_path = join(work_dir, SHAPEFILE_BASENAME + '.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_obj:
+        for ext in ('.shp', '.shx', '.dbf', '.prj'):
+            zip_obj.write(shp_basepath + ext, SHAPEFILE_BASENAME + ext)
+            os.remove(shp_basepath + ext)
+
+    return zip_path
+
+
+def get_dir_size(dir_path):
+    """Bytes in a directory (0 if it doesn't exist)"""
+    total_bytes = 0
+    for root, _dirs, fnames in os.walk(dir_path):
+        for fname in fnames:
+            total_bytes += os.path.getsize(join(root, fname))
+    return total_bytes
+
+
+def run_mode(read_mode, zip_path, scratch_dir, num_runs):
+    """Load the shapefile "num_runs" times; return (avg seconds, bytes written)"""
+    from django.conf import settings
+    from gc_apps.gis_shapefiles.models import ShapefileInfo
+    from gc_apps.gis_shapefiles.shapefile_zip_check import ShapefileZipCheck
+
+    settings.GISFILE_SCRATCH_WORK_DIRECTORY = scratch_dir
+
+    # Count bytes written to the scratch directory before it's removed
+    bytes_written = [0]
+    orig_rmtree = shutil.rmtree
+    def measuring_rmtree(path, *args, **kwargs):
+        bytes_written[0] += get_dir_size(path)
+        return orig_rmtree(path, *args, **kwargs)
+    shutil.rmtree = measuring_rmtree
+
+    elapsed = 0
+    try:
+        for _ in range(num_runs):
+            shapefile_info = ShapefileInfo(name=SHAPEFILE_BASENAME)
+            # Don't save the model, only the read is of interest
+            shapefile_info.save = lambda *args, **kwargs: None
+
+            start = time.time()
+            zip_checker = ShapefileZipCheck(zip_path)
+            zip_checker.validate()
+            success = zip_checker.load_shapefile_from_open_zip(\
+                            SHAPEFILE_BASENAME, shapefile_info, read_mode)
+            zip_checker.close_zip()
+            elapsed += time.time() - start
+
+            assert success, zip_checker.error_msg
+    finally:
+        shutil.rmtree = orig_rmtree
+
+    return elapsed / num_runs, bytes_written[0] / num_runs, shapefile_info.number_of_features
+
+
+def run_benchmark(num_features, num_runs):
+    import django
+    django.setup()
+    from gc_apps.gis_shapefiles.shapefile_zip_check import ShapefileZipCheck
+
+    work_dir = tempfile.mkdtemp(prefix='shp_zip_bench_')
+    try:
+        zip_path = make_test_zip(work_dir, num_features)
+        print('test file: %s (%0.1f MB, %d features, %d runs)' %\
+            (zip_path, os.path.getsize(zip_path) / 1048576.0, num_features, num_runs))
+        print('mode\t\tsecs/load\tMB written/load\tfeatures')
+
+        for read_mode in (ShapefileZipCheck.READ_EXTRACTED, ShapefileZipCheck.READ_IN_ARCHIVE):
+            scratch_dir = join(work_dir, 'scratch')
+            os.mkdir(scratch_dir)
+            avg_secs, avg_bytes, num_found = run_mode(read_mode, zip_path,
+                                                      scratch_dir, num_runs)
+            print('%s\t%0.3f\t\t%0.1f\t\t%d' %\
+                (read_mode, avg_secs, avg_bytes / 1048576.0, num_found))
+            shutil.rmtree(scratch_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--features', type=int, default=DEFAULT_NUM_FEATURES)
+    parser.add_argument('--runs', type=int, default=DEFAULT_NUM_RUNS)
+    args = parser.parse_args()
+
+    run_benchmark(args.features, args.runs)
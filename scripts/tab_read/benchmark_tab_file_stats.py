@@ -0,0 +1,170 @@
+"""
+Benchmark: TabFileStats ingest -- parse count and peak RSS
+
+Compares:
+    - "before": the original flow.  pd.read_csv to rename the columns,
+        rewrite the file, then pd.read_csv again to collect stats
+    - "after": TabFileStats single pass ingest
+
+Each mode runs in its own interpreter so peak RSS values don't bleed
+into each other.
+
+usage (from the repository root):
+
+    python scripts/tab_read/benchmark_tab_file_stats.py
+    python scripts/tab_read/benchmark_tab_file_stats.py --rows 2000000
+
+Sample results (Python 2.7, pandas 0.24.2; RSS after imports: ~72 MB)
+
+    single pass ingest only:
+        mode    parses  rows    secs    peak RSS (MB)
+        before  2       300000  1.03    122.9
+        after   1       300000  0.86    121.6
+        before  2       500000  1.77    151.6
+        after   1       500000  1.51    151.7
+
+    "after" with column profiling (TabFileStats.collect_stats):
+        after   1       300000  1.52    154.3
+        after   1       500000  2.83    212.1
+"""
+from __future__ import print_function
+import os, sys
+from os.path import abspath, dirname, join
+import argparse
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+PROJECT_ROOT = dirname(dirname(dirname(abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "geoconnect.settings.local")
+
+DEFAULT_NUM_ROWS = 500000
+TEST_FILENAME = 'benchmark_table.tab'
+
+
+def get_peak_rss_mb():
+    """Peak resident set size of this process, in MB (linux: ru_maxrss is in KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def make_test_file(dirname, num_rows):
+    """Write a tab delimited file with column names that need normalizing"""
+    fullpath = join(dirname, TEST_FILENAME)
+    with open(fullpath, 'w') as fh:
+        fh.write('BG_ID_10\tDisSens 2010\tPublic-Denigration\tNeighborhood\n')
+        for idx in xrange(num_rows):
+            fh.write('%d\t%0.4f\t%d\tname_%d\n' %\
+                    (250250001001 + idx, idx * 0.5, idx % 97, idx % 50))
+    return fullpath
+
+
+def get_tabular_info(dirname):
+    """Return an unsaved TabularFileInfo whose dv_file is the test file in "dirname" """
+    from django.core.files.storage import FileSystemStorage
+    from gc_apps.gis_tabular.models import TabularFileInfo
+
+    # Point the dv_file storage at the benchmark directory
+    TabularFileInfo._meta.get_field('dv_file').storage =\
+        FileSystemStorage(location=dirname)
+
+    return TabularFileInfo(datafile_label=TEST_FILENAME,
+                           delimiter='\t',
+                           dv_file=TEST_FILENAME)
+
+
+def run_before(tabular_info):
+    """The original flow: parse, rename, rewrite, parse again"""
+    from csv import QUOTE_NONNUMERIC
+    import pandas as pd
+    from django.core.files.base import ContentFile
+    from gc_apps.geo_utils.file_field_helper import get_file_path_or_url
+    from gc_apps.geo_utils.tabular_util import normalize_colname
+
+    df = pd.read_csv(get_file_path_or_url(tabular_info.dv_file), sep='\t')
+    columns_renamed = {}
+    for count, column in enumerate(df.columns.values.tolist()):
+        normalized = normalize_colname(colname=column, position=count + 1)
+        if column.decode('utf8', 'ignore') != normalized:
+            columns_renamed[column] = normalized
+    if columns_renamed:
+        df.rename(columns=columns_renamed, inplace=True)
+        fh_csv = df.to_csv(quoting=QUOTE_NONNUMERIC, sep='\t', index=False)
+        tabular_info.dv_file.save(TEST_FILENAME, ContentFile(fh_csv), save=False)
+
+    df = pd.read_csv(get_file_path_or_url(tabular_info.dv_file), sep='\t')
+    return len(df.index)
+
+
+def run_after(tabular_info):
+    """TabFileStats single pass"""
+    from gc_apps.gis_tabular.tab_file_stats import TabFileStats
+
+    # Don't save the model, only the stats are of interest
+    tabular_info.save = lambda *args, **kwargs: None
+
+    tab_file_stats = TabFileStats(file_object=tabular_info.dv_file,
+                                  delim='\t',
+                                  tabular_info=tabular_info)
+    assert not tab_file_stats.has_error(), tab_file_stats.error_message
+    return tab_file_stats.num_rows
+
+
+def run_single_mode(mode, dirname):
+    """Run one mode and print: parse_count, num_rows, seconds, peak RSS"""
+    import django
+    django.setup()
+    import pandas as pd
+
+    # Count the parses
+    parse_count = [0]
+    orig_read_csv = pd.read_csv
+    def counting_read_csv(*args, **kwargs):
+        parse_count[0] += 1
+        return orig_read_csv(*args, **kwargs)
+    pd.read_csv = counting_read_csv
+
+    tabular_info = get_tabular_info(dirname)
+    rss_start = get_peak_rss_mb()
+    start = time.time()
+    if mode == 'before':
+        num_rows = run_before(tabular_info)
+    else:
+        num_rows = run_after(tabular_info)
+    elapsed = time.time() - start
+
+    print('%s\t%d\t%d\t%0.2f\t%0.1f\t%0.1f' %\
+          (mode, parse_count[0], num_rows, elapsed, get_peak_rss_mb(), rss_start))
+
+
+def run_benchmark(num_rows):
+    """Write the test file and run each mode in a separate process"""
+    work_dir = tempfile.mkdtemp(prefix='tab_stats_bench_')
+    try:
+        fullpath = make_test_file(work_dir, num_rows)
+        print('test file: %s (%0.1f MB, %d rows)' %\
+            (fullpath, os.path.getsize(fullpath) / 1048576.0, num_rows))
+        print('mode\tparses\trows\tsecs\tpeak RSS (MB)\tRSS after imports (MB)')
+        for mode in ('before', 'after'):
+            # re-write the file b/c the "before" mode renames the columns
+            make_test_file(work_dir, num_rows)
+            subprocess.check_call([sys.executable, abspath(__file__),
+                                   '--mode', mode, '--dir', work_dir])
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=DEFAULT_NUM_ROWS)
+    parser.add_argument('--mode', choices=('before', 'after'))
+    parser.add_argument('--dir')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_single_mode(args.mode, args.dir)
+    else:
+        run_benchmark(args.rows)
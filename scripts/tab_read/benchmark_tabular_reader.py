@@ -0,0 +1,99 @@
+"""
+Benchmark: tabular file reads -- DataFrame memory and peak RSS
+
+Compares:
+    - "read_csv": the original read.  pd.read_csv, pandas' default types
+    - "compact": read_tabular_file(..., compact=True).  Census ids as
+        strings, repeated strings as categoricals, smaller integers
+    - "usecols": read_tabular_file(..., usecols=[join column]).  The read
+        used to build a join key index
+
+Each mode runs in its own interpreter so peak RSS values don't bleed
+into each other.
+
+usage (from the repository root):
+
+    python scripts/tab_read/benchmark_tabular_reader.py
+    python scripts/tab_read/benchmark_tabular_reader.py --rows 2000000
+"""
+from __future__ import print_function
+import os, sys
+from os.path import abspath, dirname, join
+import argparse
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+PROJECT_ROOT = dirname(dirname(dirname(abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+DEFAULT_NUM_ROWS = 500000
+TEST_FILENAME = 'benchmark_table.tab'
+MODES = ('read_csv', 'compact', 'usecols')
+
+
+def get_peak_rss_mb():
+    """Peak resident set size of this process, in MB (linux: ru_maxrss is in KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def make_test_file(dirname, num_rows):
+    """Write a tab delimited file: census id, float, small int, repeated strings"""
+    fullpath = join(dirname, TEST_FILENAME)
+    with open(fullpath, 'w') as fh:
+        fh.write('BG_ID_10\tDisSens2010\tPublic_Denigration\tNeighborhood\tTown\n')
+        for idx in xrange(num_rows):
+            fh.write('0%d\t%0.4f\t%d\tname_%d\ttown_%d\n' %\
+                    (250250001001 + idx, idx * 0.5, idx % 97, idx % 50, idx % 7))
+    return fullpath
+
+
+def run_single_mode(mode, fullpath):
+    """Run one mode and print: rows, seconds, DataFrame MB, peak RSS"""
+    import pandas as pd
+    from gc_apps.geo_utils.tabular_reader import read_tabular_file
+
+    rss_start = get_peak_rss_mb()
+    start = time.time()
+    if mode == 'read_csv':
+        df = pd.read_csv(fullpath, sep='\t')
+    elif mode == 'compact':
+        df = read_tabular_file(fullpath, '\t', compact=True)
+    else:
+        df = read_tabular_file(fullpath, '\t', usecols=['BG_ID_10'])
+    elapsed = time.time() - start
+
+    df_mb = df.memory_usage(deep=True).sum() / 1048576.0
+
+    print('%s\t%d\t%0.2f\t%0.1f\t%0.1f\t%0.1f' %\
+          (mode, len(df.index), elapsed, df_mb, get_peak_rss_mb(), rss_start))
+
+
+def run_benchmark(num_rows):
+    """Write the test file and run each mode in a separate process"""
+    work_dir = tempfile.mkdtemp(prefix='tab_reader_bench_')
+    try:
+        fullpath = make_test_file(work_dir, num_rows)
+        print('test file: %s (%0.1f MB, %d rows)' %\
+            (fullpath, os.path.getsize(fullpath) / 1048576.0, num_rows))
+        print('mode\trows\tsecs\tDataFrame (MB)\tpeak RSS (MB)\tRSS after imports (MB)')
+        for mode in MODES:
+            subprocess.check_call([sys.executable, abspath(__file__),
+                                   '--mode', mode, '--file', fullpath])
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=DEFAULT_NUM_ROWS)
+    parser.add_argument('--mode', choices=MODES)
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_single_mode(args.mode, args.file)
+    else:
+        run_benchmark(args.rows)
@@ -53,3 +53,35 @@ function show_map_update_titles(json_resp){
     }
 
 }
+
+/* ----------------------------------------
+   WorldMap layers are created by a background job.
+   If the JSON response describes an unfinished job,
+   poll the job status url until the job is finished.
+   Then call "on_finished(json_resp)" with the final response:
+    - success: includes the map HTML
+    - fail: includes the error message
+---------------------------------------- */
+function wait_for_layer_job(json_resp, on_finished){
+
+    if (json_resp.success && json_resp.data &&
+            json_resp.data.hasOwnProperty('job_status_url') &&
+            !json_resp.data.is_finished){
+
+        var poll_milliseconds = (json_resp.data.poll_seconds || 2) * 1000;
+
+        setTimeout(function(){
+            $.get(json_resp.data.job_status_url)
+                .done(function(job_json_resp){
+                    wait_for_layer_job(job_json_resp, on_finished);
+                })
+                .fail(function(){
+                    on_finished({success: false,
+                                 message: 'Sorry! Failed to check on the map. Please try again.'});
+                });
+        }, poll_milliseconds);
+        return;
+    }
+
+    on_finished(json_resp);
+}